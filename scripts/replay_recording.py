@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Replays a recording of webhook deliveries (see src.recorder) through
+src.handler.handler, at the pace they were recorded or faster, against local
+fakes of Github (GraphQL and REST), Asana and DynamoDb (moto), and reports
+throughput, latency percentiles and the number of calls made to each service.
+
+The fakes answer from what the recorded payloads say about each pull request,
+so the replay exercises the same code paths as production, minus the network.
+Simulated latencies can be added to each service to approximate it.
+
+    python3 -m scripts.replay_recording recording.jsonl.gz --speed 10 \
+        [--concurrency 16] [--github-latency-ms 150] [--asana-latency-ms 200]
+
+Requires moto (see requirements-dev.txt).
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import math
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from unittest.mock import patch
+
+import boto3  # type: ignore
+from moto import mock_dynamodb2  # type: ignore
+
+import src.asana.client as asana_client
+import src.dynamodb.client as dynamodb_client
+import src.dynamodb.lock as dynamodb_lock
+import src.github.client as github_client
+import src.github.graphql.client as graphql_client
+import src.github.payload as github_payload
+import src.handler as handler
+from src.config import (
+    BACKPRESSURE_TABLE,
+    COMMIT_BUILD_STATES_TABLE,
+    DEAD_LETTERS_TABLE,
+    DELIVERIES_TABLE,
+    LOCK_TABLE,
+    OBJECTS_TABLE,
+    PULL_REQUEST_SNAPSHOTS_TABLE,
+    REVIEW_IDS_TABLE,
+    SYNC_VERSIONS_TABLE,
+    USERS_TABLE,
+)
+from src.github.models import PullRequest, Review, comment_factory
+from src.recorder import read_recording
+
+_REPLAY_SECRET = "replay-secret"
+
+_EMPTY_HISTORY: Dict[str, Any] = {
+    "mergeable": "MERGEABLE",
+    "reviewRequests": {"nodes": []},
+    "reviews": {"nodes": []},
+    "comments": {"nodes": []},
+    "commits": {"nodes": [{"commit": {"status": {"state": "SUCCESS"}}}]},
+}
+
+
+class CallCounter(object):
+    """
+    Counts the calls made to each fake, by service and function, and adds the
+    simulated latency of the service to each of them
+    """
+
+    def __init__(self, latencies_ms: Dict[str, float]):
+        self.latencies_ms = latencies_ms
+        self.calls: Counter = Counter()
+
+    def wrap(self, service: str, name: str, fn: Callable) -> Callable:
+        def counted(*args, **kwargs):
+            self.calls[(service, name)] += 1
+            latency_ms = self.latencies_ms.get(service, 0)
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+            return fn(*args, **kwargs)
+
+        return counted
+
+
+class FakeGithub(object):
+    """
+    Answers GraphQL queries from what the recorded payloads said about each
+    pull request, review, comment and commit
+    """
+
+    def __init__(self):
+        # pull request node id -> FullPullRequest-shaped fields
+        self.pull_requests: Dict[str, Dict[str, Any]] = {}
+        self.reviews: Dict[str, Dict[str, Any]] = {}
+        self.comments: Dict[str, Dict[str, Any]] = {}
+        # pull request node id -> sha of its head commit
+        self.head_shas: Dict[str, str] = {}
+        # commit node id -> sha, as status payloads say
+        self.commit_shas: Dict[str, str] = {}
+        # review databaseId -> review node id
+        self.review_node_ids: Dict[str, str] = {}
+
+    def observe(self, event_type: str, payload: dict) -> None:
+        fields = github_payload.pull_request_fields_from_payload(event_type, payload)
+        if fields is not None:
+            self.pull_requests[fields["id"]] = fields
+            head_sha = payload["pull_request"].get("head", {}).get("sha")
+            if head_sha:
+                self.head_shas[fields["id"]] = head_sha
+        if event_type == "status":
+            self.commit_shas[payload["commit"]["node_id"]] = payload["sha"]
+        raw_review = payload.get("review")
+        if event_type == "pull_request_review" and raw_review:
+            self.review_node_ids[str(raw_review["id"])] = raw_review["node_id"]
+            self.reviews[raw_review["node_id"]] = {
+                "id": raw_review["node_id"],
+                "state": (raw_review.get("state") or "commented").upper(),
+                "body": raw_review.get("body") or "",
+                "author": {"login": raw_review["user"]["login"]},
+                "submittedAt": raw_review.get("submitted_at"),
+                "updatedAt": raw_review.get("submitted_at"),
+                "url": raw_review.get("html_url", ""),
+                "comments": {"nodes": []},
+            }
+        raw_comment = payload.get("comment")
+        if event_type in ("issue_comment", "pull_request_review_comment") and (
+            raw_comment
+        ):
+            self.comments[raw_comment["node_id"]] = {
+                "__typename": "IssueComment"
+                if event_type == "issue_comment"
+                else "PullRequestReviewComment",
+                "id": raw_comment["node_id"],
+                "author": {"login": raw_comment["user"]["login"]},
+                "body": raw_comment.get("body") or "",
+                "url": raw_comment.get("html_url", ""),
+                "publishedAt": raw_comment.get("created_at"),
+                "updatedAt": raw_comment.get("updated_at"),
+            }
+
+    def _raw_pull_request(self, pull_request_id: str) -> Dict[str, Any]:
+        fields = self.pull_requests.get(pull_request_id) or {
+            "id": pull_request_id,
+            "number": 1,
+            "title": "",
+            "body": "",
+            "url": "",
+            "author": {"login": "unknown"},
+            "closed": False,
+            "merged": False,
+            "repository": {"id": "unknown", "name": "", "owner": {"login": ""}},
+            "assignees": {"nodes": []},
+            "labels": {"nodes": []},
+        }
+        return {**_EMPTY_HISTORY, **fields}
+
+    def _raw_review(self, review_id: str) -> Dict[str, Any]:
+        return self.reviews.get(review_id) or {
+            "id": review_id,
+            "state": "COMMENTED",
+            "body": "",
+            "author": {"login": "unknown"},
+            "url": "",
+            "comments": {"nodes": []},
+        }
+
+    def _raw_comment(self, comment_id: str) -> Dict[str, Any]:
+        return self.comments.get(comment_id) or {
+            "__typename": "IssueComment",
+            "id": comment_id,
+            "author": {"login": "unknown"},
+            "body": "",
+            "url": "",
+        }
+
+    def _open_pull_requests_at(self, sha: Optional[str]) -> List[PullRequest]:
+        return [
+            PullRequest(self._raw_pull_request(pr_id))
+            for pr_id, head_sha in self.head_shas.items()
+            if head_sha == sha and not self.pull_requests[pr_id]["closed"]
+        ]
+
+    def _commit_checks(self, sha: str) -> Dict[str, Any]:
+        return {
+            "associatedPullRequests": {
+                "nodes": [
+                    {"id": pull_request.id(), "closed": False}
+                    for pull_request in self._open_pull_requests_at(sha)
+                ]
+            },
+            "statusCheckRollup": None,
+        }
+
+    def _review_for_database_id(self, review_database_id: Any) -> Optional[Review]:
+        review_id = self.review_node_ids.get(str(review_database_id))
+        return Review(self._raw_review(review_id)) if review_id else None
+
+    def fakes(self) -> Dict[str, Callable]:
+        return {
+            "get_pull_request": lambda pr_id: PullRequest(
+                self._raw_pull_request(pr_id)
+            ),
+            "get_pull_requests": lambda pr_ids: [
+                PullRequest(self._raw_pull_request(pr_id)) for pr_id in pr_ids
+            ],
+            "get_pull_request_history": lambda pr_id: {**_EMPTY_HISTORY, "id": pr_id,},
+            "get_pull_request_and_comment": lambda pr_id, comment_id: (
+                PullRequest(self._raw_pull_request(pr_id)),
+                comment_factory(self._raw_comment(comment_id)),
+            ),
+            "get_pull_request_and_review": lambda pr_id, review_id: (
+                PullRequest(self._raw_pull_request(pr_id)),
+                Review(self._raw_review(review_id)),
+            ),
+            "get_comment": lambda comment_id: comment_factory(
+                self._raw_comment(comment_id)
+            ),
+            "get_review": lambda review_id: Review(self._raw_review(review_id)),
+            "get_pull_requests_for_commit": lambda commit_id: (
+                self._open_pull_requests_at(self.commit_shas.get(commit_id))
+            ),
+            "get_commit_checks": lambda owner, name, sha: self._commit_checks(sha),
+            "get_review_for_database_id": lambda pr_id, review_db_id: (
+                self._review_for_database_id(review_db_id)
+            ),
+        }
+
+
+class FakeAsanaClient(asana_client.AsanaClient):
+    def __init__(self):
+        self._next_id = 0
+
+    def _new_id(self) -> str:
+        self._next_id += 1
+        return str(self._next_id)
+
+    def create_task(self, project_id: str, due_date_str: str = None) -> str:
+        return self._new_id()
+
+    def update_task(self, task_id: str, fields: dict):
+        pass
+
+    def add_followers(self, task_id: str, followers: List[str]):
+        pass
+
+    def add_comment(self, task_id: str, comment_body: str) -> str:
+        return self._new_id()
+
+    def update_comment(self, comment_id: str, comment_body: str) -> None:
+        pass
+
+    def delete_comment(self, comment_id: str) -> None:
+        pass
+
+    def get_project_custom_fields(self, project_id: str):
+        return iter([])
+
+    def find_all_tasks_for_project(self, project_id: str, opt_fields=None):
+        return iter([])
+
+    def create_attachment_on_task(self, *args, **kwargs):
+        pass
+
+
+def _create_tables(client) -> None:
+    # The same schema as terraform/main.tf
+    for table_name, key in (
+        (OBJECTS_TABLE, "github-node"),
+        (USERS_TABLE, "github/handle"),
+        (DELIVERIES_TABLE, "delivery-id"),
+        (DEAD_LETTERS_TABLE, "delivery-id"),
+        (BACKPRESSURE_TABLE, "service"),
+        (SYNC_VERSIONS_TABLE, "github-node"),
+        (REVIEW_IDS_TABLE, "review-database-id"),
+        (PULL_REQUEST_SNAPSHOTS_TABLE, "github-node"),
+        (COMMIT_BUILD_STATES_TABLE, "commit-sha"),
+    ):
+        client.create_table(
+            AttributeDefinitions=[{"AttributeName": key, "AttributeType": "S"}],
+            TableName=table_name,
+            KeySchema=[{"AttributeName": key, "KeyType": "HASH"}],
+            ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5},
+        )
+    client.create_table(
+        AttributeDefinitions=[
+            {"AttributeName": "lock_key", "AttributeType": "S"},
+            {"AttributeName": "sort_key", "AttributeType": "S"},
+        ],
+        TableName=LOCK_TABLE,
+        KeySchema=[
+            {"AttributeName": "lock_key", "KeyType": "HASH"},
+            {"AttributeName": "sort_key", "KeyType": "RANGE"},
+        ],
+        ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5},
+    )
+
+
+def _install_fakes(stack: ExitStack, github: FakeGithub, counter: CallCounter) -> None:
+    for name, fake in github.fakes().items():
+        stack.enter_context(
+            patch.object(graphql_client, name, counter.wrap("github", name, fake))
+        )
+    for name in (
+        "edit_pr_description",
+        "edit_pr_title",
+        "add_pr_comment",
+        "set_pull_request_assignee",
+        "merge_pull_request",
+    ):
+        stack.enter_context(
+            patch.object(
+                github_client,
+                name,
+                counter.wrap("github", name, lambda *args, **kwargs: None),
+            )
+        )
+
+    fake_asana = FakeAsanaClient()
+    for name in (
+        "create_task",
+        "update_task",
+        "add_followers",
+        "add_comment",
+        "update_comment",
+        "delete_comment",
+        "get_project_custom_fields",
+        "find_all_tasks_for_project",
+        "create_attachment_on_task",
+    ):
+        setattr(
+            fake_asana, name, counter.wrap("asana", name, getattr(fake_asana, name))
+        )
+    stack.enter_context(
+        patch.object(asana_client.AsanaClient, "_singleton", fake_asana)
+    )
+
+    dynamodb = dynamodb_client.DynamoDbClient()
+    stack.enter_context(
+        patch.object(dynamodb_client.DynamoDbClient, "_singleton", dynamodb)
+    )
+    for name in (
+        "get_asana_id_from_github_node_id",
+        "insert_github_node_to_asana_id_mapping",
+        "get_delivery",
+        "put_delivery",
+        "update_delivery_outcome",
+        "put_dead_letter",
+    ):
+        setattr(dynamodb, name, counter.wrap("dynamodb", name, getattr(dynamodb, name)))
+    stack.enter_context(
+        patch.object(
+            dynamodb_lock.lock_client,
+            "acquire_lock",
+            counter.wrap(
+                "dynamodb", "acquire_lock", dynamodb_lock.lock_client.acquire_lock
+            ),
+        )
+    )
+
+    stack.enter_context(patch.object(handler, "GITHUB_HMAC_SECRET", _REPLAY_SECRET))
+    # Process synchronously, so that the latency covers the whole sync
+    stack.enter_context(
+        patch.object(handler.work_queue, "is_enabled", return_value=False)
+    )
+
+
+def _event(delivery: Dict[str, Any], index: int) -> dict:
+    body = json.dumps(delivery["payload"])
+    signature = hmac.new(
+        bytes(_REPLAY_SECRET, "utf-8"), msg=bytes(body, "utf-8"), digestmod=hashlib.sha1
+    ).hexdigest()
+    return {
+        "headers": {
+            "X-GitHub-Event": delivery["event_type"],
+            "X-Hub-Signature": "sha1=" + signature,
+            # Replays must not be de-duplicated against each other
+            "X-GitHub-Delivery": f"{delivery['delivery_id']}-replay-{index}",
+        },
+        "body": body,
+    }
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def replay(
+    deliveries: List[Dict[str, Any]],
+    speed: float,
+    concurrency: int,
+    latencies_ms: Dict[str, float],
+) -> Dict[str, Any]:
+    deliveries = sorted(deliveries, key=lambda delivery: delivery["received_at"])
+    github = FakeGithub()
+    for delivery in deliveries:
+        github.observe(delivery["event_type"], delivery["payload"])
+    counter = CallCounter(latencies_ms)
+
+    with mock_dynamodb2(), ExitStack() as stack:
+        client = boto3.client("dynamodb")
+        _create_tables(client)
+        # Every repository maps to an Asana project, so that tasks get synced
+        repository_ids = {
+            fields["repository"]["id"] for fields in github.pull_requests.values()
+        }
+        dynamodb_client.DynamoDbClient().bulk_insert_github_node_to_asana_id_mapping(
+            [
+                (repository_id, "project-" + repository_id)
+                for repository_id in repository_ids
+            ]
+        )
+        _install_fakes(stack, github, counter)
+
+        results: List[Tuple[str, float]] = []
+
+        def run(event: dict, scheduled_at: float) -> None:
+            response = handler.handler(event, {})
+            results.append((response["statusCode"], time.time() - scheduled_at))
+
+        first_received_at = deliveries[0]["received_at"] if deliveries else 0
+        started_at = time.time()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for index, delivery in enumerate(deliveries):
+                scheduled_at = (
+                    started_at + (delivery["received_at"] - first_received_at) / speed
+                )
+                delay = scheduled_at - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(run, _event(delivery, index), scheduled_at)
+        duration = time.time() - started_at
+
+    sorted_latencies = sorted(latency * 1000 for _, latency in results)
+    return {
+        "deliveries": len(results),
+        "duration_seconds": round(duration, 3),
+        "throughput_per_second": round(len(results) / duration, 2) if duration else 0,
+        "latency_ms": {
+            "p50": round(percentile(sorted_latencies, 0.50), 1),
+            "p95": round(percentile(sorted_latencies, 0.95), 1),
+            "p99": round(percentile(sorted_latencies, 0.99), 1),
+            "max": round(sorted_latencies[-1], 1) if sorted_latencies else 0,
+        },
+        "status_codes": dict(Counter(status_code for status_code, _ in results)),
+        "calls": {
+            service: {
+                name: count
+                for (call_service, name), count in sorted(counter.calls.items())
+                if call_service == service
+            }
+            for service in sorted({service for service, _ in counter.calls})
+        },
+    }
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Replay recorded webhook deliveries against local fakes"
+    )
+    parser.add_argument("recording", help="A file written by src.recorder")
+    parser.add_argument(
+        "--speed", type=float, default=1, help="Replay speed, e.g. 1, 10 or 100"
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--github-latency-ms", type=float, default=0)
+    parser.add_argument("--asana-latency-ms", type=float, default=0)
+    parser.add_argument("--dynamodb-latency-ms", type=float, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    report = replay(
+        list(read_recording(args.recording)),
+        args.speed,
+        args.concurrency,
+        {
+            "github": args.github_latency_ms,
+            "asana": args.asana_latency_ms,
+            "dynamodb": args.dynamodb_latency_ms,
+        },
+    )
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,97 @@
+"""
+Concurrent calls to Github and Asana.
+
+The clients of Github's GraphQL and REST APIs, and of Asana, are blocking, so
+a handler used to make its calls one after another, even when they didn't
+depend on each other. A handler can now describe its independent calls as a
+coroutine, e.g.:
+
+    async def _link_task(pull_request, task_id):
+        await asyncio.gather(
+            aio.call(asana_helpers.create_attachments, body, task_id),
+            aio.call(_add_asana_task_to_pull_request, pull_request, task_id),
+        )
+
+    aio.run(_link_task(pull_request, task_id))
+
+Coroutines run on a single event loop, in a background thread, and each call
+runs on a thread of a shared pool of EXTERNAL_CALLS_MAX_CONCURRENCY threads.
+Github's GraphQL client shares a single pool of up to GITHUB_GRAPHQL_POOL_SIZE
+keep-alive connections across all threads (see src.github.graphql.transport).
+Each call in flight uses one connection of it, so the thread pool bounds how
+many connections are in use at once. Keep GITHUB_GRAPHQL_POOL_SIZE at least
+EXTERNAL_CALLS_MAX_CONCURRENCY, or connections beyond it are closed after each
+query.
+
+A call that runs `aio.run` itself runs the calls of its coroutine one after
+another, on its own thread, rather than waiting for threads of the pool it
+holds one of.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Coroutine, Optional, TypeVar
+
+from src.config import EXTERNAL_CALLS_MAX_CONCURRENCY
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_pool_thread = threading.local()
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _executor
+    with _lock:
+        if _loop is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=EXTERNAL_CALLS_MAX_CONCURRENCY,
+                thread_name_prefix="sgtm-aio",
+            )
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(_executor)
+            threading.Thread(
+                target=loop.run_forever, name="sgtm-aio-loop", daemon=True
+            ).start()
+            _loop = loop
+        return _loop
+
+
+def _in_pool() -> bool:
+    return getattr(_pool_thread, "active", False)
+
+
+def _call_in_pool(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    _pool_thread.active = True
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _pool_thread.active = False
+
+
+async def call(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Calls the blocking `func` with `args` and `kwargs` on the shared pool
+    """
+    if _in_pool():
+        return func(*args, **kwargs)
+    return await asyncio.get_event_loop().run_in_executor(
+        None, functools.partial(_call_in_pool, func, *args, **kwargs)
+    )
+
+
+def run(coroutine: Coroutine[Any, Any, T]) -> T:
+    """
+    Runs `coroutine` on the shared event loop, and blocks until it's done.
+    Raises what the coroutine raises.
+    """
+    if _in_pool():
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+    return asyncio.run_coroutine_threadsafe(coroutine, _event_loop()).result()
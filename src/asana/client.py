@@ -1,6 +1,7 @@
 from typing import List, Iterator, Dict, Optional
 from typing_extensions import Literal
 import asana  # type: ignore
+import src.backpressure as backpressure
 from src.config import ASANA_API_KEY
 
 # See: https://developers.asana.com/docs/input-output-options
@@ -22,6 +23,18 @@ def validate_object_id(object_id: str, message: str):
         raise ValueError(message)
 
 
+class _BackpressureReportingClient(asana.Client):
+    """
+    Reports Asana's rate limit responses to src.backpressure, before retrying
+    them the way asana.Client does
+    """
+
+    def _handle_retryable_error(self, e, retry_count):
+        if isinstance(e, asana.error.RateLimitEnforcedError):
+            backpressure.throttle(backpressure.ASANA, e.retry_after or None)
+        super()._handle_retryable_error(e, retry_count)
+
+
 class AsanaClient(object):
     """
     Encapsulates the Asana client interface, as exposed to the world. There is a single (singleton) instance of
@@ -33,7 +46,7 @@ class AsanaClient(object):
     _singleton = None
 
     def __init__(self):
-        client = asana.Client.access_token(ASANA_API_KEY)
+        client = _BackpressureReportingClient.access_token(ASANA_API_KEY)
         client.headers = {"Asana-Enable": "string_ids"}
         self.asana_api_client = client
 
@@ -1,4 +1,5 @@
-from typing import Optional
+import asyncio
+from typing import Any, Dict, List, Optional
 from . import client as asana_client
 from . import helpers as asana_helpers
 from . import logic as asana_logic
@@ -6,6 +7,7 @@ from src.github.models import Comment, PullRequest, Review
 from src.logger import logger
 from src.dynamodb import client as dynamodb_client
 from src.github import helpers as github_helpers
+import src.aio as aio
 
 
 def create_task(repository_id: str) -> Optional[str]:
@@ -33,9 +35,37 @@ def update_task(pull_request: PullRequest, task_id: str):
         for k, v in fields.items()
         if k in ("assignee", "name", "html_notes", "completed", "custom_fields")
     }
-    asana_client.update_task(task_id, update_task_fields)
-    asana_client.add_followers(task_id, fields["followers"])
-    maybe_complete_tasks_on_merge(pull_request)
+    aio.run(
+        _update_task(pull_request, task_id, update_task_fields, fields["followers"])
+    )
+
+
+async def _update_task(
+    pull_request: PullRequest,
+    task_id: str,
+    update_task_fields: Dict[str, Any],
+    followers: List[str],
+):
+    # None of these depend on each other
+    await asyncio.gather(
+        aio.call(asana_client.update_task, task_id, update_task_fields),
+        aio.call(asana_client.add_followers, task_id, followers),
+        aio.call(maybe_complete_tasks_on_merge, pull_request),
+    )
+
+
+def update_task_build_status(task_id: str, repository_id: str, build_status: str):
+    """
+    Updates only the "Build" custom field of the task, for when nothing else
+    about its pull request changed
+    """
+    custom_fields = asana_helpers.build_custom_field_from_build_status(
+        repository_id, build_status
+    )
+    if not custom_fields:
+        logger.info(f"No Build field to update on task {task_id}")
+        return
+    asana_client.update_task(task_id, {"custom_fields": custom_fields})
 
 
 def maybe_complete_tasks_on_merge(pull_request: PullRequest):
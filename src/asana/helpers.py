@@ -131,6 +131,25 @@ def _custom_fields_from_pull_request(pull_request: PullRequest) -> Dict:
         return data
 
 
+def build_custom_field_from_build_status(repository_id: str, build_status: str) -> Dict:
+    """
+    The custom_fields to update to set only the "Build" field of the
+    repository's tasks to `build_status` (e.g. "SUCCESS"), or {} if the project
+    has no such field or option.
+    """
+    project_id = dynamodb_client.get_asana_id_from_github_node_id(repository_id)
+    if project_id is None:
+        return {}
+    custom_field_settings = list(asana_client.get_project_custom_fields(project_id))
+    custom_field_id = _get_custom_field_id("Build", custom_field_settings)
+    enum_option_id = _get_custom_field_enum_option_id(
+        "Build", build_status.capitalize(), custom_field_settings
+    )
+    if custom_field_id and enum_option_id:
+        return {custom_field_id: enum_option_id}
+    return {}
+
+
 def _get_custom_field_id(
     custom_field_name: str, custom_field_settings: List[dict]
 ) -> Optional[str]:
@@ -313,7 +332,6 @@ def get_linked_task_ids(pull_request: PullRequest) -> List[str]:
                 if maybe_id is not None:
                     task_ids.append(maybe_id.group())
 
-
     # Grab any task urls in the next line
     if task_url_line:
         logger.info("Line after Asana tasks line: ", task_url_line)
@@ -0,0 +1,107 @@
+"""
+A shared signal that Asana or Github is throttling us.
+
+When a client sees a rate limit response (Asana's 429s, Github's primary or
+secondary rate limits), it calls `throttle`, which records until when the
+service asked us to back off, both in-process and in the BACKPRESSURE_TABLE so
+that every Lambda instance and worker sees it. `throttled_services` reads it
+back, from DynamoDb at most every BACKPRESSURE_REFRESH_SECONDS; if DynamoDb is
+unavailable, the in-process value is used on its own.
+
+While a service is throttled, github_webhook sheds events that can wait (see
+DeferredError), instead of calling the service only to fail again. Once the
+back off period is over, deferred events are retried by the work queue.
+"""
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
+
+from src.dynamodb import client as dynamodb_client
+from src.logger import logger
+import src.metrics as metrics
+
+ASANA = "asana"
+GITHUB = "github"
+SERVICES = (ASANA, GITHUB)
+
+# How long to back off when a service doesn't say
+DEFAULT_BACKOFF_SECONDS = 60.0
+
+BACKPRESSURE_REFRESH_SECONDS = 5.0
+
+
+class DeferredError(Exception):
+    """
+    Raised instead of handling an event that can wait while a service is throttling
+    """
+
+    pass
+
+
+_lock = threading.Lock()
+# service -> time until which it asked us to back off
+_throttled_until: Dict[str, float] = {}
+# service -> when _throttled_until was last refreshed from DynamoDb
+_refreshed_at: Dict[str, float] = {}
+
+
+def throttle(service: str, retry_after_seconds: Optional[float] = None) -> None:
+    """
+    Records that `service` asked us to back off for `retry_after_seconds`
+    """
+    until = time.time() + (retry_after_seconds or DEFAULT_BACKOFF_SECONDS)
+    with _lock:
+        if until <= _throttled_until.get(service, 0):
+            return
+        _throttled_until[service] = until
+    logger.warning(f"{service} is throttling, backing off until {until:.0f}")
+    metrics.increment("Throttled", dimensions={"service": service})
+    try:
+        dynamodb_client.put_throttled_until(service, until)
+    except Exception:
+        logger.warning(
+            f"Could not share the backpressure of {service}:\n" + traceback.format_exc()
+        )
+
+
+def _refresh(service: str, now: float) -> None:
+    with _lock:
+        if now - _refreshed_at.get(service, 0) < BACKPRESSURE_REFRESH_SECONDS:
+            return
+        _refreshed_at[service] = now
+    try:
+        shared_until = dynamodb_client.get_throttled_until(service)
+    except Exception:
+        logger.warning(
+            f"Could not read the backpressure of {service}:\n" + traceback.format_exc()
+        )
+        return
+    if shared_until is not None:
+        with _lock:
+            _throttled_until[service] = max(
+                _throttled_until.get(service, 0), shared_until
+            )
+
+
+def throttled_services() -> List[str]:
+    """
+    The services that currently ask us to back off
+    """
+    now = time.time()
+    throttled = []
+    for service in SERVICES:
+        _refresh(service, now)
+        with _lock:
+            if _throttled_until.get(service, 0) > now:
+                throttled.append(service)
+    return throttled
+
+
+def reset() -> None:
+    """
+    Forgets all backpressure recorded in-process (for tests)
+    """
+    with _lock:
+        _throttled_until.clear()
+        _refreshed_at.clear()
@@ -1,6 +1,7 @@
 import os
 import boto3  # type: ignore
 import json
+import tempfile
 
 __api_keys_s3_bucket = os.getenv("API_KEYS_S3_BUCKET")
 __api_keys_s3_key = os.getenv("API_KEYS_S3_KEY")
@@ -20,8 +21,126 @@ ENV = os.getenv("ENV", "dev")
 LOCK_TABLE = os.getenv("LOCK_TABLE", "sgtm-lock")
 OBJECTS_TABLE = os.getenv("OBJECTS_TABLE", "sgtm-objects")
 USERS_TABLE = os.getenv("USERS_TABLE", "sgtm-users")
+DELIVERIES_TABLE = os.getenv("DELIVERIES_TABLE", "sgtm-deliveries")
+DEAD_LETTERS_TABLE = os.getenv("DEAD_LETTERS_TABLE", "sgtm-dead-letters")
+BACKPRESSURE_TABLE = os.getenv("BACKPRESSURE_TABLE", "sgtm-backpressure")
+SYNC_VERSIONS_TABLE = os.getenv("SYNC_VERSIONS_TABLE", "sgtm-sync-versions")
+REVIEW_IDS_TABLE = os.getenv("REVIEW_IDS_TABLE", "sgtm-review-ids")
+PULL_REQUEST_SNAPSHOTS_TABLE = os.getenv(
+    "PULL_REQUEST_SNAPSHOTS_TABLE", "sgtm-pull-request-snapshots"
+)
+COMMIT_BUILD_STATES_TABLE = os.getenv(
+    "COMMIT_BUILD_STATES_TABLE", "sgtm-commit-build-states"
+)
 ASANA_USERS_PROJECT_ID = os.getenv("ASANA_USERS_PROJECT_ID", "")
 
+# Work queue. When WORK_QUEUE_BACKEND is unset, webhooks are processed
+# synchronously by the handler. Otherwise the handler only verifies and
+# enqueues the delivery, and src.worker processes it.
+# Supported backends: "sqs", "sqlite", "memory"
+WORK_QUEUE_BACKEND = os.getenv("WORK_QUEUE_BACKEND", "")
+WORK_QUEUE_URL = os.getenv("WORK_QUEUE_URL", "")
+WORK_QUEUE_SQLITE_PATH = os.getenv("WORK_QUEUE_SQLITE_PATH", "sgtm-work-queue.sqlite3")
+WORKER_MAX_CONCURRENCY = int(os.getenv("WORKER_MAX_CONCURRENCY", "4"))
+# A delivery that failed this many times is acknowledged once its dead letter
+# is written, to be replayed from there (see src.dead_letters). Keep it below
+# WORK_QUEUE_MAX_RECEIVES.
+WORKER_MAX_RECEIVES = int(os.getenv("WORKER_MAX_RECEIVES", "3"))
+# The maxReceiveCount of the work queue's redrive policy: a delivery that isn't
+# acknowledged on its receive number WORK_QUEUE_MAX_RECEIVES is moved to the
+# queue's dead letter queue, so the worker never defers it past that.
+WORK_QUEUE_MAX_RECEIVES = int(os.getenv("WORK_QUEUE_MAX_RECEIVES", "5"))
+# Events for the same pull request that arrive within this many seconds of each
+# other are handled as a single pull request sync. 0 disables coalescing.
+COALESCE_WINDOW_SECONDS = float(os.getenv("COALESCE_WINDOW_SECONDS", "5"))
+
+# When set, every verified delivery is appended to this gzip-compressed JSONL
+# file, to be replayed against local fakes (see src.recorder)
+RECORD_DELIVERIES_PATH = os.getenv("RECORD_DELIVERIES_PATH")
+
+# Priority lanes (see github_webhook.priority_lane). Each lane has its own
+# concurrency budget, and optionally a rate budget in deliveries per second (0
+# for none). Low lane deliveries over their rate budget are put back on the
+# queue, and dropped once they are older than LOW_LANE_MAX_AGE_SECONDS.
+HIGH_LANE_MAX_CONCURRENCY = int(os.getenv("HIGH_LANE_MAX_CONCURRENCY", "4"))
+NORMAL_LANE_MAX_CONCURRENCY = int(os.getenv("NORMAL_LANE_MAX_CONCURRENCY", "3"))
+LOW_LANE_MAX_CONCURRENCY = int(os.getenv("LOW_LANE_MAX_CONCURRENCY", "1"))
+HIGH_LANE_RATE_PER_SECOND = float(os.getenv("HIGH_LANE_RATE_PER_SECOND", "0"))
+NORMAL_LANE_RATE_PER_SECOND = float(os.getenv("NORMAL_LANE_RATE_PER_SECOND", "0"))
+LOW_LANE_RATE_PER_SECOND = float(os.getenv("LOW_LANE_RATE_PER_SECOND", "2"))
+LOW_LANE_MAX_AGE_SECONDS = float(os.getenv("LOW_LANE_MAX_AGE_SECONDS", "3600"))
+# Deferred deliveries stay invisible on the queue for this long before they're
+# retried. Every retry is a receive, so by default a deferred low lane delivery
+# reaches LOW_LANE_MAX_AGE_SECONDS on its last receive (see
+# WORK_QUEUE_MAX_RECEIVES) rather than after a few minutes.
+WORKER_DEFER_SECONDS = float(
+    os.getenv(
+        "WORKER_DEFER_SECONDS",
+        str(LOW_LANE_MAX_AGE_SECONDS / max(1, WORK_QUEUE_MAX_RECEIVES - 1)),
+    )
+)
+
+# Independent calls to Github and Asana are made concurrently, on a pool of
+# this many threads per process (see src.aio)
+EXTERNAL_CALLS_MAX_CONCURRENCY = int(os.getenv("EXTERNAL_CALLS_MAX_CONCURRENCY", "8"))
+
+# Github's GraphQL API is queried over a pool of keep-alive connections (see
+# src.github.graphql.transport). With GITHUB_GRAPHQL_PERSISTED_QUERIES, queries
+# are sent as the hashes of their documents, for a GITHUB_GRAPHQL_URL that
+# supports persisted queries (see src.github.graphql.documents).
+GITHUB_GRAPHQL_URL = os.getenv("GITHUB_GRAPHQL_URL", "https://api.github.com/graphql")
+GITHUB_GRAPHQL_PERSISTED_QUERIES = (
+    os.getenv("GITHUB_GRAPHQL_PERSISTED_QUERIES") == "true"
+)
+GITHUB_GRAPHQL_POOL_SIZE = int(os.getenv("GITHUB_GRAPHQL_POOL_SIZE", "10"))
+GITHUB_GRAPHQL_CONNECT_TIMEOUT_SECONDS = float(
+    os.getenv("GITHUB_GRAPHQL_CONNECT_TIMEOUT_SECONDS", "5")
+)
+GITHUB_GRAPHQL_READ_TIMEOUT_SECONDS = float(
+    os.getenv("GITHUB_GRAPHQL_READ_TIMEOUT_SECONDS", "30")
+)
+
+# Queries fetch the last page of a pull request's reviews, comments and review
+# requests; their earlier pages are fetched as they are read, up to this many
+# pages per pull request (see src.github.graphql.client.ConnectionPages).
+GITHUB_PAGES_PER_PULL_REQUEST = int(os.getenv("GITHUB_PAGES_PER_PULL_REQUEST", "10"))
+
+# Once fewer than this fraction of Github's GraphQL rate limit points are left,
+# events that can wait are deferred until the points reset (see
+# src.github.graphql.rate_limit).
+GITHUB_RATE_LIMIT_RESERVE = float(os.getenv("GITHUB_RATE_LIMIT_RESERVE", "0.1"))
+
+# Failed calls to Github are retried, after Github's Retry-After if it's at most
+# GITHUB_RETRY_AFTER_MAX_SECONDS. After GITHUB_CIRCUIT_FAILURE_THRESHOLD server
+# errors in a row, calls to its host fail fast for GITHUB_CIRCUIT_COOLDOWN_SECONDS
+# (see src.github.resilience).
+GITHUB_RETRY_AFTER_MAX_SECONDS = float(
+    os.getenv("GITHUB_RETRY_AFTER_MAX_SECONDS", "10")
+)
+GITHUB_CIRCUIT_FAILURE_THRESHOLD = int(
+    os.getenv("GITHUB_CIRCUIT_FAILURE_THRESHOLD", "5")
+)
+GITHUB_CIRCUIT_COOLDOWN_SECONDS = float(
+    os.getenv("GITHUB_CIRCUIT_COOLDOWN_SECONDS", "30")
+)
+
+# Fetched pull requests are cached in-process, and, with
+# PULL_REQUEST_SNAPSHOTS_SHARED, in the PULL_REQUEST_SNAPSHOTS_TABLE for every
+# instance (see src.snapshots).
+PULL_REQUEST_SNAPSHOTS_SHARED = os.getenv("PULL_REQUEST_SNAPSHOTS_SHARED") == "true"
+
+# Per pull request locks: "dynamodb" (the LOCK_TABLE), or "local" for
+# single-node deployments (see src.server), which lock files in LOCAL_LOCK_DIR
+LOCK_BACKEND = os.getenv("LOCK_BACKEND", "dynamodb")
+LOCAL_LOCK_DIR = os.getenv(
+    "LOCAL_LOCK_DIR", os.path.join(tempfile.gettempdir(), "sgtm-locks")
+)
+
+# Self-hosted server (see src.server)
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+# How long to wait for in-flight deliveries when shutting down
+SERVER_DRAIN_TIMEOUT_SECONDS = float(os.getenv("SERVER_DRAIN_TIMEOUT_SECONDS", "60"))
+
 # Feature flags
 def is_feature_flag_enabled(flag_name: str) -> bool:
     return os.getenv(flag_name) == "true"
@@ -0,0 +1,269 @@
+"""
+Dead letters of webhook deliveries that failed, and a tool to replay them.
+
+Whenever a delivery fails (while being processed by the handler, the worker or
+the server, or while being enqueued), its headers and body are written to the
+DEAD_LETTERS_TABLE, together with the error and the stage it failed at. Writing
+a dead letter is best effort, like de-duplication: it must never turn into
+another failure.
+
+After an outage, the failed deliveries can be replayed in bulk instead of being
+redelivered one by one from Github's UI:
+
+    python3 -m src.dead_letters list [--event-type pull_request]
+    python3 -m src.dead_letters replay [--concurrency 8] [--rate 10] [--limit 1000]
+
+Replays are rate limited, keep the per pull request order (deliveries with the
+same ordering key are replayed one at a time, oldest first, and a failure skips
+the rest), and are de-duplicated like deliveries from Github: a dead letter of
+a delivery that has since succeeded is deleted without being processed again.
+Replayed deliveries that succeed are deleted; the ones that fail again stay,
+with their attempt count incremented.
+"""
+import argparse
+import json
+import time
+import traceback
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import src.deliveries as delivery_dedup
+import src.github.webhook as github_webhook
+import src.metrics as metrics
+from src.dynamodb import client as dynamodb_client
+from src.lanes import TokenBucket
+from src.logger import logger
+from src.work_queue.client import WebhookDelivery
+
+# Long enough to notice an outage after a long weekend
+DEAD_LETTER_TTL_SECONDS = 14 * 24 * 60 * 60
+
+# Replay outcomes
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+DUPLICATE = "duplicate"
+BLOCKED = "blocked"
+
+
+class DeadLetter(object):
+    def __init__(
+        self,
+        delivery_id: str,
+        event_type: str,
+        ordering_key: str,
+        headers: Dict[str, str],
+        body: str,
+        stage: str,
+        error: str,
+        received_at: float,
+        failed_at: float,
+        attempts: int = 1,
+    ):
+        self.delivery_id = delivery_id
+        self.event_type = event_type
+        self.ordering_key = ordering_key
+        self.headers = headers
+        self.body = body
+        # Where the delivery failed: "handler", "enqueue", "worker", "server" or "replay"
+        self.stage = stage
+        self.error = error
+        self.received_at = received_at
+        self.failed_at = failed_at
+        self.attempts = attempts
+
+    def to_delivery(self) -> WebhookDelivery:
+        return WebhookDelivery(
+            self.delivery_id,
+            self.event_type,
+            self.body,
+            self.ordering_key,
+            received_at=self.received_at,
+        )
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> "DeadLetter":
+        return cls(
+            item["delivery-id"],
+            item["event-type"],
+            item["ordering-key"],
+            json.loads(item["headers"]),
+            item["body"],
+            item["stage"],
+            item["error"],
+            item["received-at"],
+            item["failed-at"],
+            int(item["attempts"]),
+        )
+
+
+def _headers(delivery: WebhookDelivery) -> Dict[str, str]:
+    # The signature was verified when the delivery was received, so it isn't kept
+    return {
+        "X-GitHub-Event": delivery.event_type,
+        "X-GitHub-Delivery": delivery.delivery_id,
+    }
+
+
+def record_dead_letter(delivery: WebhookDelivery, stage: str, error: str) -> bool:
+    """
+    Writes the dead letter of a delivery that failed at `stage`. Returns
+    whether it was written.
+    """
+    now = time.time()
+    metrics.increment("DeadLetters", dimensions={"stage": stage})
+    try:
+        dynamodb_client.put_dead_letter(
+            {
+                "delivery-id": delivery.delivery_id,
+                "event-type": delivery.event_type,
+                "ordering-key": delivery.ordering_key,
+                "headers": json.dumps(_headers(delivery)),
+                "body": delivery.body,
+                "stage": stage,
+                "error": error,
+                "received-at": delivery.received_at,
+                "failed-at": now,
+            },
+            int(now + DEAD_LETTER_TTL_SECONDS),
+        )
+    except Exception:
+        logger.warning(
+            f"Could not write the dead letter of delivery {delivery.delivery_id}:\n"
+            + traceback.format_exc()
+        )
+        return False
+    return True
+
+
+def get_dead_letters(event_type: Optional[str] = None) -> Iterator[DeadLetter]:
+    for item in dynamodb_client.get_all_dead_letters():
+        dead_letter = DeadLetter.from_item(item)
+        if event_type is None or dead_letter.event_type == event_type:
+            yield dead_letter
+
+
+def oldest(
+    dead_letters: Iterable[DeadLetter], limit: Optional[int]
+) -> List[DeadLetter]:
+    """
+    The `limit` dead letters (all if None) that were received first, so that a
+    limited replay never replays a delivery before an earlier one for the same
+    pull request. Scans return dead letters in no particular order.
+    """
+    by_age = sorted(dead_letters, key=lambda dead_letter: dead_letter.received_at)
+    return by_age if limit is None else by_age[:limit]
+
+
+def _replay_dead_letter(dead_letter: DeadLetter) -> str:
+    if not delivery_dedup.claim_delivery(dead_letter.delivery_id):
+        # Github or the work queue retried it since. If that attempt is still in
+        # flight and fails, it writes a new dead letter.
+        dynamodb_client.delete_dead_letter(dead_letter.delivery_id)
+        return DUPLICATE
+
+    delivery = dead_letter.to_delivery()
+    started_at = time.time()
+    try:
+        response = github_webhook.handle_github_webhook(
+            delivery.event_type, delivery.payload()
+        )
+        status_code, error = response.status_code, response.body or ""
+    except Exception as exception:
+        logger.error(traceback.format_exc())
+        status_code, error = "500", str(exception)
+    delivery_dedup.record_delivery_outcome(
+        delivery.delivery_id, status_code, started_at
+    )
+
+    if status_code.startswith("5"):
+        record_dead_letter(delivery, "replay", error)
+        return FAILED
+    dynamodb_client.delete_dead_letter(delivery.delivery_id)
+    return SUCCEEDED
+
+
+def _replay_group(
+    group: List[DeadLetter], bucket: Optional[TokenBucket]
+) -> Dict[str, str]:
+    outcomes: Dict[str, str] = OrderedDict()
+    for index, dead_letter in enumerate(group):
+        if bucket is not None:
+            bucket.acquire()
+        outcome = _replay_dead_letter(dead_letter)
+        outcomes[dead_letter.delivery_id] = outcome
+        logger.info(f"Replayed dead letter {dead_letter.delivery_id}: {outcome}")
+        if outcome == FAILED:
+            # Don't replay later deliveries for the same key before this one
+            for blocked in group[index + 1 :]:
+                outcomes[blocked.delivery_id] = BLOCKED
+            break
+    return outcomes
+
+
+def replay(
+    dead_letters: Iterable[DeadLetter],
+    max_concurrency: int = 8,
+    rate_per_second: float = 10,
+) -> Dict[str, str]:
+    """
+    Replays `dead_letters` through github_webhook.handle_github_webhook, at most
+    `rate_per_second` per second (0 for no limit). Returns each delivery id's
+    outcome: SUCCEEDED, FAILED, DUPLICATE, or BLOCKED by an earlier failure.
+    """
+    groups: "OrderedDict[str, List[DeadLetter]]" = OrderedDict()
+    for dead_letter in sorted(dead_letters, key=lambda d: d.received_at):
+        groups.setdefault(dead_letter.ordering_key, []).append(dead_letter)
+    if not groups:
+        return {}
+
+    bucket = TokenBucket(rate_per_second) if rate_per_second > 0 else None
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(groups))) as pool:
+        group_outcomes = list(
+            pool.map(lambda group: _replay_group(group, bucket), groups.values())
+        )
+
+    outcomes = {
+        delivery_id: outcome
+        for outcomes_by_id in group_outcomes
+        for delivery_id, outcome in outcomes_by_id.items()
+    }
+    for outcome, count in Counter(outcomes.values()).items():
+        metrics.increment("ReplayedDeliveries", count, dimensions={"outcome": outcome})
+    return outcomes
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="List or replay failed webhook deliveries"
+    )
+    parser.add_argument("command", choices=("list", "replay"))
+    parser.add_argument("--event-type", help="Only this X-GitHub-Event")
+    parser.add_argument(
+        "--limit", type=int, help="At most this many deliveries, oldest first"
+    )
+    parser.add_argument("--concurrency", type=int, default=8, help="Replay threads")
+    parser.add_argument(
+        "--rate", type=float, default=10, help="Replays per second, 0 for no limit"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    selected = oldest(get_dead_letters(args.event_type), args.limit)
+
+    if args.command == "list":
+        for dead_letter in selected:
+            failed_at = datetime.utcfromtimestamp(dead_letter.failed_at)
+            print(
+                f"{dead_letter.delivery_id}\t{dead_letter.event_type}\t"
+                f"{dead_letter.stage}\t{dead_letter.attempts}\t"
+                f"{failed_at:%Y-%m-%dT%H:%M:%SZ}\t{dead_letter.error}"
+            )
+    else:
+        outcomes = replay(selected, args.concurrency, args.rate)
+        logger.info(
+            f"Replayed {len(outcomes)} dead letters: {Counter(outcomes.values())}"
+        )
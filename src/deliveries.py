@@ -0,0 +1,128 @@
+"""
+De-duplication of webhook deliveries, keyed on the X-GitHub-Delivery header.
+
+Github redelivers webhooks (automatically, and when someone clicks "Redeliver"),
+and every redelivery used to run a full sync, which in the create-task path can
+create duplicate Asana tasks. Each delivery is now claimed in the DELIVERIES_TABLE
+before it is processed, and its outcome recorded afterwards, so a redelivery of a
+delivery that is in flight or already succeeded costs a single key lookup.
+
+An in-process LRU cache sits in front of DynamoDb, so repeated deliveries to a warm
+process don't even need that.
+
+If DynamoDb is unavailable, deliveries are processed anyway: de-duplication is an
+optimization, and must never cause a webhook to be dropped.
+"""
+import time
+import traceback
+from enum import Enum, unique
+from typing import Optional, Tuple
+
+from src.dynamodb import client as dynamodb_client
+from src.logger import logger
+from src.utils import LruCache
+import src.metrics as metrics
+
+# Github allows redelivering webhooks from the past few days
+DELIVERY_RECORD_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# A delivery that has been in flight for this long is assumed to have been lost
+# (e.g. the Lambda function timed out), and may be claimed again
+STALE_IN_FLIGHT_SECONDS = 15 * 60
+
+
+@unique
+class DeliveryStatus(Enum):
+    IN_FLIGHT = "in_flight"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+# delivery id -> (status, started at)
+_recent_deliveries = LruCache(max_size=10000, ttl_seconds=DELIVERY_RECORD_TTL_SECONDS)
+
+
+def _is_claimable(status: DeliveryStatus, started_at: float, now: float) -> bool:
+    if status == DeliveryStatus.FAILED:
+        return True
+    return (
+        status == DeliveryStatus.IN_FLIGHT
+        and now - started_at > STALE_IN_FLIGHT_SECONDS
+    )
+
+
+def claim_delivery(delivery_id: str) -> bool:
+    """
+    Marks the delivery as in flight, returning True if the caller should process
+    it, or False if it is a duplicate of a delivery that is in flight or already
+    succeeded.
+    """
+    now = time.time()
+    cached: Optional[Tuple[DeliveryStatus, float]] = _recent_deliveries.get(delivery_id)
+    if cached is not None and not _is_claimable(cached[0], cached[1], now):
+        metrics.increment("DuplicateDeliveries", dimensions={"source": "cache"})
+        return False
+
+    expires_at = int(now + DELIVERY_RECORD_TTL_SECONDS)
+    try:
+        claimed = dynamodb_client.put_delivery(
+            delivery_id, DeliveryStatus.IN_FLIGHT.value, now, expires_at
+        )
+        if not claimed:
+            existing = dynamodb_client.get_delivery(delivery_id)
+            if existing is None or _is_claimable(
+                DeliveryStatus(existing["status"]), existing["started-at"], now
+            ):
+                # Retry a failed (or lost) delivery, unless someone else beat us to it
+                claimed = dynamodb_client.put_delivery(
+                    delivery_id,
+                    DeliveryStatus.IN_FLIGHT.value,
+                    now,
+                    expires_at,
+                    expected=existing,
+                )
+            else:
+                _recent_deliveries.set(
+                    delivery_id,
+                    (DeliveryStatus(existing["status"]), existing["started-at"]),
+                )
+    except Exception:
+        logger.warning(
+            f"Could not de-duplicate delivery {delivery_id}, processing it anyway:\n"
+            + traceback.format_exc()
+        )
+        return True
+
+    if claimed:
+        _recent_deliveries.set(delivery_id, (DeliveryStatus.IN_FLIGHT, now))
+    else:
+        logger.info(f"Delivery {delivery_id} is a duplicate")
+        metrics.increment("DuplicateDeliveries", dimensions={"source": "dynamodb"})
+    return claimed
+
+
+def record_delivery_outcome(
+    delivery_id: Optional[str], status_code: str, started_at: float
+) -> None:
+    """
+    Records how processing a claimed delivery ended. 5xx status codes count as
+    failures, which allows the delivery to be claimed again.
+    """
+    if delivery_id is None:
+        return
+    status = (
+        DeliveryStatus.FAILED
+        if status_code.startswith("5")
+        else DeliveryStatus.SUCCEEDED
+    )
+    duration_ms = (time.time() - started_at) * 1000
+    _recent_deliveries.set(delivery_id, (status, started_at))
+    try:
+        dynamodb_client.update_delivery_outcome(
+            delivery_id, status.value, status_code, duration_ms
+        )
+    except Exception:
+        logger.warning(
+            f"Could not record the outcome of delivery {delivery_id}:\n"
+            + traceback.format_exc()
+        )
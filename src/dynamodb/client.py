@@ -1,10 +1,20 @@
-from typing import Iterator, Optional, List, Tuple
+from typing import Any, Dict, Iterator, Optional, List, Tuple
 from typing_extensions import TypedDict
 
 import boto3  # type: ignore
-from botocore.exceptions import NoRegionError  # type: ignore
-
-from src.config import OBJECTS_TABLE, USERS_TABLE
+from botocore.exceptions import ClientError, NoRegionError  # type: ignore
+
+from src.config import (
+    BACKPRESSURE_TABLE,
+    COMMIT_BUILD_STATES_TABLE,
+    DEAD_LETTERS_TABLE,
+    DELIVERIES_TABLE,
+    OBJECTS_TABLE,
+    PULL_REQUEST_SNAPSHOTS_TABLE,
+    REVIEW_IDS_TABLE,
+    SYNC_VERSIONS_TABLE,
+    USERS_TABLE,
+)
 from src.logger import logger
 from src.utils import memoize
 
@@ -37,6 +47,7 @@ class DynamoDbClient(object):
 
     GITHUB_HANDLE_KEY = "github/handle"
     USER_ID_KEY = "asana/domain-user-id"
+    DELIVERY_ID_KEY = "delivery-id"
 
     # the singleton instance of DynamoDbClient
     _singleton = None
@@ -162,6 +173,340 @@ class DynamoDbClient(object):
             )
             yield from response["Items"]
 
+    # DELIVERIES TABLE
+
+    def get_delivery(self, delivery_id: str) -> Optional[Dict[str, Any]]:
+        """
+            Retrieves the record of a webhook delivery, as a dict with the keys "status" and
+            "started-at" (and, once processed, "status-code" and "duration-ms"), or None
+            if SGTM has not seen the delivery.
+        """
+        response = self.client.get_item(
+            TableName=DELIVERIES_TABLE,
+            Key={self.DELIVERY_ID_KEY: {"S": delivery_id}},
+            ConsistentRead=True,
+        )
+        if "Item" not in response:
+            return None
+        item = response["Item"]
+        delivery: Dict[str, Any] = {
+            "status": item["status"]["S"],
+            "started-at": float(item["started-at"]["N"]),
+        }
+        if "status-code" in item:
+            delivery["status-code"] = item["status-code"]["S"]
+        if "duration-ms" in item:
+            delivery["duration-ms"] = float(item["duration-ms"]["N"])
+        return delivery
+
+    def put_delivery(
+        self,
+        delivery_id: str,
+        status: str,
+        started_at: float,
+        expires_at: int,
+        expected: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """
+            Writes the record of a webhook delivery, returning False (and writing nothing) if
+            the record was changed concurrently. If `expected` is None the record must not
+            exist yet; otherwise its status and start time must match `expected`.
+        """
+        item = {
+            self.DELIVERY_ID_KEY: {"S": delivery_id},
+            "status": {"S": status},
+            "started-at": {"N": str(started_at)},
+            "expires-at": {"N": str(expires_at)},
+        }
+        if expected is None:
+            condition = {
+                "ConditionExpression": "attribute_not_exists(#id)",
+                "ExpressionAttributeNames": {"#id": self.DELIVERY_ID_KEY},
+            }
+        else:
+            condition = {
+                "ConditionExpression": "#status = :status AND #started = :started",
+                "ExpressionAttributeNames": {
+                    "#status": "status",
+                    "#started": "started-at",
+                },
+                "ExpressionAttributeValues": {
+                    ":status": {"S": expected["status"]},
+                    ":started": {"N": str(expected["started-at"])},
+                },
+            }
+        try:
+            self.client.put_item(TableName=DELIVERIES_TABLE, Item=item, **condition)
+            return True
+        except ClientError as error:
+            if error.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def update_delivery_outcome(
+        self, delivery_id: str, status: str, status_code: str, duration_ms: float
+    ):
+        """
+            Records how processing a webhook delivery ended
+        """
+        self.client.update_item(
+            TableName=DELIVERIES_TABLE,
+            Key={self.DELIVERY_ID_KEY: {"S": delivery_id}},
+            UpdateExpression="SET #status = :status, #code = :code, #duration = :duration",
+            ExpressionAttributeNames={
+                "#status": "status",
+                "#code": "status-code",
+                "#duration": "duration-ms",
+            },
+            ExpressionAttributeValues={
+                ":status": {"S": status},
+                ":code": {"S": status_code},
+                ":duration": {"N": str(round(duration_ms, 3))},
+            },
+        )
+
+    # DEAD LETTERS TABLE
+
+    def put_dead_letter(self, dead_letter: Dict[str, Any], expires_at: int):
+        """
+            Writes the dead letter of a failed webhook delivery, replacing any earlier one
+            for the same delivery and counting the attempts
+        """
+        self.client.update_item(
+            TableName=DEAD_LETTERS_TABLE,
+            Key={self.DELIVERY_ID_KEY: {"S": dead_letter["delivery-id"]}},
+            UpdateExpression=(
+                "SET #event = :event, #key = :key, #headers = :headers, #body = :body, "
+                "#stage = :stage, #error = :error, #received = :received, "
+                "#failed = :failed, #expires = :expires ADD #attempts :one"
+            ),
+            ExpressionAttributeNames={
+                "#event": "event-type",
+                "#key": "ordering-key",
+                "#headers": "headers",
+                "#body": "body",
+                "#stage": "stage",
+                "#error": "error",
+                "#received": "received-at",
+                "#failed": "failed-at",
+                "#expires": "expires-at",
+                "#attempts": "attempts",
+            },
+            ExpressionAttributeValues={
+                ":event": {"S": dead_letter["event-type"]},
+                ":key": {"S": dead_letter["ordering-key"]},
+                ":headers": {"S": dead_letter["headers"]},
+                ":body": {"S": dead_letter["body"]},
+                ":stage": {"S": dead_letter["stage"]},
+                ":error": {"S": dead_letter["error"] or "(no message)"},
+                ":received": {"N": str(dead_letter["received-at"])},
+                ":failed": {"N": str(dead_letter["failed-at"])},
+                ":expires": {"N": str(expires_at)},
+                ":one": {"N": "1"},
+            },
+        )
+
+    def get_all_dead_letters(self) -> Iterator[Dict[str, Any]]:
+        """
+            Get all dead letters, as dicts keyed by attribute name
+        """
+        response = self.client.scan(TableName=DEAD_LETTERS_TABLE)
+        while True:
+            for item in response["Items"]:
+                yield {
+                    name: float(value["N"]) if "N" in value else value["S"]
+                    for name, value in item.items()
+                }
+            if not response.get("LastEvaluatedKey"):
+                return
+            response = self.client.scan(
+                TableName=DEAD_LETTERS_TABLE,
+                ExclusiveStartKey=response["LastEvaluatedKey"],
+            )
+
+    def delete_dead_letter(self, delivery_id: str):
+        self.client.delete_item(
+            TableName=DEAD_LETTERS_TABLE, Key={self.DELIVERY_ID_KEY: {"S": delivery_id}}
+        )
+
+    # BACKPRESSURE TABLE
+
+    def get_throttled_until(self, service: str) -> Optional[float]:
+        """
+            Retrieves the time until which `service` asked us to back off, or None
+        """
+        response = self.client.get_item(
+            TableName=BACKPRESSURE_TABLE, Key={"service": {"S": service}}
+        )
+        if "Item" not in response:
+            return None
+        return float(response["Item"]["throttled-until"]["N"])
+
+    def put_throttled_until(self, service: str, throttled_until: float):
+        """
+            Records that `service` asked us to back off until `throttled_until`. The
+            record expires an hour later.
+        """
+        self.client.put_item(
+            TableName=BACKPRESSURE_TABLE,
+            Item={
+                "service": {"S": service},
+                "throttled-until": {"N": str(throttled_until)},
+                "expires-at": {"N": str(int(throttled_until + 60 * 60))},
+            },
+        )
+
+    # SYNC VERSIONS TABLE
+
+    def get_sync_version(self, gh_node_id: str) -> Optional[Tuple[float, str]]:
+        """
+            Retrieves the updatedAt timestamp and digest of the last snapshot of
+            `gh_node_id` that was synced to Asana, or None
+        """
+        response = self.client.get_item(
+            TableName=SYNC_VERSIONS_TABLE, Key={"github-node": {"S": gh_node_id}}
+        )
+        if "Item" not in response:
+            return None
+        item = response["Item"]
+        return float(item["updated-at"]["N"]), item["digest"]["S"]
+
+    def put_sync_version(
+        self, gh_node_id: str, updated_at: float, digest: str, expires_at: int
+    ):
+        self.client.put_item(
+            TableName=SYNC_VERSIONS_TABLE,
+            Item={
+                "github-node": {"S": gh_node_id},
+                "updated-at": {"N": str(updated_at)},
+                "digest": {"S": digest},
+                "expires-at": {"N": str(expires_at)},
+            },
+        )
+
+    # REVIEW IDS TABLE
+
+    def get_review_node_id(self, review_database_id: str) -> Optional[str]:
+        """
+            Retrieves the node id of the review with the numeric `review_database_id`, or None
+        """
+        response = self.client.get_item(
+            TableName=REVIEW_IDS_TABLE,
+            Key={"review-database-id": {"S": review_database_id}},
+        )
+        if "Item" not in response:
+            return None
+        return response["Item"]["github-node"]["S"]
+
+    def put_review_node_id(self, review_database_id: str, gh_node_id: str):
+        self.client.put_item(
+            TableName=REVIEW_IDS_TABLE,
+            Item={
+                "review-database-id": {"S": review_database_id},
+                "github-node": {"S": gh_node_id},
+            },
+        )
+
+    # PULL REQUEST SNAPSHOTS TABLE
+
+    def get_pull_request_snapshot(self, gh_node_id: str) -> Optional[Tuple[str, bytes]]:
+        """
+            Retrieves the version and compressed snapshot of the pull request
+            `gh_node_id` last cached, or None
+        """
+        response = self.client.get_item(
+            TableName=PULL_REQUEST_SNAPSHOTS_TABLE,
+            Key={"github-node": {"S": gh_node_id}},
+        )
+        if "Item" not in response:
+            return None
+        item = response["Item"]
+        return item["version"]["S"], item["snapshot"]["B"]
+
+    def get_pull_request_snapshot_version(self, gh_node_id: str) -> Optional[str]:
+        """
+            Retrieves only the version of the snapshot of the pull request
+            `gh_node_id` last cached, or None
+        """
+        response = self.client.get_item(
+            TableName=PULL_REQUEST_SNAPSHOTS_TABLE,
+            Key={"github-node": {"S": gh_node_id}},
+            ProjectionExpression="#version",
+            ExpressionAttributeNames={"#version": "version"},
+        )
+        if "Item" not in response:
+            return None
+        return response["Item"]["version"]["S"]
+
+    def put_pull_request_snapshot(
+        self, gh_node_id: str, version: str, snapshot: bytes, expires_at: int
+    ):
+        self.client.put_item(
+            TableName=PULL_REQUEST_SNAPSHOTS_TABLE,
+            Item={
+                "github-node": {"S": gh_node_id},
+                "version": {"S": version},
+                "snapshot": {"B": snapshot},
+                "expires-at": {"N": str(expires_at)},
+            },
+        )
+
+    def delete_pull_request_snapshot(self, gh_node_id: str):
+        self.client.delete_item(
+            TableName=PULL_REQUEST_SNAPSHOTS_TABLE,
+            Key={"github-node": {"S": gh_node_id}},
+        )
+
+    # COMMIT BUILD STATES TABLE
+
+    def get_commit_checks(self, sha: str) -> Optional[Tuple[int, str]]:
+        """
+            Retrieves the version and serialized checks of the commit `sha` last
+            cached, or None
+        """
+        response = self.client.get_item(
+            TableName=COMMIT_BUILD_STATES_TABLE, Key={"commit-sha": {"S": sha}}
+        )
+        if "Item" not in response:
+            return None
+        item = response["Item"]
+        return int(item["version"]["N"]), item["checks"]["S"]
+
+    def put_commit_checks_if_unchanged(
+        self, sha: str, version: Optional[int], checks: str, expires_at: int
+    ) -> bool:
+        """
+            Caches `checks` as the checks of the commit `sha`, if the cached ones
+            are still at `version` (None if there weren't any). Returns False,
+            without writing, if another writer got there first.
+        """
+        condition: Dict[str, Any] = {
+            "ConditionExpression": "attribute_not_exists(#sha)",
+            "ExpressionAttributeNames": {"#sha": "commit-sha"},
+        }
+        if version is not None:
+            condition = {
+                "ConditionExpression": "#version = :version",
+                "ExpressionAttributeNames": {"#version": "version"},
+                "ExpressionAttributeValues": {":version": {"N": str(version)}},
+            }
+        try:
+            self.client.put_item(
+                TableName=COMMIT_BUILD_STATES_TABLE,
+                Item={
+                    "commit-sha": {"S": sha},
+                    "version": {"N": str((version or 0) + 1)},
+                    "checks": {"S": checks},
+                    "expires-at": {"N": str(expires_at)},
+                },
+                **condition,
+            )
+            return True
+        except ClientError as error:
+            if error.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
     @staticmethod
     def _create_client():
         # Encapsulates creating a boto3 client connection for DynamoDb with a more user-friendly error case
@@ -236,3 +581,117 @@ def bulk_insert_github_handle_to_asana_user_id_mapping(
     DynamoDbClient.singleton().bulk_insert_github_handle_to_asana_user_id_mapping(
         gh_and_asana_ids
     )
+
+
+def get_delivery(delivery_id: str) -> Optional[Dict[str, Any]]:
+    """
+        Using the singleton instance of DynamoDbClient, creating it if necessary:
+
+        Retrieves the record of a webhook delivery, or None if SGTM has not seen the delivery.
+    """
+    return DynamoDbClient.singleton().get_delivery(delivery_id)
+
+
+def put_delivery(
+    delivery_id: str,
+    status: str,
+    started_at: float,
+    expires_at: int,
+    expected: Optional[Dict[str, Any]] = None,
+) -> bool:
+    """
+        Using the singleton instance of DynamoDbClient, creating it if necessary:
+
+        Writes the record of a webhook delivery, returning False if it was changed concurrently.
+    """
+    return DynamoDbClient.singleton().put_delivery(
+        delivery_id, status, started_at, expires_at, expected
+    )
+
+
+def update_delivery_outcome(
+    delivery_id: str, status: str, status_code: str, duration_ms: float
+):
+    """
+        Using the singleton instance of DynamoDbClient, creating it if necessary:
+
+        Records how processing a webhook delivery ended
+    """
+    DynamoDbClient.singleton().update_delivery_outcome(
+        delivery_id, status, status_code, duration_ms
+    )
+
+
+def put_dead_letter(dead_letter: Dict[str, Any], expires_at: int):
+    """
+        Using the singleton instance of DynamoDbClient, creating it if necessary:
+
+        Writes the dead letter of a failed webhook delivery
+    """
+    DynamoDbClient.singleton().put_dead_letter(dead_letter, expires_at)
+
+
+def get_all_dead_letters() -> Iterator[Dict[str, Any]]:
+    return DynamoDbClient.singleton().get_all_dead_letters()
+
+
+def delete_dead_letter(delivery_id: str):
+    DynamoDbClient.singleton().delete_dead_letter(delivery_id)
+
+
+def get_throttled_until(service: str) -> Optional[float]:
+    return DynamoDbClient.singleton().get_throttled_until(service)
+
+
+def put_throttled_until(service: str, throttled_until: float):
+    DynamoDbClient.singleton().put_throttled_until(service, throttled_until)
+
+
+def get_sync_version(gh_node_id: str) -> Optional[Tuple[float, str]]:
+    return DynamoDbClient.singleton().get_sync_version(gh_node_id)
+
+
+def put_sync_version(gh_node_id: str, updated_at: float, digest: str, expires_at: int):
+    DynamoDbClient.singleton().put_sync_version(
+        gh_node_id, updated_at, digest, expires_at
+    )
+
+
+def get_review_node_id(review_database_id: str) -> Optional[str]:
+    return DynamoDbClient.singleton().get_review_node_id(review_database_id)
+
+
+def put_review_node_id(review_database_id: str, gh_node_id: str):
+    DynamoDbClient.singleton().put_review_node_id(review_database_id, gh_node_id)
+
+
+def get_pull_request_snapshot(gh_node_id: str) -> Optional[Tuple[str, bytes]]:
+    return DynamoDbClient.singleton().get_pull_request_snapshot(gh_node_id)
+
+
+def put_pull_request_snapshot(
+    gh_node_id: str, version: str, snapshot: bytes, expires_at: int
+):
+    DynamoDbClient.singleton().put_pull_request_snapshot(
+        gh_node_id, version, snapshot, expires_at
+    )
+
+
+def get_pull_request_snapshot_version(gh_node_id: str) -> Optional[str]:
+    return DynamoDbClient.singleton().get_pull_request_snapshot_version(gh_node_id)
+
+
+def delete_pull_request_snapshot(gh_node_id: str):
+    DynamoDbClient.singleton().delete_pull_request_snapshot(gh_node_id)
+
+
+def get_commit_checks(sha: str) -> Optional[Tuple[int, str]]:
+    return DynamoDbClient.singleton().get_commit_checks(sha)
+
+
+def put_commit_checks_if_unchanged(
+    sha: str, version: Optional[int], checks: str, expires_at: int
+) -> bool:
+    return DynamoDbClient.singleton().put_commit_checks_if_unchanged(
+        sha, version, checks, expires_at
+    )
@@ -2,7 +2,8 @@ from typing import Optional
 from datetime import timedelta
 import boto3  # type: ignore
 from contextlib import contextmanager
-from src.config import LOCK_TABLE
+from src.config import LOCK_BACKEND, LOCK_TABLE
+from src.local_lock import local_lock
 from python_dynamodb_lock.python_dynamodb_lock import DynamoDBLockClient  # type: ignore
 
 
@@ -23,6 +24,12 @@ lock_client = DynamoDBLockClient(
 def dynamodb_lock(
     lock_name: str, retry_timeout: Optional[timedelta] = timedelta(seconds=20)
 ):
+    if LOCK_BACKEND == "local":
+        # Single-node deployments don't need a distributed lock
+        with local_lock(lock_name, retry_timeout=retry_timeout):
+            yield None
+        return
+
     # TODO: Make this match get-lock-client in the clojure code
     lock = lock_client.acquire_lock(
         lock_name, sort_key=lock_name, retry_timeout=retry_timeout
@@ -0,0 +1,294 @@
+"""
+Derives the Build state of a commit from check_suite and check_run webhooks, so
+that they can keep a pull request's Build field up to date without refetching
+the pull request.
+
+The checks of each commit (the ids of its open pull requests, and the state of
+each of its check runs, completed check suites and status contexts) are cached
+in the COMMIT_BUILD_STATES_TABLE, which every instance shares. The first event
+for a commit seeds them with a single small query (see GetCommitChecks); later
+events only apply their payload to them, and `status` events keep their status
+contexts up to date. They're fetched again only if they can't tell whom to
+report to: when the commit had no open pull request over
+COMMIT_CHECKS_REFETCH_SECONDS ago, since one may have been opened since.
+
+The rollup state is derived the way Github does: failed if any check failed,
+pending if any of them hasn't finished, and successful otherwise. The state last
+reported for the commit is cached along with its checks, and only changes are
+reported. Cached checks are written with a conditional put, so that concurrent
+events for a commit don't lose each other's updates. If DynamoDb is
+unavailable, each event fetches the checks of its commit and reports its state.
+"""
+import json
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.dynamodb import client as dynamodb_client
+import src.github.graphql.client as graphql_client
+from src.github.models import Commit
+from src.logger import logger
+
+_SUCCESSFUL_CONCLUSIONS = ("SUCCESS", "NEUTRAL", "SKIPPED")
+
+# Checks stop changing soon after a commit is pushed
+COMMIT_BUILD_STATE_TTL_SECONDS = 24 * 60 * 60
+# How long cached checks without an open pull request are trusted
+COMMIT_CHECKS_REFETCH_SECONDS = 60
+# How many times a conditional put is retried when other events for the same
+# commit keep getting there first
+_MAX_WRITE_ATTEMPTS = 3
+
+
+class CommitChecks(object):
+    def __init__(
+        self,
+        pull_request_ids: List[str],
+        contexts: Dict[str, Tuple[str, Optional[int]]],
+        fetched_at: float,
+        reported_state: Optional[str] = None,
+    ):
+        self.pull_request_ids = pull_request_ids
+        # context key -> (Commit.BUILD_SUCCESSFUL, BUILD_PENDING or BUILD_FAILED,
+        # id of the check run or suite, or None for status contexts)
+        self.contexts = contexts
+        self.fetched_at = fetched_at
+        # The rollup state last reported for the commit
+        self.reported_state = reported_state
+
+    def apply(self, key: str, state: str, check_id: Optional[int]) -> None:
+        """
+        Records the state of a context. Earlier check runs with the same key (e.g.
+        before a re-run), and retried deliveries of earlier events for the same
+        check run, don't override what's recorded.
+        """
+        if key in self.contexts and check_id is not None:
+            recorded_state, recorded_id = self.contexts[key]
+            if recorded_id is not None and (
+                check_id < recorded_id
+                or (
+                    check_id == recorded_id
+                    and state == Commit.BUILD_PENDING
+                    and recorded_state != Commit.BUILD_PENDING
+                )
+            ):
+                return
+        self.contexts[key] = (state, check_id)
+
+    def rollup_state(self) -> Optional[str]:
+        states = {state for state, _ in self.contexts.values()}
+        if not states:
+            return None
+        if Commit.BUILD_FAILED in states:
+            return Commit.BUILD_FAILED
+        if Commit.BUILD_PENDING in states:
+            return Commit.BUILD_PENDING
+        return Commit.BUILD_SUCCESSFUL
+
+    def is_stale(self) -> bool:
+        return (
+            not self.pull_request_ids
+            and time.time() - self.fetched_at > COMMIT_CHECKS_REFETCH_SECONDS
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "pull_request_ids": self.pull_request_ids,
+                "contexts": self.contexts,
+                "fetched_at": self.fetched_at,
+                "reported_state": self.reported_state,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, raw: str) -> "CommitChecks":
+        data = json.loads(raw)
+        return cls(
+            data["pull_request_ids"],
+            {
+                key: (state, check_id)
+                for key, (state, check_id) in data["contexts"].items()
+            },
+            data["fetched_at"],
+            data["reported_state"],
+        )
+
+
+def _check_state(status: Optional[str], conclusion: Optional[str]) -> str:
+    # Check runs and suites: status is QUEUED, IN_PROGRESS or COMPLETED
+    if (status or "").upper() != "COMPLETED":
+        return Commit.BUILD_PENDING
+    if (conclusion or "").upper() in _SUCCESSFUL_CONCLUSIONS:
+        return Commit.BUILD_SUCCESSFUL
+    return Commit.BUILD_FAILED
+
+
+def _status_state(state: str) -> str:
+    # Status contexts: SUCCESS, PENDING, EXPECTED, FAILURE or ERROR
+    state = state.upper()
+    if state == "SUCCESS":
+        return Commit.BUILD_SUCCESSFUL
+    if state in ("PENDING", "EXPECTED"):
+        return Commit.BUILD_PENDING
+    return Commit.BUILD_FAILED
+
+
+def _context_from_payload(
+    event_type: str, payload: dict
+) -> Optional[Tuple[str, str, int]]:
+    if event_type == "check_run":
+        check_run = payload["check_run"]
+        return (
+            f"check_run:{check_run['name']}",
+            _check_state(check_run["status"], check_run["conclusion"]),
+            check_run["id"],
+        )
+    elif event_type == "check_suite":
+        check_suite = payload["check_suite"]
+        if check_suite["status"] != "completed":
+            # Github creates a suite for every app that could run checks, whether
+            # or not it will, so only completed suites say anything
+            return None
+        return (
+            f"check_suite:{check_suite['app']['slug']}",
+            _check_state(check_suite["status"], check_suite["conclusion"]),
+            check_suite["id"],
+        )
+    raise ValueError(f"Unexpected event type {event_type}")
+
+
+def _fetch_commit_checks(repository: dict, sha: str) -> CommitChecks:
+    fetched_at = time.time()
+    commit = graphql_client.get_commit_checks(
+        repository["owner"]["login"], repository["name"], sha
+    )
+    if commit is None:
+        return CommitChecks([], {}, fetched_at)
+    pull_request_ids = [
+        node["id"]
+        for node in commit["associatedPullRequests"]["nodes"]
+        if not node["closed"]
+    ]
+    checks = CommitChecks(pull_request_ids, {}, fetched_at)
+    rollup = commit.get("statusCheckRollup") or {}
+    for node in rollup.get("contexts", {}).get("nodes", []):
+        if node["__typename"] == "CheckRun":
+            checks.apply(
+                f"check_run:{node['name']}",
+                _check_state(node["status"], node["conclusion"]),
+                node["databaseId"],
+            )
+        elif node["__typename"] == "StatusContext":
+            checks.apply(
+                f"status:{node['context']}", _status_state(node["state"]), None
+            )
+    return checks
+
+
+def _update_cached_commit_checks(
+    sha: str, update: Callable[[Optional[CommitChecks]], Optional[CommitChecks]]
+) -> Optional[CommitChecks]:
+    """
+    Caches what `update` makes of the cached checks of `sha` (None if there
+    aren't any), unless it returns None. Retries if other events for the commit
+    updated them in the meantime. Returns the checks that were cached, or None.
+    """
+    for _ in range(_MAX_WRITE_ATTEMPTS):
+        cached = dynamodb_client.get_commit_checks(sha)
+        version, checks = (
+            (cached[0], CommitChecks.from_json(cached[1]))
+            if cached is not None
+            else (None, None)
+        )
+        updated = update(checks)
+        if updated is None:
+            return None
+        if dynamodb_client.put_commit_checks_if_unchanged(
+            sha,
+            version,
+            updated.to_json(),
+            int(time.time() + COMMIT_BUILD_STATE_TTL_SECONDS),
+        ):
+            return updated
+    raise RuntimeError(f"Checks of {sha[:7]} kept changing while updating them")
+
+
+def record_event(event_type: str, payload: dict) -> Optional[Tuple[List[str], str]]:
+    """
+    Records the check suite or check run that the event reports. Returns the
+    ids of the commit's open pull requests and its rollup state if that changed
+    since it was last reported, or None otherwise.
+    """
+    context = _context_from_payload(event_type, payload)
+    if context is None:
+        return None
+    key, state, check_id = context
+    sha = payload[event_type]["head_sha"]
+    repository = payload["repository"]
+    # The rollup state last reported, before this event
+    reported_state: Optional[str] = None
+    # What was fetched from Github, None while fetching
+    fetched: List[Optional[CommitChecks]] = []
+
+    def update(checks: Optional[CommitChecks]) -> CommitChecks:
+        nonlocal reported_state
+        reported_state = checks.reported_state if checks is not None else None
+        if checks is None or checks.is_stale():
+            fetched.append(None)
+            checks = fetched[-1] = _fetch_commit_checks(repository, sha)
+        checks.apply(key, state, check_id)
+        if checks.pull_request_ids:
+            checks.reported_state = checks.rollup_state() or reported_state
+        return checks
+
+    try:
+        checks = _update_cached_commit_checks(sha, update)
+    except Exception:
+        if fetched and fetched[-1] is None:
+            # Github failed, not DynamoDb
+            raise
+        logger.warning(
+            f"Could not use the cached checks of {sha[:7]}, reporting their state "
+            "anyway:\n" + traceback.format_exc()
+        )
+        reported_state = None
+        checks = (fetched[-1] if fetched else None) or _fetch_commit_checks(
+            repository, sha
+        )
+        checks.apply(key, state, check_id)
+
+    rollup_state = checks.rollup_state() if checks is not None else None
+    if (
+        checks is None
+        or not checks.pull_request_ids
+        or rollup_state is None
+        or rollup_state == reported_state
+    ):
+        return None
+
+    logger.info(f"Build state of {sha[:7]} is now {rollup_state}")
+    return checks.pull_request_ids, rollup_state
+
+
+def record_status(payload: dict) -> None:
+    """
+    Records the status context that a status event reports in the cached checks
+    of its commit, if there are any. Statuses report their state themselves (see
+    github_webhook), so this only keeps the checks up to date for later events.
+    """
+    sha = payload["sha"]
+
+    def update(checks: Optional[CommitChecks]) -> Optional[CommitChecks]:
+        if checks is not None:
+            checks.apply(
+                f"status:{payload['context']}", _status_state(payload["state"]), None
+            )
+        return checks
+
+    try:
+        _update_cached_commit_checks(sha, update)
+    except Exception:
+        logger.warning(
+            f"Could not record a status of {sha[:7]}:\n" + traceback.format_exc()
+        )
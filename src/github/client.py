@@ -1,8 +1,85 @@
-from github import Github, PullRequest  # type: ignore
+import functools
+import http.client
+from typing import Callable
+
+from github import Github, GithubException, PullRequest, RateLimitExceededException  # type: ignore
+import src.backpressure as backpressure
 from src.config import GITHUB_API_KEY
+from . import resilience
 
 gh_client = Github(GITHUB_API_KEY)
 
+_HOST = "api.github.com"
+
+
+def _is_secondary_rate_limit(error: GithubException) -> bool:
+    return error.status == 403 and "rate limit" in str(error.data).lower()
+
+
+def _reports_throttling(fn: Callable) -> Callable:
+    """
+    Reports Github's rate limit errors to src.backpressure. PyGithub doesn't
+    expose the response headers, so the default back off period is used.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except RateLimitExceededException:
+            backpressure.throttle(backpressure.GITHUB)
+            raise
+        except GithubException as error:
+            # Secondary rate limits are plain 403s
+            if _is_secondary_rate_limit(error):
+                backpressure.throttle(backpressure.GITHUB)
+            raise
+
+    return wrapper
+
+
+def _classify_error(error: Exception) -> resilience.Failure:
+    # PyGithub doesn't expose the Retry-After of rate limits, so they aren't
+    # retried here: src.backpressure defers events until they are over instead
+    if isinstance(error, RateLimitExceededException) or (
+        isinstance(error, GithubException) and _is_secondary_rate_limit(error)
+    ):
+        return resilience.Failure(resilience.RATE_LIMITED, "rate_limit")
+    if isinstance(error, GithubException) and error.status >= 500:
+        return resilience.Failure(resilience.RETRYABLE, "server_error", degraded=True)
+    if isinstance(error, (OSError, http.client.HTTPException)):
+        # requests' errors are OSErrors
+        return resilience.Failure(resilience.RETRYABLE, "connection", degraded=True)
+    return resilience.FATAL_FAILURE
+
+
+def _classify_error_once_sent(error: Exception) -> resilience.Failure:
+    """
+    Like _classify_error, for calls that must not be repeated once Github might
+    have received them: a server error doesn't tell whether it did.
+    """
+    failure = _classify_error(error)
+    if failure.kind == resilience.RETRYABLE:
+        return failure._replace(kind=resilience.FATAL)
+    return failure
+
+
+def _retried(idempotent: bool = True) -> Callable[[Callable], Callable]:
+    """
+    Retries the transient errors of a call (see src.github.resilience), unless
+    it isn't `idempotent`
+    """
+    classify = _classify_error if idempotent else _classify_error_once_sent
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return resilience.call(_HOST, "rest", lambda: fn(*args, **kwargs), classify)
+
+        return wrapper
+
+    return decorator
+
 
 def _get_pull_request(owner: str, repository: str, number: int) -> PullRequest:
     repo = gh_client.get_repo(f"{owner}/{repository}")
@@ -10,21 +87,29 @@ def _get_pull_request(owner: str, repository: str, number: int) -> PullRequest:
     return pr
 
 
+@_retried()
+@_reports_throttling
 def edit_pr_description(owner: str, repository: str, number: int, description: str):
     pr = _get_pull_request(owner, repository, number)
     pr.edit(body=description)
 
 
+@_retried()
+@_reports_throttling
 def edit_pr_title(owner: str, repository: str, number: int, title: str):
     pr = _get_pull_request(owner, repository, number)
     pr.edit(title=title)
 
 
+@_retried(idempotent=False)
+@_reports_throttling
 def add_pr_comment(owner: str, repository: str, number: int, comment: str):
     pr = _get_pull_request(owner, repository, number)
     pr.create_issue_comment(comment)
 
 
+@_retried()
+@_reports_throttling
 def set_pull_request_assignee(owner: str, repository: str, number: int, assignee: str):
     repo = gh_client.get_repo(f"{owner}/{repository}")
     # Using get_issue here because get_pull returns a pull request which only
@@ -33,6 +118,8 @@ def set_pull_request_assignee(owner: str, repository: str, number: int, assignee
     pr.edit(assignee=assignee)
 
 
+@_retried(idempotent=False)
+@_reports_throttling
 def merge_pull_request(owner: str, repository: str, number: int, title: str, body: str):
     pr = _get_pull_request(owner, repository, number)
 
@@ -1,14 +1,20 @@
+import asyncio
+from typing import Optional
 import src.dynamodb.client as dynamodb_client
 import src.asana.controller as asana_controller
 from . import logic as github_logic
 from . import client as github_client
 import src.asana.helpers as asana_helpers
+import src.review_ids as review_ids
+import src.sync_versions as sync_versions
 from src.github.models import Comment, PullRequest, Review
 from src.logger import logger
+import src.aio as aio
 
 
 def upsert_pull_request(pull_request: PullRequest):
     pull_request_id = pull_request.id()
+    version = _pull_request_version(pull_request)
     task_id = dynamodb_client.get_asana_id_from_github_node_id(pull_request_id)
     if task_id is None:
         task_id = asana_controller.create_task(pull_request.repository_id())
@@ -18,13 +24,40 @@ def upsert_pull_request(pull_request: PullRequest):
 
         logger.info(f"Task created for pull request {pull_request_id}: {task_id}")
         dynamodb_client.insert_github_node_to_asana_id_mapping(pull_request_id, task_id)
-        asana_helpers.create_attachments(pull_request.body(), task_id)
-        _add_asana_task_to_pull_request(pull_request, task_id)
+        aio.run(_link_new_task(pull_request, task_id))
     else:
+        if sync_versions.is_stale(pull_request_id, version, "pull_request"):
+            return
         logger.info(
             f"Task found for pull request {pull_request_id}, updating task {task_id}"
         )
     asana_controller.update_task(pull_request, task_id)
+    sync_versions.record_synced(pull_request_id, version)
+
+
+def _pull_request_version(
+    pull_request: PullRequest,
+) -> Optional[sync_versions.SyncVersion]:
+    return sync_versions.snapshot_version(
+        pull_request.updated_at(), pull_request.to_raw()
+    )
+
+
+async def _link_new_task(pull_request: PullRequest, task_id: str):
+    # The attachments come from the original body, so they don't wait for the
+    # link to the task to be added to it
+    await asyncio.gather(
+        aio.call(asana_helpers.create_attachments, pull_request.body(), task_id),
+        aio.call(_add_asana_task_to_pull_request, pull_request, task_id),
+    )
+
+
+def _update_task(pull_request: PullRequest, task_id: str):
+    pull_request_id = pull_request.id()
+    version = _pull_request_version(pull_request)
+    if not sync_versions.is_stale(pull_request_id, version, "pull_request"):
+        asana_controller.update_task(pull_request, task_id)
+        sync_versions.record_synced(pull_request_id, version)
 
 
 def _add_asana_task_to_pull_request(pull_request: PullRequest, task_id: str):
@@ -42,7 +75,13 @@ def _add_asana_task_to_pull_request(pull_request: PullRequest, task_id: str):
     pull_request.set_body(new_body)
 
 
-def upsert_comment(pull_request: PullRequest, comment: Comment):
+def upsert_comment(
+    pull_request: PullRequest, comment: Comment, update_task: bool = True
+):
+    """
+    Syncs the comment to the pull request's task. Pass `update_task=False` if
+    the caller will sync the task itself afterwards.
+    """
     pull_request_id = pull_request.id()
     task_id = dynamodb_client.get_asana_id_from_github_node_id(pull_request_id)
     if task_id is None:
@@ -51,11 +90,20 @@ def upsert_comment(pull_request: PullRequest, comment: Comment):
         )
         # TODO: Full sync
     else:
-        asana_controller.upsert_github_comment_to_task(comment, task_id)
-        asana_controller.update_task(pull_request, task_id)
+        comment_id = comment.id()
+        version = sync_versions.snapshot_version(comment.updated_at(), comment.to_raw())
+        if not sync_versions.is_stale(comment_id, version, "comment"):
+            asana_controller.upsert_github_comment_to_task(comment, task_id)
+            sync_versions.record_synced(comment_id, version)
+        if update_task:
+            _update_task(pull_request, task_id)
 
 
-def upsert_review(pull_request: PullRequest, review: Review):
+def upsert_review(pull_request: PullRequest, review: Review, update_task: bool = True):
+    """
+    Syncs the review to the pull request's task. Pass `update_task=False` if
+    the caller will sync the task itself afterwards.
+    """
     pull_request_id = pull_request.id()
     task_id = dynamodb_client.get_asana_id_from_github_node_id(pull_request_id)
     if task_id is None:
@@ -64,13 +112,28 @@ def upsert_review(pull_request: PullRequest, review: Review):
         )
         # TODO: Full sync
     else:
-        logger.info(
-            f"Found task id {task_id} for pull_request {pull_request_id}. Adding review now."
-        )
-        asana_controller.upsert_github_review_to_task(review, task_id)
-        if review.is_approval_or_changes_requested():
-            assign_pull_request_to_author(pull_request)
-        asana_controller.update_task(pull_request, task_id)
+        review_id = review.id()
+        version = sync_versions.snapshot_version(review.updated_at(), review.to_raw())
+        if not sync_versions.is_stale(review_id, version, "review"):
+            logger.info(
+                f"Found task id {task_id} for pull_request {pull_request_id}. Adding review now."
+            )
+            asana_controller.upsert_github_review_to_task(review, task_id)
+            if review.is_approval_or_changes_requested():
+                assign_pull_request_to_author(pull_request)
+            sync_versions.record_synced(review_id, version)
+        review_ids.record(review)
+        if update_task:
+            _update_task(pull_request, task_id)
+
+
+def update_build_status(pull_request_id: str, repository_id: str, build_status: str):
+    task_id = dynamodb_client.get_asana_id_from_github_node_id(pull_request_id)
+    if task_id is None:
+        logger.info(f"Task not found for pull request {pull_request_id}")
+        return
+    logger.info(f"Setting Build of task {task_id} to {build_status}")
+    asana_controller.update_task_build_status(task_id, repository_id, build_status)
 
 
 def assign_pull_request_to_author(pull_request: PullRequest):
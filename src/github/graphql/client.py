@@ -1,66 +1,475 @@
-from typing import Tuple, FrozenSet, Optional
+import hashlib
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+import urllib.request
+from typing import Any, Dict, Iterator, List, Tuple, FrozenSet, Optional
 from sgqlc.endpoint.http import HTTPEndpoint  # type: ignore
-from src.config import GITHUB_API_KEY
+import src.backpressure as backpressure
+import src.github.resilience as resilience
+import src.review_ids as review_ids
+import src.snapshots as snapshots
+from src.config import (
+    GITHUB_API_KEY,
+    GITHUB_GRAPHQL_CONNECT_TIMEOUT_SECONDS,
+    GITHUB_GRAPHQL_PERSISTED_QUERIES,
+    GITHUB_GRAPHQL_POOL_SIZE,
+    GITHUB_GRAPHQL_READ_TIMEOUT_SECONDS,
+    GITHUB_GRAPHQL_URL,
+    GITHUB_PAGES_PER_PULL_REQUEST,
+)
+from src.logger import logger
+import src.metrics as metrics
 from src.github.models import comment_factory, PullRequest, Review, Comment
+from .documents import document
+from .rate_limit import budget as rate_limit_budget
+from .transport import PooledTransport
 from .queries import (
+    CONNECTION_PAGE_QUERIES,
+    GetComment,
+    GetCommitChecks,
     GetPullRequest,
     GetPullRequestAndComment,
     GetPullRequestAndReview,
-    GetPullRequestForCommit,
+    GetPullRequestsForCommit,
+    GetPullRequestHistory,
+    GetPullRequestVersion,
+    GetPullRequests,
+    GetReview,
     IterateReviews,
+    PULL_REQUESTS_PER_QUERY,
 )
 
 
-__url = "https://api.github.com/graphql"
+__url = GITHUB_GRAPHQL_URL
 __headers = {"Authorization": f"bearer {GITHUB_API_KEY}"}
-__endpoint = HTTPEndpoint(__url, __headers)
 
 
-def _execute_graphql_query(query: FrozenSet[str], variables: dict) -> dict:
-    query_str = "\n".join(query)
-    response = __endpoint(query_str, variables)
-    if "errors" in response:
-        raise ValueError(f"Error in graphql query:\n{response }")
+def _retry_after_seconds(headers: Any) -> Optional[float]:
+    """
+    How long Github asks us to back off: Retry-After for secondary rate limits,
+    or until X-RateLimit-Reset once the primary rate limit is used up
+    """
+    if headers.get("Retry-After"):
+        return float(headers["Retry-After"])
+    if headers.get("X-RateLimit-Remaining") == "0" and headers.get("X-RateLimit-Reset"):
+        return max(0.0, float(headers["X-RateLimit-Reset"]) - time.time())
+    return None
+
+
+class _BackpressureReportingEndpoint(HTTPEndpoint):
+    """
+    Reports Github's rate limit responses to src.backpressure
+    """
+
+    def _log_http_error(self, query, req, exc):
+        if exc.code in (403, 429):
+            retry_after = _retry_after_seconds(exc.headers)
+            if retry_after is not None or exc.code == 429:
+                backpressure.throttle(backpressure.GITHUB, retry_after)
+        return super()._log_http_error(query, req, exc)
+
+
+def _is_persisted_query_not_found(response: dict) -> bool:
+    return any(
+        error.get("message") == "PersistedQueryNotFound"
+        or (error.get("extensions") or {}).get("code") == "PERSISTED_QUERY_NOT_FOUND"
+        for error in response.get("errors") or []
+    )
+
+
+class _PersistedQueryEndpoint(_BackpressureReportingEndpoint):
+    """
+    Sends the sha256 hash of each query document instead of its text, following
+    the automatic persisted queries protocol: the text is only sent when the
+    server answers that it doesn't know the hash, which registers it.
+
+    Github's API doesn't support persisted queries; this is for endpoints and
+    proxies that do (see GITHUB_GRAPHQL_URL).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._sending_text = threading.local()
+
+    def __call__(self, query, variables=None, operation_name=None, **kwargs):
+        self._sending_text.value = False
+        response = super().__call__(query, variables, operation_name, **kwargs)
+        if not _is_persisted_query_not_found(response):
+            return response
+        metrics.increment("GraphqlPersistedQueryMisses")
+        self._sending_text.value = True
+        return super().__call__(query, variables, operation_name, **kwargs)
+
+    def get_http_post_request(self, query, variables, operation_name, headers):
+        body: Dict[str, Any] = {
+            "variables": variables,
+            "operationName": operation_name,
+            "extensions": {
+                "persistedQuery": {
+                    "version": 1,
+                    "sha256Hash": hashlib.sha256(query.encode("utf-8")).hexdigest(),
+                }
+            },
+        }
+        if self._sending_text.value:
+            body["query"] = query
+        post_data = json.dumps(body).encode("utf-8")
+        headers.update({"Content-Type": "application/json; charset=utf-8"})
+        return urllib.request.Request(
+            url=self.url, data=post_data, headers=headers, method="POST"
+        )
+
+
+# Shared by every query, so that connections are reused across warm invocations
+__transport = PooledTransport(
+    GITHUB_GRAPHQL_POOL_SIZE,
+    GITHUB_GRAPHQL_CONNECT_TIMEOUT_SECONDS,
+    GITHUB_GRAPHQL_READ_TIMEOUT_SECONDS,
+)
+__endpoint = (
+    _PersistedQueryEndpoint
+    if GITHUB_GRAPHQL_PERSISTED_QUERIES
+    else _BackpressureReportingEndpoint
+)(__url, __headers, urlopen=__transport)
+
+# Github's webhooks can reference node ids that its GraphQL API can't resolve
+# yet (it does not have read-after-write consistency). Those queries are
+# retried with capped exponential backoff and full jitter, like queries that
+# fail with a server error (see src.github.resilience); the worst case adds up
+# to ~8 seconds, but the common case pays nothing.
+NODE_RESOLUTION_MAX_ATTEMPTS = 6
+NODE_RESOLUTION_BASE_DELAY_SECONDS = 0.25
+NODE_RESOLUTION_MAX_DELAY_SECONDS = 4.0
+
+_RETRY_POLICY = resilience.RetryPolicy(
+    NODE_RESOLUTION_MAX_ATTEMPTS,
+    NODE_RESOLUTION_BASE_DELAY_SECONDS,
+    NODE_RESOLUTION_MAX_DELAY_SECONDS,
+)
+_HOST = urllib.parse.urlparse(__url).netloc
+
+_NODE_RESOLUTION_ERROR_MESSAGE = "Could not resolve to a node"
+
+
+class GraphqlError(ValueError):
+    """
+    Raised for a response with errors
+    """
+
+    def __init__(self, response: dict):
+        super().__init__(f"Error in graphql query:\n{response}")
+        self.response = response
+
+
+def _is_node_resolution_error(response: dict) -> bool:
+    errors = response.get("errors") or []
+    return bool(errors) and all(
+        _NODE_RESOLUTION_ERROR_MESSAGE in error.get("message", "") for error in errors
+    )
+
+
+def _is_rate_limited_error(response: dict) -> bool:
+    return any(
+        error.get("type") == "RATE_LIMITED" for error in response.get("errors") or []
+    )
+
+
+def _classify_error(error: Exception) -> resilience.Failure:
+    if isinstance(error, (OSError, http.client.HTTPException)):
+        # The transport couldn't connect, or the connection dropped
+        return resilience.Failure(resilience.RETRYABLE, "connection", degraded=True)
+    if not isinstance(error, GraphqlError):
+        return resilience.FATAL_FAILURE
+    response = error.response
+    if _is_node_resolution_error(response):
+        return resilience.Failure(resilience.RETRYABLE, "node_resolution")
+    if _is_rate_limited_error(response):
+        return resilience.Failure(resilience.RATE_LIMITED, "rate_limit")
+    # sgqlc reports HTTP errors as a single error with their status and headers
+    http_error = next(
+        (e for e in response.get("errors") or [] if e.get("status")), None
+    )
+    if http_error is None:
+        return resilience.FATAL_FAILURE
+    status = http_error["status"]
+    retry_after = _retry_after_seconds(http_error.get("headers") or {})
+    if status == 429 or (status == 403 and retry_after is not None):
+        return resilience.Failure(
+            resilience.RATE_LIMITED, "rate_limit", retry_after=retry_after
+        )
+    if status >= 500:
+        return resilience.Failure(
+            resilience.RETRYABLE,
+            "server_error",
+            degraded=True,
+            retry_after=retry_after,
+        )
+    return resilience.FATAL_FAILURE
+
+
+def _execute_graphql_query(
+    query: FrozenSet[str], variables: dict, allow_partial_errors: bool = False
+) -> dict:
+    """
+    Executes the query, raising GraphqlError if the response has errors, unless
+    `allow_partial_errors` is set and the response has data despite them.
+    Transient errors are retried (see src.github.resilience).
+    """
+    compiled = document(query)
+
+    def execute() -> dict:
+        response = __endpoint(compiled.text, variables, compiled.operation_name)
+        if "errors" not in response:
+            return response
+        if _is_rate_limited_error(response):
+            backpressure.throttle(backpressure.GITHUB)
+        if allow_partial_errors and response.get("data"):
+            logger.warning(f"Partial errors in graphql query: {response['errors']}")
+            metrics.increment("GraphqlPartialErrors")
+            return response
+        raise GraphqlError(response)
+
+    response = resilience.call(
+        _HOST, "graphql", execute, _classify_error, _RETRY_POLICY
+    )
     data = response["data"]
+    rate_limit = data.pop("rateLimit", None)
+    if rate_limit is not None:
+        rate_limit_budget.record(compiled.operation_name, rate_limit)
     # if len(data.keys()) == 1:
     #     return data[list(data.keys())[0]]
     return data
 
 
+class ConnectionPages(object):
+    """
+    Fetches the earlier pages of the connections of a pull request, and of its
+    reviews and review requests, as they are read (see src.github.models.pages).
+
+    Reading every page of every connection of a pull request with thousands of
+    comments would make each of its events cost dozens of queries, so at most
+    `max_pages` pages are fetched in all. Past that, connections are missing
+    their earliest nodes, which is logged and counted (PaginationCeilingReached).
+    """
+
+    def __init__(
+        self, pull_request_id: str, max_pages: int = GITHUB_PAGES_PER_PULL_REQUEST
+    ):
+        self._pull_request_id = pull_request_id
+        self._remaining_pages = max_pages
+
+    def __call__(
+        self, node_id: str, connection: str, raw_connection: Dict[str, Any]
+    ) -> Iterator[List[Dict[str, Any]]]:
+        query = CONNECTION_PAGE_QUERIES[connection]
+        field = connection.split(".")[1]
+        page_info = raw_connection.get("pageInfo") or {}
+        while page_info.get("hasPreviousPage"):
+            if self._remaining_pages <= 0:
+                logger.warning(
+                    f"Not fetching the earliest {connection} of {node_id}: "
+                    f"pull request {self._pull_request_id} used up its pages"
+                )
+                metrics.increment(
+                    "PaginationCeilingReached", dimensions={"connection": connection}
+                )
+                return
+            self._remaining_pages -= 1
+            data = _execute_graphql_query(
+                query, {"id": node_id, "before": page_info["startCursor"]}
+            )
+            metrics.increment("GraphqlPages", dimensions={"connection": connection})
+            page = data["node"][field]
+            yield page["nodes"]
+            page_info = page["pageInfo"]
+
+
+def _pull_request(raw: Dict[str, Any]) -> PullRequest:
+    return PullRequest(raw, ConnectionPages(raw["id"]))
+
+
+def _review(raw: Dict[str, Any]) -> Review:
+    return Review(raw, ConnectionPages(raw["id"]))
+
+
+def _snapshot_version(raw: Dict[str, Any]) -> str:
+    """
+    What, when it changes, means that a pull request needs to be fetched again
+    """
+    return json.dumps(
+        [
+            raw.get("updatedAt"),
+            raw.get("headRefOid"),
+            raw.get("mergeable"),
+            raw.get("commits"),
+        ],
+        sort_keys=True,
+    )
+
+
+def _cached_pull_request(pull_request_id: str) -> Optional[Dict[str, Any]]:
+    """
+    The raw snapshot of the pull request (see src.snapshots), if a probe for
+    its version shows that it didn't change since. Without a snapshot, nothing
+    is probed, so that the caller's query is the only round trip.
+    """
+    snapshot = snapshots.get(pull_request_id)
+    if snapshot is None:
+        metrics.increment("PullRequestSnapshots", dimensions={"result": "miss"})
+        return None
+    version, raw = snapshot
+    probe = _execute_graphql_query(GetPullRequestVersion, {"id": pull_request_id})
+    if _snapshot_version(probe["pullRequest"] or {}) != version:
+        metrics.increment("PullRequestSnapshots", dimensions={"result": "changed"})
+        return None
+    metrics.increment("PullRequestSnapshots", dimensions={"result": "hit"})
+    return raw
+
+
+def _keep_snapshot(raw: Dict[str, Any]) -> Dict[str, Any]:
+    snapshots.put(raw["id"], _snapshot_version(raw), raw)
+    return raw
+
+
 def get_pull_request(pull_request_id: str) -> PullRequest:
-    data = _execute_graphql_query(GetPullRequest, {"id": pull_request_id})
-    return PullRequest(data["pullRequest"])
+    raw = _cached_pull_request(pull_request_id)
+    if raw is None:
+        data = _execute_graphql_query(GetPullRequest, {"id": pull_request_id})
+        raw = _keep_snapshot(data["pullRequest"])
+    return _pull_request(raw)
+
+
+def get_pull_requests(pull_request_ids: List[str]) -> List[Optional[PullRequest]]:
+    """
+    Fetches several pull requests with as few queries as possible, each asking
+    for up to PULL_REQUESTS_PER_QUERY of them under aliases. Returns them in the
+    order of `pull_request_ids`, with None for the ones that couldn't be fetched
+    (e.g. that were deleted, or aren't pull requests).
+    """
+    pull_requests: List[Optional[PullRequest]] = []
+    for start in range(0, len(pull_request_ids), PULL_REQUESTS_PER_QUERY):
+        chunk = pull_request_ids[start : start + PULL_REQUESTS_PER_QUERY]
+        data = _execute_graphql_query(
+            GetPullRequests(len(chunk)),
+            {f"id{i}": pull_request_id for i, pull_request_id in enumerate(chunk)},
+            allow_partial_errors=True,
+        )
+        for i in range(len(chunk)):
+            raw = data.get(f"pr{i}")
+            if raw is not None and raw.get("__typename") == "PullRequest":
+                pull_requests.append(_pull_request(_keep_snapshot(raw)))
+            else:
+                pull_requests.append(None)
+    return pull_requests
+
+
+def prefetch_pull_requests(pull_request_ids: List[str]) -> None:
+    """
+    Keeps snapshots of the pull requests that don't have one yet, fetched with
+    as few queries as possible (see get_pull_requests), so that fetching each
+    of them next only costs a probe for its version.
+    """
+    missing = [
+        pull_request_id
+        for pull_request_id in dict.fromkeys(pull_request_ids)
+        if snapshots.get(pull_request_id) is None
+    ]
+    if len(missing) > 1:
+        get_pull_requests(missing)
+
+
+def get_pull_request_history(pull_request_id: str) -> Dict[str, Any]:
+    """
+    Fetches only the fields of a pull request that its webhook payloads lack
+    (reviews, comments, review requests, commit statuses and mergeability), as
+    raw data to be merged with the payload's fields. A snapshot of the whole pull
+    request is used instead if it is still current.
+    """
+    cached = _cached_pull_request(pull_request_id)
+    if cached is not None:
+        return cached
+    data = _execute_graphql_query(GetPullRequestHistory, {"id": pull_request_id})
+    return data["pullRequest"]
 
 
 def get_pull_request_and_comment(
     pull_request_id: str, comment_id: str
 ) -> Tuple[PullRequest, Comment]:
+    cached = _cached_pull_request(pull_request_id)
+    if cached is not None:
+        return _pull_request(cached), get_comment(comment_id)
     data = _execute_graphql_query(
         GetPullRequestAndComment,
         {"pullRequestId": pull_request_id, "commentId": comment_id},
     )
-    return PullRequest(data["pullRequest"]), comment_factory(data["comment"])
+    return (
+        _pull_request(_keep_snapshot(data["pullRequest"])),
+        comment_factory(data["comment"]),
+    )
 
 
 def get_pull_request_and_review(
     pull_request_id: str, review_id: str
 ) -> Tuple[PullRequest, Review]:
+    cached = _cached_pull_request(pull_request_id)
+    if cached is not None:
+        return _pull_request(cached), get_review(review_id)
     data = _execute_graphql_query(
         GetPullRequestAndReview,
         {"pullRequestId": pull_request_id, "reviewId": review_id},
     )
-    return PullRequest(data["pullRequest"]), Review(data["review"])
+    return (
+        _pull_request(_keep_snapshot(data["pullRequest"])),
+        _review(data["review"]),
+    )
 
 
-def get_pull_request_for_commit(commit_id: str) -> Optional[PullRequest]:
-    data = _execute_graphql_query(GetPullRequestForCommit, {"id": commit_id})
-    edges = data["commit"]["associatedPullRequests"]["edges"]
+def get_comment(comment_id: str) -> Comment:
+    data = _execute_graphql_query(GetComment, {"commentId": comment_id})
+    return comment_factory(data["comment"])
+
+
+def get_review(review_id: str) -> Review:
+    data = _execute_graphql_query(GetReview, {"reviewId": review_id})
+    return _review(data["review"])
+
 
-    if edges:
-        pull_request = data["commit"]["associatedPullRequests"]["edges"][0]["node"]
-        return PullRequest(pull_request)
-    else:
+def _get_review_if_exists(review_id: str) -> Optional[Review]:
+    """
+    Like get_review, but returns None if the review was deleted
+    """
+    data = _execute_graphql_query(
+        GetReview, {"reviewId": review_id}, allow_partial_errors=True
+    )
+    if data.get("review") is None:
         return None
+    return _review(data["review"])
+
+
+def get_pull_requests_for_commit(commit_id: str) -> List[PullRequest]:
+    """
+    Fetches the open pull requests associated with a commit, loaded with only
+    the fields that automerge needs (see the AutomergePullRequest fragment)
+    """
+    data = _execute_graphql_query(GetPullRequestsForCommit, {"id": commit_id})
+    edges = data["commit"]["associatedPullRequests"]["edges"]
+    pull_requests = [_pull_request(edge["node"]) for edge in edges]
+    return [pull_request for pull_request in pull_requests if not pull_request.closed()]
+
+
+def get_commit_checks(owner: str, name: str, sha: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetches the ids of the pull requests associated with a commit, and the
+    state of each of its checks and status contexts, as raw data. Returns None
+    if the commit doesn't exist.
+    """
+    data = _execute_graphql_query(
+        GetCommitChecks, {"owner": owner, "name": name, "oid": sha}
+    )
+    return data["repository"]["commit"]
 
 
 def get_review_for_database_id(
@@ -78,10 +487,15 @@ def get_review_for_database_id(
         @pull_request_id is the `id` for the pull request.
         @review_db_id is the `databaseId` for the review.
 
-    Unfortunately, this requires iterating through all reviews on the given pull request.
+    Reviews that SGTM synced are fetched by the node id recorded for them (see
+    src.review_ids). Others require iterating through all reviews on the given pull request.
 
     See https://developer.github.com/v4/object/repository/#fields
     """
+    review_id = review_ids.node_id(review_db_id)
+    if review_id is not None:
+        return _get_review_if_exists(review_id)
+
     data = _execute_graphql_query(IterateReviews, {"pullRequestId": pull_request_id})
     while data["node"]["reviews"]["edges"]:
         try:
@@ -92,7 +506,7 @@ def get_review_for_database_id(
                     if e["node"]["databaseId"] == review_db_id
                 )
             )
-            return Review(match)
+            return _review(match)
         except StopIteration:
             # no matching reviews, continue.
             data = _execute_graphql_query(
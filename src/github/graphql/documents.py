@@ -0,0 +1,71 @@
+"""
+Compiled GraphQL query documents.
+
+Queries are kept as sets of operation and fragment definitions (see
+src.github.graphql.fragments). Each set is compiled once into a document: its
+definitions are parsed, put in a deterministic order (operations first, then
+fragments, each by name), printed with all insignificant whitespace and
+punctuation stripped, and hashed. The same query always produces the same text
+and hash, which is what persisted queries are keyed on.
+"""
+import hashlib
+from typing import Dict, FrozenSet, Iterable, Tuple
+
+from graphql import parse, print_ast
+from graphql.language import (
+    DocumentNode,
+    FragmentDefinitionNode,
+    OperationDefinitionNode,
+)
+from graphql.utilities import strip_ignored_characters
+
+
+class QueryDocument(object):
+    def __init__(self, text: str, operation_name: str):
+        self.text = text
+        self.operation_name = operation_name
+        self.sha256 = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def __str__(self) -> str:
+        return self.text
+
+
+def _sort_key(definition) -> Tuple[int, str]:
+    if isinstance(definition, OperationDefinitionNode):
+        return 0, definition.name.value if definition.name else ""
+    elif isinstance(definition, FragmentDefinitionNode):
+        return 1, definition.name.value
+    raise ValueError(f"Unexpected definition in query: {definition.kind}")
+
+
+def compile_document(query: FrozenSet[str]) -> QueryDocument:
+    definitions = [
+        definition for source in query for definition in parse(source).definitions
+    ]
+    definitions.sort(key=_sort_key)
+    operations = [d for d in definitions if isinstance(d, OperationDefinitionNode)]
+    if len(operations) != 1 or operations[0].name is None:
+        raise ValueError("Expected a single, named operation")
+    text = strip_ignored_characters(
+        print_ast(DocumentNode(definitions=tuple(definitions)))
+    )
+    return QueryDocument(text, operations[0].name.value)
+
+
+_documents: Dict[FrozenSet[str], QueryDocument] = {}
+
+
+def precompile(queries: Iterable[FrozenSet[str]]) -> None:
+    for query in queries:
+        document(query)
+
+
+def document(query: FrozenSet[str]) -> QueryDocument:
+    """
+    The compiled document of `query`, compiling it on first use
+    """
+    compiled = _documents.get(query)
+    if compiled is None:
+        compiled = compile_document(query)
+        _documents[query] = compiled
+    return compiled
@@ -0,0 +1,56 @@
+from typing import FrozenSet
+
+# @GraphqlInPython
+# Only the fields of a pull request that deciding whether to automerge it, and
+# merging it, need (see src.github.logic). The rest of a PullRequest built from
+# it raises FieldNotFetchedError when read.
+_automerge_pull_request = """
+fragment AutomergePullRequest on PullRequest {
+  id
+  body
+  title
+  closed
+  merged
+  number
+  mergeable
+  repository {
+    id
+    name
+    owner {
+      login
+    }
+  }
+  labels(last: 20) {
+    nodes {
+      name
+    }
+  }
+  reviews(last: 20) {
+    pageInfo {
+      hasPreviousPage
+      startCursor
+    }
+    nodes {
+      author {
+        login
+      }
+      state
+      submittedAt
+    }
+  }
+  commits(last: 1) {
+    nodes {
+      commit {
+        status {
+          state
+        }
+        statusCheckRollup {
+          state
+        }
+      }
+    }
+  }
+}
+"""
+
+AutomergePullRequest: FrozenSet[str] = frozenset([_automerge_pull_request])
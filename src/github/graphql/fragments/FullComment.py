@@ -24,6 +24,7 @@ fragment FullComment on Comment {
     }
   }
   body
+  updatedAt
   ... on IssueComment {
     url
   }
@@ -1,4 +1,4 @@
-from .FullReview import FullReview
+from .PullRequestHistory import PullRequestHistory
 from typing import FrozenSet
 
 # @GraphqlInPython
@@ -6,7 +6,6 @@ _full_pull_request = """
 fragment FullPullRequest on PullRequest {
   id
   body
-  bodyHTML
   title
   author {
     login
@@ -14,9 +13,11 @@ fragment FullPullRequest on PullRequest {
   closed
   merged
   mergedAt
-  mergeable
+  updatedAt
+  headRefOid
   url
   number
+  ...PullRequestHistory
   repository {
     id
     name
@@ -24,58 +25,11 @@ fragment FullPullRequest on PullRequest {
       login
     }
   }
-  reviewRequests(last: 20) {
-    nodes {
-      requestedReviewer {
-        ... on User {
-          login
-        }
-        ... on Team {
-          name
-          members(last:20) {
-            nodes {
-              ... on User {
-                login
-              }
-            }
-          }
-        }
-      }
-    }
-  }
-  reviews(last: 20) {
-    nodes {
-      ...FullReview
-    }
-  }
-  comments(last: 20) {
-    nodes {
-      id
-      author {
-        login
-      }
-      publishedAt
-      body
-      url
-    }
-  }
   assignees(last: 20) {
     nodes {
       login
     }
   }
-  commits(last: 1) {
-    nodes {
-      commit {
-        status {
-          state
-        }
-        statusCheckRollup {
-          state
-        }
-      }
-    }
-  }
   labels(last: 20) {
     nodes {
       name
@@ -84,4 +38,4 @@ fragment FullPullRequest on PullRequest {
 }
 """
 
-FullPullRequest: FrozenSet[str] = frozenset([_full_pull_request]) | FullReview
+FullPullRequest: FrozenSet[str] = frozenset([_full_pull_request]) | PullRequestHistory
@@ -5,6 +5,7 @@ from .FullComment import FullComment
 _full_review = """
 fragment FullReview on PullRequestReview {
   id
+  databaseId
   author {
     login
     ... on User {
@@ -13,8 +14,13 @@ fragment FullReview on PullRequestReview {
   }
   body
   submittedAt
+  updatedAt
   state
   comments(last: 20) {
+    pageInfo {
+      hasPreviousPage
+      startCursor
+    }
     nodes {
       ...FullComment
     }
@@ -0,0 +1,17 @@
+from typing import FrozenSet
+
+# @GraphqlInPython
+_pull_request_comment = """
+fragment PullRequestComment on IssueComment {
+  id
+  author {
+    login
+  }
+  publishedAt
+  updatedAt
+  body
+  url
+}
+"""
+
+PullRequestComment: FrozenSet[str] = frozenset([_pull_request_comment])
@@ -0,0 +1,61 @@
+from .FullReview import FullReview
+from .PullRequestComment import PullRequestComment
+from .ReviewRequest import ReviewRequest
+from typing import FrozenSet
+
+# @GraphqlInPython
+# The fields of a pull request that its webhook payloads don't include (see
+# src.github.payload). FullPullRequest includes all of these.
+#
+# Only the last page of each connection is fetched; the earlier pages of those
+# with a `pageInfo` are fetched when they are read (see
+# src.github.graphql.client.ConnectionPages).
+_pull_request_history = """
+fragment PullRequestHistory on PullRequest {
+  id
+  mergeable
+  reviewRequests(last: 20) {
+    pageInfo {
+      hasPreviousPage
+      startCursor
+    }
+    nodes {
+      ...ReviewRequest
+    }
+  }
+  reviews(last: 20) {
+    pageInfo {
+      hasPreviousPage
+      startCursor
+    }
+    nodes {
+      ...FullReview
+    }
+  }
+  comments(last: 20) {
+    pageInfo {
+      hasPreviousPage
+      startCursor
+    }
+    nodes {
+      ...PullRequestComment
+    }
+  }
+  commits(last: 1) {
+    nodes {
+      commit {
+        status {
+          state
+        }
+        statusCheckRollup {
+          state
+        }
+      }
+    }
+  }
+}
+"""
+
+PullRequestHistory: FrozenSet[str] = (
+    frozenset([_pull_request_history]) | FullReview | PullRequestComment | ReviewRequest
+)
@@ -0,0 +1,17 @@
+from typing import FrozenSet
+
+# @GraphqlInPython
+# Spread into every query, so that the cost of each query and the points left
+# are tracked (see src.github.graphql.rate_limit)
+_rate_limit = """
+fragment RateLimit on Query {
+  rateLimit {
+    cost
+    limit
+    remaining
+    resetAt
+  }
+}
+"""
+
+RateLimit: FrozenSet[str] = frozenset([_rate_limit])
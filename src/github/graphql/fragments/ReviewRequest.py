@@ -0,0 +1,29 @@
+from typing import FrozenSet
+
+# @GraphqlInPython
+_review_request = """
+fragment ReviewRequest on ReviewRequest {
+  requestedReviewer {
+    ... on User {
+      login
+    }
+    ... on Team {
+      id
+      name
+      members(last: 20) {
+        pageInfo {
+          hasPreviousPage
+          startCursor
+        }
+        nodes {
+          ... on User {
+            login
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+ReviewRequest: FrozenSet[str] = frozenset([_review_request])
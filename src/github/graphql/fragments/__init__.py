@@ -1,3 +1,8 @@
+from .AutomergePullRequest import AutomergePullRequest
 from .FullComment import FullComment
 from .FullPullRequest import FullPullRequest
 from .FullReview import FullReview
+from .PullRequestHistory import PullRequestHistory
+from .PullRequestComment import PullRequestComment
+from .ReviewRequest import ReviewRequest
+from .RateLimit import RateLimit
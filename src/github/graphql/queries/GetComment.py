@@ -0,0 +1,27 @@
+from typing import FrozenSet
+from ..fragments import FullComment, FullReview, RateLimit
+
+# @GraphqlInPython
+_get_comment = """
+query GetComment($commentId: ID!) {
+  ...RateLimit
+  comment: node(id: $commentId) {
+    ... on Comment {
+      ...FullComment
+    }
+    ... on IssueComment {
+      url
+    }
+    ... on PullRequestReviewComment {
+      url
+      pullRequestReview {
+        ... FullReview
+      }
+    }
+  }
+}
+"""
+
+GetComment: FrozenSet[str] = frozenset(
+    [_get_comment]
+) | FullComment | FullReview | RateLimit
@@ -0,0 +1,45 @@
+from typing import FrozenSet
+from ..fragments import RateLimit
+
+# @GraphqlInPython
+# Just enough to derive a commit's Build state (see src.github.checks). Like
+# GetPullRequestsForCommit, ten pull requests is plenty, and closed ones are
+# skipped by src.github.checks. Contexts aren't paginated: past the first 100,
+# check runs and status contexts only reach the cached checks of the commit
+# through their own events.
+_get_commit_checks = """
+query GetCommitChecks($owner: String!, $name: String!, $oid: GitObjectID!) {
+  ...RateLimit
+  repository(owner: $owner, name: $name) {
+    commit: object(oid: $oid) {
+      ... on Commit {
+        associatedPullRequests(first: 10) {
+          nodes {
+            id
+            closed
+          }
+        }
+        statusCheckRollup {
+          contexts(first: 100) {
+            nodes {
+              __typename
+              ... on CheckRun {
+                databaseId
+                name
+                status
+                conclusion
+              }
+              ... on StatusContext {
+                context
+                state
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+GetCommitChecks: FrozenSet[str] = frozenset([_get_commit_checks]) | RateLimit
@@ -0,0 +1,57 @@
+from typing import Dict, FrozenSet
+from ..fragments import (
+    FullComment,
+    FullReview,
+    PullRequestComment,
+    ReviewRequest,
+    RateLimit,
+)
+
+# The largest page Github allows
+CONNECTION_PAGE_SIZE = 100
+
+
+def _connection_page(
+    type_name: str, connection: str, selection: str, fragments: FrozenSet[str]
+) -> FrozenSet[str]:
+    # @GraphqlInPython
+    _get_connection_page = f"""
+query Get{type_name}{connection[0].upper() + connection[1:]}Page($id: ID!, $before: String) {{
+  ...RateLimit
+  node(id: $id) {{
+    ... on {type_name} {{
+      {connection}(last: {CONNECTION_PAGE_SIZE}, before: $before) {{
+        pageInfo {{
+          hasPreviousPage
+          startCursor
+        }}
+        nodes {{
+          {selection}
+        }}
+      }}
+    }}
+  }}
+}}
+"""
+    return frozenset([_get_connection_page]) | fragments | RateLimit
+
+
+# The query for the page of nodes of each paginated connection before a cursor,
+# keyed by "<type>.<connection>"; its data is at ["node"][<connection>]
+CONNECTION_PAGE_QUERIES: Dict[str, FrozenSet[str]] = {
+    "PullRequest.comments": _connection_page(
+        "PullRequest", "comments", "...PullRequestComment", PullRequestComment
+    ),
+    "PullRequest.reviewRequests": _connection_page(
+        "PullRequest", "reviewRequests", "...ReviewRequest", ReviewRequest
+    ),
+    "PullRequest.reviews": _connection_page(
+        "PullRequest", "reviews", "...FullReview", FullReview
+    ),
+    "PullRequestReview.comments": _connection_page(
+        "PullRequestReview", "comments", "...FullComment", FullComment
+    ),
+    "Team.members": _connection_page(
+        "Team", "members", "... on User { login }", frozenset()
+    ),
+}
@@ -1,9 +1,10 @@
 from typing import FrozenSet
-from ..fragments import FullPullRequest, FullReview
+from ..fragments import FullPullRequest, FullReview, RateLimit
 
 # @GraphqlInPython
 _get_pull_request = """
 query GetPullRequest($id: ID!) {
+  ...RateLimit
   pullRequest: node(id: $id) {
     __typename
     ... on PullRequest {
@@ -15,4 +16,4 @@ query GetPullRequest($id: ID!) {
 
 GetPullRequest: FrozenSet[str] = frozenset(
     [_get_pull_request]
-) | FullPullRequest | FullReview
+) | FullPullRequest | FullReview | RateLimit
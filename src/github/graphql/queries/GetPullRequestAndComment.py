@@ -1,9 +1,10 @@
 from typing import FrozenSet
-from ..fragments import FullPullRequest, FullComment, FullReview
+from ..fragments import FullPullRequest, FullComment, FullReview, RateLimit
 
 # @GraphqlInPython
 _get_pull_request_and_comment = """
 query GetPullRequestAndComment($pullRequestId: ID!, $commentId: ID!) {
+  ...RateLimit
   pullRequest: node(id: $pullRequestId) {
     __typename
     ... on PullRequest {
@@ -30,4 +31,4 @@ query GetPullRequestAndComment($pullRequestId: ID!, $commentId: ID!) {
 
 GetPullRequestAndComment: FrozenSet[str] = frozenset(
     [_get_pull_request_and_comment]
-) | FullPullRequest | FullComment | FullReview
+) | FullPullRequest | FullComment | FullReview | RateLimit
@@ -1,9 +1,10 @@
 from typing import FrozenSet
-from ..fragments import FullPullRequest, FullReview
+from ..fragments import FullPullRequest, FullReview, RateLimit
 
 # @GraphqlInPython
 _get_pull_request_and_review = """
 query GetPullRequestAndReview($pullRequestId: ID!, $reviewId: ID!) {
+  ...RateLimit
   pullRequest: node(id: $pullRequestId) {
     __typename
     ... on PullRequest {
@@ -23,4 +24,4 @@ query GetPullRequestAndReview($pullRequestId: ID!, $reviewId: ID!) {
 
 GetPullRequestAndReview: FrozenSet[str] = frozenset(
     [_get_pull_request_and_review]
-) | FullPullRequest | FullReview
+) | FullPullRequest | FullReview | RateLimit
@@ -0,0 +1,19 @@
+from typing import FrozenSet
+from ..fragments import PullRequestHistory, RateLimit
+
+# @GraphqlInPython
+_get_pull_request_history = """
+query GetPullRequestHistory($id: ID!) {
+  ...RateLimit
+  pullRequest: node(id: $id) {
+    __typename
+    ... on PullRequest {
+      ...PullRequestHistory
+    }
+  }
+}
+"""
+
+GetPullRequestHistory: FrozenSet[str] = frozenset(
+    [_get_pull_request_history]
+) | PullRequestHistory | RateLimit
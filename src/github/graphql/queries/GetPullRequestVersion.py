@@ -0,0 +1,37 @@
+from typing import FrozenSet
+from ..fragments import RateLimit
+
+# @GraphqlInPython
+# Just enough to tell whether a cached pull request changed (see
+# src.github.graphql.client._snapshot_version). updatedAt doesn't change with
+# new commit statuses or mergeability, so those are fetched too.
+_get_pull_request_version = """
+query GetPullRequestVersion($id: ID!) {
+  ...RateLimit
+  pullRequest: node(id: $id) {
+    __typename
+    ... on PullRequest {
+      id
+      updatedAt
+      headRefOid
+      mergeable
+      commits(last: 1) {
+        nodes {
+          commit {
+            status {
+              state
+            }
+            statusCheckRollup {
+              state
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+GetPullRequestVersion: FrozenSet[str] = frozenset(
+    [_get_pull_request_version]
+) | RateLimit
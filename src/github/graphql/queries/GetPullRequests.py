@@ -0,0 +1,35 @@
+from typing import FrozenSet
+from src.utils import memoize
+from ..fragments import FullPullRequest, FullReview, RateLimit
+
+# Each FullPullRequest asks for up to ~900 nodes (20 review requests of 20 team
+# members, 20 reviews of 20 comments, ...) in 46 connections, so 50 of them stay
+# far below Github's limit of 500,000 nodes per query, and cost 23 of the 5,000
+# points per hour. Larger queries mostly risk timing out.
+PULL_REQUESTS_PER_QUERY = 50
+
+
+@memoize
+def GetPullRequests(count: int) -> FrozenSet[str]:
+    """
+    A query for `count` pull requests at once, aliased pr0, pr1, ... and
+    taking the variables id0, id1, ...
+    """
+    variables = ", ".join(f"$id{i}: ID!" for i in range(count))
+    aliases = "\n".join(
+        f"""
+  pr{i}: node(id: $id{i}) {{
+    __typename
+    ... on PullRequest {{
+      ...FullPullRequest
+    }}
+  }}"""
+        for i in range(count)
+    )
+    # @GraphqlInPython
+    _get_pull_requests = f"""
+query GetPullRequests({variables}) {{
+  ...RateLimit{aliases}
+}}
+"""
+    return frozenset([_get_pull_requests]) | FullPullRequest | FullReview | RateLimit
@@ -0,0 +1,29 @@
+from typing import FrozenSet
+from ..fragments import AutomergePullRequest, RateLimit
+
+# A commit is the head of several pull requests with stacked branches, or when
+# a branch is opened against several bases or forks. Ten is plenty, and merged
+# pull requests of earlier commits are skipped by the client.
+# @GraphqlInPython
+_get_pull_requests_for_commit = """
+query GetPullRequestsForCommit($id: ID!) {
+  ...RateLimit
+  commit: node(id: $id) {
+    ... on Commit {
+      associatedPullRequests(first: 10) {
+        edges {
+          node {
+            ... on PullRequest {
+                ...AutomergePullRequest
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+GetPullRequestsForCommit: FrozenSet[str] = frozenset(
+    [_get_pull_requests_for_commit]
+) | AutomergePullRequest | RateLimit
@@ -0,0 +1,18 @@
+from typing import FrozenSet
+from ..fragments import FullReview, RateLimit
+
+# @GraphqlInPython
+_get_review = """
+query GetReview($reviewId: ID!) {
+  ...RateLimit
+  review: node(id: $reviewId) {
+    __typename
+    id
+    ... on PullRequestReview {
+      ...FullReview
+    }
+  }
+}
+"""
+
+GetReview: FrozenSet[str] = frozenset([_get_review]) | FullReview | RateLimit
@@ -1,9 +1,10 @@
 from typing import FrozenSet
-from ..fragments import FullReview
+from ..fragments import FullReview, RateLimit
 
 # @GraphqlInPython
 _iterate_reviews = """
 query IterateReviews($pullRequestId: ID!, $cursor: String) {
+  ...RateLimit
   node(id: $pullRequestId) {
     ... on PullRequest {
       reviews(first: 20, after: $cursor) {
@@ -11,7 +12,6 @@ query IterateReviews($pullRequestId: ID!, $cursor: String) {
           cursor
           node {
             ...FullReview
-            databaseId
           }
         }
       }
@@ -20,4 +20,4 @@ query IterateReviews($pullRequestId: ID!, $cursor: String) {
 }
 """
 
-IterateReviews: FrozenSet[str] = frozenset([_iterate_reviews]) | FullReview
+IterateReviews: FrozenSet[str] = frozenset([_iterate_reviews]) | FullReview | RateLimit
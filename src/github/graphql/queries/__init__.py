@@ -1,5 +1,30 @@
+from .GetComment import GetComment
+from .GetCommitChecks import GetCommitChecks
+from .GetConnectionPage import CONNECTION_PAGE_QUERIES, CONNECTION_PAGE_SIZE
 from .GetPullRequest import GetPullRequest
 from .GetPullRequestAndComment import GetPullRequestAndComment
 from .GetPullRequestAndReview import GetPullRequestAndReview
-from .GetPullRequestForCommit import GetPullRequestForCommit
+from .GetPullRequestHistory import GetPullRequestHistory
+from .GetPullRequestVersion import GetPullRequestVersion
+from .GetPullRequests import GetPullRequests, PULL_REQUESTS_PER_QUERY
+from .GetPullRequestsForCommit import GetPullRequestsForCommit
+from .GetReview import GetReview
 from .IterateReviews import IterateReviews
+from ..documents import precompile
+
+ALL_QUERIES = (
+    GetComment,
+    GetCommitChecks,
+    GetPullRequest,
+    GetPullRequestAndComment,
+    GetPullRequestAndReview,
+    GetPullRequestHistory,
+    GetPullRequestVersion,
+    GetPullRequests(PULL_REQUESTS_PER_QUERY),
+    GetPullRequestsForCommit,
+    GetReview,
+    IterateReviews,
+) + tuple(CONNECTION_PAGE_QUERIES.values())
+
+# Compile every query into its document once, at import
+precompile(ALL_QUERIES)
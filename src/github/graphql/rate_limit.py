@@ -0,0 +1,136 @@
+"""
+A process-wide budget of Github's GraphQL rate limit points.
+
+Github allows a number of points per hour (5,000 by default), and we used to
+only find out that they had run out when queries started failing. Every query
+now asks for its `rateLimit` (see the RateLimit fragment), and every response
+is recorded here: the cost of the query (GraphqlQueryCost, per operation) and
+the points left (GraphqlRateLimitRemaining).
+
+From the points spent over the last SPEND_WINDOW_SECONDS, the budget predicts
+when the points will run out. Every instance spends the same points, so the
+points spent are the larger of what this instance spent and how much the points
+left dropped over the window. Github is then throttled in src.backpressure, so
+that events that can wait are deferred, and only high priority events keep
+spending points:
+
+  * until the points reset, once fewer than GITHUB_RATE_LIMIT_RESERVE of them
+    are left;
+  * for PACING_SECONDS at a time, while they are predicted to run out before
+    they reset.
+"""
+import collections
+import threading
+import time
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import src.backpressure as backpressure
+from src.config import GITHUB_RATE_LIMIT_RESERVE
+from src.logger import logger
+import src.metrics as metrics
+from src.utils import parse_date_string
+
+SPEND_WINDOW_SECONDS = 5 * 60
+PACING_SECONDS = 60.0
+
+
+class RateLimitBudget(object):
+    def __init__(
+        self,
+        reserve: float = GITHUB_RATE_LIMIT_RESERVE,
+        spend_window_seconds: float = SPEND_WINDOW_SECONDS,
+    ):
+        self._reserve = reserve
+        self._spend_window_seconds = spend_window_seconds
+        self._lock = threading.Lock()
+        self._limit: Optional[int] = None
+        self._remaining: Optional[int] = None
+        self._reset_at = 0.0
+        # (when, cost, remaining, reset_at) of the queries made in the spend window
+        self._spent: Deque[Tuple[float, int, int, float]] = collections.deque()
+        self._throttled_until = 0.0
+
+    def record(self, operation_name: str, rate_limit: Dict[str, Any]) -> None:
+        """
+        Records the `rateLimit` returned with a response to `operation_name`
+        """
+        now = time.time()
+        cost = rate_limit["cost"]
+        with self._lock:
+            self._limit = rate_limit["limit"]
+            self._remaining = rate_limit["remaining"]
+            self._reset_at = parse_date_string(rate_limit["resetAt"]).timestamp()
+            self._spent.append((now, cost, rate_limit["remaining"], self._reset_at))
+        metrics.increment(
+            "GraphqlQueryCost", cost, dimensions={"operation": operation_name}
+        )
+        metrics.gauge("GraphqlRateLimitRemaining", rate_limit["remaining"])
+        self._maybe_throttle(now)
+
+    def remaining(self) -> Optional[int]:
+        """
+        The points left, or None before the first query
+        """
+        with self._lock:
+            return self._remaining
+
+    def seconds_until_exhausted(self, now: Optional[float] = None) -> Optional[float]:
+        """
+        When the points left will run out at the recent rate of spending, or
+        None if no points were spent recently
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            while self._spent and self._spent[0][0] < now - self._spend_window_seconds:
+                self._spent.popleft()
+            if self._remaining is None or not self._spent:
+                return None
+            rate = (
+                sum(cost for _, cost, _, _ in self._spent) / self._spend_window_seconds
+            )
+            first_at, _, first_remaining, first_reset_at = self._spent[0]
+            last_at, _, last_remaining, last_reset_at = self._spent[-1]
+            if last_at > first_at and last_reset_at == first_reset_at:
+                # Includes the points that other instances spent
+                rate = max(
+                    rate, (first_remaining - last_remaining) / (last_at - first_at)
+                )
+            if rate <= 0:
+                return None
+            return self._remaining / rate
+
+    def _is_below_reserve(self) -> bool:
+        with self._lock:
+            return (
+                self._remaining is not None
+                and self._limit is not None
+                and self._remaining < self._limit * self._reserve
+            )
+
+    def _maybe_throttle(self, now: float) -> None:
+        with self._lock:
+            reset_at = self._reset_at
+            if now < self._throttled_until or now >= reset_at:
+                return
+        if self._is_below_reserve():
+            until = reset_at
+            logger.warning(
+                f"Only {self.remaining()} Github points left, deferring events "
+                f"that can wait until they reset at {reset_at:.0f}"
+            )
+        else:
+            exhausted_in = self.seconds_until_exhausted(now)
+            if exhausted_in is None or now + exhausted_in >= reset_at:
+                return
+            until = min(reset_at, now + PACING_SECONDS)
+            logger.warning(
+                f"Github points are predicted to run out in {exhausted_in:.0f}s, "
+                f"before they reset at {reset_at:.0f}"
+            )
+        with self._lock:
+            self._throttled_until = until
+        metrics.increment("GraphqlRateLimitLow")
+        backpressure.throttle(backpressure.GITHUB, until - now)
+
+
+budget = RateLimitBudget()
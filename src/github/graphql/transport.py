@@ -0,0 +1,128 @@
+"""
+A keep-alive, pooled HTTP transport for sgqlc's HTTPEndpoint.
+
+HTTPEndpoint sends each query with urllib.request.urlopen, which opens a new
+connection, and so pays a TLS handshake, for every query; a webhook typically
+makes two or three. PooledTransport implements the same interface as urlopen
+on top of a requests Session, so connections to Github are kept alive and
+reused across queries, and across warm Lambda invocations, since the transport
+lives as long as the module. A single transport, and so a single pool of
+connections, is shared by every thread (see src.aio). Responses are gzip-compressed in transit, and
+decoded by requests.
+
+Each new connection is counted (GraphqlConnections) and its handshake timed
+(GraphqlHandshakeTime); each request is counted as made on a new or a reused
+connection (GraphqlRequests).
+"""
+import io
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection  # type: ignore
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool  # type: ignore
+
+import src.metrics as metrics
+
+_connections = threading.local()
+
+
+class _TimedConnectionMixin(object):
+    def connect(self):
+        started_at = time.time()
+        super().connect()  # type: ignore
+        metrics.increment("GraphqlConnections")
+        metrics.timing("GraphqlHandshakeTime", (time.time() - started_at) * 1000)
+        _connections.opened = getattr(_connections, "opened", 0) + 1
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class PooledTransport(object):
+    """
+    Implements the interface of urllib.request.urlopen that sgqlc's
+    HTTPEndpoint uses, with a pool of up to `pool_size` keep-alive connections
+    per host. `connect_timeout_seconds` and `read_timeout_seconds` apply unless
+    the endpoint passes a timeout, which then overrides the read timeout.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        connect_timeout_seconds: float = 5,
+        read_timeout_seconds: float = 30,
+    ):
+        self._connect_timeout_seconds = connect_timeout_seconds
+        self._read_timeout_seconds = read_timeout_seconds
+        self._session = requests.Session()
+        adapter = _TimedHTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def _timeout(self, timeout: Optional[float]) -> Tuple[float, float]:
+        return (
+            self._connect_timeout_seconds,
+            timeout if timeout is not None else self._read_timeout_seconds,
+        )
+
+    def __call__(
+        self, req: urllib.request.Request, timeout: Optional[float] = None
+    ) -> io.BytesIO:
+        # requests sets the Content-Length itself
+        headers = {
+            name: value
+            for name, value in req.header_items()
+            if name.lower() != "content-length"
+        }
+        _connections.opened = 0
+        response = self._session.request(
+            req.get_method(),
+            req.full_url,
+            data=req.data,
+            headers=headers,
+            timeout=self._timeout(timeout),
+        )
+        metrics.increment(
+            "GraphqlRequests",
+            dimensions={"connection": "new" if _connections.opened else "reused"},
+        )
+        body = io.BytesIO(response.content)
+        if response.status_code >= 400:
+            raise urllib.error.HTTPError(
+                req.full_url,
+                response.status_code,
+                response.reason,
+                response.headers,  # type: ignore
+                body,
+            )
+        return body
+
+    def close(self) -> None:
+        self._session.close()
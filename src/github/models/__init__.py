@@ -7,6 +7,7 @@ from .pull_request_review_comment import PullRequestReviewComment
 from .user import User
 from .commit import Commit
 from .label import Label
+from .partial import FieldNotFetchedError
 
 
 def comment_factory(raw: Dict[str, Any]) -> Comment:
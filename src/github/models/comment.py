@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from src.utils import parse_date_string
 from .user import User
 
@@ -16,6 +16,12 @@ class Comment(object):
     def published_at(self) -> datetime:
         return parse_date_string(self._raw["publishedAt"])
 
+    def updated_at(self) -> Optional[datetime]:
+        updated_at = self._raw.get("updatedAt", None)
+        if updated_at is None:
+            return None
+        return parse_date_string(updated_at)
+
     def body(self) -> str:
         return self._raw["body"]
 
@@ -0,0 +1,39 @@
+"""
+Support for connections with more nodes than their query fetched.
+
+Queries only fetch the last page of each connection (e.g. a pull request's last
+20 comments), along with its `pageInfo`. A model built with a PageLoader
+fetches the earlier pages of a connection the first time the connection is
+read, so that handlers that never read it don't pay for them.
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Given the id of the node that has the connection, the connection as
+# "<type>.<connection>" (e.g. "PullRequest.comments") and its fetched page,
+# yields the nodes of each earlier page, from the latest page to the earliest
+PageLoader = Callable[[str, str, Dict[str, Any]], Iterator[List[Dict[str, Any]]]]
+
+
+def has_earlier_pages(raw_connection: Dict[str, Any]) -> bool:
+    return bool((raw_connection.get("pageInfo") or {}).get("hasPreviousPage"))
+
+
+def all_nodes(
+    raw_connection: Dict[str, Any],
+    node_id: Optional[str],
+    connection: str,
+    pages: Optional[PageLoader],
+) -> List[Dict[str, Any]]:
+    """
+    The nodes of `raw_connection`, in order, after fetching its earlier pages
+    with `pages` if there are any. They are stored in `raw_connection`, so that
+    they are only fetched once.
+    """
+    if pages is None or node_id is None or not has_earlier_pages(raw_connection):
+        return raw_connection["nodes"]
+    earlier_pages = list(pages(node_id, connection, raw_connection))
+    raw_connection["nodes"] = [
+        node for page in reversed(earlier_pages) for node in page
+    ] + raw_connection["nodes"]
+    raw_connection["pageInfo"] = {"hasPreviousPage": False, "startCursor": None}
+    return raw_connection["nodes"]
@@ -0,0 +1,24 @@
+"""
+Support for partially loaded models.
+
+Each query only fetches the fields that its handler needs (see
+src.github.graphql.fragments), so a model may be built from raw data that lacks
+some fields. Reading a field that wasn't fetched raises FieldNotFetchedError,
+rather than a bare KeyError, or a default that looks like real data.
+"""
+from typing import Any, Dict
+
+
+class FieldNotFetchedError(Exception):
+    pass
+
+
+def fetched(raw: Dict[str, Any], field: str, model: str) -> Any:
+    """
+    The value of `field` in the raw data of a `model`, which must have been fetched
+    """
+    if field not in raw:
+        raise FieldNotFetchedError(
+            f"{model}.{field} was not fetched by the query this {model} came from"
+        )
+    return raw[field]
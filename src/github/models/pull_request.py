@@ -10,6 +10,8 @@ from .review import Review
 from .commit import Commit
 from .user import User
 from .label import Label
+from .pages import PageLoader, all_nodes
+from .partial import fetched
 import copy
 import collections
 
@@ -33,26 +35,47 @@ class MergeableState(Enum):
 
 
 class PullRequest(object):
-    def __init__(self, raw_pull_request: Dict[str, Any]):
+    def __init__(
+        self, raw_pull_request: Dict[str, Any], pages: Optional[PageLoader] = None
+    ):
         self._raw = copy.deepcopy(raw_pull_request)
-        self._assignees = self._assignees_from_raw()
+        self._pages = pages
+        self._assignees: Optional[List[str]] = None
+        self._reviews: Optional[List[Review]] = None
+
+    def _fetched(self, field: str) -> Any:
+        return fetched(self._raw, field, "PullRequest")
+
+    def _nodes(self, connection: str) -> List[Dict[str, Any]]:
+        """
+        All nodes of one of the pull request's connections, fetching its
+        earlier pages the first time it is read
+        """
+        return all_nodes(
+            self._fetched(connection),
+            self._raw.get("id"),
+            f"PullRequest.{connection}",
+            self._pages,
+        )
 
     def _assignees_from_raw(self) -> List[str]:
-        return sorted([node["login"] for node in self._raw["assignees"]["nodes"]])
+        return sorted([node["login"] for node in self._fetched("assignees")["nodes"]])
 
     def assignees(self) -> List[str]:
+        if self._assignees is None:
+            self._assignees = self._assignees_from_raw()
         return self._assignees
 
     def set_assignees(self, assignees: List[str]):
         self._raw = copy.deepcopy(self._raw)
-        self._raw["assignees"]["nodes"] = [
-            {"login": assignee_login} for assignee_login in assignees
-        ]
+        self._raw["assignees"] = {
+            "nodes": [{"login": assignee_login} for assignee_login in assignees]
+        }
         self._assignees = self._assignees_from_raw()
 
     def requested_reviewers(self) -> List[str]:
         reviewer_logins = set()
-        for node in self._raw["reviewRequests"]["nodes"]:
+        for node in self._nodes("reviewRequests"):
             if (
                 node["requestedReviewer"] is not None
                 and "login" in node["requestedReviewer"]
@@ -62,7 +85,10 @@ class PullRequest(object):
                 node["requestedReviewer"] is not None
                 and "members" in node["requestedReviewer"]
             ):
-                for reviewer in node["requestedReviewer"]["members"].get("nodes", []):
+                team = node["requestedReviewer"]
+                for reviewer in all_nodes(
+                    team["members"], team.get("id"), "Team.members", self._pages
+                ):
                     reviewer_logins.add(reviewer["login"])
         return sorted(reviewer_logins)
 
@@ -90,40 +116,40 @@ class PullRequest(object):
             return Assignee(login=assignee, reason=AssigneeReason.MULTIPLE_ASSIGNEES)
 
     def id(self) -> str:
-        return self._raw["id"]
+        return self._fetched("id")
 
     def number(self) -> int:
-        return self._raw["number"]
+        return self._fetched("number")
 
     def title(self) -> str:
-        return self._raw["title"]
+        return self._fetched("title")
 
     def url(self) -> str:
-        return self._raw["url"]
+        return self._fetched("url")
 
     def repository_id(self) -> str:
-        return self._raw["repository"]["id"]
+        return self._fetched("repository")["id"]
 
     def repository_name(self) -> str:
-        return self._raw["repository"]["name"]
+        return self._fetched("repository")["name"]
 
     def owner_handle(self) -> str:
         return self.owner().login()
 
     def owner(self) -> User:
-        return User(self._raw["owner"])
+        return User(self._fetched("owner"))
 
     def repository_owner_handle(self) -> str:
-        return self._raw["repository"]["owner"]["login"]
+        return self._fetched("repository")["owner"]["login"]
 
     def author(self) -> User:
-        return User(self._raw["author"])
+        return User(self._fetched("author"))
 
     def author_handle(self) -> str:
         return self.author().login()
 
     def body(self) -> str:
-        return self._raw["body"]
+        return self._fetched("body")
 
     def set_body(self, body: str):
         self._raw = copy.deepcopy(self._raw)
@@ -134,13 +160,13 @@ class PullRequest(object):
         self._raw["title"] = copy.deepcopy(title)
 
     def closed(self) -> bool:
-        return self._raw["closed"]
+        return self._fetched("closed")
 
     def merged(self) -> bool:
-        return self._raw["merged"]
+        return self._fetched("merged")
 
     def mergeable(self) -> MergeableState:
-        return MergeableState(self._raw["mergeable"])
+        return MergeableState(self._fetched("mergeable"))
 
     def is_mergeable(self) -> bool:
         return self.mergeable() == MergeableState.MERGEABLE
@@ -176,11 +202,22 @@ class PullRequest(object):
             return None
         return parse_date_string(merged_at)
 
+    def updated_at(self) -> Optional[datetime]:
+        updated_at = self._raw.get("updatedAt", None)
+        if updated_at is None:
+            return None
+        return parse_date_string(updated_at)
+
     def reviews(self) -> List[Review]:
-        return [Review(review) for review in self._raw["reviews"]["nodes"]]
+        # kept, so that each review's comments are only paged through once
+        if self._reviews is None:
+            self._reviews = [
+                Review(review, self._pages) for review in self._nodes("reviews")
+            ]
+        return list(self._reviews)
 
     def comments(self) -> List[IssueComment]:
-        return [IssueComment(comment) for comment in self._raw["comments"]["nodes"]]
+        return [IssueComment(comment) for comment in self._nodes("comments")]
 
     def to_raw(self) -> Dict[str, Any]:
         return copy.deepcopy(self._raw)
@@ -189,7 +226,7 @@ class PullRequest(object):
         return self.commits()[0].status()
 
     def commits(self) -> List[Commit]:
-        return [Commit(commit) for commit in self._raw["commits"]["nodes"]]
+        return [Commit(commit) for commit in self._fetched("commits")["nodes"]]
 
     def labels(self) -> List[Label]:
-        return [Label(label) for label in self._raw["labels"]["nodes"]]
+        return [Label(label) for label in self._fetched("labels")["nodes"]]
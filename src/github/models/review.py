@@ -1,11 +1,13 @@
 from __future__ import annotations
 
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 from enum import Enum, unique
 
 from src.utils import parse_date_string
 from .user import User
+from .pages import PageLoader, all_nodes
+from .partial import fetched
 import copy
 from .pull_request_review_comment import PullRequestReviewComment
 
@@ -22,21 +24,34 @@ class ReviewState(Enum):
 
 
 class Review(object):
-    def __init__(self, raw_review: Dict[str, Any]):
+    def __init__(self, raw_review: Dict[str, Any], pages: Optional[PageLoader] = None):
         self._raw = copy.deepcopy(raw_review)
+        self._pages = pages
+
+    def _fetched(self, field: str) -> Any:
+        return fetched(self._raw, field, "Review")
 
     @classmethod
     def from_comment(cls, comment: PullRequestReviewComment) -> Review:
         return cls(comment.raw_review())
 
     def id(self) -> str:
-        return self._raw["id"]
+        return self._fetched("id")
+
+    def database_id(self) -> Optional[int]:
+        return self._raw.get("databaseId")
 
     def submitted_at(self) -> datetime:
-        return parse_date_string(self._raw["submittedAt"])
+        return parse_date_string(self._fetched("submittedAt"))
+
+    def updated_at(self) -> Optional[datetime]:
+        updated_at = self._raw.get("updatedAt", None)
+        if updated_at is None:
+            return None
+        return parse_date_string(updated_at)
 
     def state(self) -> ReviewState:
-        return ReviewState(self._raw["state"])
+        return ReviewState(self._fetched("state"))
 
     def is_approval_or_changes_requested(self) -> bool:
         return self.state() in (ReviewState.APPROVED, ReviewState.CHANGES_REQUESTED)
@@ -48,16 +63,21 @@ class Review(object):
         return self.state() == ReviewState.CHANGES_REQUESTED
 
     def body(self) -> str:
-        return self._raw["body"]
+        return self._fetched("body")
 
     def comments(self) -> List[PullRequestReviewComment]:
         return [
             PullRequestReviewComment(comment)
-            for comment in self._raw.get("comments", {}).get("nodes", [])
+            for comment in all_nodes(
+                self._fetched("comments"),
+                self._raw.get("id"),
+                "PullRequestReview.comments",
+                self._pages,
+            )
         ]
 
     def author(self) -> User:
-        return User(self._raw["author"])
+        return User(self._fetched("author"))
 
     def author_handle(self) -> str:
         return self.author().login()
@@ -66,7 +86,7 @@ class Review(object):
         return copy.deepcopy(self._raw)
 
     def url(self) -> str:
-        return self._raw["url"]
+        return self._fetched("url")
 
     def is_just_comments(self) -> bool:
         """Return true if this review is not a meaningful state and doesn't contain a body.
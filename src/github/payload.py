@@ -0,0 +1,148 @@
+"""
+Builds models from webhook payloads, so that handlers don't refetch from
+Github's GraphQL API what the webhook already told us.
+
+`pull_request`, `pull_request_review`, `pull_request_review_comment` and
+`issue_comment` payloads contain the pull request's own fields (title, body,
+state, when it was merged, assignees, labels, ...), and issue_comment payloads
+contain the comment itself, except for its author's display name. They don't contain
+the pull request's reviews, comments, review requests or commit statuses, so
+those are still fetched, in a single query that is much smaller than the full
+pull request (see the PullRequestHistory fragment).
+
+If a payload lacks one of the fields we need (e.g. older issue_comment payloads
+don't say whether a closed pull request was merged), the whole pull request is
+fetched instead, exactly as before.
+"""
+from typing import Any, Dict, Optional
+
+from src.dynamodb import client as dynamodb_client
+import src.github.graphql.client as graphql_client
+from src.github.models import Comment, IssueComment, PullRequest, Review
+from src.logger import logger
+import src.metrics as metrics
+
+
+def _user(raw_user: dict) -> Dict[str, Any]:
+    return {"login": raw_user["login"]}
+
+
+def _repository(raw_repository: dict) -> Dict[str, Any]:
+    return {
+        "id": raw_repository["node_id"],
+        "name": raw_repository["name"],
+        "owner": _user(raw_repository["owner"]),
+    }
+
+
+def _common_fields(raw: dict, repository: dict) -> Dict[str, Any]:
+    # The fields that pull requests and the issues of pull requests share
+    return {
+        "id": raw["node_id"],
+        "number": raw["number"],
+        "title": raw["title"],
+        # Github's REST API uses null for empty bodies, its GraphQL API ""
+        "body": raw["body"] or "",
+        "url": raw["html_url"],
+        "author": _user(raw["user"]),
+        "closed": raw["state"] == "closed",
+        "updatedAt": raw["updated_at"],
+        "repository": _repository(repository),
+        "assignees": {"nodes": [_user(user) for user in raw["assignees"]]},
+        "labels": {"nodes": [{"name": label["name"]} for label in raw["labels"]]},
+    }
+
+
+def _fields_from_pull_request(payload: dict) -> Dict[str, Any]:
+    raw = payload["pull_request"]
+    fields = _common_fields(raw, raw["base"]["repo"])
+    # Only pull_request payloads say whether the pull request was merged
+    fields["merged"] = raw.get("merged", raw["merged_at"] is not None)
+    fields["mergedAt"] = raw["merged_at"]
+    return fields
+
+
+def _fields_from_issue(payload: dict) -> Dict[str, Any]:
+    raw = payload["issue"]
+    fields = _common_fields(raw, payload["repository"])
+    merged_at = raw["pull_request"]["merged_at"]
+    fields["merged"] = merged_at is not None
+    fields["mergedAt"] = merged_at
+    return fields
+
+
+def pull_request_fields_from_payload(
+    event_type: str, payload: dict
+) -> Optional[Dict[str, Any]]:
+    """
+    The pull request's fields that `payload` contains, in the shape of the
+    FullPullRequest fragment, or None if it lacks any of them.
+    """
+    try:
+        if event_type in (
+            "pull_request",
+            "pull_request_review",
+            "pull_request_review_comment",
+        ):
+            return _fields_from_pull_request(payload)
+        elif event_type == "issue_comment":
+            return _fields_from_issue(payload)
+    except (KeyError, TypeError) as error:
+        logger.info(f"{event_type} payload is missing pull request field {error}")
+    return None
+
+
+def get_pull_request(event_type: str, payload: dict) -> PullRequest:
+    """
+    Builds the pull request that `payload` is about, fetching only the fields
+    the payload doesn't contain.
+    """
+    fields = pull_request_fields_from_payload(event_type, payload)
+    if fields is None:
+        metrics.increment("PayloadFallback", dimensions={"event": event_type})
+        pull_request_id = (
+            payload["issue"]["node_id"]
+            if event_type == "issue_comment"
+            else payload["pull_request"]["node_id"]
+        )
+        return graphql_client.get_pull_request(pull_request_id)
+
+    history = graphql_client.get_pull_request_history(fields["id"])
+    return PullRequest(
+        {**history, **fields}, graphql_client.ConnectionPages(fields["id"])
+    )
+
+
+def comment_from_payload(payload: dict) -> Comment:
+    """
+    Builds the comment of an issue_comment payload. The payload doesn't include
+    the author's display name, which Asana shows for Github users without an
+    Asana account, so their comments are fetched instead.
+    """
+    raw = payload["comment"]
+    login = raw["user"]["login"]
+    if dynamodb_client.get_asana_domain_user_id_from_github_handle(login) is None:
+        metrics.increment("PayloadFallback", dimensions={"event": "issue_comment"})
+        return graphql_client.get_comment(raw["node_id"])
+    return IssueComment(
+        {
+            "__typename": "IssueComment",
+            "id": raw["node_id"],
+            "author": _user(raw["user"]),
+            "body": raw["body"] or "",
+            "url": raw["html_url"],
+            "publishedAt": raw["created_at"],
+            "updatedAt": raw["updated_at"],
+        }
+    )
+
+
+def get_review(pull_request: PullRequest, review_id: str) -> Review:
+    """
+    Payloads don't include a review's inline comments, so the review is taken
+    from the pull request's already-fetched reviews, or else fetched by itself.
+    """
+    for review in pull_request.reviews():
+        if review.id() == review_id:
+            return review
+    return graphql_client.get_review(review_id)
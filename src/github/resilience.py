@@ -0,0 +1,235 @@
+"""
+Retries, and a circuit breaker per host, for calls to Github.
+
+A transient 502, or a short secondary rate limit, used to fail the whole
+webhook, so that the whole sync was redone. Calls to Github's GraphQL API (see
+src.github.graphql.client) and REST API (see src.github.client) now go through
+`call`, with a classifier for the errors of each API:
+
+  * RETRYABLE errors (server errors, dropped connections, nodes that Github
+    can't resolve yet) are retried with capped exponential backoff and full
+    jitter, or after the Retry-After that Github asked for;
+  * RATE_LIMITED errors are retried after their Retry-After, unless it's
+    unknown or longer than GITHUB_RETRY_AFTER_MAX_SECONDS, since waiting would
+    only waste Lambda time. src.backpressure defers events until then instead;
+  * FATAL errors are raised straight away.
+
+Errors that show that Github itself is failing (server errors and dropped
+connections) count towards the circuit breaker of its host. After
+GITHUB_CIRCUIT_FAILURE_THRESHOLD of them in a row, the circuit opens, and
+calls to the host fail fast with CircuitOpenError for
+GITHUB_CIRCUIT_COOLDOWN_SECONDS. Then a single call is let through: the circuit
+closes if it succeeds, and opens again if Github fails it. Other errors (e.g.
+a node that doesn't exist) leave the circuit as it is.
+"""
+import random
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional, TypeVar
+
+import src.backpressure as backpressure
+from src.config import (
+    GITHUB_CIRCUIT_COOLDOWN_SECONDS,
+    GITHUB_CIRCUIT_FAILURE_THRESHOLD,
+    GITHUB_RETRY_AFTER_MAX_SECONDS,
+)
+from src.logger import logger
+import src.metrics as metrics
+
+T = TypeVar("T")
+
+RETRYABLE = "retryable"
+RATE_LIMITED = "rate_limited"
+FATAL = "fatal"
+
+
+class Failure(NamedTuple):
+    # RETRYABLE, RATE_LIMITED or FATAL
+    kind: str
+    # what went wrong, e.g. "server_error", for logs and metrics
+    reason: str
+    # whether Github itself is failing, which counts towards the circuit breaker
+    degraded: bool = False
+    # how long Github asked us to wait before retrying, if it said
+    retry_after: Optional[float] = None
+
+
+class RetryPolicy(NamedTuple):
+    max_attempts: int
+    base_delay_seconds: float
+    max_delay_seconds: float
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy(
+    max_attempts=4, base_delay_seconds=0.5, max_delay_seconds=4.0
+)
+
+FATAL_FAILURE = Failure(FATAL, "error")
+
+
+class CircuitOpenError(backpressure.DeferredError):
+    """
+    Raised instead of calling a host while its circuit is open. Like other
+    DeferredErrors, its event is retried later by the work queue.
+    """
+
+    pass
+
+
+class CircuitBreaker(object):
+    def __init__(
+        self,
+        host: str,
+        failure_threshold: int = GITHUB_CIRCUIT_FAILURE_THRESHOLD,
+        cooldown_seconds: float = GITHUB_CIRCUIT_COOLDOWN_SECONDS,
+    ):
+        self._host = host
+        self._failure_threshold = failure_threshold
+        self._cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        # whether the single call let through after the cooldown is in flight
+        self._probing = False
+
+    def before_call(self) -> None:
+        """
+        Raises CircuitOpenError if the host must not be called now
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self._probing or time.time() < self._opened_at + self._cooldown_seconds:
+                metrics.increment(
+                    "GithubCircuitRejected", dimensions={"host": self._host}
+                )
+                raise CircuitOpenError(f"The circuit to {self._host} is open")
+            self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            was_open = self._opened_at is not None
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+        if was_open:
+            logger.info(f"The circuit to {self._host} is closed again")
+            metrics.increment("GithubCircuitClosed", dimensions={"host": self._host})
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            opens = self._probing or (
+                self._opened_at is None and self._failures >= self._failure_threshold
+            )
+            self._probing = False
+            if opens:
+                self._opened_at = time.time()
+        if opens:
+            logger.warning(
+                f"{self._failures} calls to {self._host} failed in a row, failing "
+                f"fast for {self._cooldown_seconds:.0f}s"
+            )
+            metrics.increment("GithubCircuitOpened", dimensions={"host": self._host})
+
+    def record_other_failure(self) -> None:
+        """
+        Records a failure that says nothing about whether the host is failing
+        (e.g. a node that doesn't exist). The circuit stays as it is, but if the
+        call was the one let through after the cooldown, another one can be.
+        """
+        with self._lock:
+            self._probing = False
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+
+_breakers_lock = threading.Lock()
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def circuit_breaker(host: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+def reset() -> None:
+    """
+    Forgets the state of every circuit breaker (for tests)
+    """
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def _retry_delay(
+    failure: Failure, attempt: int, policy: RetryPolicy
+) -> Optional[float]:
+    """
+    How long to wait before retrying after `attempt` failed, or None to give up
+    """
+    if failure.kind == FATAL or attempt >= policy.max_attempts:
+        return None
+    if failure.retry_after is not None:
+        if failure.retry_after > GITHUB_RETRY_AFTER_MAX_SECONDS:
+            return None
+        return failure.retry_after
+    if failure.kind == RATE_LIMITED:
+        return None
+    # Full jitter: a random delay between 0 and the capped exponential backoff
+    cap = min(
+        policy.max_delay_seconds, policy.base_delay_seconds * (2 ** (attempt - 1))
+    )
+    return random.uniform(0, cap)
+
+
+def call(
+    host: str,
+    api: str,
+    fn: Callable[[], T],
+    classify: Callable[[Exception], Failure],
+    policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+) -> T:
+    """
+    Calls `fn`, which calls `api` on `host`, retrying the errors that
+    `classify` doesn't find fatal, as long as the circuit to `host` is closed.
+    Raises the last error otherwise.
+    """
+    breaker = circuit_breaker(host)
+    attempt = 1
+    waited_seconds = 0.0
+    while True:
+        breaker.before_call()
+        try:
+            result = fn()
+        except Exception as error:
+            failure = classify(error)
+            if failure.degraded:
+                breaker.record_failure()
+            else:
+                breaker.record_other_failure()
+            dimensions = {"api": api, "reason": failure.reason}
+            delay = _retry_delay(failure, attempt, policy)
+            if delay is None:
+                if attempt > 1:
+                    metrics.increment("GithubRetriesExhausted", dimensions=dimensions)
+                raise
+            logger.info(
+                f"Github {api} call failed ({failure.reason}, attempt {attempt}), "
+                f"retrying in {delay:.2f}s"
+            )
+            metrics.increment("GithubRetries", dimensions=dimensions)
+            time.sleep(delay)
+            waited_seconds += delay
+            attempt += 1
+            continue
+        breaker.record_success()
+        if attempt > 1:
+            metrics.increment("GithubRetriesRecovered", dimensions={"api": api})
+            metrics.timing(
+                "GithubRetryWait", waited_seconds * 1000, dimensions={"api": api}
+            )
+        return result
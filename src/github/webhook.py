@@ -1,21 +1,31 @@
-from typing import Optional
+import asyncio
+import collections
+import traceback
+from enum import Enum, unique
+from typing import List, Optional, Tuple
 from operator import itemgetter
-import time
 
+import src.aio as aio
+import src.backpressure as backpressure
+import src.repositories as repositories
+import src.snapshots as snapshots
 import src.github.graphql.client as graphql_client
+import src.github.payload as github_payload
 from src.dynamodb.lock import dynamodb_lock
+import src.github.checks as github_checks
 import src.github.controller as github_controller
 import src.github.logic as github_logic
 from src.http import HttpResponse
 from src.logger import logger
-from src.github.models import PullRequestReviewComment, Review
+import src.metrics as metrics
+from src.github.models import PullRequest, PullRequestReviewComment, Review
 
 
 # https://developer.github.com/v3/activity/events/types/#pullrequestevent
 def _handle_pull_request_webhook(payload: dict) -> HttpResponse:
     pull_request_id = payload["pull_request"]["node_id"]
     with dynamodb_lock(pull_request_id):
-        pull_request = graphql_client.get_pull_request(pull_request_id)
+        pull_request = github_payload.get_pull_request("pull_request", payload)
         # a label change will trigger this webhook, so it may trigger automerge
         github_logic.maybe_automerge_pull_request(pull_request)
         github_logic.maybe_add_automerge_warning_comment(pull_request)
@@ -31,10 +41,10 @@ def _handle_issue_comment_webhook(payload: dict) -> HttpResponse:
     comment_id = comment["node_id"]
     with dynamodb_lock(issue_id):
         if action in ("created", "edited"):
-            pull_request, comment = graphql_client.get_pull_request_and_comment(
-                issue_id, comment_id
+            pull_request = github_payload.get_pull_request("issue_comment", payload)
+            github_controller.upsert_comment(
+                pull_request, github_payload.comment_from_payload(payload)
             )
-            github_controller.upsert_comment(pull_request, comment)
             return HttpResponse("200")
         elif action == "deleted":
             logger.info(f"Deleting comment {comment_id}")
@@ -52,9 +62,8 @@ def _handle_pull_request_review_webhook(payload: dict) -> HttpResponse:
     review_id = payload["review"]["node_id"]
 
     with dynamodb_lock(pull_request_id):
-        pull_request, review = graphql_client.get_pull_request_and_review(
-            pull_request_id, review_id
-        )
+        pull_request = github_payload.get_pull_request("pull_request_review", payload)
+        review = github_payload.get_review(pull_request, review_id)
         github_logic.maybe_automerge_pull_request(pull_request)
         github_controller.upsert_review(pull_request, review)
     return HttpResponse("200")
@@ -120,26 +129,72 @@ def _handle_pull_request_review_comment(payload: dict):
 
 # https://developer.github.com/v3/activity/events/types/#statusevent
 def _handle_status_webhook(payload: dict) -> HttpResponse:
+    github_checks.record_status(payload)
     commit_id = payload["commit"]["node_id"]
-    pull_request = graphql_client.get_pull_request_for_commit(commit_id)
-    if pull_request is None:
+    # Statuses of unmapped repositories were already dropped (see
+    # is_for_unmapped_repository), and a commit's pull requests are in its
+    # repository
+    pull_requests = graphql_client.get_pull_requests_for_commit(commit_id)
+    if not pull_requests:
         # This could happen for commits that get pushed outside of the normal
         # pull request flow. These should just be silently ignored.
-        logger.warn(f"No pull request found for commit id {commit_id}")
+        logger.info(f"No open pull request to sync found for commit id {commit_id}")
         return HttpResponse("200")
 
+    aio.run(_update_build_statuses(pull_requests))
+    return HttpResponse("200")
+
+
+async def _update_build_statuses(pull_requests: List[PullRequest]):
+    await asyncio.gather(
+        *(
+            aio.call(_update_build_status, pull_request)
+            for pull_request in pull_requests
+        )
+    )
+
+
+def _update_build_status(pull_request: PullRequest):
+    # A status only changes the build status, so rather than syncing the whole
+    # pull request, which would need all of its fields, only the Build field of
+    # its task is updated.
     with dynamodb_lock(pull_request.id()):
         github_logic.maybe_automerge_pull_request(pull_request)
-        github_controller.upsert_pull_request(pull_request)
+        build_status = pull_request.build_status()
+        if build_status is not None:
+            github_controller.update_build_status(
+                pull_request.id(), pull_request.repository_id(), build_status
+            )
+
+
+def _handle_check_webhook(event_type: str, payload: dict) -> HttpResponse:
+    check = payload[event_type]
+    logger.info(
+        f"Received {event_type} webhook: {payload.get('action')} {check.get('name', '')} "
+        f"{check['status']}/{check['conclusion']} for {check['head_sha'][:7]}"
+    )
+    changed = github_checks.record_event(event_type, payload)
+    if changed is None:
         return HttpResponse("200")
 
-def _handle_check_suite_webhook(payload: dict) -> HttpResponse:
-    logger.info(f"Received check_suite webhook: {payload}")
+    pull_request_ids, build_status = changed
+    repository_id = payload["repository"]["node_id"]
+    for pull_request_id in pull_request_ids:
+        with dynamodb_lock(pull_request_id):
+            github_controller.update_build_status(
+                pull_request_id, repository_id, build_status
+            )
     return HttpResponse("200")
 
+
+# https://docs.github.com/en/developers/webhooks-and-events/webhook-events-and-payloads#check_suite
+def _handle_check_suite_webhook(payload: dict) -> HttpResponse:
+    return _handle_check_webhook("check_suite", payload)
+
+
+# https://docs.github.com/en/developers/webhooks-and-events/webhook-events-and-payloads#check_run
 def _handle_check_run_webhook(payload: dict) -> HttpResponse:
-    logger.info(f"Received check_run webhook: {payload}")
-    return HttpResponse("200")
+    return _handle_check_webhook("check_run", payload)
 
 
 _events_map = {
@@ -153,18 +208,378 @@ _events_map = {
 }
 
 
+# ----------------------------------------------------------------------------------
+# Coalesced handling
+#
+# When several events for the same pull request arrive close together (e.g. a
+# push triggers "synchronize" and several status events, or a review is
+# submitted with many inline comments), syncing the pull request once per event
+# is wasted work. Instead, each comment and review is still upserted
+# individually, but the pull request is fetched and its task updated only once.
+# ----------------------------------------------------------------------------------
+
+
+def _upsert_issue_comment(pull_request: PullRequest, payload: dict):
+    action = payload["action"]
+    comment_id = payload["comment"]["node_id"]
+    if action in ("created", "edited"):
+        comment = graphql_client.get_comment(comment_id)
+        github_controller.upsert_comment(pull_request, comment, update_task=False)
+    elif action == "deleted":
+        logger.info(f"Deleting comment {comment_id}")
+        github_controller.delete_comment(comment_id)
+    else:
+        logger.info(f"Unknown action for issue_comment: {action}")
+
+
+def _upsert_pull_request_review(pull_request: PullRequest, payload: dict):
+    review = graphql_client.get_review(payload["review"]["node_id"])
+    github_controller.upsert_review(pull_request, review, update_task=False)
+
+
+def _upsert_pull_request_review_comment(pull_request: PullRequest, payload: dict):
+    action = payload["action"]
+    comment_id = payload["comment"]["node_id"]
+    review: Optional[Review] = None
+    if action in ("created", "edited"):
+        comment = graphql_client.get_comment(comment_id)
+        if isinstance(comment, PullRequestReviewComment):
+            review = Review.from_comment(comment)
+    elif action == "deleted":
+        review = graphql_client.get_review_for_database_id(
+            pull_request.id(), payload["comment"]["pull_request_review_id"]
+        )
+        if review is None:
+            logger.info("No review found in Github. Deleting the Asana comment.")
+            github_controller.delete_comment(comment_id)
+    if review is not None:
+        github_controller.upsert_review(pull_request, review, update_task=False)
+
+
+_coalesced_upserts_map = {
+    "issue_comment": _upsert_issue_comment,
+    "pull_request_review": _upsert_pull_request_review,
+    "pull_request_review_comment": _upsert_pull_request_review_comment,
+}
+
+
+_pull_request_events = ("pull_request",) + tuple(_coalesced_upserts_map.keys())
+
+
+def is_coalescable_event(event_type: str) -> bool:
+    return event_type == "status" or event_type in _pull_request_events
+
+
+def _syncs_the_pull_request(events: List[Tuple[str, dict]]) -> bool:
+    # See handle_coalesced_github_webhooks
+    return len(events) > 1 and any(event_type != "status" for event_type, _ in events)
+
+
+# Events that change the body of a comment or review, which the version of a
+# pull request snapshot doesn't cover (see src.snapshots)
+_SNAPSHOT_INVALIDATING_ACTIONS = {
+    "issue_comment": frozenset(("edited", "deleted")),
+    "pull_request_review": frozenset(("edited", "dismissed")),
+    "pull_request_review_comment": frozenset(("edited", "deleted")),
+}
+
+
+def _invalidate_snapshots(events: List[Tuple[str, dict]]) -> None:
+    for event_type, payload in events:
+        if payload.get("action") in _SNAPSHOT_INVALIDATING_ACTIONS.get(event_type, ()):
+            snapshots.invalidate(ordering_key(event_type, payload))
+
+
+def prefetch_pull_requests(jobs: List[List[Tuple[str, dict]]]) -> None:
+    """
+    Fetches the pull requests that `jobs` (lists of events, each handled with
+    handle_coalesced_github_webhooks) will sync together, rather than one query
+    per pull request. Best effort: if this fails, each job fetches its own.
+    """
+    pull_request_ids = list(
+        dict.fromkeys(
+            ordering_key(*events[0])
+            for events in jobs
+            if _syncs_the_pull_request(events)
+        )
+    )
+    if len(pull_request_ids) < 2 or backpressure.throttled_services():
+        # Nothing to save, or most of the jobs will be shed (see
+        # _shed_if_throttled)
+        return
+    try:
+        graphql_client.prefetch_pull_requests(pull_request_ids)
+    except Exception:
+        logger.warning(
+            f"Could not prefetch pull requests {pull_request_ids}:\n"
+            + traceback.format_exc()
+        )
+
+
+def handle_coalesced_github_webhooks(events: List[Tuple[str, dict]]) -> HttpResponse:
+    """
+    Handles several coalescable events that share an ordering key, in the order
+    given, as a single pull request sync.
+    """
+    if len(events) == 1:
+        event_type, payload = events[0]
+        return handle_github_webhook(event_type, payload)
+
+    _shed_if_throttled(events)
+    _invalidate_snapshots(events)
+
+    logger.info(f"Coalescing {len(events)} events: {[e for e, _ in events]}")
+    metrics.increment("CoalescedEvents", len(events) - 1)
+
+    statuses = [payload for event_type, payload in events if event_type == "status"]
+    if len(statuses) == len(events):
+        # Status events for the same commit all result in the same sync, but
+        # each of them may be for a different context
+        for payload in statuses[:-1]:
+            github_checks.record_status(payload)
+        return _events_map["status"](statuses[-1])
+    for payload in statuses:
+        github_checks.record_status(payload)
+
+    pull_request_id = ordering_key(*events[0])
+    with dynamodb_lock(pull_request_id):
+        pull_request = graphql_client.get_pull_request(pull_request_id)
+        for event_type, payload in events:
+            if event_type in _coalesced_upserts_map:
+                _coalesced_upserts_map[event_type](pull_request, payload)
+
+        github_logic.maybe_automerge_pull_request(pull_request)
+        if any(event_type == "pull_request" for event_type, _ in events):
+            github_logic.maybe_add_automerge_warning_comment(pull_request)
+        github_controller.upsert_pull_request(pull_request)
+        return HttpResponse("200")
+
+
+# ----------------------------------------------------------------------------------
+# Relevance rules
+#
+# Many events can't change anything SGTM syncs: the task's fields and followers,
+# automerge, or comments. Each rule below matches an event type, a set of
+# actions (None for any action) and a predicate on the raw payload; events that
+# match a rule are dropped before any lock is taken or query is made.
+# ----------------------------------------------------------------------------------
+
+_SkipRule = collections.namedtuple("_SkipRule", "event_type actions applies reason")
+
+
+def _always(payload: dict) -> bool:
+    return True
+
+
+def _pull_request_is_closed(payload: dict) -> bool:
+    return payload["pull_request"].get("state") == "closed"
+
+
+def _pull_request_is_closed_without_merging(payload: dict) -> bool:
+    pull_request = payload["pull_request"]
+    merged = pull_request.get("merged", pull_request.get("merged_at") is not None)
+    return _pull_request_is_closed(payload) and not merged
+
+
+def _issue_is_not_a_pull_request(payload: dict) -> bool:
+    # Github sends comments on plain issues through the same event
+    return "pull_request" not in payload["issue"]
+
+
+_skip_rules = [
+    _SkipRule(
+        "pull_request",
+        frozenset(("locked", "unlocked", "milestoned", "demilestoned")),
+        _always,
+        "the action doesn't affect the task",
+    ),
+    _SkipRule(
+        "pull_request",
+        frozenset(
+            ("auto_merge_enabled", "auto_merge_disabled", "enqueued", "dequeued")
+        ),
+        _always,
+        "Github's own merge features don't affect the task or SGTM's automerge",
+    ),
+    _SkipRule(
+        "pull_request",
+        frozenset(("review_request_removed",)),
+        _pull_request_is_closed,
+        "followers are only ever added",
+    ),
+    _SkipRule(
+        "pull_request",
+        frozenset(("labeled", "unlabeled")),
+        _pull_request_is_closed_without_merging,
+        "labels only matter for automerging open pull requests, and for completing "
+        "the tasks of merged ones",
+    ),
+    _SkipRule(
+        "check_suite",
+        frozenset(("requested", "rerequested")),
+        _always,
+        "only completed check suites change the Build field",
+    ),
+    _SkipRule(
+        "issue_comment",
+        None,
+        _issue_is_not_a_pull_request,
+        "the comment is on an issue, not a pull request",
+    ),
+]
+
+
+def skip_reason(event_type: str, payload: dict) -> Optional[str]:
+    """
+    Returns why the event can't affect anything SGTM syncs, or None if it
+    should be handled. Only looks at the raw payload.
+    """
+    action = payload.get("action")
+    for rule in _skip_rules:
+        if (
+            rule.event_type == event_type
+            and (rule.actions is None or action in rule.actions)
+            and rule.applies(payload)
+        ):
+            return rule.reason
+    return None
+
+
+def should_skip_event(event_type: str, payload: dict) -> bool:
+    """
+    Like skip_reason, but logs and counts skipped events, per event type and action.
+    """
+    reason = skip_reason(event_type, payload)
+    if reason is None:
+        return False
+    action = payload.get("action") or "none"
+    logger.info(f"Skipping {event_type} event with action {action}: {reason}")
+    metrics.increment(
+        "SkippedEvents", dimensions={"event": event_type, "action": action}
+    )
+    return True
+
+
+def is_for_unmapped_repository(event_type: str, payload: dict) -> bool:
+    """
+    Returns True if the event is for a repository that isn't mapped to an Asana
+    project, logging and counting it like a skipped event.
+    """
+    repository_id = (payload.get("repository") or {}).get("node_id")
+    if repository_id is None or repositories.is_mapped(repository_id):
+        return False
+    action = payload.get("action") or "none"
+    logger.info(
+        f"Skipping {event_type} event with action {action}: repository "
+        f"{repository_id} has no Asana project"
+    )
+    metrics.increment("UnmappedRepositoryEvents", dimensions={"event": event_type})
+    return True
+
+
+# ----------------------------------------------------------------------------------
+# Priority lanes
+#
+# Merges, approvals and new pull requests are what people are waiting on, while
+# edits and deletions of comments only touch a single Asana comment. src.worker
+# gives each lane its own concurrency and rate budget, so that during an incident
+# low-value work can't use up the Github and Asana rate limits.
+# ----------------------------------------------------------------------------------
+
+
+@unique
+class Lane(Enum):
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
+
+
+# From highest to lowest priority
+LANES = (Lane.HIGH, Lane.NORMAL, Lane.LOW)
+
+_LaneRule = collections.namedtuple("_LaneRule", "event_type actions lane")
+
+_lane_rules = [
+    _LaneRule(
+        "pull_request",
+        frozenset(("opened", "closed", "reopened", "ready_for_review")),
+        Lane.HIGH,
+    ),
+    _LaneRule("pull_request_review", frozenset(("submitted", "dismissed")), Lane.HIGH),
+    _LaneRule("pull_request_review", frozenset(("edited",)), Lane.LOW),
+    _LaneRule("issue_comment", frozenset(("edited", "deleted")), Lane.LOW),
+    _LaneRule(
+        "pull_request_review_comment", frozenset(("edited", "deleted")), Lane.LOW
+    ),
+]
+
+
+def priority_lane(event_type: str, payload: dict) -> Lane:
+    """
+    The lane the event should be processed in; NORMAL unless a rule says otherwise
+    """
+    action = payload.get("action")
+    for rule in _lane_rules:
+        if rule.event_type == event_type and action in rule.actions:
+            return rule.lane
+    return Lane.NORMAL
+
+
+def _shed_if_throttled(events: List[Tuple[str, dict]]) -> None:
+    """
+    Raises backpressure.DeferredError if Asana or Github is throttling us and
+    none of `events` is in the high priority lane, so that they are retried
+    once the service has recovered instead of adding to the storm.
+    """
+    if any(priority_lane(*event) == Lane.HIGH for event in events):
+        return
+    throttled = backpressure.throttled_services()
+    if not throttled:
+        return
+    for event_type, payload in events:
+        metrics.increment(
+            "ShedEvents", dimensions={"event": event_type, "service": throttled[0]}
+        )
+    raise backpressure.DeferredError(
+        f"Deferred while {' and '.join(throttled)} is throttling"
+    )
+
+
+def is_supported_event(event_type: str) -> bool:
+    return event_type in _events_map
+
+
+def ordering_key(event_type: str, payload: dict) -> str:
+    """
+    The key that deliveries must be serialized on: events with the same key
+    touch the same Asana task, so they must be processed in order.
+    This is the pull request's node id where the payload contains it.
+    """
+    if "pull_request" in payload:
+        return payload["pull_request"]["node_id"]
+    elif "issue" in payload:
+        return payload["issue"]["node_id"]
+    elif event_type == "status":
+        return payload["commit"]["node_id"]
+    elif event_type in ("check_suite", "check_run"):
+        return payload[event_type]["head_sha"]
+    return event_type
+
+
 def handle_github_webhook(event_type, payload) -> HttpResponse:
     if event_type not in _events_map:
         logger.info(f"No handler for event type {event_type}")
         return HttpResponse("501", f"No handler for event type {event_type}")
 
+    if should_skip_event(event_type, payload) or is_for_unmapped_repository(
+        event_type, payload
+    ):
+        return HttpResponse("200")
+
+    _shed_if_throttled([(event_type, payload)])
+    _invalidate_snapshots([(event_type, payload)])
+
     logger.info(f"Received event type {event_type}!")
-    # TEMPORARY: sleep for 2 seconds before handling any webhook. We're running
-    # into an issue where the Github Webhook sends us a node_id, but when we
-    # immediately query that id using the GraphQL API, we get back an error
-    # "Could not resolve to a node with the global id of '<node_id>'". This is
-    # an attempt to mitigate this issue temporarily by waiting a second to see
-    # if Github's data consistency needs a bit of time (does not have
-    # read-after-write consistency)
-    time.sleep(2)
+    # Github's GraphQL API may not be able to resolve node ids from the webhook
+    # immediately; graphql_client retries those queries with backoff.
     return _events_map[event_type](payload)
@@ -2,12 +2,19 @@ import hashlib
 import hmac
 import json
 import traceback
+import uuid
 
-from typing import Dict
+from typing import Callable, Dict, Optional
 from src.http import HttpResponse, HttpResponseDict
 from src.config import GITHUB_HMAC_SECRET
 from src.logger import logger
+import src.backpressure as backpressure
+import src.dead_letters as dead_letters
+import src.deliveries as delivery_dedup
 import src.github.webhook as github_webhook
+import src.recorder as recorder
+import src.work_queue.client as work_queue
+from src.work_queue.client import WebhookDelivery
 
 
 def handler(event: dict, context: dict) -> HttpResponseDict:
@@ -19,35 +26,103 @@ def handler(event: dict, context: dict) -> HttpResponseDict:
             ),
         ).to_dict()
 
-    event_type = event["headers"].get("X-GitHub-Event")
-    signature = event["headers"].get("X-Hub-Signature")
-    delivery_id = event["headers"].get("X-GitHub-Delivery")
+    return handle_webhook(event["headers"], event["body"]).to_dict()
+
+
+def handle_webhook(
+    headers: Dict[str, str],
+    body: str,
+    dispatch: Optional[Callable[[WebhookDelivery], HttpResponse]] = None,
+) -> HttpResponse:
+    """
+    Verifies a webhook delivery and hands it to `dispatch`, which is
+    responsible for recording its outcome. By default, deliveries are enqueued
+    on the work queue if there is one, and processed synchronously otherwise.
+    """
+    event_type = headers.get("X-GitHub-Event")
+    signature = headers.get("X-Hub-Signature")
+    delivery_id = headers.get("X-GitHub-Delivery")
     logger.info(f"Webhook delivery id: {delivery_id}")
 
     if GITHUB_HMAC_SECRET is None:
-        return HttpResponse("400", "GITHUB_HMAC_SECRET").to_dict()
+        return HttpResponse("400", "GITHUB_HMAC_SECRET")
     secret: str = GITHUB_HMAC_SECRET
 
     generated_signature = (
         "sha1="
         + hmac.new(
-            bytes(secret, "utf-8"),
-            msg=bytes(event["body"], "utf-8"),
-            digestmod=hashlib.sha1,
+            bytes(secret, "utf-8"), msg=bytes(body, "utf-8"), digestmod=hashlib.sha1,
         ).hexdigest()
     )
-    if not hmac.compare_digest(generated_signature, signature):
-        return HttpResponse("501").to_dict()
+    if not hmac.compare_digest(generated_signature, signature or ""):
+        return HttpResponse("501")
 
     if not event_type:
-        return HttpResponse(
-            "400", "Expected a X-GitHub-Event header, but none found"
-        ).to_dict()
+        return HttpResponse("400", "Expected a X-GitHub-Event header, but none found")
+
+    if not github_webhook.is_supported_event(event_type):
+        logger.info(f"No handler for event type {event_type}")
+        return HttpResponse("501", f"No handler for event type {event_type}")
+
+    recorder.record(delivery_id, event_type, body)
+    github_event = json.loads(body)
+    # Irrelevant events are dropped before anything is claimed, queued or fetched
+    if github_webhook.should_skip_event(event_type, github_event):
+        return HttpResponse("200", "Skipped irrelevant event")
+    if github_webhook.is_for_unmapped_repository(event_type, github_event):
+        return HttpResponse("200", "Skipped event for an unmapped repository")
+
+    if delivery_id is not None and not delivery_dedup.claim_delivery(delivery_id):
+        return HttpResponse("200", f"Delivery {delivery_id} was already processed")
+
+    delivery = WebhookDelivery(
+        delivery_id or str(uuid.uuid4()),
+        event_type,
+        body,
+        github_webhook.ordering_key(event_type, github_event),
+    )
+    if dispatch is None:
+        dispatch = _enqueue_delivery if work_queue.is_enabled() else _process_delivery
+    return dispatch(delivery)
+
+
+def _process_delivery(delivery: WebhookDelivery) -> HttpResponse:
+    try:
+        http_response = github_webhook.handle_github_webhook(
+            delivery.event_type, delivery.payload()
+        )
+    except backpressure.DeferredError as error:
+        # Shed rather than failed: a 5xx outcome leaves the delivery claimable
+        # by Github's redelivery, and there is nothing to dead-letter
+        logger.info(f"Deferred delivery {delivery.delivery_id}: {error}")
+        delivery_dedup.record_delivery_outcome(
+            delivery.delivery_id, "503", delivery.received_at
+        )
+        return HttpResponse("503", str(error))
+    except Exception as error:
+        logger.error(traceback.format_exc())
+        http_response = HttpResponse("500", str(error))
+    delivery_dedup.record_delivery_outcome(
+        delivery.delivery_id, http_response.status_code, delivery.received_at
+    )
+    if http_response.status_code.startswith("5"):
+        dead_letters.record_dead_letter(delivery, "handler", http_response.body or "")
+    return http_response
+
 
-    github_event = json.loads(event["body"])
+def _enqueue_delivery(delivery: WebhookDelivery) -> HttpResponse:
+    """
+    Persist the verified delivery to the work queue and acknowledge it right
+    away; src.worker does the actual sync. Github times out deliveries after
+    10 seconds, so we want to respond well within that.
+    """
     try:
-        http_response = github_webhook.handle_github_webhook(event_type, github_event)
-        return http_response.to_dict()
+        work_queue.enqueue(delivery)
+        return HttpResponse("200")
     except Exception as error:
         logger.error(traceback.format_exc())
-        return HttpResponse("500", str(error)).to_dict()
+        delivery_dedup.record_delivery_outcome(
+            delivery.delivery_id, "500", delivery.received_at
+        )
+        dead_letters.record_dead_letter(delivery, "enqueue", str(error))
+        return HttpResponse("500", str(error))
@@ -1,7 +1,7 @@
 from typing import Optional  # Python 3.8 or higher: Literal, TypedDict
 from typing_extensions import Literal, TypedDict
 
-HTTP_STATUS = Literal["200", "400", "401", "500", "501"]
+HTTP_STATUS = Literal["200", "400", "401", "500", "501", "503"]
 
 
 class HttpResponseDict(TypedDict):
@@ -0,0 +1,121 @@
+"""
+Concurrency and rate budgets for the priority lanes that src.worker processes
+deliveries in (see github_webhook.priority_lane).
+
+Each lane has a concurrency budget (how many of its delivery groups may be
+processed at once) and an optional rate budget (a token bucket of deliveries
+per second). When a high or normal lane is over its rate budget, its
+deliveries wait for a token; low lane deliveries are deferred instead.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from src.config import (
+    HIGH_LANE_MAX_CONCURRENCY,
+    HIGH_LANE_RATE_PER_SECOND,
+    LOW_LANE_MAX_CONCURRENCY,
+    LOW_LANE_RATE_PER_SECOND,
+    NORMAL_LANE_MAX_CONCURRENCY,
+    NORMAL_LANE_RATE_PER_SECOND,
+)
+from src.github.webhook import Lane
+import src.metrics as metrics
+
+
+class TokenBucket(object):
+    def __init__(self, rate_per_second: float, burst: Optional[float] = None):
+        self._rate = rate_per_second
+        self._burst = burst if burst is not None else max(1.0, rate_per_second)
+        self._tokens = self._burst
+        self._updated_at = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._updated_at) * self._rate
+        )
+        self._updated_at = now
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            self._refill(time.time())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                self._refill(time.time())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+class LaneBudget(object):
+    def __init__(
+        self,
+        lane: Lane,
+        max_concurrency: int,
+        rate_per_second: float = 0,
+        can_defer: bool = False,
+    ):
+        self.lane = lane
+        self.can_defer = can_defer
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._bucket = TokenBucket(rate_per_second) if rate_per_second > 0 else None
+        self._lock = threading.Lock()
+        self._depth = 0
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """
+        Holds one of the lane's concurrency slots, waiting for one if necessary
+        """
+        with self._slots:
+            yield
+
+    def admit(self) -> bool:
+        """
+        Takes one delivery from the lane's rate budget. Returns False if the
+        lane is over budget and its deliveries should be deferred.
+        """
+        if self._bucket is None:
+            return True
+        if self._bucket.try_acquire():
+            return True
+        if self.can_defer:
+            return False
+        self._bucket.acquire()
+        return True
+
+    def queued(self, count: int) -> None:
+        """
+        Tracks the number of the lane's deliveries waiting to be processed
+        """
+        with self._lock:
+            self._depth = max(0, self._depth + count)
+            depth = self._depth
+        metrics.gauge("LaneQueueDepth", depth, dimensions={"lane": self.lane.value})
+
+
+_budgets: Dict[Lane, LaneBudget] = {
+    Lane.HIGH: LaneBudget(
+        Lane.HIGH, HIGH_LANE_MAX_CONCURRENCY, HIGH_LANE_RATE_PER_SECOND
+    ),
+    Lane.NORMAL: LaneBudget(
+        Lane.NORMAL, NORMAL_LANE_MAX_CONCURRENCY, NORMAL_LANE_RATE_PER_SECOND
+    ),
+    Lane.LOW: LaneBudget(
+        Lane.LOW, LOW_LANE_MAX_CONCURRENCY, LOW_LANE_RATE_PER_SECOND, can_defer=True
+    ),
+}
+
+
+def budget(lane: Lane) -> LaneBudget:
+    return _budgets[lane]
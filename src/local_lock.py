@@ -0,0 +1,60 @@
+"""
+A named lock shared by every thread and process on this machine, for
+single-node deployments (see src.server), where it replaces the DynamoDB lock.
+
+Each lock name maps to a lock file in LOCAL_LOCK_DIR, which is locked with
+flock(2). flock locks belong to an open file description, so two threads that
+open the same file conflict just like two processes do.
+"""
+import fcntl
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Iterator, Optional
+
+from src.config import LOCAL_LOCK_DIR
+
+_POLL_INTERVAL_SECONDS = 0.05
+
+
+class LockTimeoutError(Exception):
+    pass
+
+
+def _lock_file_path(lock_name: str) -> str:
+    # Lock names are Github node ids, but hash them so any name is a valid file name
+    digest = hashlib.sha1(lock_name.encode("utf-8")).hexdigest()
+    return os.path.join(LOCAL_LOCK_DIR, f"{digest}.lock")
+
+
+@contextmanager
+def local_lock(
+    lock_name: str, retry_timeout: Optional[timedelta] = timedelta(seconds=20)
+) -> Iterator[None]:
+    """
+    Holds the lock named `lock_name` for the duration of the block. Raises
+    LockTimeoutError if it can't be acquired within `retry_timeout` (or waits
+    indefinitely if that is None).
+    """
+    os.makedirs(LOCAL_LOCK_DIR, exist_ok=True)
+    with open(_lock_file_path(lock_name), "a") as lock_file:
+        if retry_timeout is None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            deadline = time.time() + retry_timeout.total_seconds()
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.time() >= deadline:
+                        raise LockTimeoutError(
+                            f"Could not acquire lock {lock_name} within {retry_timeout}"
+                        )
+                    time.sleep(_POLL_INTERVAL_SECONDS)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
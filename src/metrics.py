@@ -0,0 +1,120 @@
+"""
+Lightweight process metrics.
+
+Counters and timings are always aggregated in-process (see `snapshot`), so
+they can be inspected by tests and long-lived entry points. When running
+inside AWS Lambda, each data point is additionally printed to stdout in the
+CloudWatch Embedded Metric Format, which CloudWatch turns into real metrics
+without any extra API calls.
+See https://docs.aws.amazon.com/AmazonCloudWatch/latest/monitoring/CloudWatch_Embedded_Metric_Format_Specification.html
+"""
+import collections
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+NAMESPACE = "SGTM"
+
+# Only the most recent timings are kept in-process, so long-lived processes stay bounded
+_MAX_TIMINGS_PER_METRIC = 1000
+
+_EMIT_EMBEDDED_METRICS = "AWS_LAMBDA_FUNCTION_NAME" in os.environ
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_timings: Dict[str, collections.deque] = {}
+
+
+def _key(name: str, dimensions: Optional[Dict[str, str]]) -> str:
+    if not dimensions:
+        return name
+    dims = ",".join(f"{k}={v}" for k, v in sorted(dimensions.items()))
+    return f"{name}[{dims}]"
+
+
+def _emit(
+    name: str, value: float, unit: str, dimensions: Optional[Dict[str, str]]
+) -> None:
+    if not _EMIT_EMBEDDED_METRICS:
+        return
+    dimensions = dimensions or {}
+    print(
+        json.dumps(
+            {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [
+                        {
+                            "Namespace": NAMESPACE,
+                            "Dimensions": [sorted(dimensions.keys())],
+                            "Metrics": [{"Name": name, "Unit": unit}],
+                        }
+                    ],
+                },
+                name: value,
+                **dimensions,
+            }
+        ),
+        flush=True,
+    )
+
+
+def increment(
+    name: str, value: float = 1, dimensions: Optional[Dict[str, str]] = None
+) -> None:
+    """
+    Increments the counter `name` (optionally split by `dimensions`) by `value`
+    """
+    key = _key(name, dimensions)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _emit(name, value, "Count", dimensions)
+
+
+def timing(
+    name: str, milliseconds: float, dimensions: Optional[Dict[str, str]] = None
+) -> None:
+    """
+    Records a single duration, in milliseconds, for the timer `name`
+    """
+    key = _key(name, dimensions)
+    with _lock:
+        _timings.setdefault(
+            key, collections.deque(maxlen=_MAX_TIMINGS_PER_METRIC)
+        ).append(milliseconds)
+    _emit(name, milliseconds, "Milliseconds", dimensions)
+
+
+def gauge(name: str, value: float, dimensions: Optional[Dict[str, str]] = None):
+    """
+    Records the current value of `name`. In-process, only the latest value is kept.
+    """
+    key = _key(name, dimensions)
+    with _lock:
+        _counters[key] = value
+    _emit(name, value, "None", dimensions)
+
+
+def counter_value(name: str, dimensions: Optional[Dict[str, str]] = None) -> float:
+    with _lock:
+        return _counters.get(_key(name, dimensions), 0)
+
+
+def snapshot() -> Dict[str, dict]:
+    """
+    Returns a copy of all in-process counters and timings, keyed by metric name
+    (with dimensions appended, e.g. "SkippedEvents[action=locked,event=pull_request]")
+    """
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "timings": {k: list(v) for k, v in _timings.items()},
+        }
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _timings.clear()
@@ -0,0 +1,59 @@
+"""
+Records verified webhook deliveries, so that real traffic can be replayed
+against local fakes of Github, Asana and DynamoDb to measure changes
+(see scripts/replay_recording.py).
+
+When RECORD_DELIVERIES_PATH is set, the handler appends each verified delivery
+(its id, event type, payload and arrival time) to that file as one line of
+JSON. Every line is written as its own gzip member, so the file can be appended
+to by several processes and still be read as a single gzip stream.
+
+Recording is best effort: it must never cause a delivery to fail.
+"""
+import gzip
+import json
+import threading
+import time
+import traceback
+from typing import Any, Dict, Iterator, Optional
+
+from src.config import RECORD_DELIVERIES_PATH
+from src.logger import logger
+
+_lock = threading.Lock()
+
+
+def record(
+    delivery_id: Optional[str],
+    event_type: str,
+    body: str,
+    received_at: Optional[float] = None,
+    path: Optional[str] = RECORD_DELIVERIES_PATH,
+) -> None:
+    if path is None:
+        return
+    try:
+        line = json.dumps(
+            {
+                "delivery_id": delivery_id,
+                "event_type": event_type,
+                "received_at": received_at if received_at is not None else time.time(),
+                "payload": json.loads(body),
+            }
+        )
+        with _lock, gzip.open(path, "at", encoding="utf-8") as recording:
+            recording.write(line + "\n")
+    except Exception:
+        logger.warning(
+            f"Could not record delivery {delivery_id}:\n" + traceback.format_exc()
+        )
+
+
+def read_recording(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    The deliveries recorded in `path`, in the order they were recorded
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as recording:
+        for line in recording:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,49 @@
+"""
+Which repositories are mapped to an Asana project.
+
+SGTM is usually installed as an organization-wide webhook, so most deliveries
+are for repositories that have no project in the OBJECTS_TABLE. Without a
+project, no task can be created, but we used to only find that out after taking
+the lock, fetching the pull request and evaluating automerge.
+
+Whether each repository is mapped is kept in memory and refreshed from DynamoDb
+every MAPPED_REPOSITORIES_REFRESH_SECONDS, so that events for unmapped
+repositories can be dropped before any of that, at the cost of a dictionary
+lookup. A repository that was just mapped is synced after the next refresh.
+
+If DynamoDb is unavailable, repositories are assumed to be mapped: dropping an
+event must never be the result of an outage.
+"""
+import traceback
+
+from src.dynamodb import client as dynamodb_client
+from src.logger import logger
+from src.utils import LruCache
+
+MAPPED_REPOSITORIES_REFRESH_SECONDS = 5 * 60
+
+# repository node id -> whether it is mapped to an Asana project
+_mapped_repositories = LruCache(
+    max_size=10000, ttl_seconds=MAPPED_REPOSITORIES_REFRESH_SECONDS
+)
+
+
+def is_mapped(repository_id: str) -> bool:
+    """
+    Returns True unless `repository_id` is known not to be mapped to an Asana project
+    """
+    mapped = _mapped_repositories.get(repository_id)
+    if mapped is not None:
+        return mapped
+    try:
+        mapped = (
+            dynamodb_client.get_asana_id_from_github_node_id(repository_id) is not None
+        )
+    except Exception:
+        logger.warning(
+            f"Could not look up the project of repository {repository_id}:\n"
+            + traceback.format_exc()
+        )
+        return True
+    _mapped_repositories.set(repository_id, mapped)
+    return mapped
@@ -0,0 +1,68 @@
+"""
+The node ids of synced reviews, by their numeric databaseId.
+
+pull_request_review_comment payloads only identify the review of a comment by
+its databaseId. Once the comment is deleted, it can't be queried for its
+review, so the review used to be found by paging through every review of the
+pull request (see src.github.graphql.client.get_review_for_database_id).
+
+The ids of each synced review are recorded in the REVIEW_IDS_TABLE, so that the
+review can then be fetched by its node id. Paging through the reviews remains
+the fallback for reviews synced before they were recorded, and for when
+DynamoDb is unavailable.
+"""
+import traceback
+from typing import Optional, Union
+
+from src.dynamodb import client as dynamodb_client
+from src.github.models import Review
+from src.logger import logger
+from src.utils import LruCache
+import src.metrics as metrics
+
+# review databaseId -> node id. Ids never change, so entries don't expire.
+_node_ids = LruCache(max_size=10000)
+
+
+def record(review: Review) -> None:
+    """
+    Records the node id of `review` by its databaseId, if it was fetched
+    """
+    database_id = review.database_id()
+    if database_id is None:
+        return
+    key = str(database_id)
+    node_id = review.id()
+    if _node_ids.get(key) == node_id:
+        return
+    try:
+        dynamodb_client.put_review_node_id(key, node_id)
+    except Exception:
+        logger.warning(
+            f"Could not record the node id of review {key}:\n" + traceback.format_exc()
+        )
+        return
+    _node_ids.set(key, node_id)
+
+
+def node_id(database_id: Union[int, str]) -> Optional[str]:
+    """
+    The node id of the review with `database_id`, or None if it isn't known
+    """
+    key = str(database_id)
+    found: Optional[str] = _node_ids.get(key)
+    if found is None:
+        try:
+            found = dynamodb_client.get_review_node_id(key)
+        except Exception:
+            logger.warning(
+                f"Could not look up the node id of review {key}:\n"
+                + traceback.format_exc()
+            )
+            return None
+        if found is not None:
+            _node_ids.set(key, found)
+    metrics.increment(
+        "ReviewIdLookups", dimensions={"result": "hit" if found else "miss"}
+    )
+    return found
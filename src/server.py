@@ -0,0 +1,307 @@
+"""
+Runs SGTM as a long-lived HTTP service, instead of as a Lambda function.
+
+Webhook deliveries are verified (see src.handler.handle_webhook) and
+acknowledged right away, then processed by a pool of worker threads or
+processes. Deliveries with the same ordering key (usually the pull request
+node id) are processed one at a time, in the order they arrived, so on a
+single node the DynamoDB lock can be replaced by a local one (LOCK_BACKEND=local).
+
+Endpoints:
+    • POST /: Github webhook deliveries
+    • GET /health: 200 while serving, 503 once draining
+
+On SIGTERM or SIGINT the server rejects new deliveries with a 503, and waits up
+to SERVER_DRAIN_TIMEOUT_SECONDS for the ones it accepted to finish. It keeps
+answering GET /health until then, and only stops listening once drained.
+
+    python3 -m src.server --port 8000 --concurrency 4 [--processes]
+"""
+import argparse
+import json
+import signal
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from typing import Any, Callable, Deque, Dict, Iterable, Optional, Tuple
+from wsgiref.simple_server import WSGIServer, make_server
+
+import src.backpressure as backpressure
+import src.dead_letters as dead_letters
+import src.deliveries as delivery_dedup
+import src.github.webhook as github_webhook
+import src.handler as handler
+import src.metrics as metrics
+from src.config import SERVER_DRAIN_TIMEOUT_SECONDS, SERVER_PORT, WORKER_MAX_CONCURRENCY
+from src.http import HttpResponse
+from src.logger import logger
+from src.work_queue.client import WebhookDelivery
+
+_Job = Tuple[Callable[..., Any], Tuple[Any, ...], Callable[[Future], None]]
+
+
+class PoolClosedError(Exception):
+    pass
+
+
+class KeyedWorkerPool(object):
+    """
+    Runs jobs on `executor`, at most one at a time per key, in the order they
+    were submitted. Jobs with different keys run concurrently.
+    """
+
+    def __init__(self, executor: Executor):
+        self._executor = executor
+        self._lock = threading.Condition()
+        # key -> jobs waiting for the running job with that key to finish
+        self._waiting: Dict[str, Deque[_Job]] = {}
+        self._pending = 0
+        self._closed = False
+
+    def submit(
+        self,
+        key: str,
+        fn: Callable[..., Any],
+        args: Tuple[Any, ...],
+        callback: Callable[[Future], None],
+    ) -> None:
+        """
+        Schedules `fn(*args)`; `callback` is called with its future once it is done.
+        """
+        job = (fn, args, callback)
+        with self._lock:
+            if self._closed:
+                raise PoolClosedError("The worker pool is draining")
+            self._pending += 1
+            if key in self._waiting:
+                self._waiting[key].append(job)
+                return
+            self._waiting[key] = deque()
+        self._start(key, job)
+
+    def _start(self, key: str, job: _Job) -> None:
+        fn, args, _ = job
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda done: self._finished(key, job, done))
+
+    def _finished(self, key: str, job: _Job, future: Future) -> None:
+        try:
+            job[2](future)
+        except Exception:
+            logger.error(traceback.format_exc())
+        with self._lock:
+            self._pending -= 1
+            waiting = self._waiting[key]
+            next_job = waiting.popleft() if waiting else None
+            if next_job is None:
+                del self._waiting[key]
+            self._lock.notify_all()
+        if next_job is not None:
+            self._start(key, next_job)
+
+    def pending(self) -> int:
+        """
+        The number of jobs that are running or waiting to run
+        """
+        with self._lock:
+            return self._pending
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Stops accepting jobs, and waits up to `timeout` seconds for the
+        accepted ones to finish. Returns True if they all did.
+        """
+        with self._lock:
+            self._closed = True
+            drained = self._lock.wait_for(lambda: self._pending == 0, timeout)
+        self._executor.shutdown(wait=drained)
+        return drained
+
+
+def _process_delivery(event_type: str, body: str) -> str:
+    # Module-level, so that it can be pickled for process pools
+    return github_webhook.handle_github_webhook(
+        event_type, json.loads(body)
+    ).status_code
+
+
+def _delivery_processed(delivery: WebhookDelivery, future: Future) -> None:
+    error = future.exception()
+    # Set when the delivery failed, as opposed to being processed or shed
+    dead_letter_error: Optional[str] = None
+    if error is None:
+        status_code = future.result()
+        if status_code.startswith("5"):
+            dead_letter_error = f"The handler responded {status_code}"
+    elif isinstance(error, backpressure.DeferredError):
+        # Shed rather than failed: the 5xx outcome leaves the delivery
+        # claimable by Github's redelivery, and there is nothing to dead-letter
+        logger.info(f"Deferred delivery {delivery.delivery_id}: {error}")
+        status_code = "503"
+    else:
+        logger.error(f"Delivery {delivery.delivery_id} failed: {error!r}")
+        status_code = "500"
+        dead_letter_error = str(error)
+    delivery_dedup.record_delivery_outcome(
+        delivery.delivery_id, status_code, delivery.received_at
+    )
+    if dead_letter_error is not None:
+        dead_letters.record_dead_letter(delivery, "server", dead_letter_error)
+    metrics.timing("ServerDeliveryLatency", (time.time() - delivery.received_at) * 1000)
+    logger.info(f"Processed webhook delivery {delivery.delivery_id}: {status_code}")
+
+
+def _headers_from_environ(environ: Dict[str, Any]) -> Dict[str, str]:
+    # WSGI exposes headers as HTTP_<NAME>; src.handler expects Github's spelling
+    headers = {}
+    for name in ("X-GitHub-Event", "X-Hub-Signature", "X-GitHub-Delivery"):
+        value = environ.get("HTTP_" + name.upper().replace("-", "_"))
+        if value is not None:
+            headers[name] = value
+    return headers
+
+
+_STATUS_LINES = {
+    "200": "200 OK",
+    "400": "400 Bad Request",
+    "401": "401 Unauthorized",
+    "404": "404 Not Found",
+    "500": "500 Internal Server Error",
+    "501": "501 Not Implemented",
+    "503": "503 Service Unavailable",
+}
+
+
+class Application(object):
+    """
+    The WSGI application. Verified deliveries are dispatched to `pool`.
+    """
+
+    def __init__(self, pool: KeyedWorkerPool):
+        self.pool = pool
+        self.draining = False
+
+    def __call__(
+        self, environ: Dict[str, Any], start_response: Callable
+    ) -> Iterable[bytes]:
+        method = environ.get("REQUEST_METHOD", "GET")
+        path = environ.get("PATH_INFO", "/")
+        if path == "/health" and method == "GET":
+            status = "503" if self.draining else "200"
+            body = json.dumps(
+                {
+                    "status": "draining" if self.draining else "ok",
+                    "pending": self.pool.pending(),
+                }
+            )
+        elif method == "POST" and self.draining:
+            status, body = "503", "Draining"
+        elif method == "POST":
+            response = self._handle_delivery(environ)
+            status, body = response.status_code, response.body or ""
+        else:
+            status, body = "404", ""
+
+        data = body.encode("utf-8")
+        start_response(
+            _STATUS_LINES[status],
+            [("Content-Type", "text/plain"), ("Content-Length", str(len(data)))],
+        )
+        return [data]
+
+    def _handle_delivery(self, environ: Dict[str, Any]) -> HttpResponse:
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        body = environ["wsgi.input"].read(length).decode("utf-8")
+        return handler.handle_webhook(
+            _headers_from_environ(environ), body, dispatch=self._dispatch
+        )
+
+    def _dispatch(self, delivery: WebhookDelivery) -> HttpResponse:
+        try:
+            self.pool.submit(
+                delivery.ordering_key,
+                _process_delivery,
+                (delivery.event_type, delivery.body),
+                lambda future: _delivery_processed(delivery, future),
+            )
+        except PoolClosedError as error:
+            # The server started draining while this delivery was verified
+            delivery_dedup.record_delivery_outcome(
+                delivery.delivery_id, "503", delivery.received_at
+            )
+            dead_letters.record_dead_letter(delivery, "server", str(error))
+            return HttpResponse("503", str(error))
+        return HttpResponse("200")
+
+
+def drain_and_stop(
+    app: Application, stop: Callable[[], None], drain_timeout: float
+) -> None:
+    """
+    Drains the pool of `app`, which keeps answering requests meanwhile, then
+    calls `stop`
+    """
+    if app.pool.drain(drain_timeout):
+        logger.info("Drained all deliveries")
+    else:
+        logger.warning(
+            f"{app.pool.pending()} deliveries were still pending after {drain_timeout}s"
+        )
+    stop()
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def serve(
+    port: int = SERVER_PORT,
+    max_concurrency: int = WORKER_MAX_CONCURRENCY,
+    use_processes: bool = False,
+    drain_timeout: float = SERVER_DRAIN_TIMEOUT_SECONDS,
+) -> None:
+    executor: Executor = (
+        ProcessPoolExecutor(max_workers=max_concurrency)
+        if use_processes
+        else ThreadPoolExecutor(max_workers=max_concurrency)
+    )
+    app = Application(KeyedWorkerPool(executor))
+    httpd = make_server("", port, app, server_class=_ThreadingWSGIServer)
+
+    def _shutdown(signum, frame):
+        logger.info(f"Received signal {signum}, draining")
+        app.draining = True
+        # shutdown() blocks until serve_forever() returns, so it can't run on
+        # this thread, and the server must keep serving /health until drained
+        threading.Thread(
+            target=drain_and_stop, args=(app, httpd.shutdown, drain_timeout)
+        ).start()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+
+    logger.info(f"Serving on port {port} with {max_concurrency} workers")
+    httpd.serve_forever()
+    httpd.server_close()
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run SGTM as an HTTP server")
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument(
+        "--concurrency", type=int, default=WORKER_MAX_CONCURRENCY, help="Workers"
+    )
+    parser.add_argument(
+        "--processes",
+        action="store_true",
+        help="Use worker processes instead of threads",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    serve(args.port, args.concurrency, args.processes)
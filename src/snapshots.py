@@ -0,0 +1,130 @@
+"""
+Snapshots of recently fetched pull requests.
+
+A review with inline comments triggers several events for the same pull
+request within seconds, and each used to fetch the whole pull request again,
+which takes about a second. Fetched pull requests are now kept here with their
+version, and src.github.graphql.client only uses a snapshot if a much cheaper
+query shows that the version didn't change.
+
+Snapshots are kept in two tiers: in-process, and, with
+PULL_REQUEST_SNAPSHOTS_SHARED, zlib-compressed in the
+PULL_REQUEST_SNAPSHOTS_TABLE, where every instance can find them. Snapshots
+expire after SNAPSHOT_TTL_SECONDS.
+
+The version doesn't cover the bodies of comments and reviews, so events that
+edit or delete them invalidate the snapshot. An invalidation deletes the
+shared snapshot too, and a snapshot found in-process is only used while the
+shared one still has its version.
+
+Like de-duplication, this is an optimization: if DynamoDb is unavailable, the
+pull request is fetched as before.
+"""
+import json
+import time
+import traceback
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+from src.config import PULL_REQUEST_SNAPSHOTS_SHARED
+from src.dynamodb import client as dynamodb_client
+from src.logger import logger
+from src.utils import LruCache
+import src.metrics as metrics
+
+SNAPSHOT_TTL_SECONDS = 10 * 60
+
+# (version, raw pull request)
+Snapshot = Tuple[str, Dict[str, Any]]
+
+# github node id -> Snapshot
+_snapshots = LruCache(max_size=500, ttl_seconds=SNAPSHOT_TTL_SECONDS)
+
+
+def _get_shared(gh_node_id: str) -> Optional[Snapshot]:
+    try:
+        item = dynamodb_client.get_pull_request_snapshot(gh_node_id)
+    except Exception:
+        logger.warning(
+            f"Could not read the snapshot of {gh_node_id}:\n" + traceback.format_exc()
+        )
+        return None
+    if item is None:
+        return None
+    version, compressed = item
+    return version, json.loads(zlib.decompress(compressed).decode("utf-8"))
+
+
+def _is_shared(gh_node_id: str, version: str) -> bool:
+    try:
+        return dynamodb_client.get_pull_request_snapshot_version(gh_node_id) == version
+    except Exception:
+        logger.warning(
+            f"Could not read the snapshot version of {gh_node_id}:\n"
+            + traceback.format_exc()
+        )
+        # Keep using the snapshot found in-process, as without a shared tier
+        return True
+
+
+def get(gh_node_id: str) -> Optional[Snapshot]:
+    """
+    The last snapshot of the pull request `gh_node_id`, if it hasn't expired
+    or been invalidated. It must not be modified.
+    """
+    snapshot: Optional[Snapshot] = _snapshots.get(gh_node_id)
+    tier = "local"
+    if (
+        snapshot is not None
+        and PULL_REQUEST_SNAPSHOTS_SHARED
+        and not _is_shared(gh_node_id, snapshot[0])
+    ):
+        # Invalidated, or replaced with a later version, by another instance
+        _snapshots.pop(gh_node_id)
+        snapshot = None
+    if snapshot is None and PULL_REQUEST_SNAPSHOTS_SHARED:
+        snapshot = _get_shared(gh_node_id)
+        tier = "shared"
+        if snapshot is not None:
+            _snapshots.set(gh_node_id, snapshot)
+    if snapshot is not None:
+        metrics.increment("PullRequestSnapshotsFound", dimensions={"tier": tier})
+    return snapshot
+
+
+def put(gh_node_id: str, version: str, raw: Dict[str, Any]) -> None:
+    """
+    Keeps `raw`, the pull request `gh_node_id` at `version`. It must not be
+    modified afterwards.
+    """
+    _snapshots.set(gh_node_id, (version, raw))
+    if not PULL_REQUEST_SNAPSHOTS_SHARED:
+        return
+    try:
+        dynamodb_client.put_pull_request_snapshot(
+            gh_node_id,
+            version,
+            zlib.compress(json.dumps(raw).encode("utf-8")),
+            int(time.time() + SNAPSHOT_TTL_SECONDS),
+        )
+    except Exception:
+        logger.warning(
+            f"Could not share the snapshot of {gh_node_id}:\n" + traceback.format_exc()
+        )
+
+
+def invalidate(gh_node_id: str) -> None:
+    """
+    Drops the snapshot of the pull request `gh_node_id`, e.g. because one of
+    its comments was edited.
+    """
+    _snapshots.pop(gh_node_id)
+    if not PULL_REQUEST_SNAPSHOTS_SHARED:
+        return
+    try:
+        dynamodb_client.delete_pull_request_snapshot(gh_node_id)
+    except Exception:
+        logger.warning(
+            f"Could not invalidate the snapshot of {gh_node_id}:\n"
+            + traceback.format_exc()
+        )
@@ -0,0 +1,106 @@
+"""
+Versions of the pull requests, comments and reviews last synced to Asana, used
+to skip the Asana writes of events that are older than what was already synced.
+
+Webhooks arrive out of order and are retried. An event processed after a newer
+one used to repeat all of the newer one's work, and could write stale state to
+the task. After each sync, the synced snapshot's version is written to the
+SYNC_VERSIONS_TABLE: Github's `updatedAt` of the node, and a digest of the
+snapshot. A snapshot is stale if it was updated before the synced one, or if it
+was updated at the same time and is identical to it (e.g. the retry of an event
+that was already synced).
+
+The digest matters because `updatedAt` doesn't cover everything we sync: a new
+commit status or a change in mergeability changes the fetched pull request
+without changing its `updatedAt`.
+
+Like de-duplication, this is an optimization: if DynamoDb is unavailable, or a
+snapshot has no `updatedAt`, the event is synced as before.
+"""
+import hashlib
+import json
+import time
+import traceback
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from src.dynamodb import client as dynamodb_client
+from src.logger import logger
+from src.utils import LruCache
+import src.metrics as metrics
+
+# Pull requests that see no activity for this long are synced in full again
+SYNC_VERSION_TTL_SECONDS = 30 * 24 * 60 * 60
+
+# (updatedAt as a timestamp, digest of the snapshot)
+SyncVersion = Tuple[float, str]
+
+# github node id -> SyncVersion
+_synced_versions = LruCache(max_size=10000, ttl_seconds=SYNC_VERSION_TTL_SECONDS)
+
+
+def snapshot_version(
+    updated_at: Optional[datetime], raw: Dict[str, Any]
+) -> Optional[SyncVersion]:
+    """
+    The version of a fetched snapshot, or None if it doesn't say when it was updated
+    """
+    if updated_at is None:
+        return None
+    serialized = json.dumps(raw, sort_keys=True, default=str).encode("utf-8")
+    return updated_at.timestamp(), hashlib.sha1(serialized).hexdigest()
+
+
+def _is_stale(version: SyncVersion, synced: SyncVersion) -> bool:
+    return version[0] < synced[0] or version == synced
+
+
+def is_stale(gh_node_id: str, version: Optional[SyncVersion], kind: str) -> bool:
+    """
+    Returns True if a snapshot of `gh_node_id` at least as new as `version` was
+    already synced, so that syncing this one can be skipped.
+    """
+    if version is None:
+        return False
+    cached: Optional[SyncVersion] = _synced_versions.get(gh_node_id)
+    if cached is not None and _is_stale(version, cached):
+        stale = True
+    else:
+        try:
+            synced = dynamodb_client.get_sync_version(gh_node_id)
+        except Exception:
+            logger.warning(
+                f"Could not read the synced version of {gh_node_id}, syncing it anyway:\n"
+                + traceback.format_exc()
+            )
+            return False
+        if synced is None:
+            return False
+        _synced_versions.set(gh_node_id, synced)
+        stale = _is_stale(version, synced)
+
+    if stale:
+        logger.info(f"{kind} {gh_node_id} is not newer than its last sync, skipping")
+        metrics.increment("StaleSnapshots", dimensions={"kind": kind})
+    return stale
+
+
+def record_synced(gh_node_id: str, version: Optional[SyncVersion]) -> None:
+    """
+    Records that the snapshot of `gh_node_id` at `version` was synced to Asana
+    """
+    if version is None:
+        return
+    _synced_versions.set(gh_node_id, version)
+    try:
+        dynamodb_client.put_sync_version(
+            gh_node_id,
+            version[0],
+            version[1],
+            int(time.time() + SYNC_VERSION_TTL_SECONDS),
+        )
+    except Exception:
+        logger.warning(
+            f"Could not record the synced version of {gh_node_id}:\n"
+            + traceback.format_exc()
+        )
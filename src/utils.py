@@ -1,5 +1,8 @@
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Callable, Dict, Any
+from typing import Callable, Dict, Any, Optional, Tuple
 
 
 def parse_date_string(date_string: str) -> datetime:
@@ -21,3 +24,51 @@ def memoize(func: Callable) -> Callable:
         return result
 
     return inner
+
+
+class LruCache(object):
+    """
+    A thread-safe, size-bounded cache that evicts the least recently used
+    entry once `max_size` is reached. If `ttl_seconds` is set, entries also
+    expire that many seconds after they were set.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: Optional[float] = None):
+        self._max_size = max_size
+        self._ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            set_at, value = entry
+            if (
+                self._ttl_seconds is not None
+                and time.time() - set_at > self._ttl_seconds
+            ):
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Any) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,384 @@
+"""
+A durable queue of verified webhook deliveries.
+
+The webhook handler enqueues deliveries and returns immediately; src.worker
+drains the queue. Deliveries carry an `ordering_key` (usually the pull request
+node id) so that the worker can process deliveries for the same pull request in
+the order they were received, while deliveries for different pull requests are
+processed concurrently.
+
+Backends:
+    • "sqs": an SQS FIFO queue, used in production. The ordering key is used as
+      the MessageGroupId, so SQS itself preserves per-pull-request ordering.
+    • "sqlite": a local file-backed queue, for running SGTM outside of AWS.
+    • "memory": a process-local queue, for tests and single-process setups.
+"""
+import json
+import math
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import boto3  # type: ignore
+
+from src.config import WORK_QUEUE_BACKEND, WORK_QUEUE_SQLITE_PATH, WORK_QUEUE_URL
+
+
+class WebhookDelivery(object):
+    """
+    A single verified Github webhook delivery, as stored on the queue. The body
+    is kept as the raw JSON string that Github sent.
+    """
+
+    def __init__(
+        self,
+        delivery_id: str,
+        event_type: str,
+        body: str,
+        ordering_key: str,
+        received_at: Optional[float] = None,
+        receipt: Optional[str] = None,
+        receive_count: int = 1,
+    ):
+        self.delivery_id = delivery_id
+        self.event_type = event_type
+        self.body = body
+        self.ordering_key = ordering_key
+        self.received_at = received_at if received_at is not None else time.time()
+        # Backend-specific handle used to acknowledge the delivery once processed
+        self.receipt = receipt
+        # How many times the delivery was received from the queue, this time included
+        self.receive_count = receive_count
+
+    def payload(self) -> Dict[str, Any]:
+        return json.loads(self.body)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "delivery_id": self.delivery_id,
+                "event_type": self.event_type,
+                "body": self.body,
+                "ordering_key": self.ordering_key,
+                "received_at": self.received_at,
+            }
+        )
+
+    @classmethod
+    def from_json(
+        cls, raw: str, receipt: Optional[str] = None, receive_count: int = 1
+    ) -> "WebhookDelivery":
+        data = json.loads(raw)
+        return cls(
+            data["delivery_id"],
+            data["event_type"],
+            data["body"],
+            data["ordering_key"],
+            received_at=data["received_at"],
+            receipt=receipt,
+            receive_count=receive_count,
+        )
+
+    def __repr__(self) -> str:
+        return f"WebhookDelivery({self.delivery_id}, {self.event_type}, {self.ordering_key})"
+
+
+class WorkQueue(object):
+    """
+    Interface implemented by each queue backend.
+
+    Received deliveries are invisible to other receivers until they are either
+    acknowledged (removed for good), released (made visible again), or deferred
+    (made visible again after a delay).
+    """
+
+    def enqueue(self, delivery: WebhookDelivery) -> None:
+        raise NotImplementedError()
+
+    def receive(
+        self, max_items: int = 10, wait_seconds: float = 0
+    ) -> List[WebhookDelivery]:
+        raise NotImplementedError()
+
+    def ack(self, delivery: WebhookDelivery) -> None:
+        raise NotImplementedError()
+
+    def release(self, delivery: WebhookDelivery) -> None:
+        raise NotImplementedError()
+
+    def defer(self, delivery: WebhookDelivery, delay_seconds: float) -> None:
+        raise NotImplementedError()
+
+
+class InMemoryWorkQueue(WorkQueue):
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._pending: Deque[WebhookDelivery] = deque()
+        self._in_flight: Dict[str, WebhookDelivery] = {}
+        # (time at which it becomes visible again, delivery) for deferred deliveries
+        self._deferred: List[Tuple[float, WebhookDelivery]] = []
+        # delivery id -> how many times it was received
+        self._receive_counts: Dict[str, int] = {}
+
+    def enqueue(self, delivery: WebhookDelivery) -> None:
+        with self._lock:
+            self._pending.append(delivery)
+            self._lock.notify()
+
+    def receive(
+        self, max_items: int = 10, wait_seconds: float = 0
+    ) -> List[WebhookDelivery]:
+        with self._lock:
+            self._undefer_due()
+            if not self._pending and wait_seconds > 0:
+                self._lock.wait(wait_seconds)
+                self._undefer_due()
+            received: List[WebhookDelivery] = []
+            while self._pending and len(received) < max_items:
+                delivery = self._pending.popleft()
+                delivery.receipt = str(uuid.uuid4())
+                delivery.receive_count = (
+                    self._receive_counts.get(delivery.delivery_id, 0) + 1
+                )
+                self._receive_counts[delivery.delivery_id] = delivery.receive_count
+                self._in_flight[delivery.receipt] = delivery
+                received.append(delivery)
+            return received
+
+    def ack(self, delivery: WebhookDelivery) -> None:
+        with self._lock:
+            if delivery.receipt is not None:
+                self._in_flight.pop(delivery.receipt, None)
+            self._receive_counts.pop(delivery.delivery_id, None)
+
+    def release(self, delivery: WebhookDelivery) -> None:
+        with self._lock:
+            if delivery.receipt is not None:
+                self._in_flight.pop(delivery.receipt, None)
+            delivery.receipt = None
+            self._requeue(delivery)
+            self._lock.notify()
+
+    def defer(self, delivery: WebhookDelivery, delay_seconds: float) -> None:
+        with self._lock:
+            if delivery.receipt is not None:
+                self._in_flight.pop(delivery.receipt, None)
+            delivery.receipt = None
+            self._deferred.append((time.time() + delay_seconds, delivery))
+
+    def _undefer_due(self) -> None:
+        now = time.time()
+        for visible_at, delivery in [d for d in self._deferred if d[0] <= now]:
+            self._deferred.remove((visible_at, delivery))
+            self._requeue(delivery)
+
+    def _requeue(self, delivery: WebhookDelivery) -> None:
+        # Put the delivery back in its original position in the queue
+        self._pending.append(delivery)
+        self._pending = deque(sorted(self._pending, key=lambda d: d.received_at))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending) + len(self._deferred)
+
+
+class SqliteWorkQueue(WorkQueue):
+    """
+    A file-backed queue. Received rows are claimed for `visibility_timeout`
+    seconds; if they are neither acknowledged nor released in that time (e.g.
+    the worker crashed), they become visible again.
+    """
+
+    def __init__(self, path: str, visibility_timeout: float = 300):
+        self._visibility_timeout = visibility_timeout
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS deliveries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message TEXT NOT NULL,
+                claimed_until REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        columns = [
+            row[1] for row in self._connection.execute("PRAGMA table_info(deliveries)")
+        ]
+        if "receive_count" not in columns:
+            self._connection.execute(
+                "ALTER TABLE deliveries ADD COLUMN receive_count INTEGER NOT NULL DEFAULT 0"
+            )
+
+    def enqueue(self, delivery: WebhookDelivery) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO deliveries (message) VALUES (?)", (delivery.to_json(),)
+            )
+
+    def receive(
+        self, max_items: int = 10, wait_seconds: float = 0
+    ) -> List[WebhookDelivery]:
+        deadline = time.time() + wait_seconds
+        while True:
+            received = self._claim(max_items)
+            if received or time.time() >= deadline:
+                return received
+            time.sleep(min(0.1, max(0.0, deadline - time.time())))
+
+    def _claim(self, max_items: int) -> List[WebhookDelivery]:
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._connection.execute(
+                    "SELECT id, message, receive_count FROM deliveries WHERE claimed_until <= ? ORDER BY id LIMIT ?",
+                    (now, max_items),
+                ).fetchall()
+                self._connection.executemany(
+                    "UPDATE deliveries SET claimed_until = ?, receive_count = receive_count + 1 WHERE id = ?",
+                    [(now + self._visibility_timeout, row_id) for row_id, _, _ in rows],
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        return [
+            WebhookDelivery.from_json(
+                message, receipt=str(row_id), receive_count=receive_count + 1
+            )
+            for row_id, message, receive_count in rows
+        ]
+
+    def ack(self, delivery: WebhookDelivery) -> None:
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM deliveries WHERE id = ?", (int(delivery.receipt or 0),)
+            )
+
+    def release(self, delivery: WebhookDelivery) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE deliveries SET claimed_until = 0 WHERE id = ?",
+                (int(delivery.receipt or 0),),
+            )
+
+    def defer(self, delivery: WebhookDelivery, delay_seconds: float) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE deliveries SET claimed_until = ? WHERE id = ?",
+                (time.time() + delay_seconds, int(delivery.receipt or 0)),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM deliveries"
+            ).fetchone()[0]
+
+
+class SqsWorkQueue(WorkQueue):
+    """
+    An SQS FIFO queue. In production the worker is driven by the Lambda SQS
+    event source mapping (see src.worker.handler), so `receive` is only needed
+    for draining the queue by hand.
+    """
+
+    def __init__(self, queue_url: str):
+        self._queue_url = queue_url
+        self._client = boto3.client("sqs")
+
+    def enqueue(self, delivery: WebhookDelivery) -> None:
+        self._client.send_message(
+            QueueUrl=self._queue_url,
+            MessageBody=delivery.to_json(),
+            MessageGroupId=delivery.ordering_key,
+            # SQS drops messages with the same deduplication id for 5 minutes
+            MessageDeduplicationId=delivery.delivery_id,
+        )
+
+    def receive(
+        self, max_items: int = 10, wait_seconds: float = 0
+    ) -> List[WebhookDelivery]:
+        response = self._client.receive_message(
+            QueueUrl=self._queue_url,
+            MaxNumberOfMessages=min(max_items, 10),
+            WaitTimeSeconds=int(min(math.ceil(wait_seconds), 20)),
+            AttributeNames=["ApproximateReceiveCount"],
+        )
+        return [
+            WebhookDelivery.from_json(
+                message["Body"],
+                receipt=message["ReceiptHandle"],
+                receive_count=int(
+                    message.get("Attributes", {}).get("ApproximateReceiveCount", 1)
+                ),
+            )
+            for message in response.get("Messages", [])
+        ]
+
+    def ack(self, delivery: WebhookDelivery) -> None:
+        self._client.delete_message(
+            QueueUrl=self._queue_url, ReceiptHandle=delivery.receipt
+        )
+
+    def release(self, delivery: WebhookDelivery) -> None:
+        self._client.change_message_visibility(
+            QueueUrl=self._queue_url,
+            ReceiptHandle=delivery.receipt,
+            VisibilityTimeout=0,
+        )
+
+    def defer(self, delivery: WebhookDelivery, delay_seconds: float) -> None:
+        self._client.change_message_visibility(
+            QueueUrl=self._queue_url,
+            ReceiptHandle=delivery.receipt,
+            # SQS caps visibility timeouts at 12 hours
+            VisibilityTimeout=min(int(delay_seconds), 43200),
+        )
+
+
+class ConfigurationError(Exception):
+    pass
+
+
+def create_work_queue(backend: str) -> WorkQueue:
+    if backend == "sqs":
+        if not WORK_QUEUE_URL:
+            raise ConfigurationError("WORK_QUEUE_URL is required for the sqs backend")
+        return SqsWorkQueue(WORK_QUEUE_URL)
+    elif backend == "sqlite":
+        return SqliteWorkQueue(WORK_QUEUE_SQLITE_PATH)
+    elif backend == "memory":
+        return InMemoryWorkQueue()
+    else:
+        raise ConfigurationError(f"Unknown work queue backend: {backend}")
+
+
+_singleton: Optional[WorkQueue] = None
+_singleton_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    return bool(WORK_QUEUE_BACKEND)
+
+
+def singleton() -> WorkQueue:
+    """
+    The process-wide work queue, configured by WORK_QUEUE_BACKEND, lazily
+    created upon the first request.
+    """
+    global _singleton
+    with _singleton_lock:
+        if _singleton is None:
+            _singleton = create_work_queue(WORK_QUEUE_BACKEND)
+        return _singleton
+
+
+def enqueue(delivery: WebhookDelivery) -> None:
+    singleton().enqueue(delivery)
@@ -0,0 +1,461 @@
+"""
+Processes webhook deliveries that src.handler enqueued on the work queue.
+
+Deliveries are grouped by their ordering key (usually the pull request node
+id). Groups are processed concurrently, up to WORKER_MAX_CONCURRENCY at a
+time, while deliveries within a group are processed one at a time, in the
+order they were received. If a delivery fails (raises, or its handler responds
+with a 5xx), the rest of its group is not processed, so that it can be retried
+without reordering. Once a delivery has failed WORKER_MAX_RECEIVES times, it
+is acknowledged as soon as its dead letter is written, so that it's replayed
+from there (see src.dead_letters) instead of holding up its group forever.
+
+Within a group, deliveries that arrived within COALESCE_WINDOW_SECONDS of
+each other are coalesced into a single job, which syncs the pull request once
+(see github_webhook.handle_coalesced_github_webhooks). The pull requests that
+the coalesced jobs of a batch sync are fetched together beforehand (see
+github_webhook.prefetch_pull_requests).
+
+Each group is processed in the priority lane of its most urgent delivery (see
+github_webhook.priority_lane): higher lanes are started first, and each lane
+has its own concurrency and rate budgets (see src.lanes). Low lane deliveries
+over their rate budget are deferred: put back on the queue, invisible for
+WORKER_DEFER_SECONDS (along with the later deliveries of their group). They are
+dropped once they are older than LOW_LANE_MAX_AGE_SECONDS, or on their last
+receive before the queue's redrive policy would move them to its dead letter
+queue (WORK_QUEUE_MAX_RECEIVES). Deliveries that github_webhook sheds while
+Asana or Github is throttling us (see src.backpressure) are deferred the same
+way, and fail like any other delivery on their last receive.
+
+Entry points:
+    • `handler`: the Lambda function attached to the SQS work queue.
+    • `drain`: drains a work queue in-process (e.g. sqlite, when running
+      locally): `python3 -m src.worker`.
+"""
+import argparse
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+
+import src.backpressure as backpressure
+import src.dead_letters as dead_letters
+import src.deliveries as delivery_dedup
+import src.github.webhook as github_webhook
+import src.lanes as lanes
+import src.metrics as metrics
+import src.work_queue.client as work_queue
+from src.config import (
+    COALESCE_WINDOW_SECONDS,
+    LOW_LANE_MAX_AGE_SECONDS,
+    WORK_QUEUE_MAX_RECEIVES,
+    WORKER_DEFER_SECONDS,
+    WORKER_MAX_CONCURRENCY,
+    WORKER_MAX_RECEIVES,
+)
+from src.github.webhook import LANES, Lane
+from src.logger import logger
+from src.work_queue.client import WebhookDelivery, WorkQueue
+
+
+class DeliveryResult(object):
+    def __init__(
+        self,
+        delivery: WebhookDelivery,
+        error: Optional[str] = None,
+        deferred: bool = False,
+    ):
+        self.delivery = delivery
+        # None if the delivery was processed, otherwise the reason it wasn't
+        self.error = error
+        # Whether the delivery should be retried after WORKER_DEFER_SECONDS,
+        # rather than as soon as the queue makes it visible again
+        self.deferred = deferred
+
+    def succeeded(self) -> bool:
+        return self.error is None
+
+
+def _group_by_ordering_key(
+    deliveries: List[WebhookDelivery],
+) -> "OrderedDict[str, List[WebhookDelivery]]":
+    groups: "OrderedDict[str, List[WebhookDelivery]]" = OrderedDict()
+    for delivery in sorted(deliveries, key=lambda d: d.received_at):
+        groups.setdefault(delivery.ordering_key, []).append(delivery)
+    return groups
+
+
+def _group_lane(group: List[WebhookDelivery]) -> Lane:
+    return min(
+        (
+            github_webhook.priority_lane(delivery.event_type, delivery.payload())
+            for delivery in group
+        ),
+        key=LANES.index,
+    )
+
+
+def _coalesce(
+    group: List[WebhookDelivery], window_seconds: float
+) -> List[List[WebhookDelivery]]:
+    """
+    Splits a group of deliveries (sorted by arrival) into jobs. Consecutive
+    coalescable deliveries that arrived within `window_seconds` of the first
+    delivery of the job are merged into it.
+    """
+    jobs: List[List[WebhookDelivery]] = []
+    for delivery in group:
+        if (
+            window_seconds > 0
+            and jobs
+            and github_webhook.is_coalescable_event(delivery.event_type)
+            and github_webhook.is_coalescable_event(jobs[-1][0].event_type)
+            and delivery.received_at - jobs[-1][0].received_at <= window_seconds
+        ):
+            jobs[-1].append(delivery)
+        else:
+            jobs.append([delivery])
+    return jobs
+
+
+def _process_job(job: List[WebhookDelivery], lane: Lane = Lane.NORMAL) -> str:
+    """
+    Processes the deliveries of `job`, and returns the status code of the response
+    """
+    start = time.time()
+    delivery_ids = [delivery.delivery_id for delivery in job]
+    logger.info(f"Processing webhook delivery ids: {delivery_ids}")
+    if len(job) == 1:
+        response = github_webhook.handle_github_webhook(
+            job[0].event_type, job[0].payload()
+        )
+    else:
+        response = github_webhook.handle_coalesced_github_webhooks(
+            [(delivery.event_type, delivery.payload()) for delivery in job]
+        )
+    for delivery in job:
+        metrics.timing(
+            "WorkerDeliveryLatency",
+            (time.time() - delivery.received_at) * 1000,
+            dimensions={"lane": lane.value},
+        )
+    metrics.timing("WorkerJobDuration", (time.time() - start) * 1000)
+    logger.info(
+        f"Processed webhook delivery ids {delivery_ids}: {response.status_code}"
+    )
+    return response.status_code
+
+
+def _drop(job: List[WebhookDelivery], lane: Lane) -> List[DeliveryResult]:
+    logger.warning(
+        f"Dropping {lane.value} lane webhook delivery ids "
+        f"{[delivery.delivery_id for delivery in job]}: over budget for too long"
+    )
+    metrics.increment("DroppedDeliveries", len(job), dimensions={"lane": lane.value})
+    for delivery in job:
+        delivery_dedup.record_delivery_outcome(
+            delivery.delivery_id, "200", delivery.received_at
+        )
+    return [DeliveryResult(delivery) for delivery in job]
+
+
+def _defer(
+    job: List[WebhookDelivery], lane: Lane, reason: str, error: str
+) -> List[DeliveryResult]:
+    # Not attempted, so no outcome is recorded: redeliveries of these stay
+    # claimable until the queue retries them
+    metrics.increment(
+        "DeferredDeliveries",
+        len(job),
+        dimensions={"lane": lane.value, "reason": reason},
+    )
+    return [DeliveryResult(delivery, error, deferred=True) for delivery in job]
+
+
+def _on_last_receive(job: List[WebhookDelivery]) -> bool:
+    # Putting these back on the queue would move them to its dead letter queue,
+    # without an outcome or a dead letter of ours
+    return any(delivery.receive_count >= WORK_QUEUE_MAX_RECEIVES for delivery in job)
+
+
+def _process_group(
+    group: List[WebhookDelivery],
+    window_seconds: float = COALESCE_WINDOW_SECONDS,
+    lane: Lane = Lane.NORMAL,
+) -> List[DeliveryResult]:
+    budget = lanes.budget(lane)
+    results: List[DeliveryResult] = []
+    jobs = _coalesce(group, window_seconds)
+    with budget.slot():
+        for index, job in enumerate(jobs):
+            budget.queued(-len(job))
+            if not budget.admit():
+                if time.time() - job[
+                    0
+                ].received_at > LOW_LANE_MAX_AGE_SECONDS or _on_last_receive(job):
+                    results.extend(_drop(job, lane))
+                    continue
+                error = f"Deferred: {lane.value} lane is over its rate budget"
+                results.extend(_defer(job, lane, "rate_budget", error))
+                _block_later_jobs(
+                    results, jobs[index + 1 :], job, budget, deferred=True
+                )
+                break
+            try:
+                status_code = _process_job(job, lane)
+            except backpressure.DeferredError as error:
+                logger.info(f"{error}: {[d.delivery_id for d in job]}")
+                if _on_last_receive(job):
+                    results.extend(_fail(job, "503", str(error)))
+                    _block_later_jobs(results, jobs[index + 1 :], job, budget)
+                    break
+                results.extend(_defer(job, lane, "backpressure", str(error)))
+                _block_later_jobs(
+                    results, jobs[index + 1 :], job, budget, deferred=True
+                )
+                break
+            except Exception as error:
+                logger.error(traceback.format_exc())
+                results.extend(_fail(job, "500", str(error)))
+                _block_later_jobs(results, jobs[index + 1 :], job, budget)
+                break
+            if status_code.startswith("5"):
+                results.extend(
+                    _fail(job, status_code, f"The handler responded {status_code}")
+                )
+                _block_later_jobs(results, jobs[index + 1 :], job, budget)
+                break
+            for delivery in job:
+                delivery_dedup.record_delivery_outcome(
+                    delivery.delivery_id, status_code, delivery.received_at
+                )
+                results.append(DeliveryResult(delivery))
+    return results
+
+
+def _fail(
+    job: List[WebhookDelivery], status_code: str, error: str
+) -> List[DeliveryResult]:
+    metrics.increment("WorkerDeliveryFailed", len(job))
+    results = []
+    for delivery in job:
+        delivery_dedup.record_delivery_outcome(
+            delivery.delivery_id, status_code, delivery.received_at
+        )
+        written = dead_letters.record_dead_letter(delivery, "worker", error)
+        if written and delivery.receive_count >= WORKER_MAX_RECEIVES:
+            # Given up: acknowledged, to be replayed from its dead letter
+            logger.warning(
+                f"Giving up on delivery {delivery.delivery_id} after "
+                f"{delivery.receive_count} attempts"
+            )
+            metrics.increment("WorkerDeliveriesGivenUp")
+            results.append(DeliveryResult(delivery))
+        else:
+            results.append(DeliveryResult(delivery, error))
+    return results
+
+
+def _block_later_jobs(
+    results: List[DeliveryResult],
+    later_jobs: List[List[WebhookDelivery]],
+    job: List[WebhookDelivery],
+    budget: lanes.LaneBudget,
+    deferred: bool = False,
+) -> None:
+    # Don't process later deliveries for the same key before `job` (if `job` was
+    # deferred, they're deferred with it, so that they aren't retried first)
+    for later_job in later_jobs:
+        budget.queued(-len(later_job))
+        results.extend(
+            DeliveryResult(
+                skipped, f"Blocked by delivery {job[0].delivery_id}", deferred
+            )
+            for skipped in later_job
+        )
+
+
+def process_deliveries(
+    deliveries: List[WebhookDelivery],
+    max_concurrency: int = WORKER_MAX_CONCURRENCY,
+    window_seconds: float = COALESCE_WINDOW_SECONDS,
+) -> List[DeliveryResult]:
+    """
+    Process `deliveries`, serialized per ordering key and concurrently across
+    keys, higher priority lanes first. Returns one result per delivery.
+    """
+    groups = _group_by_ordering_key(deliveries)
+    if not groups:
+        return []
+    laned_groups = sorted(
+        ((_group_lane(group), group) for group in groups.values()),
+        key=lambda laned_group: LANES.index(laned_group[0]),
+    )
+    for lane, group in laned_groups:
+        lanes.budget(lane).queued(len(group))
+    github_webhook.prefetch_pull_requests(
+        [
+            [(delivery.event_type, delivery.payload()) for delivery in job]
+            for _, group in laned_groups
+            for job in _coalesce(group, window_seconds)
+        ]
+    )
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(groups))) as pool:
+        group_results = list(
+            pool.map(
+                lambda laned_group: _process_group(
+                    laned_group[1], window_seconds, laned_group[0]
+                ),
+                laned_groups,
+            )
+        )
+    return [result for results in group_results for result in results]
+
+
+def _receive_batch(
+    queue: WorkQueue, batch_size: int, wait_seconds: float, window_seconds: float
+) -> List[WebhookDelivery]:
+    """
+    Receives a batch from `queue`. Once the first delivery arrives, keeps
+    receiving for `window_seconds`, so that events that arrive in a burst end
+    up in the same batch and can be coalesced.
+    """
+    batch = queue.receive(max_items=batch_size, wait_seconds=wait_seconds)
+    deadline = time.time() + window_seconds
+    while batch and time.time() < deadline:
+        batch.extend(
+            queue.receive(
+                max_items=batch_size, wait_seconds=max(0.0, deadline - time.time())
+            )
+        )
+    return batch
+
+
+def drain(
+    queue: WorkQueue,
+    max_concurrency: int = WORKER_MAX_CONCURRENCY,
+    batch_size: int = 10,
+    wait_seconds: float = 0,
+    forever: bool = False,
+    window_seconds: float = COALESCE_WINDOW_SECONDS,
+) -> int:
+    """
+    Receives batches from `queue` and processes them until the queue is empty
+    (or forever). Returns the number of deliveries that were processed.
+
+    Failed deliveries are held, and released back onto the queue once it has
+    been drained, so that they are retried on the next pass rather than in a
+    tight loop. Later deliveries with the same ordering key as a failed one are
+    held too, so that per-key ordering is preserved. Deferred deliveries are
+    put back on the queue right away, invisible for WORKER_DEFER_SECONDS, and
+    so are later deliveries with their ordering key until then.
+    """
+    processed = 0
+    held: List[WebhookDelivery] = []
+    blocked_keys: Set[str] = set()
+    # ordering key -> until when its deliveries are deferred
+    deferred_until: Dict[str, float] = {}
+    while True:
+        batch = _receive_batch(queue, batch_size, wait_seconds, window_seconds)
+        if not batch:
+            for delivery in held:
+                queue.release(delivery)
+            held, blocked_keys = [], set()
+            if forever:
+                continue
+            return processed
+
+        runnable = []
+        for delivery in batch:
+            if deferred_until.get(delivery.ordering_key, 0) > time.time():
+                queue.defer(delivery, WORKER_DEFER_SECONDS)
+            elif delivery.ordering_key in blocked_keys:
+                held.append(delivery)
+            else:
+                runnable.append(delivery)
+
+        for result in process_deliveries(runnable, max_concurrency, window_seconds):
+            if result.succeeded():
+                queue.ack(result.delivery)
+                processed += 1
+            elif result.deferred:
+                deferred_until[result.delivery.ordering_key] = (
+                    time.time() + WORKER_DEFER_SECONDS
+                )
+                queue.defer(result.delivery, WORKER_DEFER_SECONDS)
+            else:
+                blocked_keys.add(result.delivery.ordering_key)
+                held.append(result.delivery)
+
+
+def _defer_message(delivery: WebhookDelivery) -> None:
+    try:
+        work_queue.singleton().defer(delivery, WORKER_DEFER_SECONDS)
+    except Exception:
+        # It's retried after the queue's visibility timeout instead
+        logger.warning(
+            f"Failed to defer delivery {delivery.delivery_id}: "
+            + traceback.format_exc()
+        )
+
+
+def handler(event: dict, context: dict) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Entrypoint for the Lambda function triggered by the SQS work queue.
+
+    Uses SQS partial batch responses: deliveries that failed are reported back
+    so that only they (and not the whole batch) become visible again. Deferred
+    ones are first made invisible for WORKER_DEFER_SECONDS, so that waiting out
+    a rate budget or a back off doesn't use up their receives.
+    """
+    deliveries = []
+    message_ids: Dict[int, str] = {}
+    for record in event.get("Records", []):
+        delivery = WebhookDelivery.from_json(
+            record["body"],
+            receipt=record["receiptHandle"],
+            receive_count=int(
+                record.get("attributes", {}).get("ApproximateReceiveCount", 1)
+            ),
+        )
+        message_ids[id(delivery)] = record["messageId"]
+        deliveries.append(delivery)
+
+    results = process_deliveries(deliveries)
+    for result in results:
+        if result.deferred:
+            _defer_message(result.delivery)
+    return {
+        "batchItemFailures": [
+            {"itemIdentifier": message_ids[id(result.delivery)]}
+            for result in results
+            if not result.succeeded()
+        ]
+    }
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Process webhook deliveries from the SGTM work queue"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=WORKER_MAX_CONCURRENCY, help="Worker threads"
+    )
+    parser.add_argument(
+        "--forever",
+        action="store_true",
+        help="Keep polling the queue instead of exiting once it is empty",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    count = drain(
+        work_queue.singleton(),
+        max_concurrency=args.concurrency,
+        wait_seconds=1 if args.forever else 0,
+        forever=args.forever,
+    )
+    logger.info(f"Processed {count} deliveries")
@@ -20,7 +20,14 @@ resource "aws_iam_policy" "lambda-function-dynamodb-policy" {
       "Resource": [
         "${aws_dynamodb_table.sgtm-lock.arn}",
         "${aws_dynamodb_table.sgtm-objects.arn}",
-        "${aws_dynamodb_table.sgtm-users.arn}"
+        "${aws_dynamodb_table.sgtm-users.arn}",
+        "${aws_dynamodb_table.sgtm-deliveries.arn}",
+        "${aws_dynamodb_table.sgtm-dead-letters.arn}",
+        "${aws_dynamodb_table.sgtm-backpressure.arn}",
+        "${aws_dynamodb_table.sgtm-sync-versions.arn}",
+        "${aws_dynamodb_table.sgtm-review-ids.arn}",
+        "${aws_dynamodb_table.sgtm-pull-request-snapshots.arn}",
+        "${aws_dynamodb_table.sgtm-commit-build-states.arn}"
       ],
       "Effect": "Allow"
     },
@@ -30,7 +37,9 @@ resource "aws_iam_policy" "lambda-function-dynamodb-policy" {
         "dynamodb:UpdateItem"
       ],
       "Resource": [
-        "${aws_dynamodb_table.sgtm-lock.arn}"
+        "${aws_dynamodb_table.sgtm-lock.arn}",
+        "${aws_dynamodb_table.sgtm-deliveries.arn}",
+        "${aws_dynamodb_table.sgtm-dead-letters.arn}"
       ],
       "Effect": "Allow"
     }
@@ -53,6 +62,7 @@ resource "aws_iam_policy" "lambda-function-cloudwatch-policy" {
       ],
       "Resource": [
         "arn:aws:logs:${var.aws_region}:*:log-group:/aws/lambda/${aws_lambda_function.sgtm.function_name}:*",
+        "arn:aws:logs:${var.aws_region}:*:log-group:/aws/lambda/${aws_lambda_function.sgtm_worker.function_name}:*",
         "arn:aws:logs:${var.aws_region}:*:log-group:/aws/lambda/${aws_lambda_function.sgtm_sync_users.function_name}:*"
       ],
       "Effect": "Allow"
@@ -81,6 +91,35 @@ resource "aws_iam_role" "iam_for_lambda_function" {
 EOF
 }
 
+# Gives the Lambda functions permissions to enqueue and process webhook deliveries
+resource "aws_iam_policy" "lambda-function-work-queue-policy" {
+  policy     = <<EOF
+{
+  "Version": "2012-10-17",
+  "Statement": [
+    {
+      "Action": [
+        "sqs:SendMessage",
+        "sqs:ReceiveMessage",
+        "sqs:DeleteMessage",
+        "sqs:ChangeMessageVisibility",
+        "sqs:GetQueueAttributes"
+      ],
+      "Resource": [
+        "${aws_sqs_queue.sgtm_work_queue.arn}"
+      ],
+      "Effect": "Allow"
+    }
+  ]
+}
+EOF
+}
+
+resource "aws_iam_role_policy_attachment" "lambda-function-work-queue-policy-attachment" {
+  role       = aws_iam_role.iam_for_lambda_function.name
+  policy_arn = aws_iam_policy.lambda-function-work-queue-policy.arn
+}
+
 resource "aws_iam_role_policy_attachment" "lambda-function-dynamo-db-access-policy-attachment" {
   role       = aws_iam_role.iam_for_lambda_function.name
   policy_arn = aws_iam_policy.lambda-function-dynamodb-policy.arn
@@ -154,6 +193,35 @@ resource "aws_lambda_function" "sgtm" {
       API_KEYS_S3_KEY     = var.api_key_s3_object,
       SGTM_FEATURE__AUTOMERGE_ENABLED = var.sgtm_feature__automerge_enabled,
       SGTM_FEATURE__AUTOCOMPLETE_ENABLED = var.sgtm_feature__autocomplete_enabled, 
+      WORK_QUEUE_BACKEND  = "sqs",
+      WORK_QUEUE_URL      = aws_sqs_queue.sgtm_work_queue.id,
+    }
+  }
+}
+
+# Processes the webhook deliveries that the sgtm function enqueues
+resource "aws_lambda_function" "sgtm_worker" {
+  s3_bucket     = aws_s3_bucket.lambda_code_s3_bucket.bucket
+  s3_key        = aws_s3_bucket_object.lambda_code_bundle.key
+  function_name = "sgtm_worker"
+  role          = aws_iam_role.iam_for_lambda_function.arn
+  handler       = "src.worker.handler"
+  source_code_hash = filebase64sha256("../build/function.zip")
+
+  runtime = "python3.7"
+
+  timeout = var.lambda_function_timeout
+  # Bounds how many batches (and so, pull requests) are processed at once
+  reserved_concurrent_executions = var.worker_max_concurrency
+  environment {
+    variables = {
+      API_KEYS_S3_BUCKET  = var.api_key_s3_bucket_name,
+      API_KEYS_S3_KEY     = var.api_key_s3_object,
+      # To defer deliveries, by changing their visibility
+      WORK_QUEUE_BACKEND  = "sqs",
+      WORK_QUEUE_URL      = aws_sqs_queue.sgtm_work_queue.id,
+      SGTM_FEATURE__AUTOMERGE_ENABLED = var.sgtm_feature__automerge_enabled,
+      SGTM_FEATURE__AUTOCOMPLETE_ENABLED = var.sgtm_feature__autocomplete_enabled,
     }
   }
 }
@@ -198,6 +266,40 @@ resource "aws_cloudwatch_event_target" "execute_sgtm_sync_users_event_target" {
   arn       = aws_lambda_function.sgtm_sync_users.arn
 }
 
+### WORK QUEUE
+
+# FIFO, with the pull request node id as the message group id, so that deliveries
+# for a single pull request are processed in order.
+resource "aws_sqs_queue" "sgtm_work_queue" {
+  name                        = "sgtm-work-queue.fifo"
+  fifo_queue                  = true
+  # Must be at least the worker's timeout
+  visibility_timeout_seconds  = var.lambda_function_timeout
+  message_retention_seconds   = 345600
+  # The worker gives up on deliveries after WORKER_MAX_RECEIVES (3) attempts,
+  # once their dead letter is written; this catches the ones whose dead letter
+  # couldn't be, so that they don't hold up their message group either. Keep
+  # maxReceiveCount in sync with WORK_QUEUE_MAX_RECEIVES, which the worker
+  # never defers deliveries past.
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.sgtm_work_queue_dead_letters.arn
+    maxReceiveCount     = 5
+  })
+}
+
+resource "aws_sqs_queue" "sgtm_work_queue_dead_letters" {
+  name                      = "sgtm-work-queue-dead-letters.fifo"
+  fifo_queue                = true
+  message_retention_seconds = 1209600
+}
+
+resource "aws_lambda_event_source_mapping" "sgtm_worker_work_queue" {
+  event_source_arn        = aws_sqs_queue.sgtm_work_queue.arn
+  function_name           = aws_lambda_function.sgtm_worker.arn
+  batch_size              = 10
+  function_response_types = ["ReportBatchItemFailures"]
+}
+
 ### API
 
 resource "aws_api_gateway_rest_api" "sgtm_rest_api" {
@@ -327,6 +429,133 @@ resource "aws_dynamodb_table" "sgtm-users" {
   }
 }
 
+# Records of processed webhook deliveries, used to drop redeliveries. Records
+# expire on their own, so losing this table only costs a few duplicate syncs.
+resource "aws_dynamodb_table" "sgtm-deliveries" {
+  name           = "sgtm-deliveries"
+  read_capacity  = 5
+  write_capacity = 5
+  hash_key       = "delivery-id"
+
+  attribute {
+    name = "delivery-id"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires-at"
+    enabled        = true
+  }
+}
+
+# Headers and bodies of webhook deliveries that failed, so that they can be
+# replayed with `python3 -m src.dead_letters replay` after an outage
+resource "aws_dynamodb_table" "sgtm-dead-letters" {
+  name           = "sgtm-dead-letters"
+  read_capacity  = 5
+  write_capacity = 5
+  hash_key       = "delivery-id"
+
+  attribute {
+    name = "delivery-id"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires-at"
+    enabled        = true
+  }
+}
+
+# Until when Asana and Github asked us to back off, shared by all instances
+resource "aws_dynamodb_table" "sgtm-backpressure" {
+  name           = "sgtm-backpressure"
+  read_capacity  = 5
+  write_capacity = 5
+  hash_key       = "service"
+
+  attribute {
+    name = "service"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires-at"
+    enabled        = true
+  }
+}
+
+# The version of each pull request, comment and review last synced to Asana, so
+# that events older than it skip their Asana writes
+resource "aws_dynamodb_table" "sgtm-sync-versions" {
+  name           = "sgtm-sync-versions"
+  read_capacity  = 5
+  write_capacity = 5
+  hash_key       = "github-node"
+
+  attribute {
+    name = "github-node"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires-at"
+    enabled        = true
+  }
+}
+
+# The node id of each synced review by its numeric databaseId, which is all
+# that pull_request_review_comment payloads say about the review
+resource "aws_dynamodb_table" "sgtm-review-ids" {
+  name           = "sgtm-review-ids"
+  read_capacity  = 5
+  write_capacity = 5
+  hash_key       = "review-database-id"
+
+  attribute {
+    name = "review-database-id"
+    type = "S"
+  }
+}
+
+# Compressed snapshots of recently fetched pull requests, shared by every
+# instance when PULL_REQUEST_SNAPSHOTS_SHARED is set
+resource "aws_dynamodb_table" "sgtm-pull-request-snapshots" {
+  name           = "sgtm-pull-request-snapshots"
+  read_capacity  = 5
+  write_capacity = 5
+  hash_key       = "github-node"
+
+  attribute {
+    name = "github-node"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires-at"
+    enabled        = true
+  }
+}
+
+# The Build state last reported for each recent commit by check_suite and
+# check_run webhooks, so that every instance reports each change only once
+resource "aws_dynamodb_table" "sgtm-commit-build-states" {
+  name           = "sgtm-commit-build-states"
+  read_capacity  = 5
+  write_capacity = 5
+  hash_key       = "commit-sha"
+
+  attribute {
+    name = "commit-sha"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires-at"
+    enabled        = true
+  }
+}
+
 resource "aws_kms_key" "api_encryption_key" {
   description             = "This key is used to encrypt api key bucket objects"
   deletion_window_in_days = 10
@@ -53,3 +53,9 @@ variable "sgtm_feature__autocomplete_enabled" {
   description = "'true' if behavior to autocomplete linked tasks with Github labels is enabled"
   default     = "false"
 }
+
+variable "worker_max_concurrency" {
+  type        = number
+  description = "Maximum number of concurrent executions of the sgtm_worker Lambda function"
+  default     = 10
+}
@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+from src.asana import helpers as asana_helpers
+
+from test.impl.base_test_case_class import BaseClass
+from test.impl.builders.custom_field_builder import get_custom_field_settings_for_test
+
+
+@patch("src.asana.client.get_project_custom_fields")
+@patch("src.dynamodb.client.get_asana_id_from_github_node_id")
+class TestBuildCustomFieldFromBuildStatus(BaseClass):
+    CUSTOM_FIELD_SETTINGS = get_custom_field_settings_for_test(
+        custom_field_gid="11111",
+        custom_field_name="Build",
+        enabled_enum_option_gid="22222",
+        enabled_enum_option_name="Success",
+    )
+
+    def test_returns_build_field_and_option(
+        self, get_asana_id_from_github_node_id, get_project_custom_fields
+    ):
+        get_asana_id_from_github_node_id.return_value = "project-id"
+        get_project_custom_fields.return_value = iter(self.CUSTOM_FIELD_SETTINGS)
+
+        custom_fields = asana_helpers.build_custom_field_from_build_status(
+            "repository-id", "SUCCESS"
+        )
+
+        self.assertEqual(custom_fields, {"11111": "22222"})
+        get_project_custom_fields.assert_called_once_with("project-id")
+
+    def test_returns_nothing_for_unknown_option(
+        self, get_asana_id_from_github_node_id, get_project_custom_fields
+    ):
+        get_asana_id_from_github_node_id.return_value = "project-id"
+        get_project_custom_fields.return_value = iter(self.CUSTOM_FIELD_SETTINGS)
+
+        self.assertEqual(
+            asana_helpers.build_custom_field_from_build_status(
+                "repository-id", "PENDING"
+            ),
+            {},
+        )
+
+    def test_returns_nothing_without_project(
+        self, get_asana_id_from_github_node_id, get_project_custom_fields
+    ):
+        get_asana_id_from_github_node_id.return_value = None
+
+        self.assertEqual(
+            asana_helpers.build_custom_field_from_build_status(
+                "repository-id", "SUCCESS"
+            ),
+            {},
+        )
+        get_project_custom_fields.assert_not_called()
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
@@ -46,3 +46,50 @@ if __name__ == "__main__":
     from unittest import main as run_tests
 
     run_tests()
+
+    def test_put_delivery_only_if_absent(self):
+        self.assertEqual(dynamodb_client.get_delivery("delivery-put"), None)
+        self.assertTrue(
+            dynamodb_client.put_delivery("delivery-put", "in_flight", 10.0, 1000)
+        )
+        self.assertFalse(
+            dynamodb_client.put_delivery("delivery-put", "in_flight", 20.0, 1000)
+        )
+        self.assertEqual(
+            dynamodb_client.get_delivery("delivery-put"),
+            {"status": "in_flight", "started-at": 10.0},
+        )
+
+    def test_put_delivery_with_expected_record(self):
+        dynamodb_client.put_delivery("delivery-cas", "failed", 10.0, 1000)
+        stale = {"status": "in_flight", "started-at": 10.0}
+        self.assertFalse(
+            dynamodb_client.put_delivery(
+                "delivery-cas", "in_flight", 20.0, 1000, expected=stale
+            )
+        )
+        current = dynamodb_client.get_delivery("delivery-cas")
+        self.assertTrue(
+            dynamodb_client.put_delivery(
+                "delivery-cas", "in_flight", 20.0, 1000, expected=current
+            )
+        )
+        self.assertEqual(
+            dynamodb_client.get_delivery("delivery-cas"),
+            {"status": "in_flight", "started-at": 20.0},
+        )
+
+    def test_update_delivery_outcome(self):
+        dynamodb_client.put_delivery("delivery-outcome", "in_flight", 10.0, 1000)
+        dynamodb_client.update_delivery_outcome(
+            "delivery-outcome", "succeeded", "200", 12.5
+        )
+        self.assertEqual(
+            dynamodb_client.get_delivery("delivery-outcome"),
+            {
+                "status": "succeeded",
+                "started-at": 10.0,
+                "status-code": "200",
+                "duration-ms": 12.5,
+            },
+        )
@@ -1,6 +1,8 @@
 from datetime import timedelta
+from unittest.mock import patch
 from python_dynamodb_lock.python_dynamodb_lock import DynamoDBLockError  # type: ignore
 from test.impl.mock_dynamodb_test_case import MockDynamoDbTestCase
+import src.dynamodb.lock as lock
 from src.dynamodb.lock import dynamodb_lock
 
 
@@ -55,6 +57,18 @@ class DynamodbLockTest(MockDynamoDbTestCase):
 
         self.assertEqual(dummy_counter, 1)
 
+    @patch.object(lock, "LOCK_BACKEND", "local")
+    @patch.object(lock, "local_lock")
+    def test_dynamodb_lock_uses_local_lock_for_local_backend(self, local_lock):
+        with patch.object(lock.lock_client, "acquire_lock") as acquire_lock:
+            with dynamodb_lock("pull_request_id"):
+                pass
+
+        local_lock.assert_called_once_with(
+            "pull_request_id", retry_timeout=timedelta(seconds=20)
+        )
+        acquire_lock.assert_not_called()
+
 
 if __name__ == "__main__":
     from unittest import main as run_tests
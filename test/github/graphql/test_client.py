@@ -1,7 +1,12 @@
+import io
+import json
 from unittest.mock import patch, Mock, call
 from src.github.graphql import client
-from src.github.graphql.queries import IterateReviews
+import src.metrics as metrics
+from src.github.graphql.documents import document
+from src.github.graphql.queries import GetPullRequest, GetReview, IterateReviews
 from test.impl.base_test_case_class import BaseClass
+from test.impl.builders import builder, build
 
 
 @patch.object(client, "_execute_graphql_query")
@@ -9,6 +14,11 @@ class TestGithubClientGetReviewForDatabaseId(BaseClass):
     REVIEW_DB_ID = "1234566"
     PULL_REQUEST_ID = "jiefjiejfji232--"
 
+    def setUp(self):
+        patcher = patch.object(client.review_ids, "node_id", return_value=None)
+        self.node_id = patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_when_no_reviews_found__should_return_None(self, mock_query):
         mock_query.return_value = {"node": {"reviews": {"edges": []}}}
 
@@ -55,6 +65,31 @@ class TestGithubClientGetReviewForDatabaseId(BaseClass):
         )
         self.assertEqual(mock_query.call_count, 2)
 
+    def test_when_review_id_is_recorded__should_fetch_it_directly(self, mock_query):
+        self.node_id.return_value = "recorded-review"
+        mock_query.return_value = {"review": {"id": "recorded-review"}}
+
+        actual = client.get_review_for_database_id(
+            self.PULL_REQUEST_ID, self.REVIEW_DB_ID
+        )
+
+        self.assertEqual(actual.id(), "recorded-review")
+        self.node_id.assert_called_once_with(self.REVIEW_DB_ID)
+        mock_query.assert_called_once_with(
+            GetReview, {"reviewId": "recorded-review"}, allow_partial_errors=True
+        )
+
+    def test_when_recorded_review_was_deleted__should_return_None(self, mock_query):
+        self.node_id.return_value = "deleted-review"
+        mock_query.return_value = {"review": None}
+
+        actual = client.get_review_for_database_id(
+            self.PULL_REQUEST_ID, self.REVIEW_DB_ID
+        )
+
+        self.assertEqual(actual, None)
+        mock_query.assert_called_once()
+
     def test_when_review_in_first_batch_matches__should_return_it(self, mock_query):
         matching_node = {"id": "matching-review", "databaseId": self.REVIEW_DB_ID}
         other_node = {"id": "other-review", "databaseId": "doesnt match"}
@@ -119,6 +154,436 @@ class TestGithubClientGetReviewForDatabaseId(BaseClass):
         self.assertEqual(mock_query.call_count, 2)
 
 
+@patch.object(client, "__endpoint")
+class TestGetPullRequests(BaseClass):
+    @staticmethod
+    def _respond(query, variables, operation_name):
+        return {
+            "data": {
+                f"pr{name[2:]}": {
+                    "__typename": "PullRequest",
+                    "id": pull_request_id,
+                    "assignees": {"nodes": []},
+                }
+                for name, pull_request_id in variables.items()
+            }
+        }
+
+    def test_fetches_pull_requests_in_chunks_in_input_order(self, endpoint):
+        endpoint.side_effect = self._respond
+        pull_request_ids = [f"pr-{i}" for i in range(120)]
+
+        pull_requests = client.get_pull_requests(pull_request_ids)
+
+        self.assertEqual([pr.id() for pr in pull_requests], pull_request_ids)
+        self.assertEqual(
+            [len(c[0][1]) for c in endpoint.call_args_list],
+            [client.PULL_REQUESTS_PER_QUERY, client.PULL_REQUESTS_PER_QUERY, 20],
+        )
+
+    def test_returns_none_for_pull_requests_that_could_not_be_fetched(self, endpoint):
+        endpoint.return_value = {
+            "data": {
+                "pr0": {
+                    "__typename": "PullRequest",
+                    "id": "a",
+                    "assignees": {"nodes": []},
+                },
+                "pr1": None,
+                "pr2": {"__typename": "Issue"},
+            },
+            "errors": [
+                {
+                    "type": "NOT_FOUND",
+                    "path": ["pr1"],
+                    "message": "Could not resolve to a node",
+                }
+            ],
+        }
+
+        pull_requests = client.get_pull_requests(["a", "deleted", "issue"])
+
+        self.assertEqual(pull_requests[0].id(), "a")
+        self.assertEqual(pull_requests[1:], [None, None])
+        endpoint.assert_called_once()
+
+
+@patch.object(client, "__endpoint")
+class TestPullRequestSnapshots(BaseClass):
+    def setUp(self):
+        client.snapshots._snapshots.clear()
+
+    @staticmethod
+    def _pull_request(updated_at: str) -> dict:
+        return {
+            "__typename": "PullRequest",
+            "id": "snapshot-pr",
+            "updatedAt": updated_at,
+            "headRefOid": "0123456",
+            "mergeable": "MERGEABLE",
+            "commits": {"nodes": []},
+            "title": "A pull request",
+        }
+
+    def test_uses_the_snapshot_while_the_pull_request_is_unchanged(self, endpoint):
+        endpoint.side_effect = [
+            {"data": {"pullRequest": self._pull_request("2020-01-01T00:00:00Z")}},
+            {"data": {"pullRequest": self._pull_request("2020-01-01T00:00:00Z")}},
+        ]
+
+        client.get_pull_request("snapshot-pr")
+        pull_request = client.get_pull_request("snapshot-pr")
+
+        self.assertEqual(pull_request.title(), "A pull request")
+        self.assertEqual(
+            [c[0][2] for c in endpoint.call_args_list],
+            ["GetPullRequest", "GetPullRequestVersion"],
+        )
+
+    def test_does_not_probe_without_a_snapshot(self, endpoint):
+        pull_request = self._pull_request("2020-01-01T00:00:00Z")
+        endpoint.side_effect = [
+            {"data": {"pullRequest": pull_request}},
+            {
+                "data": {
+                    "pullRequest": pull_request,
+                    "comment": {"__typename": "IssueComment", "id": "comment"},
+                }
+            },
+        ]
+
+        client.get_pull_request_history("snapshot-pr")
+        client.get_pull_request_and_comment("snapshot-pr", "comment")
+
+        self.assertEqual(
+            [c[0][2] for c in endpoint.call_args_list],
+            ["GetPullRequestHistory", "GetPullRequestAndComment"],
+        )
+
+    def test_fetches_the_pull_request_again_once_it_changed(self, endpoint):
+        endpoint.side_effect = [
+            {"data": {"pullRequest": self._pull_request("2020-01-01T00:00:00Z")}},
+            {"data": {"pullRequest": self._pull_request("2020-01-02T00:00:00Z")}},
+            {"data": {"pullRequest": self._pull_request("2020-01-02T00:00:00Z")}},
+        ]
+
+        client.get_pull_request("snapshot-pr")
+        client.get_pull_request("snapshot-pr")
+
+        self.assertEqual(
+            [c[0][2] for c in endpoint.call_args_list],
+            ["GetPullRequest", "GetPullRequestVersion", "GetPullRequest"],
+        )
+
+    def test_prefetches_pull_requests_without_a_snapshot_in_one_query(self, endpoint):
+        def respond(query, variables, operation_name):
+            return {
+                "data": {
+                    f"pr{name[2:]}": {
+                        **self._pull_request("2020-01-01T00:00:00Z"),
+                        "id": pull_request_id,
+                    }
+                    for name, pull_request_id in variables.items()
+                }
+            }
+
+        endpoint.side_effect = respond
+        client.prefetch_pull_requests(["pr-1", "pr-2", "pr-1"])
+        endpoint.side_effect = None
+        endpoint.return_value = {
+            "data": {"pullRequest": self._pull_request("2020-01-01T00:00:00Z")}
+        }
+
+        client.prefetch_pull_requests(["pr-1", "pr-2"])
+        client.get_pull_request("pr-1")
+        client.get_pull_request("pr-2")
+
+        self.assertEqual(
+            [c[0][2] for c in endpoint.call_args_list],
+            ["GetPullRequests", "GetPullRequestVersion", "GetPullRequestVersion"],
+        )
+        self.assertEqual(
+            endpoint.call_args_list[0][0][1], {"id0": "pr-1", "id1": "pr-2"}
+        )
+
+    def test_does_not_prefetch_a_single_pull_request(self, endpoint):
+        client.prefetch_pull_requests(["pr-1"])
+
+        endpoint.assert_not_called()
+
+
+def _comments_page(bodies, start_cursor=None):
+    return {
+        "pageInfo": {
+            "hasPreviousPage": start_cursor is not None,
+            "startCursor": start_cursor,
+        },
+        "nodes": [{"id": body, "body": body} for body in bodies],
+    }
+
+
+@patch.object(client, "_execute_graphql_query")
+class TestGetPullRequestsForCommit(BaseClass):
+    def test_returns_the_open_pull_requests(self, execute_query):
+        open_pull_requests = [build(builder.pull_request()) for _ in range(2)]
+        closed = build(builder.pull_request().closed(True))
+        execute_query.return_value = {
+            "commit": {
+                "associatedPullRequests": {
+                    "edges": [
+                        {"node": pull_request.to_raw()}
+                        for pull_request in [open_pull_requests[0], closed]
+                        + open_pull_requests[1:]
+                    ]
+                }
+            }
+        }
+
+        actual = client.get_pull_requests_for_commit("commit-id")
+
+        self.assertEqual(
+            [pull_request.id() for pull_request in actual],
+            [pull_request.id() for pull_request in open_pull_requests],
+        )
+
+
+@patch.object(client, "_execute_graphql_query")
+class TestConnectionPages(BaseClass):
+    def _pull_request(self, max_pages: int = 10) -> client.PullRequest:
+        return client.PullRequest(
+            {"id": "pr", "comments": _comments_page(["c5", "c6"], "cursor-5")},
+            client.ConnectionPages("pr", max_pages),
+        )
+
+    @staticmethod
+    def _respond(query, variables):
+        pages = {
+            "cursor-5": _comments_page(["c3", "c4"], "cursor-3"),
+            "cursor-3": _comments_page(["c1", "c2"]),
+        }
+        return {"node": {"comments": pages[variables["before"]]}}
+
+    def test_fetches_earlier_pages_once_when_read(self, execute_query):
+        execute_query.side_effect = self._respond
+        pull_request = self._pull_request()
+        execute_query.assert_not_called()
+
+        bodies = [comment.body() for comment in pull_request.comments()]
+        pull_request.comments()
+
+        self.assertEqual(bodies, ["c1", "c2", "c3", "c4", "c5", "c6"])
+        self.assertEqual(
+            [c[0][1] for c in execute_query.call_args_list],
+            [{"id": "pr", "before": "cursor-5"}, {"id": "pr", "before": "cursor-3"}],
+        )
+
+    def test_stops_at_the_page_ceiling(self, execute_query):
+        metrics.reset()
+        execute_query.side_effect = self._respond
+        pull_request = self._pull_request(max_pages=1)
+
+        bodies = [comment.body() for comment in pull_request.comments()]
+
+        self.assertEqual(bodies, ["c3", "c4", "c5", "c6"])
+        execute_query.assert_called_once()
+        self.assertEqual(
+            metrics.counter_value(
+                "PaginationCeilingReached", {"connection": "PullRequest.comments"}
+            ),
+            1,
+        )
+
+
+@patch.object(client.time, "sleep")
+@patch.object(client, "__endpoint")
+class TestExecuteGraphqlQueryNodeResolutionRetry(BaseClass):
+    NOT_RESOLVED = {
+        "data": {"pullRequest": None},
+        "errors": [
+            {
+                "type": "NOT_FOUND",
+                "message": "Could not resolve to a node with the global id of 'abc'",
+            }
+        ],
+    }
+
+    def test_does_not_sleep_when_node_resolves(self, endpoint, sleep):
+        endpoint.return_value = {"data": {"pullRequest": {"id": "abc"}}}
+
+        actual = client._execute_graphql_query(GetPullRequest, {"id": "abc"})
+
+        self.assertEqual(actual, {"pullRequest": {"id": "abc"}})
+        endpoint.assert_called_once()
+        sleep.assert_not_called()
+
+    def test_retries_until_node_resolves(self, endpoint, sleep):
+        endpoint.side_effect = [
+            self.NOT_RESOLVED,
+            self.NOT_RESOLVED,
+            {"data": {"pullRequest": {"id": "abc"}}},
+        ]
+
+        actual = client._execute_graphql_query(GetPullRequest, {"id": "abc"})
+
+        self.assertEqual(actual, {"pullRequest": {"id": "abc"}})
+        self.assertEqual(endpoint.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+        for (delay,), _ in sleep.call_args_list:
+            self.assertLessEqual(delay, client.NODE_RESOLUTION_MAX_DELAY_SECONDS)
+
+    def test_gives_up_after_max_attempts(self, endpoint, sleep):
+        endpoint.return_value = self.NOT_RESOLVED
+
+        with self.assertRaises(ValueError):
+            client._execute_graphql_query(GetPullRequest, {"id": "abc"})
+
+        self.assertEqual(endpoint.call_count, client.NODE_RESOLUTION_MAX_ATTEMPTS)
+
+    def test_does_not_retry_other_errors(self, endpoint, sleep):
+        endpoint.return_value = {"errors": [{"message": "Something went wrong"}]}
+
+        with self.assertRaises(ValueError):
+            client._execute_graphql_query(GetPullRequest, {"id": "abc"})
+
+        endpoint.assert_called_once()
+        sleep.assert_not_called()
+
+
+@patch.object(client.time, "sleep")
+@patch.object(client, "__endpoint")
+class TestExecuteGraphqlQueryRetries(BaseClass):
+    RESOLVED = {"data": {"pullRequest": {"id": "abc"}}}
+
+    def setUp(self):
+        client.resilience.reset()
+        self.addCleanup(client.resilience.reset)
+
+    def _http_error(self, status, headers=None):
+        return {
+            "data": None,
+            "errors": [
+                {"message": "HTTP Error", "status": status, "headers": headers or {}}
+            ],
+        }
+
+    def test_retries_server_errors(self, endpoint, sleep):
+        endpoint.side_effect = [self._http_error(502), self.RESOLVED]
+
+        actual = client._execute_graphql_query(GetPullRequest, {"id": "abc"})
+
+        self.assertEqual(actual, {"pullRequest": {"id": "abc"}})
+        self.assertEqual(endpoint.call_count, 2)
+
+    def test_retries_dropped_connections(self, endpoint, sleep):
+        endpoint.side_effect = [ConnectionResetError(), self.RESOLVED]
+
+        actual = client._execute_graphql_query(GetPullRequest, {"id": "abc"})
+
+        self.assertEqual(actual, {"pullRequest": {"id": "abc"}})
+
+    @patch.object(client.backpressure, "throttle")
+    def test_retries_after_short_secondary_rate_limits(self, throttle, endpoint, sleep):
+        endpoint.side_effect = [
+            self._http_error(403, {"Retry-After": "2"}),
+            self.RESOLVED,
+        ]
+
+        client._execute_graphql_query(GetPullRequest, {"id": "abc"})
+
+        sleep.assert_called_once_with(2.0)
+
+    def test_does_not_retry_client_errors(self, endpoint, sleep):
+        endpoint.return_value = self._http_error(401)
+
+        with self.assertRaises(client.GraphqlError):
+            client._execute_graphql_query(GetPullRequest, {"id": "abc"})
+
+        endpoint.assert_called_once()
+
+    def test_fails_fast_once_github_keeps_failing(self, endpoint, sleep):
+        endpoint.return_value = self._http_error(503)
+        threshold = client.resilience.GITHUB_CIRCUIT_FAILURE_THRESHOLD
+
+        # The retries stop once the circuit opens, and later queries fail fast
+        for _ in range(2):
+            with self.assertRaises(client.resilience.CircuitOpenError):
+                client._execute_graphql_query(GetPullRequest, {"id": "abc"})
+
+        self.assertEqual(endpoint.call_count, threshold)
+
+
+@patch.object(client.backpressure, "throttle")
+class TestGraphqlBackpressure(BaseClass):
+    @patch.object(client, "__endpoint")
+    def test_reports_rate_limited_errors(self, endpoint, throttle):
+        endpoint.return_value = {"errors": [{"type": "RATE_LIMITED", "message": ""}]}
+
+        with self.assertRaises(ValueError):
+            client._execute_graphql_query(GetPullRequest, {"id": "abc"})
+
+        throttle.assert_called_once_with(client.backpressure.GITHUB)
+
+    def test_retry_after_seconds(self, throttle):
+        self.assertEqual(client._retry_after_seconds({"Retry-After": "30"}), 30.0)
+        with patch.object(client.time, "time", return_value=100.0):
+            self.assertEqual(
+                client._retry_after_seconds(
+                    {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "160"}
+                ),
+                60.0,
+            )
+        self.assertIsNone(
+            client._retry_after_seconds(
+                {"X-RateLimit-Remaining": "10", "X-RateLimit-Reset": "160"}
+            )
+        )
+
+
+class TestPersistedQueries(BaseClass):
+    NOT_FOUND = {"errors": [{"message": "PersistedQueryNotFound"}]}
+    FOUND = {"data": {"pullRequest": {"id": "abc"}}}
+
+    def setUp(self):
+        self.bodies = []
+        self.responses = []
+
+        def urlopen(req, timeout=None):
+            self.bodies.append(json.loads(req.data))
+            return io.BytesIO(json.dumps(self.responses.pop(0)).encode("utf-8"))
+
+        self.endpoint = client._PersistedQueryEndpoint(
+            "https://graphql.example.com", urlopen=urlopen
+        )
+        self.document = document(GetPullRequest)
+
+    def _call(self):
+        return self.endpoint(
+            self.document.text, {"id": "abc"}, self.document.operation_name
+        )
+
+    def test_sends_only_the_hash_of_known_queries(self):
+        self.responses = [self.FOUND]
+
+        self.assertEqual(self._call(), self.FOUND)
+
+        (body,) = self.bodies
+        self.assertNotIn("query", body)
+        self.assertEqual(
+            body["extensions"]["persistedQuery"]["sha256Hash"], self.document.sha256
+        )
+        self.assertEqual(body["variables"], {"id": "abc"})
+
+    def test_sends_the_text_of_unknown_queries(self):
+        self.responses = [self.NOT_FOUND, self.FOUND]
+
+        self.assertEqual(self._call(), self.FOUND)
+
+        self.assertEqual(
+            ["query" in body for body in self.bodies], [False, True],
+        )
+        self.assertEqual(self.bodies[1]["query"], self.document.text)
+
+
 if __name__ == "__main__":
     from unittest import main as run_tests
 
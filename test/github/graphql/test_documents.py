@@ -0,0 +1,54 @@
+import os
+
+from graphql import build_schema, parse, validate
+
+from test.impl.base_test_case_class import BaseClass
+from src.github.graphql import documents
+from src.github.graphql.queries import ALL_QUERIES, GetPullRequest
+
+SCHEMA_PATH = os.path.join(os.path.dirname(documents.__file__), "schema.graphql")
+
+
+class TestDocuments(BaseClass):
+    def test_queries_are_compiled_at_import(self):
+        for query in ALL_QUERIES:
+            self.assertIn(query, documents._documents)
+
+    def test_documents_are_minified_and_deterministic(self):
+        compiled = documents.compile_document(GetPullRequest)
+        # the same definitions, in a different order
+        reordered = documents.compile_document(
+            frozenset(reversed(list(GetPullRequest)))
+        )
+
+        self.assertEqual(compiled.text, reordered.text)
+        self.assertEqual(compiled.sha256, reordered.sha256)
+        self.assertEqual(compiled.operation_name, "GetPullRequest")
+        self.assertNotIn("\n", compiled.text)
+        self.assertTrue(compiled.text.startswith("query GetPullRequest("))
+        self.assertLess(len(compiled.text), len("\n".join(GetPullRequest)))
+
+    def test_documents_are_valid_against_the_schema(self):
+        with open(SCHEMA_PATH) as schema_file:
+            schema = build_schema(schema_file.read())
+
+        for query in ALL_QUERIES:
+            compiled = documents.document(query)
+            with self.subTest(query=compiled.operation_name):
+                self.assertEqual(validate(schema, parse(compiled.text)), [])
+
+    def test_every_query_reports_its_rate_limit(self):
+        for query in ALL_QUERIES:
+            compiled = documents.document(query)
+            with self.subTest(query=compiled.operation_name):
+                self.assertIn("...RateLimit", compiled.text)
+
+    def test_rejects_queries_without_a_single_named_operation(self):
+        with self.assertRaises(ValueError):
+            documents.compile_document(frozenset(["fragment A on User { login }"]))
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
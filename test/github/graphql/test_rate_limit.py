@@ -0,0 +1,90 @@
+from unittest.mock import patch
+
+from test.impl.base_test_case_class import BaseClass
+import src.metrics as metrics
+from src.github.graphql import client
+from src.github.graphql.queries import GetReview
+from src.github.graphql.rate_limit import RateLimitBudget
+
+NOW = 1600000000.0
+# an hour after NOW
+RESET_AT = "2020-09-13T13:26:40Z"
+
+
+def _rate_limit(remaining: int, cost: int = 1) -> dict:
+    return {"cost": cost, "limit": 5000, "remaining": remaining, "resetAt": RESET_AT}
+
+
+@patch.object(client.backpressure, "throttle")
+@patch("src.github.graphql.rate_limit.time.time", return_value=NOW)
+class TestRateLimitBudget(BaseClass):
+    def test_records_remaining_points_and_query_cost(self, time, throttle):
+        metrics.reset()
+        budget = RateLimitBudget(reserve=0.1)
+
+        budget.record("GetReview", _rate_limit(4000, cost=3))
+
+        self.assertEqual(budget.remaining(), 4000)
+        self.assertEqual(
+            metrics.counter_value("GraphqlQueryCost", {"operation": "GetReview"}), 3
+        )
+        self.assertEqual(metrics.counter_value("GraphqlRateLimitRemaining"), 4000)
+        throttle.assert_not_called()
+
+    def test_predicts_when_points_run_out(self, time, throttle):
+        budget = RateLimitBudget(reserve=0.1, spend_window_seconds=100)
+        self.assertIsNone(budget.seconds_until_exhausted())
+
+        budget.record("GetReview", _rate_limit(4000, cost=50))
+
+        # 50 points per 100 seconds
+        self.assertEqual(budget.seconds_until_exhausted(), 8000)
+
+    def test_predicts_from_the_points_other_instances_spent(self, time, throttle):
+        budget = RateLimitBudget(reserve=0.1, spend_window_seconds=100)
+
+        budget.record("GetReview", _rate_limit(4000))
+        time.return_value = NOW + 10
+        budget.record("GetReview", _rate_limit(3000))
+
+        # 1000 points per 10 seconds, although this instance only spent 2
+        self.assertEqual(budget.seconds_until_exhausted(), 30)
+        throttle.assert_called_once_with(client.backpressure.GITHUB, 60)
+
+    def test_defers_until_reset_below_the_reserve(self, time, throttle):
+        budget = RateLimitBudget(reserve=0.1)
+
+        budget.record("GetReview", _rate_limit(499))
+        budget.record("GetReview", _rate_limit(498))
+
+        throttle.assert_called_once_with(client.backpressure.GITHUB, 3600)
+
+    def test_paces_when_points_are_predicted_to_run_out_before_reset(
+        self, time, throttle
+    ):
+        budget = RateLimitBudget(reserve=0.1, spend_window_seconds=100)
+
+        # 1000 points per 100 seconds leaves 400 seconds of points
+        budget.record("GetPullRequests", _rate_limit(4000, cost=1000))
+
+        throttle.assert_called_once_with(client.backpressure.GITHUB, 60)
+
+
+@patch.object(client.rate_limit_budget, "record")
+@patch.object(client, "__endpoint")
+class TestExecuteGraphqlQueryRateLimit(BaseClass):
+    def test_records_the_rate_limit_of_each_response(self, endpoint, record):
+        endpoint.return_value = {
+            "data": {"review": {"id": "review"}, "rateLimit": _rate_limit(4000)}
+        }
+
+        data = client._execute_graphql_query(GetReview, {"reviewId": "review"})
+
+        self.assertEqual(data, {"review": {"id": "review"}})
+        record.assert_called_once_with("GetReview", _rate_limit(4000))
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
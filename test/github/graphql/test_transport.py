@@ -0,0 +1,83 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest.mock import patch
+
+from test.impl.base_test_case_class import BaseClass
+import src.metrics as metrics
+from src.github.graphql import client
+from src.github.graphql.transport import PooledTransport
+
+
+class _GraphqlHandler(BaseHTTPRequestHandler):
+    # keep-alive
+    protocol_version = "HTTP/1.1"
+    status = 200
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        body = json.dumps({"data": {"query": request["query"]}}).encode("utf-8")
+        self.send_response(self.status)
+        self.send_header(
+            "Content-Type", "application/json" if self.status == 200 else "text/plain"
+        )
+        if self.status == 429:
+            self.send_header("Retry-After", "30")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestPooledTransport(BaseClass):
+    def setUp(self):
+        metrics.reset()
+        _GraphqlHandler.status = 200
+        self.server = _Server(("127.0.0.1", 0), _GraphqlHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.transport = PooledTransport(pool_size=2)
+        self.addCleanup(self.transport.close)
+        self.endpoint = client._BackpressureReportingEndpoint(
+            f"http://127.0.0.1:{self.server.server_address[1]}/graphql",
+            urlopen=self.transport,
+        )
+
+    def test_reuses_connections_and_decodes_gzip(self):
+        self.assertEqual(self.endpoint("{ a }"), {"data": {"query": "{ a }"}})
+        self.assertEqual(self.endpoint("{ b }"), {"data": {"query": "{ b }"}})
+
+        self.assertEqual(metrics.counter_value("GraphqlConnections"), 1)
+        self.assertEqual(
+            metrics.counter_value("GraphqlRequests", {"connection": "new"}), 1
+        )
+        self.assertEqual(
+            metrics.counter_value("GraphqlRequests", {"connection": "reused"}), 1
+        )
+
+    def test_http_errors_are_reported_like_urlopen_does(self):
+        _GraphqlHandler.status = 429
+
+        with patch.object(client.backpressure, "throttle") as throttle:
+            response = self.endpoint("{ a }")
+
+        self.assertEqual(response["errors"][0]["status"], 429)
+        throttle.assert_called_once_with(client.backpressure.GITHUB, 30.0)
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
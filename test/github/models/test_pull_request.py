@@ -1,7 +1,7 @@
 from test.impl.base_test_case_class import BaseClass
 from test.impl.builders import builder, build
 
-from src.github.models import PullRequest
+from src.github.models import FieldNotFetchedError, PullRequest
 
 
 class TestPullRequest(BaseClass):
@@ -14,6 +14,18 @@ class TestPullRequest(BaseClass):
         )
         self.assertEqual(["user1", "user2"], pull_request.requested_reviewers())
 
+    def test_partially_loaded_pull_request_fails_loudly_on_fields_not_fetched(self):
+        raw = build(builder.pull_request().title("slim")).to_raw()
+        del raw["assignees"]
+        del raw["comments"]
+        pull_request = PullRequest(raw)
+
+        self.assertEqual(pull_request.title(), "slim")
+        with self.assertRaises(FieldNotFetchedError):
+            pull_request.assignees()
+        with self.assertRaises(FieldNotFetchedError):
+            pull_request.comments()
+
 
 if __name__ == "__main__":
     from unittest import main as run_tests
@@ -0,0 +1,256 @@
+from unittest.mock import patch
+
+from test.impl.mock_dynamodb_test_case import MockDynamoDbTestCase
+import src.dynamodb.client as dynamodb_client
+from src.github import checks
+from src.github.models import Commit
+
+REPOSITORY = {"node_id": "repo-node-id", "name": "sgtm", "owner": {"login": "orb"}}
+
+
+def _check_run(
+    sha: str, name: str, status: str, conclusion: str = None, check_id: int = 1
+) -> dict:
+    return {
+        "action": "completed" if status == "completed" else "created",
+        "check_run": {
+            "id": check_id,
+            "name": name,
+            "head_sha": sha,
+            "status": status,
+            "conclusion": conclusion,
+        },
+        "repository": REPOSITORY,
+    }
+
+
+def _listed_check_run(
+    name: str, status: str, conclusion: str = None, check_id: int = 1
+) -> dict:
+    return {
+        "__typename": "CheckRun",
+        "databaseId": check_id,
+        "name": name,
+        "status": status.upper(),
+        "conclusion": conclusion.upper() if conclusion else None,
+    }
+
+
+def _commit(contexts: list, pull_request_ids: list = None) -> dict:
+    nodes = [{"id": "merged-pr-node-id", "closed": True}] + [
+        {"id": pull_request_id, "closed": False}
+        for pull_request_id in (
+            ["pr-node-id"] if pull_request_ids is None else pull_request_ids
+        )
+    ]
+    return {
+        "associatedPullRequests": {"nodes": nodes},
+        "statusCheckRollup": {"contexts": {"nodes": contexts}},
+    }
+
+
+@patch("src.github.graphql.client.get_commit_checks")
+class TestRecordEvent(MockDynamoDbTestCase):
+    def test_fetches_the_checks_of_a_commit_only_for_its_first_event(
+        self, get_commit_checks
+    ):
+        sha = "seeded"
+        get_commit_checks.return_value = _commit([])
+
+        checks.record_event("check_run", _check_run(sha, "lint", "in_progress"))
+        checks.record_event(
+            "check_run", _check_run(sha, "lint", "completed", "success")
+        )
+
+        get_commit_checks.assert_called_once_with("orb", "sgtm", sha)
+
+    def test_reports_only_changes_of_the_rollup_state(self, get_commit_checks):
+        sha = "changes"
+        get_commit_checks.return_value = _commit([])
+
+        self.assertEqual(
+            checks.record_event(
+                "check_run", _check_run(sha, "lint", "queued", None, 1)
+            ),
+            (["pr-node-id"], Commit.BUILD_PENDING),
+        )
+        self.assertIsNone(
+            checks.record_event(
+                "check_run", _check_run(sha, "test", "in_progress", None, 2)
+            )
+        )
+        self.assertIsNone(
+            checks.record_event(
+                "check_run", _check_run(sha, "lint", "completed", "success", 1)
+            )
+        )
+        self.assertEqual(
+            checks.record_event(
+                "check_run", _check_run(sha, "test", "completed", "neutral", 2)
+            ),
+            (["pr-node-id"], Commit.BUILD_SUCCESSFUL),
+        )
+
+    def test_does_not_report_what_another_instance_reported(self, get_commit_checks):
+        sha = "reported-elsewhere"
+        get_commit_checks.return_value = _commit([])
+        checks.record_event(
+            "check_run", _check_run(sha, "lint", "completed", "success")
+        )
+
+        # e.g. another instance processing a redelivery
+        self.assertIsNone(
+            checks.record_event(
+                "check_run", _check_run(sha, "lint", "completed", "success")
+            )
+        )
+
+    def test_what_github_lists_wins_over_a_retried_payload(self, get_commit_checks):
+        sha = "retried"
+        get_commit_checks.return_value = _commit(
+            [_listed_check_run("lint", "completed", "failure", check_id=7)]
+        )
+
+        # e.g. a retried delivery of an earlier event
+        self.assertEqual(
+            checks.record_event(
+                "check_run", _check_run(sha, "lint", "in_progress", check_id=7)
+            ),
+            (["pr-node-id"], Commit.BUILD_FAILED),
+        )
+
+    def test_later_check_runs_with_the_same_name_win(self, get_commit_checks):
+        sha = "rerun"
+        get_commit_checks.return_value = _commit([])
+        checks.record_event(
+            "check_run", _check_run(sha, "lint", "completed", "failure", check_id=1)
+        )
+
+        self.assertIsNone(
+            checks.record_event(
+                "check_run", _check_run(sha, "lint", "in_progress", check_id=1)
+            )
+        )
+        self.assertEqual(
+            checks.record_event(
+                "check_run", _check_run(sha, "lint", "queued", check_id=2)
+            ),
+            (["pr-node-id"], Commit.BUILD_PENDING),
+        )
+
+    def test_any_failed_context_fails_the_build(self, get_commit_checks):
+        sha = "failed"
+        get_commit_checks.return_value = _commit(
+            [
+                {"__typename": "StatusContext", "context": "ci", "state": "ERROR"},
+                _listed_check_run("lint", "completed", "success"),
+            ]
+        )
+
+        self.assertEqual(
+            checks.record_event(
+                "check_run", _check_run(sha, "lint", "completed", "success")
+            ),
+            (["pr-node-id"], Commit.BUILD_FAILED),
+        )
+
+    def test_statuses_update_the_cached_checks(self, get_commit_checks):
+        sha = "statuses"
+        get_commit_checks.return_value = _commit(
+            [{"__typename": "StatusContext", "context": "ci", "state": "PENDING"}]
+        )
+        checks.record_event("check_run", _check_run(sha, "lint", "in_progress"))
+
+        checks.record_status({"sha": sha, "context": "ci", "state": "success"})
+
+        self.assertEqual(
+            checks.record_event(
+                "check_run", _check_run(sha, "lint", "completed", "success")
+            ),
+            (["pr-node-id"], Commit.BUILD_SUCCESSFUL),
+        )
+        get_commit_checks.assert_called_once()
+
+    def test_statuses_of_commits_without_cached_checks_are_ignored(
+        self, get_commit_checks
+    ):
+        checks.record_status({"sha": "uncached", "context": "ci", "state": "success"})
+
+        self.assertIsNone(dynamodb_client.get_commit_checks("uncached"))
+
+    def test_fetches_again_once_pull_requests_may_have_been_opened(
+        self, get_commit_checks
+    ):
+        sha = "no-pull-request-yet"
+        get_commit_checks.return_value = _commit([], pull_request_ids=[])
+        self.assertIsNone(
+            checks.record_event("check_run", _check_run(sha, "lint", "in_progress"))
+        )
+
+        get_commit_checks.return_value = _commit([])
+        with patch.object(checks, "COMMIT_CHECKS_REFETCH_SECONDS", -1):
+            self.assertEqual(
+                checks.record_event(
+                    "check_run", _check_run(sha, "lint", "completed", "success")
+                ),
+                (["pr-node-id"], Commit.BUILD_SUCCESSFUL),
+            )
+        self.assertEqual(get_commit_checks.call_count, 2)
+
+    @patch.object(
+        checks.dynamodb_client,
+        "put_commit_checks_if_unchanged",
+        side_effect=[False, True],
+    )
+    def test_retries_when_another_event_updated_the_checks_first(
+        self, put_commit_checks_if_unchanged, get_commit_checks
+    ):
+        get_commit_checks.return_value = _commit([])
+
+        self.assertEqual(
+            checks.record_event(
+                "check_run", _check_run("raced", "lint", "completed", "success")
+            ),
+            (["pr-node-id"], Commit.BUILD_SUCCESSFUL),
+        )
+        self.assertEqual(put_commit_checks_if_unchanged.call_count, 2)
+
+    @patch.object(
+        checks.dynamodb_client,
+        "get_commit_checks",
+        side_effect=Exception("unavailable"),
+    )
+    def test_fetches_and_reports_the_state_if_dynamodb_is_unavailable(
+        self, dynamodb_get_commit_checks, get_commit_checks
+    ):
+        get_commit_checks.return_value = _commit([])
+        payload = _check_run("unavailable", "lint", "completed", "success")
+
+        for _ in range(2):
+            self.assertEqual(
+                checks.record_event("check_run", payload),
+                (["pr-node-id"], Commit.BUILD_SUCCESSFUL),
+            )
+        self.assertEqual(get_commit_checks.call_count, 2)
+
+    def test_ignores_check_suites_that_have_not_completed(self, get_commit_checks):
+        payload = {
+            "action": "requested",
+            "check_suite": {
+                "id": 1,
+                "head_sha": "queued-suite",
+                "status": "queued",
+                "conclusion": None,
+                "app": {"slug": "dependabot"},
+            },
+            "repository": REPOSITORY,
+        }
+
+        self.assertIsNone(checks.record_event("check_suite", payload))
+        get_commit_checks.assert_not_called()
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
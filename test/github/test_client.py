@@ -0,0 +1,70 @@
+from unittest.mock import patch
+
+from github import GithubException, RateLimitExceededException  # type: ignore
+import requests
+
+from test.impl.base_test_case_class import BaseClass
+import src.github.client as github_client
+
+
+@patch.object(github_client.backpressure, "throttle")
+@patch.object(github_client.resilience.time, "sleep")
+@patch.object(github_client, "_get_pull_request")
+class TestRetries(BaseClass):
+    def setUp(self):
+        github_client.resilience.reset()
+        self.addCleanup(github_client.resilience.reset)
+
+    def test_retries_server_errors(self, get_pull_request, sleep, throttle):
+        pull_request = get_pull_request.return_value
+        pull_request.edit.side_effect = [GithubException(502, "Bad Gateway"), None]
+
+        github_client.edit_pr_description("owner", "repo", 1, "body")
+
+        self.assertEqual(pull_request.edit.call_count, 2)
+
+    def test_retries_dropped_connections(self, get_pull_request, sleep, throttle):
+        pull_request = get_pull_request.return_value
+        pull_request.edit.side_effect = [requests.ConnectionError(), None]
+
+        github_client.edit_pr_title("owner", "repo", 1, "title")
+
+        self.assertEqual(pull_request.edit.call_count, 2)
+
+    def test_does_not_retry_client_errors(self, get_pull_request, sleep, throttle):
+        pull_request = get_pull_request.return_value
+        pull_request.edit.side_effect = GithubException(422, "Validation Failed")
+
+        with self.assertRaises(GithubException):
+            github_client.edit_pr_description("owner", "repo", 1, "body")
+
+        pull_request.edit.assert_called_once()
+
+    def test_reports_rate_limits_instead_of_retrying(
+        self, get_pull_request, sleep, throttle
+    ):
+        pull_request = get_pull_request.return_value
+        pull_request.edit.side_effect = RateLimitExceededException(403, "limit")
+
+        with self.assertRaises(RateLimitExceededException):
+            github_client.edit_pr_description("owner", "repo", 1, "body")
+
+        pull_request.edit.assert_called_once()
+        throttle.assert_called_once_with(github_client.backpressure.GITHUB)
+
+    def test_does_not_repeat_comments_after_server_errors(
+        self, get_pull_request, sleep, throttle
+    ):
+        pull_request = get_pull_request.return_value
+        pull_request.create_issue_comment.side_effect = GithubException(502, "")
+
+        with self.assertRaises(GithubException):
+            github_client.add_pr_comment("owner", "repo", 1, "comment")
+
+        pull_request.create_issue_comment.assert_called_once()
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
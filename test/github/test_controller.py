@@ -5,6 +5,7 @@ import src.github.client as github_client
 import src.github.controller as github_controller
 import src.asana.controller as asana_controller
 import src.dynamodb.client as dynamodb_client
+from src.github.models import Commit, ReviewState
 from test.impl.builders import builder
 
 
@@ -53,6 +54,100 @@ class GithubControllerTest(MockDynamoDbTestCase):
         create_task_mock.assert_not_called()
         update_task_mock.assert_called_with(pull_request, existing_task_id)
 
+    @patch.object(asana_controller, "update_task")
+    def test_upsert_pull_request_skips_snapshots_older_than_the_last_sync(
+        self, update_task_mock
+    ):
+        pull_request_builder = builder.pull_request().updated_at("2020-01-02T00:00:00Z")
+        newer = pull_request_builder.build()
+        older = pull_request_builder.updated_at("2020-01-01T00:00:00Z").build()
+        dynamodb_client.insert_github_node_to_asana_id_mapping(newer.id(), uuid4().hex)
+
+        github_controller.upsert_pull_request(newer)
+        github_controller.upsert_pull_request(older)
+        # e.g. a retry of the event that was just synced
+        github_controller.upsert_pull_request(newer)
+
+        update_task_mock.assert_called_once()
+        self.assertIs(update_task_mock.call_args[0][0], newer)
+
+    @patch.object(asana_controller, "update_task")
+    def test_upsert_pull_request_syncs_changes_that_keep_updated_at(
+        self, update_task_mock
+    ):
+        # A new commit status doesn't change the pull request's updatedAt
+        pull_request_builder = builder.pull_request().updated_at("2020-01-02T00:00:00Z")
+        pending = pull_request_builder.build()
+        successful = pull_request_builder.commit(
+            builder.commit(Commit.BUILD_SUCCESSFUL)
+        ).build()
+        dynamodb_client.insert_github_node_to_asana_id_mapping(
+            pending.id(), uuid4().hex
+        )
+
+        github_controller.upsert_pull_request(pending)
+        github_controller.upsert_pull_request(successful)
+
+        self.assertEqual(update_task_mock.call_count, 2)
+
+    @patch.object(asana_controller, "update_task")
+    @patch.object(asana_controller, "upsert_github_comment_to_task")
+    def test_upsert_comment_skips_comment_already_synced(
+        self, add_comment_mock, update_task_mock
+    ):
+        pull_request = builder.pull_request().updated_at("2020-01-02T00:00:00Z").build()
+        comment = builder.comment().updated_at("2020-01-02T00:00:00Z").build()
+        dynamodb_client.insert_github_node_to_asana_id_mapping(
+            pull_request.id(), uuid4().hex
+        )
+
+        github_controller.upsert_comment(pull_request, comment)
+        github_controller.upsert_comment(pull_request, comment)
+
+        add_comment_mock.assert_called_once()
+        update_task_mock.assert_called_once()
+
+    @patch.object(github_client, "set_pull_request_assignee")
+    @patch.object(asana_controller, "update_task")
+    @patch.object(asana_controller, "upsert_github_review_to_task")
+    def test_upsert_review_skips_review_already_synced(
+        self, add_review_mock, update_task_mock, set_pr_assignee_mock
+    ):
+        pull_request = builder.pull_request().build()
+        review = (
+            builder.review()
+            .state(ReviewState.APPROVED)
+            .updated_at("2020-01-02T00:00:00Z")
+            .build()
+        )
+        dynamodb_client.insert_github_node_to_asana_id_mapping(
+            pull_request.id(), uuid4().hex
+        )
+
+        github_controller.upsert_review(pull_request, review)
+        github_controller.upsert_review(pull_request, review)
+
+        add_review_mock.assert_called_once()
+        set_pr_assignee_mock.assert_called_once()
+        # the pull request has no updatedAt, so it is always synced
+        self.assertEqual(update_task_mock.call_count, 2)
+
+    @patch.object(github_client, "set_pull_request_assignee")
+    @patch.object(asana_controller, "update_task")
+    @patch.object(asana_controller, "upsert_github_review_to_task")
+    def test_upsert_review_records_its_node_id(
+        self, add_review_mock, update_task_mock, set_pr_assignee_mock
+    ):
+        pull_request = builder.pull_request().build()
+        review = builder.review().state(ReviewState.COMMENTED).database_id(42).build()
+        dynamodb_client.insert_github_node_to_asana_id_mapping(
+            pull_request.id(), uuid4().hex
+        )
+
+        github_controller.upsert_review(pull_request, review)
+
+        self.assertEqual(dynamodb_client.get_review_node_id("42"), review.id())
+
     @patch.object(github_client, "edit_pr_description")
     def test_add_asana_task_to_pull_request(self, edit_pr_mock):
         pull_request = builder.pull_request("original body").build()
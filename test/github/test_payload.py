@@ -0,0 +1,213 @@
+from unittest.mock import patch
+
+from test.impl.base_test_case_class import BaseClass
+from test.impl.builders import builder, build
+from src.github import payload as github_payload
+from src.github.models import IssueComment, ReviewState
+
+HISTORY = {
+    "id": "pr-node-id",
+    "mergeable": "MERGEABLE",
+    "reviewRequests": {"nodes": []},
+    "reviews": {"nodes": []},
+    "comments": {"nodes": []},
+    "commits": {"nodes": [{"commit": {"status": {"state": "SUCCESS"}}}]},
+}
+
+REPOSITORY = {"node_id": "repo-node-id", "name": "sgtm", "owner": {"login": "orb"}}
+
+
+def _raw_pull_request(**overrides) -> dict:
+    raw = {
+        "node_id": "pr-node-id",
+        "number": 42,
+        "title": "Make it faster",
+        "body": None,
+        "html_url": "https://github.com/orb/sgtm/pull/42",
+        "user": {"login": "author"},
+        "state": "closed",
+        "merged": True,
+        "merged_at": "2020-01-02T03:04:05Z",
+        "updated_at": "2020-01-02T03:04:06Z",
+        "assignees": [{"login": "assignee"}],
+        "labels": [{"name": "merge after tests"}],
+        "base": {"repo": REPOSITORY},
+    }
+    raw.update(overrides)
+    return raw
+
+
+@patch("src.github.graphql.client.get_pull_request")
+@patch("src.github.graphql.client.get_pull_request_history", return_value=HISTORY)
+class TestGetPullRequest(BaseClass):
+    def test_builds_pull_request_from_payload_and_history(
+        self, get_pull_request_history, get_pull_request
+    ):
+        payload = {"action": "closed", "pull_request": _raw_pull_request()}
+
+        pull_request = github_payload.get_pull_request("pull_request", payload)
+
+        get_pull_request_history.assert_called_once_with("pr-node-id")
+        get_pull_request.assert_not_called()
+        self.assertEqual(pull_request.id(), "pr-node-id")
+        self.assertEqual(pull_request.number(), 42)
+        self.assertEqual(pull_request.title(), "Make it faster")
+        self.assertEqual(pull_request.body(), "")
+        self.assertEqual(pull_request.author_handle(), "author")
+        self.assertTrue(pull_request.closed())
+        self.assertTrue(pull_request.merged())
+        self.assertIsNotNone(pull_request.merged_at())
+        self.assertIsNotNone(pull_request.updated_at())
+        self.assertEqual(pull_request.assignees(), ["assignee"])
+        self.assertEqual(
+            [label.name() for label in pull_request.labels()], ["merge after tests"]
+        )
+        self.assertEqual(pull_request.repository_id(), "repo-node-id")
+        self.assertEqual(pull_request.repository_owner_handle(), "orb")
+        self.assertTrue(pull_request.is_build_successful())
+        self.assertTrue(pull_request.is_mergeable())
+
+    def test_builds_pull_request_from_pull_request_review_payload(
+        self, get_pull_request_history, get_pull_request
+    ):
+        # As sent by Github: the pull request of a review has no "merged" flag
+        payload = {
+            "action": "submitted",
+            "review": {
+                "id": 1234,
+                "node_id": "review-node-id",
+                "user": {"login": "reviewer"},
+                "body": "Looks good",
+                "state": "approved",
+                "html_url": "https://github.com/orb/sgtm/pull/42#pullrequestreview-1234",
+                "submitted_at": "2020-01-02T03:04:05Z",
+            },
+            "pull_request": {
+                "url": "https://api.github.com/repos/orb/sgtm/pulls/42",
+                "id": 4242,
+                "node_id": "pr-node-id",
+                "html_url": "https://github.com/orb/sgtm/pull/42",
+                "number": 42,
+                "state": "open",
+                "locked": False,
+                "title": "Make it faster",
+                "user": {"login": "author"},
+                "body": "Faster",
+                "created_at": "2020-01-01T03:04:05Z",
+                "updated_at": "2020-01-02T03:04:05Z",
+                "closed_at": None,
+                "merged_at": None,
+                "merge_commit_sha": "abc123",
+                "assignee": None,
+                "assignees": [],
+                "requested_reviewers": [],
+                "labels": [],
+                "head": {"ref": "faster", "sha": "abc123", "repo": REPOSITORY},
+                "base": {"ref": "master", "sha": "def456", "repo": REPOSITORY},
+                "author_association": "MEMBER",
+            },
+            "repository": REPOSITORY,
+        }
+
+        pull_request = github_payload.get_pull_request("pull_request_review", payload)
+
+        get_pull_request.assert_not_called()
+        get_pull_request_history.assert_called_once_with("pr-node-id")
+        self.assertFalse(pull_request.closed())
+        self.assertFalse(pull_request.merged())
+        self.assertEqual(pull_request.body(), "Faster")
+
+    def test_builds_pull_request_from_issue_comment_payload(
+        self, get_pull_request_history, get_pull_request
+    ):
+        issue = _raw_pull_request(
+            state="open", pull_request={"merged_at": None}, labels=[]
+        )
+        payload = {"action": "created", "issue": issue, "repository": REPOSITORY}
+
+        pull_request = github_payload.get_pull_request("issue_comment", payload)
+
+        get_pull_request.assert_not_called()
+        self.assertFalse(pull_request.closed())
+        self.assertFalse(pull_request.merged())
+        self.assertEqual(pull_request.repository_name(), "sgtm")
+
+    def test_fetches_whole_pull_request_when_payload_lacks_fields(
+        self, get_pull_request_history, get_pull_request
+    ):
+        # Older payloads don't say whether the pull request was merged
+        issue = _raw_pull_request(pull_request={"url": "https://api.github.com/..."})
+        payload = {"action": "created", "issue": issue, "repository": REPOSITORY}
+
+        github_payload.get_pull_request("issue_comment", payload)
+
+        get_pull_request.assert_called_once_with("pr-node-id")
+        get_pull_request_history.assert_not_called()
+
+
+@patch("src.github.graphql.client.get_comment")
+@patch.object(
+    github_payload.dynamodb_client, "get_asana_domain_user_id_from_github_handle"
+)
+class TestCommentFromPayload(BaseClass):
+    PAYLOAD = {
+        "action": "edited",
+        "comment": {
+            "node_id": "comment-node-id",
+            "user": {"login": "commenter"},
+            "body": "LGTM @author",
+            "html_url": "https://github.com/orb/sgtm/pull/42#issuecomment-1",
+            "created_at": "2020-01-02T03:04:05Z",
+            "updated_at": "2020-01-03T03:04:05Z",
+        },
+    }
+
+    def test_builds_comments_of_asana_users(self, asana_user_id, get_comment):
+        asana_user_id.return_value = "asana-user-id"
+        payload = self.PAYLOAD
+
+        comment = github_payload.comment_from_payload(payload)
+
+        self.assertIsInstance(comment, IssueComment)
+        self.assertEqual(comment.id(), "comment-node-id")
+        self.assertEqual(comment.author_handle(), "commenter")
+        self.assertEqual(comment.body(), "LGTM @author")
+        self.assertEqual(comment.url(), payload["comment"]["html_url"])
+        self.assertEqual(comment.updated_at().day, 3)
+        asana_user_id.assert_called_once_with("commenter")
+        get_comment.assert_not_called()
+
+    def test_fetches_comments_of_other_users_for_their_name(
+        self, asana_user_id, get_comment
+    ):
+        asana_user_id.return_value = None
+
+        comment = github_payload.comment_from_payload(self.PAYLOAD)
+
+        self.assertEqual(comment, get_comment.return_value)
+        get_comment.assert_called_once_with("comment-node-id")
+
+
+@patch("src.github.graphql.client.get_review")
+class TestGetReview(BaseClass):
+    def test_uses_review_from_pull_request(self, get_review):
+        review = builder.review().state(ReviewState.APPROVED)
+        pull_request = build(builder.pull_request().review(review))
+
+        found = github_payload.get_review(pull_request, review.build().id())
+
+        self.assertEqual(found.id(), review.build().id())
+        get_review.assert_not_called()
+
+    def test_fetches_review_missing_from_pull_request(self, get_review):
+        pull_request = build(builder.pull_request())
+
+        github_payload.get_review(pull_request, "review-node-id")
+
+        get_review.assert_called_once_with("review-node-id")
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
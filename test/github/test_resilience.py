@@ -0,0 +1,190 @@
+from unittest.mock import Mock, patch
+
+from test.impl.base_test_case_class import BaseClass
+import src.backpressure as backpressure
+import src.github.resilience as resilience
+import src.metrics as metrics
+
+SERVER_ERROR = resilience.Failure(resilience.RETRYABLE, "server_error", degraded=True)
+RATE_LIMITED = resilience.Failure(resilience.RATE_LIMITED, "rate_limit")
+
+
+def _failing_with(failure: resilience.Failure):
+    return lambda error: failure
+
+
+@patch.object(resilience.time, "sleep")
+class TestCall(BaseClass):
+    def setUp(self):
+        resilience.reset()
+        self.addCleanup(resilience.reset)
+        metrics.reset()
+
+    def test_retries_retryable_errors_with_capped_backoff(self, sleep):
+        fn = Mock(side_effect=[ValueError(), ValueError(), "result"])
+
+        actual = resilience.call("host", "rest", fn, _failing_with(SERVER_ERROR))
+
+        self.assertEqual(actual, "result")
+        self.assertEqual(fn.call_count, 3)
+        for (delay,), _ in sleep.call_args_list:
+            self.assertLessEqual(
+                delay, resilience.DEFAULT_RETRY_POLICY.max_delay_seconds
+            )
+        self.assertEqual(
+            metrics.counter_value("GithubRetriesRecovered", {"api": "rest"}), 1
+        )
+
+    def test_gives_up_after_max_attempts(self, sleep):
+        fn = Mock(side_effect=ValueError())
+
+        with self.assertRaises(ValueError):
+            resilience.call("host", "rest", fn, _failing_with(SERVER_ERROR))
+
+        self.assertEqual(fn.call_count, resilience.DEFAULT_RETRY_POLICY.max_attempts)
+
+    def test_does_not_retry_fatal_errors(self, sleep):
+        fn = Mock(side_effect=ValueError())
+
+        with self.assertRaises(ValueError):
+            resilience.call("host", "rest", fn, _failing_with(resilience.FATAL_FAILURE))
+
+        fn.assert_called_once()
+        sleep.assert_not_called()
+
+    def test_honors_short_retry_after(self, sleep):
+        fn = Mock(side_effect=[ValueError(), "result"])
+
+        resilience.call(
+            "host", "rest", fn, _failing_with(RATE_LIMITED._replace(retry_after=3.0))
+        )
+
+        sleep.assert_called_once_with(3.0)
+
+    def test_does_not_wait_for_long_or_unknown_rate_limits(self, sleep):
+        for retry_after in (None, 3600.0):
+            fn = Mock(side_effect=ValueError())
+
+            with self.assertRaises(ValueError):
+                resilience.call(
+                    "host",
+                    "rest",
+                    fn,
+                    _failing_with(RATE_LIMITED._replace(retry_after=retry_after)),
+                )
+
+            fn.assert_called_once()
+        sleep.assert_not_called()
+
+
+class TestCircuitBreaker(BaseClass):
+    def test_opens_after_failures_in_a_row(self):
+        breaker = resilience.CircuitBreaker("host", failure_threshold=2)
+
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+
+        with self.assertRaises(resilience.CircuitOpenError):
+            breaker.before_call()
+
+    def test_is_a_deferred_error(self):
+        self.assertTrue(
+            issubclass(resilience.CircuitOpenError, backpressure.DeferredError)
+        )
+
+    @patch.object(resilience.time, "time")
+    def test_lets_a_single_call_through_after_the_cooldown(self, time):
+        time.return_value = 100.0
+        breaker = resilience.CircuitBreaker(
+            "host", failure_threshold=1, cooldown_seconds=30
+        )
+        breaker.record_failure()
+
+        time.return_value = 131.0
+        breaker.before_call()
+        with self.assertRaises(resilience.CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_success()
+        self.assertFalse(breaker.is_open())
+        breaker.before_call()
+
+    @patch.object(resilience.time, "time")
+    def test_opens_again_if_the_call_after_the_cooldown_fails(self, time):
+        time.return_value = 100.0
+        breaker = resilience.CircuitBreaker(
+            "host", failure_threshold=3, cooldown_seconds=30
+        )
+        for _ in range(3):
+            breaker.record_failure()
+
+        time.return_value = 131.0
+        breaker.before_call()
+        breaker.record_failure()
+
+        with self.assertRaises(resilience.CircuitOpenError):
+            breaker.before_call()
+
+    @patch.object(resilience.time, "time")
+    def test_other_failures_leave_the_circuit_as_it_is(self, time):
+        time.return_value = 100.0
+        breaker = resilience.CircuitBreaker(
+            "host", failure_threshold=2, cooldown_seconds=30
+        )
+        breaker.record_failure()
+        breaker.record_other_failure()
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open())
+
+        time.return_value = 131.0
+        breaker.before_call()
+        breaker.record_other_failure()
+
+        self.assertTrue(breaker.is_open())
+        # Another call can find out whether Github recovered
+        breaker.before_call()
+
+    @patch.object(resilience.time, "sleep")
+    def test_fatal_errors_do_not_reset_the_failure_streak(self, sleep):
+        resilience.reset()
+        self.addCleanup(resilience.reset)
+        breaker = resilience.circuit_breaker("host")
+        for _ in range(resilience.GITHUB_CIRCUIT_FAILURE_THRESHOLD - 1):
+            breaker.record_failure()
+
+        with self.assertRaises(ValueError):
+            resilience.call(
+                "host",
+                "rest",
+                Mock(side_effect=ValueError()),
+                _failing_with(resilience.FATAL_FAILURE),
+            )
+        breaker.record_failure()
+
+        self.assertTrue(breaker.is_open())
+
+    @patch.object(resilience.time, "sleep")
+    def test_fails_fast_while_open(self, sleep):
+        resilience.reset()
+        self.addCleanup(resilience.reset)
+        fn = Mock(side_effect=ValueError())
+        policy = resilience.RetryPolicy(10, 0.1, 0.1)
+
+        # The retries stop once the circuit opens
+        with self.assertRaises(resilience.CircuitOpenError):
+            resilience.call("host", "rest", fn, _failing_with(SERVER_ERROR), policy)
+        calls = fn.call_count
+        with self.assertRaises(resilience.CircuitOpenError):
+            resilience.call("host", "rest", fn, _failing_with(SERVER_ERROR), policy)
+
+        self.assertEqual(fn.call_count, calls)
+        self.assertEqual(calls, resilience.GITHUB_CIRCUIT_FAILURE_THRESHOLD)
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
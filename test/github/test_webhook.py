@@ -1,9 +1,11 @@
-from unittest.mock import patch, Mock, MagicMock
+from unittest.mock import patch, Mock, MagicMock, call
 
 from test.impl.base_test_case_class import BaseClass
+from test.impl.builders import builder, build
 
 from src.github import webhook
-from src.github.models import PullRequest, PullRequestReviewComment, Review
+import src.metrics as metrics
+from src.github.models import Commit, PullRequest, PullRequestReviewComment, Review
 
 
 class TestHandleGithubWebhook(BaseClass):
@@ -12,6 +14,337 @@ class TestHandleGithubWebhook(BaseClass):
 
         self.assertEqual(response.status_code, "501")
 
+    @patch.object(webhook, "_handle_pull_request_webhook")
+    def test_handle_github_webhook_skips_irrelevant_actions(self, handle):
+        metrics.reset()
+        payload = {"action": "locked", "pull_request": {"node_id": "abcde"}}
+
+        response = webhook.handle_github_webhook("pull_request", payload)
+
+        self.assertEqual(response.status_code, "200")
+        handle.assert_not_called()
+        self.assertEqual(
+            metrics.counter_value(
+                "SkippedEvents", {"event": "pull_request", "action": "locked"}
+            ),
+            1,
+        )
+
+    @patch.object(webhook.repositories, "is_mapped", return_value=False)
+    @patch.object(webhook, "_handle_pull_request_webhook")
+    def test_handle_github_webhook_drops_events_for_unmapped_repositories(
+        self, handle, is_mapped
+    ):
+        metrics.reset()
+        payload = {
+            "action": "opened",
+            "pull_request": {"node_id": "abcde"},
+            "repository": {"node_id": "unmapped-repo"},
+        }
+
+        response = webhook.handle_github_webhook("pull_request", payload)
+
+        self.assertEqual(response.status_code, "200")
+        handle.assert_not_called()
+        is_mapped.assert_called_once_with("unmapped-repo")
+        self.assertEqual(
+            metrics.counter_value(
+                "UnmappedRepositoryEvents", {"event": "pull_request"}
+            ),
+            1,
+        )
+
+    @patch.object(webhook.backpressure, "throttled_services", return_value=[])
+    @patch.object(webhook.repositories, "is_mapped", return_value=True)
+    @patch.object(webhook.snapshots, "invalidate")
+    @patch.dict(webhook._events_map, {"issue_comment": Mock()})
+    def test_handle_github_webhook_invalidates_snapshots_of_edited_comments(
+        self, invalidate, *_
+    ):
+        for action, invalidated in (("edited", True), ("created", False)):
+            with self.subTest(action=action):
+                invalidate.reset_mock()
+                payload = {
+                    "action": action,
+                    "issue": {"node_id": "abcde", "pull_request": {}},
+                    "comment": {"node_id": "comment"},
+                }
+
+                webhook.handle_github_webhook("issue_comment", payload)
+
+                if invalidated:
+                    invalidate.assert_called_once_with("abcde")
+                else:
+                    invalidate.assert_not_called()
+
+
+@patch.object(webhook.repositories, "is_mapped", return_value=True)
+@patch.object(webhook.backpressure, "throttled_services", return_value=[])
+@patch.object(webhook, "dynamodb_lock")
+@patch("src.github.controller.update_build_status")
+@patch.object(webhook.github_checks, "record_event")
+class TestHandleCheckRunWebhook(BaseClass):
+    PAYLOAD = {
+        "action": "completed",
+        "check_run": {
+            "name": "test",
+            "head_sha": "0123456789abcdef",
+            "status": "completed",
+            "conclusion": "failure",
+        },
+        "repository": {"node_id": "repo-node-id"},
+    }
+
+    def test_updates_build_status_when_it_changed(
+        self, record_event, update_build_status, lock, throttled_services, is_mapped
+    ):
+        record_event.return_value = (["pr-1", "pr-2"], "FAILURE")
+
+        response = webhook.handle_github_webhook("check_run", self.PAYLOAD)
+
+        self.assertEqual(response.status_code, "200")
+        record_event.assert_called_once_with("check_run", self.PAYLOAD)
+        update_build_status.assert_has_calls(
+            [
+                call("pr-1", "repo-node-id", "FAILURE"),
+                call("pr-2", "repo-node-id", "FAILURE"),
+            ]
+        )
+        lock.assert_has_calls([call("pr-1"), call("pr-2")], any_order=True)
+
+    def test_does_nothing_when_build_status_is_unchanged(
+        self, record_event, update_build_status, lock, throttled_services, is_mapped
+    ):
+        record_event.return_value = None
+
+        webhook.handle_github_webhook("check_run", self.PAYLOAD)
+
+        update_build_status.assert_not_called()
+
+
+@patch.object(webhook.repositories, "is_mapped", return_value=True)
+@patch.object(webhook.backpressure, "throttled_services", return_value=[])
+@patch.object(webhook, "dynamodb_lock")
+@patch("src.github.controller.update_build_status")
+@patch("src.github.controller.upsert_pull_request")
+@patch("src.github.logic.maybe_automerge_pull_request")
+@patch("src.github.graphql.client.get_pull_requests_for_commit")
+class TestHandleStatusWebhook(BaseClass):
+    PAYLOAD = {
+        "sha": "abc1234",
+        "context": "ci",
+        "commit": {"node_id": "commit-node-id"},
+        "state": "success",
+    }
+
+    def setUp(self):
+        patcher = patch.object(webhook.github_checks, "record_status")
+        self.record_status = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_updates_only_the_build_status_of_the_pull_request(
+        self,
+        get_pull_requests_for_commit,
+        maybe_automerge_pull_request,
+        upsert_pull_request,
+        update_build_status,
+        lock,
+        throttled_services,
+        is_mapped,
+    ):
+        raw = build(
+            builder.pull_request().commit(builder.commit(Commit.BUILD_SUCCESSFUL))
+        ).to_raw()
+        # as loaded by the AutomergePullRequest fragment
+        for field in ("assignees", "comments", "reviewRequests", "author", "url"):
+            del raw[field]
+        pull_request = PullRequest(raw)
+        get_pull_requests_for_commit.return_value = [pull_request]
+
+        response = webhook.handle_github_webhook("status", self.PAYLOAD)
+
+        self.assertEqual(response.status_code, "200")
+        get_pull_requests_for_commit.assert_called_once_with("commit-node-id")
+        maybe_automerge_pull_request.assert_called_once_with(pull_request)
+        update_build_status.assert_called_once_with(
+            pull_request.id(), pull_request.repository_id(), Commit.BUILD_SUCCESSFUL
+        )
+        upsert_pull_request.assert_not_called()
+
+    def test_ignores_commits_without_a_pull_request(
+        self,
+        get_pull_requests_for_commit,
+        maybe_automerge_pull_request,
+        upsert_pull_request,
+        update_build_status,
+        lock,
+        throttled_services,
+        is_mapped,
+    ):
+        get_pull_requests_for_commit.return_value = []
+
+        response = webhook.handle_github_webhook("status", self.PAYLOAD)
+
+        self.assertEqual(response.status_code, "200")
+        maybe_automerge_pull_request.assert_not_called()
+        update_build_status.assert_not_called()
+        # Later check events derive the Build state from it
+        self.record_status.assert_called_once_with(self.PAYLOAD)
+
+    def test_updates_every_pull_request_of_the_commit_under_its_own_lock(
+        self,
+        get_pull_requests_for_commit,
+        maybe_automerge_pull_request,
+        upsert_pull_request,
+        update_build_status,
+        lock,
+        throttled_services,
+        is_mapped,
+    ):
+        pull_requests = [
+            build(builder.pull_request().commit(builder.commit(Commit.BUILD_FAILED)))
+            for _ in range(3)
+        ]
+        get_pull_requests_for_commit.return_value = pull_requests
+
+        webhook.handle_github_webhook("status", self.PAYLOAD)
+
+        self.assertCountEqual(
+            [c[0][0] for c in lock.call_args_list], [pr.id() for pr in pull_requests]
+        )
+        self.assertCountEqual(
+            [c[0][0] for c in maybe_automerge_pull_request.call_args_list],
+            pull_requests,
+        )
+        self.assertCountEqual(
+            [c[0] for c in update_build_status.call_args_list],
+            [
+                (pr.id(), pr.repository_id(), Commit.BUILD_FAILED)
+                for pr in pull_requests
+            ],
+        )
+
+    def test_drops_statuses_of_unmapped_repositories_before_fetching(
+        self,
+        get_pull_requests_for_commit,
+        maybe_automerge_pull_request,
+        upsert_pull_request,
+        update_build_status,
+        lock,
+        throttled_services,
+        is_mapped,
+    ):
+        is_mapped.return_value = False
+        payload = {**self.PAYLOAD, "repository": {"node_id": "unmapped-repo"}}
+
+        response = webhook.handle_github_webhook("status", payload)
+
+        self.assertEqual(response.status_code, "200")
+        is_mapped.assert_called_once_with("unmapped-repo")
+        get_pull_requests_for_commit.assert_not_called()
+        lock.assert_not_called()
+
+
+class TestSkipReason(BaseClass):
+    def _pull_request_event(
+        self, action: str, state: str = "open", merged: bool = False
+    ) -> dict:
+        return {
+            "action": action,
+            "pull_request": {"node_id": "abcde", "state": state, "merged": merged},
+        }
+
+    def test_skips_actions_that_cannot_affect_the_task(self):
+        for action in ("locked", "unlocked", "milestoned", "demilestoned"):
+            self.assertIsNotNone(
+                webhook.skip_reason("pull_request", self._pull_request_event(action))
+            )
+
+    def test_skips_review_request_removed_and_labels_only_on_closed_pull_requests(
+        self,
+    ):
+        for action in ("review_request_removed", "labeled", "unlabeled"):
+            self.assertIsNone(
+                webhook.skip_reason("pull_request", self._pull_request_event(action))
+            )
+            self.assertIsNotNone(
+                webhook.skip_reason(
+                    "pull_request", self._pull_request_event(action, "closed")
+                )
+            )
+
+    def test_handles_labels_on_merged_pull_requests(self):
+        # e.g. the label that completes the linked tasks on merge
+        for action in ("labeled", "unlabeled"):
+            self.assertIsNone(
+                webhook.skip_reason(
+                    "pull_request",
+                    self._pull_request_event(action, "closed", merged=True),
+                )
+            )
+        self.assertIsNotNone(
+            webhook.skip_reason(
+                "pull_request",
+                self._pull_request_event("review_request_removed", "closed", True),
+            )
+        )
+
+    def test_handles_actions_that_can_affect_the_task(self):
+        for action in ("opened", "edited", "closed", "synchronize", "review_requested"):
+            self.assertIsNone(
+                webhook.skip_reason(
+                    "pull_request", self._pull_request_event(action, "closed")
+                )
+            )
+
+    def test_skips_comments_on_issues(self):
+        payload = {
+            "action": "created",
+            "issue": {"node_id": "issue"},
+            "comment": {"node_id": "comment"},
+        }
+        self.assertIsNotNone(webhook.skip_reason("issue_comment", payload))
+
+        payload["issue"]["pull_request"] = {"url": "https://api.github.com/..."}
+        self.assertIsNone(webhook.skip_reason("issue_comment", payload))
+
+
+@patch.object(webhook.backpressure, "throttled_services", return_value=["asana"])
+class TestShedWhileThrottled(BaseClass):
+    def test_defers_events_that_can_wait(self, throttled_services):
+        with self.assertRaises(webhook.backpressure.DeferredError):
+            webhook.handle_github_webhook(
+                "issue_comment", {"action": "edited", "issue": {"pull_request": {}}},
+            )
+
+    def test_handles_high_priority_events(self, throttled_services):
+        handle = Mock(return_value=webhook.HttpResponse("200"))
+        with patch.dict(webhook._events_map, {"pull_request": handle}):
+            webhook.handle_github_webhook(
+                "pull_request", {"action": "closed", "pull_request": {}}
+            )
+
+        handle.assert_called_once()
+        throttled_services.assert_not_called()
+
+
+class TestPriorityLane(BaseClass):
+    def test_lanes(self):
+        cases = [
+            ("pull_request", "closed", webhook.Lane.HIGH),
+            ("pull_request_review", "submitted", webhook.Lane.HIGH),
+            ("pull_request", "synchronize", webhook.Lane.NORMAL),
+            ("issue_comment", "created", webhook.Lane.NORMAL),
+            ("status", None, webhook.Lane.NORMAL),
+            ("issue_comment", "edited", webhook.Lane.LOW),
+            ("pull_request_review_comment", "deleted", webhook.Lane.LOW),
+        ]
+        for event_type, action, lane in cases:
+            with self.subTest(event_type=event_type, action=action):
+                self.assertEqual(
+                    webhook.priority_lane(event_type, {"action": action}), lane
+                )
+
 
 @patch.object(webhook, "dynamodb_lock")
 class HandleIssueCommentWebhook(BaseClass):
@@ -31,6 +364,27 @@ class HandleIssueCommentWebhook(BaseClass):
         response = webhook._handle_issue_comment_webhook(self.payload)
         self.assertEqual(response.status_code, "400")
 
+    @patch("src.github.controller.upsert_comment")
+    @patch("src.github.graphql.client.get_pull_request_and_comment")
+    @patch.object(webhook.github_payload, "comment_from_payload")
+    @patch.object(webhook.github_payload, "get_pull_request")
+    def test_builds_pull_request_and_comment_from_payload(
+        self,
+        get_pull_request,
+        comment_from_payload,
+        get_pull_request_and_comment,
+        upsert_comment,
+        lock,
+    ):
+        response = webhook._handle_issue_comment_webhook(self.payload)
+
+        self.assertEqual(response.status_code, "200")
+        get_pull_request.assert_called_once_with("issue_comment", self.payload)
+        get_pull_request_and_comment.assert_not_called()
+        upsert_comment.assert_called_once_with(
+            get_pull_request.return_value, comment_from_payload.return_value
+        )
+
 
 @patch.object(webhook, "dynamodb_lock")
 @patch("src.github.controller.delete_comment")
@@ -130,6 +484,166 @@ class TestHandlePullRequestReviewComment(BaseClass):
         delete_comment.assert_called_once_with(self.COMMENT_NODE_ID)
 
 
+@patch.object(webhook, "dynamodb_lock")
+@patch("src.github.logic.maybe_add_automerge_warning_comment")
+@patch("src.github.logic.maybe_automerge_pull_request")
+@patch("src.github.controller.upsert_pull_request")
+@patch("src.github.controller.upsert_review")
+@patch("src.github.controller.upsert_comment")
+@patch("src.github.graphql.client.get_review")
+@patch("src.github.graphql.client.get_comment")
+@patch("src.github.graphql.client.get_pull_request")
+class TestHandleCoalescedGithubWebhooks(BaseClass):
+    PULL_REQUEST_NODE_ID = "abcde"
+
+    def test_syncs_the_pull_request_once_and_upserts_each_comment_and_review(
+        self,
+        get_pull_request,
+        get_comment,
+        get_review,
+        upsert_comment,
+        upsert_review,
+        upsert_pull_request,
+        maybe_automerge_pull_request,
+        maybe_add_automerge_warning_comment,
+        lock,
+    ):
+        pull_request = MagicMock(spec=PullRequest)
+        get_pull_request.return_value = pull_request
+        comment_1, comment_2 = Mock(), Mock()
+        get_comment.side_effect = [comment_1, comment_2]
+        review = Mock()
+        get_review.return_value = review
+        pull_request_payload = {"node_id": self.PULL_REQUEST_NODE_ID}
+
+        events = [
+            (
+                "pull_request",
+                {"action": "synchronize", "pull_request": pull_request_payload},
+            ),
+            (
+                "issue_comment",
+                {
+                    "action": "created",
+                    "issue": pull_request_payload,
+                    "comment": {"node_id": "comment-1"},
+                },
+            ),
+            (
+                "issue_comment",
+                {
+                    "action": "edited",
+                    "issue": pull_request_payload,
+                    "comment": {"node_id": "comment-2"},
+                },
+            ),
+            (
+                "pull_request_review",
+                {
+                    "action": "submitted",
+                    "pull_request": pull_request_payload,
+                    "review": {"node_id": "review-1"},
+                },
+            ),
+        ]
+
+        with patch.object(webhook.snapshots, "invalidate") as invalidate:
+            response = webhook.handle_coalesced_github_webhooks(events)
+
+        self.assertEqual(response.status_code, "200")
+        # comment-2 was edited, so the pull request must not come from a snapshot
+        invalidate.assert_called_once_with(self.PULL_REQUEST_NODE_ID)
+        lock.assert_called_once_with(self.PULL_REQUEST_NODE_ID)
+        get_pull_request.assert_called_once_with(self.PULL_REQUEST_NODE_ID)
+        upsert_comment.assert_has_calls(
+            [
+                call(pull_request, comment_1, update_task=False),
+                call(pull_request, comment_2, update_task=False),
+            ]
+        )
+        upsert_review.assert_called_once_with(pull_request, review, update_task=False)
+        upsert_pull_request.assert_called_once_with(pull_request)
+        maybe_automerge_pull_request.assert_called_once_with(pull_request)
+        maybe_add_automerge_warning_comment.assert_called_once_with(pull_request)
+
+    @patch.object(webhook.backpressure, "throttled_services", return_value=[])
+    @patch.object(webhook.github_checks, "record_status")
+    def test_records_every_coalesced_status(self, record_status, *_):
+        statuses = [
+            {"sha": "abc1234", "context": context, "state": "success"}
+            for context in ("ci", "lint", "deploy")
+        ]
+        handle_status_webhook = Mock(return_value=webhook.HttpResponse("200"))
+
+        with patch.dict(webhook._events_map, {"status": handle_status_webhook}):
+            webhook.handle_coalesced_github_webhooks(
+                [("status", status) for status in statuses]
+            )
+
+        # The last one is recorded by the status handler
+        self.assertEqual([c[0][0] for c in record_status.call_args_list], statuses[:-1])
+        handle_status_webhook.assert_called_once_with(statuses[-1])
+
+
+@patch.object(webhook.backpressure, "throttled_services", return_value=[])
+@patch("src.github.graphql.client.prefetch_pull_requests")
+class TestPrefetchPullRequests(BaseClass):
+    @staticmethod
+    def _event(event_type: str, node_id: str) -> tuple:
+        if event_type == "status":
+            return (event_type, {"commit": {"node_id": node_id}})
+        return (event_type, {"pull_request": {"node_id": node_id}})
+
+    def _coalesced_jobs(self, *pull_request_ids: str) -> list:
+        return [
+            [self._event("pull_request", pull_request_id)] * 2
+            for pull_request_id in pull_request_ids
+        ]
+
+    def test_prefetches_the_pull_requests_of_coalesced_jobs(
+        self, prefetch_pull_requests, throttled_services
+    ):
+        jobs = [
+            [self._event("pull_request", "pr-1"), self._event("pull_request", "pr-1")],
+            # handled on their own, from their payload
+            [self._event("pull_request", "pr-2")],
+            # only update the Build field
+            [self._event("status", "commit-1"), self._event("status", "commit-1")],
+            [
+                self._event("pull_request_review", "pr-3"),
+                self._event("pull_request", "pr-3"),
+            ],
+        ]
+
+        webhook.prefetch_pull_requests(jobs)
+
+        prefetch_pull_requests.assert_called_once_with(["pr-1", "pr-3"])
+
+    def test_does_not_prefetch_while_throttled(
+        self, prefetch_pull_requests, throttled_services
+    ):
+        throttled_services.return_value = ["github"]
+
+        webhook.prefetch_pull_requests(self._coalesced_jobs("pr-1", "pr-2"))
+
+        prefetch_pull_requests.assert_not_called()
+
+    def test_does_not_prefetch_a_single_pull_request(
+        self, prefetch_pull_requests, throttled_services
+    ):
+        webhook.prefetch_pull_requests(self._coalesced_jobs("pr-1", "pr-1"))
+
+        prefetch_pull_requests.assert_not_called()
+        throttled_services.assert_not_called()
+
+    def test_failures_are_left_to_each_job(
+        self, prefetch_pull_requests, throttled_services
+    ):
+        prefetch_pull_requests.side_effect = Exception("unavailable")
+
+        webhook.prefetch_pull_requests(self._coalesced_jobs("pr-1", "pr-2"))
+
+
 if __name__ == "__main__":
     from unittest import main as run_tests
 
@@ -27,6 +27,10 @@ class CommentBuilder(BuilderBaseClass):
         self.raw_comment["publishedAt"] = transform_datetime(published_at)
         return self
 
+    def updated_at(self, updated_at: Union[str, datetime]):
+        self.raw_comment["updatedAt"] = transform_datetime(updated_at)
+        return self
+
     def build(self) -> Comment:
         return Comment(self.raw_comment)
 
@@ -86,6 +86,10 @@ class PullRequestBuilder(BuilderBaseClass):
         self.raw_pr["mergedAt"] = transform_datetime(merged_at)
         return self
 
+    def updated_at(self, updated_at: Union[str, datetime]):
+        self.raw_pr["updatedAt"] = transform_datetime(updated_at)
+        return self
+
     def comment(self, comment: Union[CommentBuilder, Comment]):
         return self.comments([comment])
 
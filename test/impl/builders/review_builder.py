@@ -34,6 +34,14 @@ class ReviewBuilder(BuilderBaseClass):
         self.raw_review["submittedAt"] = transform_datetime(submitted_at)
         return self
 
+    def updated_at(self, updated_at: Union[str, datetime]):
+        self.raw_review["updatedAt"] = transform_datetime(updated_at)
+        return self
+
+    def database_id(self, database_id: int):
+        self.raw_review["databaseId"] = database_id
+        return self
+
     def comment(self, comment: Union[CommentBuilder, Comment]):
         return self.comments([comment])
 
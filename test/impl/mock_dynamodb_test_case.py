@@ -4,7 +4,18 @@ or other external resources.
 """
 import boto3  # type: ignore
 from moto import mock_dynamodb2  # type: ignore
-from src.config import OBJECTS_TABLE, USERS_TABLE, LOCK_TABLE
+from src.config import (
+    OBJECTS_TABLE,
+    USERS_TABLE,
+    LOCK_TABLE,
+    DELIVERIES_TABLE,
+    DEAD_LETTERS_TABLE,
+    BACKPRESSURE_TABLE,
+    COMMIT_BUILD_STATES_TABLE,
+    PULL_REQUEST_SNAPSHOTS_TABLE,
+    REVIEW_IDS_TABLE,
+    SYNC_VERSIONS_TABLE,
+)
 from .base_test_case_class import BaseClass
 from .mock_dynamodb_test_data_helper import MockDynamoDbTestDataHelper
 
@@ -63,5 +74,59 @@ class MockDynamoDbTestCase(BaseClass):
                 {"AttributeName": "sort_key", "KeyType": "RANGE",},
             ],
         )
+
+        client.create_table(
+            AttributeDefinitions=[
+                {"AttributeName": "delivery-id", "AttributeType": "S",}
+            ],
+            TableName=DELIVERIES_TABLE,
+            KeySchema=[{"AttributeName": "delivery-id", "KeyType": "HASH",}],
+        )
+
+        client.create_table(
+            AttributeDefinitions=[
+                {"AttributeName": "delivery-id", "AttributeType": "S",}
+            ],
+            TableName=DEAD_LETTERS_TABLE,
+            KeySchema=[{"AttributeName": "delivery-id", "KeyType": "HASH",}],
+        )
+
+        client.create_table(
+            AttributeDefinitions=[{"AttributeName": "service", "AttributeType": "S",}],
+            TableName=BACKPRESSURE_TABLE,
+            KeySchema=[{"AttributeName": "service", "KeyType": "HASH",}],
+        )
+
+        client.create_table(
+            AttributeDefinitions=[
+                {"AttributeName": "github-node", "AttributeType": "S",}
+            ],
+            TableName=SYNC_VERSIONS_TABLE,
+            KeySchema=[{"AttributeName": "github-node", "KeyType": "HASH",}],
+        )
+
+        client.create_table(
+            AttributeDefinitions=[
+                {"AttributeName": "review-database-id", "AttributeType": "S",}
+            ],
+            TableName=REVIEW_IDS_TABLE,
+            KeySchema=[{"AttributeName": "review-database-id", "KeyType": "HASH",}],
+        )
+
+        client.create_table(
+            AttributeDefinitions=[
+                {"AttributeName": "github-node", "AttributeType": "S",}
+            ],
+            TableName=PULL_REQUEST_SNAPSHOTS_TABLE,
+            KeySchema=[{"AttributeName": "github-node", "KeyType": "HASH",}],
+        )
+
+        client.create_table(
+            AttributeDefinitions=[
+                {"AttributeName": "commit-sha", "AttributeType": "S",}
+            ],
+            TableName=COMMIT_BUILD_STATES_TABLE,
+            KeySchema=[{"AttributeName": "commit-sha", "KeyType": "HASH",}],
+        )
         cls.client = client
         cls.test_data = MockDynamoDbTestDataHelper(client)
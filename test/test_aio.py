@@ -0,0 +1,62 @@
+import asyncio
+import threading
+
+from test.impl.base_test_case_class import BaseClass
+import src.aio as aio
+
+
+class TestAio(BaseClass):
+    def test_runs_calls_concurrently(self):
+        # Each call waits for the other, so they only finish if both run at once
+        barrier = threading.Barrier(2, timeout=5)
+
+        async def waiting_for_each_other():
+            return await asyncio.gather(aio.call(barrier.wait), aio.call(barrier.wait))
+
+        self.assertEqual(sorted(aio.run(waiting_for_each_other())), [0, 1])
+
+    def test_passes_arguments_and_returns_results_in_order(self):
+        async def added():
+            return await asyncio.gather(
+                aio.call(lambda a, b: a + b, 1, b=2), aio.call(str.upper, "sgtm")
+            )
+
+        self.assertEqual(aio.run(added()), [3, "SGTM"])
+
+    def test_raises_what_a_call_raises(self):
+        def fail():
+            raise ValueError("oops")
+
+        async def failing():
+            await asyncio.gather(aio.call(fail), aio.call(lambda: None))
+
+        with self.assertRaises(ValueError):
+            aio.run(failing())
+
+    def test_nested_runs_make_their_calls_on_their_own_thread(self):
+        threads = []
+
+        async def inner():
+            await asyncio.gather(
+                aio.call(lambda: threads.append(threading.get_ident())),
+                aio.call(lambda: threads.append(threading.get_ident())),
+            )
+
+        def outer_call():
+            threads.append(threading.get_ident())
+            aio.run(inner())
+
+        async def outer():
+            await aio.call(outer_call)
+
+        aio.run(outer())
+
+        self.assertEqual(len(threads), 3)
+        self.assertEqual(len(set(threads)), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
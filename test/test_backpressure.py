@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+from test.impl.mock_dynamodb_test_case import MockDynamoDbTestCase
+import src.backpressure as backpressure
+import src.dynamodb.client as dynamodb_client
+
+
+class TestBackpressure(MockDynamoDbTestCase):
+    def setUp(self):
+        backpressure.reset()
+        self.addCleanup(backpressure.reset)
+        # Each test starts without any shared backpressure
+        for service in backpressure.SERVICES:
+            dynamodb_client.put_throttled_until(service, 0)
+
+    def test_not_throttled_by_default(self):
+        self.assertEqual(backpressure.throttled_services(), [])
+
+    def test_throttle_is_shared_through_dynamodb(self):
+        backpressure.throttle(backpressure.ASANA, 30)
+        # As seen by another process
+        backpressure.reset()
+
+        self.assertEqual(backpressure.throttled_services(), [backpressure.ASANA])
+
+    def test_throttle_expires(self):
+        backpressure.throttle(backpressure.GITHUB, 30)
+
+        with patch.object(backpressure.time, "time", return_value=10 ** 12):
+            self.assertEqual(backpressure.throttled_services(), [])
+
+    @patch.object(backpressure.dynamodb_client, "get_throttled_until")
+    @patch.object(backpressure.dynamodb_client, "put_throttled_until")
+    def test_falls_back_to_in_process_signal(self, put, get):
+        put.side_effect = get.side_effect = Exception("DynamoDb is down")
+
+        backpressure.throttle(backpressure.GITHUB)
+
+        self.assertEqual(backpressure.throttled_services(), [backpressure.GITHUB])
+
+    def test_refreshes_from_dynamodb_at_most_every_few_seconds(self):
+        self.assertEqual(backpressure.throttled_services(), [])
+        # Another process is throttled
+        dynamodb_client.put_throttled_until(backpressure.ASANA, 10 ** 12)
+
+        self.assertEqual(backpressure.throttled_services(), [])
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
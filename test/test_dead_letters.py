@@ -0,0 +1,108 @@
+from unittest.mock import patch
+
+from test.impl.mock_dynamodb_test_case import MockDynamoDbTestCase
+import src.dead_letters as dead_letters
+import src.deliveries as deliveries
+from src.http import HttpResponse
+from src.work_queue.client import WebhookDelivery
+
+
+def _delivery(delivery_id: str, ordering_key: str, received_at: float):
+    return WebhookDelivery(
+        delivery_id,
+        "pull_request",
+        f'{{"id": "{delivery_id}"}}',
+        ordering_key,
+        received_at=received_at,
+    )
+
+
+def _dead_letters(*delivery_ids: str):
+    return sorted(
+        (
+            dead_letter
+            for dead_letter in dead_letters.get_dead_letters()
+            if dead_letter.delivery_id in delivery_ids
+        ),
+        key=lambda dead_letter: dead_letter.delivery_id,
+    )
+
+
+@patch.object(dead_letters.github_webhook, "handle_github_webhook")
+class TestDeadLetters(MockDynamoDbTestCase):
+    def setUp(self):
+        deliveries._recent_deliveries.clear()
+
+    def test_records_headers_body_error_and_stage(self, handle):
+        dead_letters.record_dead_letter(_delivery("a", "pr-1", 1), "worker", "boom")
+        dead_letters.record_dead_letter(_delivery("a", "pr-1", 1), "replay", "bang")
+
+        (dead_letter,) = _dead_letters("a")
+        self.assertEqual(
+            dead_letter.headers,
+            {"X-GitHub-Event": "pull_request", "X-GitHub-Delivery": "a"},
+        )
+        self.assertEqual(dead_letter.body, '{"id": "a"}')
+        self.assertEqual(dead_letter.ordering_key, "pr-1")
+        self.assertEqual((dead_letter.stage, dead_letter.error), ("replay", "bang"))
+        self.assertEqual(dead_letter.attempts, 2)
+
+    def test_replay_deletes_dead_letters_that_succeed(self, handle):
+        handle.return_value = HttpResponse("200")
+        dead_letters.record_dead_letter(_delivery("b", "pr-2", 1), "handler", "boom")
+
+        outcomes = dead_letters.replay(_dead_letters("b"), rate_per_second=0)
+
+        self.assertEqual(outcomes, {"b": dead_letters.SUCCEEDED})
+        handle.assert_called_once_with("pull_request", {"id": "b"})
+        self.assertEqual(_dead_letters("b"), [])
+
+    def test_replay_keeps_order_and_stops_at_failures(self, handle):
+        handle.side_effect = [Exception("boom"), HttpResponse("200")]
+        dead_letters.record_dead_letter(_delivery("d", "pr-3", 2), "worker", "boom")
+        dead_letters.record_dead_letter(_delivery("c", "pr-3", 1), "worker", "boom")
+
+        outcomes = dead_letters.replay(_dead_letters("c", "d"), rate_per_second=0)
+
+        self.assertEqual(
+            outcomes, {"c": dead_letters.FAILED, "d": dead_letters.BLOCKED}
+        )
+        handle.assert_called_once_with("pull_request", {"id": "c"})
+        replayed, blocked = _dead_letters("c", "d")
+        self.assertEqual((replayed.stage, replayed.attempts), ("replay", 2))
+        self.assertEqual((blocked.stage, blocked.attempts), ("worker", 1))
+
+    def test_replay_skips_deliveries_that_have_since_succeeded(self, handle):
+        dead_letters.record_dead_letter(_delivery("e", "pr-4", 1), "worker", "boom")
+        deliveries.claim_delivery("e")
+        deliveries.record_delivery_outcome("e", "200", 1)
+
+        outcomes = dead_letters.replay(_dead_letters("e"), rate_per_second=0)
+
+        self.assertEqual(outcomes, {"e": dead_letters.DUPLICATE})
+        handle.assert_not_called()
+        self.assertEqual(_dead_letters("e"), [])
+
+    def test_limits_to_the_oldest_dead_letters(self, handle):
+        for delivery_id, received_at in (("g", 3), ("h", 1), ("i", 2)):
+            dead_letters.record_dead_letter(
+                _delivery(delivery_id, "pr-6", received_at), "worker", "boom"
+            )
+
+        selected = dead_letters.oldest(_dead_letters("g", "h", "i"), limit=2)
+
+        self.assertEqual(
+            [dead_letter.delivery_id for dead_letter in selected], ["h", "i"]
+        )
+
+    @patch.object(dead_letters.dynamodb_client, "put_dead_letter")
+    def test_recording_never_raises(self, put_dead_letter, handle):
+        put_dead_letter.side_effect = Exception("DynamoDb is down")
+
+        dead_letters.record_dead_letter(_delivery("f", "pr-5", 1), "worker", "boom")
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
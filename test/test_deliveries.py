@@ -0,0 +1,76 @@
+from unittest.mock import patch
+
+from test.impl.mock_dynamodb_test_case import MockDynamoDbTestCase
+import src.deliveries as deliveries
+import src.dynamodb.client as dynamodb_client
+from src.deliveries import DeliveryStatus
+
+
+class TestDeliveries(MockDynamoDbTestCase):
+    def setUp(self):
+        deliveries._recent_deliveries.clear()
+
+    def test_claims_new_delivery(self):
+        self.assertTrue(deliveries.claim_delivery("new"))
+        self.assertEqual(
+            dynamodb_client.get_delivery("new")["status"],
+            DeliveryStatus.IN_FLIGHT.value,
+        )
+
+    def test_rejects_duplicate_of_in_flight_delivery(self):
+        self.assertTrue(deliveries.claim_delivery("in-flight"))
+        deliveries._recent_deliveries.clear()
+        self.assertFalse(deliveries.claim_delivery("in-flight"))
+
+    def test_rejects_duplicate_of_succeeded_delivery(self):
+        self.assertTrue(deliveries.claim_delivery("succeeded"))
+        deliveries.record_delivery_outcome("succeeded", "200", 0)
+        deliveries._recent_deliveries.clear()
+
+        self.assertFalse(deliveries.claim_delivery("succeeded"))
+        self.assertEqual(
+            dynamodb_client.get_delivery("succeeded")["status-code"], "200"
+        )
+
+    def test_reclaims_failed_delivery(self):
+        self.assertTrue(deliveries.claim_delivery("failed"))
+        deliveries.record_delivery_outcome("failed", "500", 0)
+
+        self.assertTrue(deliveries.claim_delivery("failed"))
+        self.assertEqual(
+            dynamodb_client.get_delivery("failed")["status"],
+            DeliveryStatus.IN_FLIGHT.value,
+        )
+
+    def test_reclaims_stale_in_flight_delivery(self):
+        with patch.object(deliveries.time, "time", return_value=1000.0):
+            self.assertTrue(deliveries.claim_delivery("stale"))
+        deliveries._recent_deliveries.clear()
+
+        later = 1000.0 + deliveries.STALE_IN_FLIGHT_SECONDS + 1
+        with patch.object(deliveries.time, "time", return_value=later):
+            self.assertTrue(deliveries.claim_delivery("stale"))
+
+    def test_duplicate_in_cache_does_not_hit_dynamodb(self):
+        self.assertTrue(deliveries.claim_delivery("cached"))
+        with patch.object(dynamodb_client, "put_delivery") as put_delivery:
+            self.assertFalse(deliveries.claim_delivery("cached"))
+        put_delivery.assert_not_called()
+
+    def test_processes_delivery_when_dynamodb_is_unavailable(self):
+        with patch.object(
+            dynamodb_client, "put_delivery", side_effect=Exception("unavailable")
+        ):
+            self.assertTrue(deliveries.claim_delivery("unavailable"))
+        with patch.object(
+            dynamodb_client,
+            "update_delivery_outcome",
+            side_effect=Exception("unavailable"),
+        ):
+            deliveries.record_delivery_outcome("unavailable", "200", 0)
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
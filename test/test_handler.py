@@ -0,0 +1,182 @@
+import hashlib
+import hmac
+import json
+from unittest.mock import patch
+
+from test.impl.base_test_case_class import BaseClass
+import src.handler as handler
+from src.http import HttpResponse
+from src.work_queue.client import InMemoryWorkQueue
+
+SECRET = "top-secret"
+
+
+def _event(event_type: str, payload: dict, delivery_id: str = "delivery-1") -> dict:
+    body = json.dumps(payload)
+    signature = (
+        "sha1="
+        + hmac.new(
+            bytes(SECRET, "utf-8"), msg=bytes(body, "utf-8"), digestmod=hashlib.sha1
+        ).hexdigest()
+    )
+    return {
+        "headers": {
+            "X-GitHub-Event": event_type,
+            "X-Hub-Signature": signature,
+            "X-GitHub-Delivery": delivery_id,
+        },
+        "body": body,
+    }
+
+
+@patch.object(handler, "GITHUB_HMAC_SECRET", SECRET)
+@patch.object(handler.delivery_dedup, "record_delivery_outcome")
+@patch.object(handler.delivery_dedup, "claim_delivery", return_value=True)
+@patch.object(handler.github_webhook, "handle_github_webhook")
+class TestHandler(BaseClass):
+    PAYLOAD = {"action": "edited", "pull_request": {"node_id": "pr-node-id"}}
+
+    def test_rejects_invalid_signature(self, handle_github_webhook, *_):
+        event = _event("pull_request", self.PAYLOAD)
+        event["headers"]["X-Hub-Signature"] = "sha1=invalid"
+
+        response = handler.handler(event, {})
+
+        self.assertEqual(response["statusCode"], "501")
+        handle_github_webhook.assert_not_called()
+
+    @patch.object(handler.work_queue, "is_enabled", return_value=False)
+    def test_processes_synchronously_without_a_work_queue(
+        self, is_enabled, handle_github_webhook, *_
+    ):
+        handle_github_webhook.return_value = HttpResponse("200")
+
+        response = handler.handler(_event("pull_request", self.PAYLOAD), {})
+
+        self.assertEqual(response["statusCode"], "200")
+        handle_github_webhook.assert_called_once_with("pull_request", self.PAYLOAD)
+
+    @patch.object(handler.work_queue, "is_enabled", return_value=True)
+    def test_enqueues_delivery_when_work_queue_is_enabled(
+        self, is_enabled, handle_github_webhook, *_
+    ):
+        queue = InMemoryWorkQueue()
+        with patch.object(handler.work_queue, "singleton", return_value=queue):
+            response = handler.handler(_event("pull_request", self.PAYLOAD), {})
+
+        self.assertEqual(response["statusCode"], "200")
+        handle_github_webhook.assert_not_called()
+        (delivery,) = queue.receive()
+        self.assertEqual(delivery.delivery_id, "delivery-1")
+        self.assertEqual(delivery.event_type, "pull_request")
+        self.assertEqual(delivery.ordering_key, "pr-node-id")
+        self.assertEqual(delivery.payload(), self.PAYLOAD)
+
+    @patch.object(handler.work_queue, "is_enabled", return_value=True)
+    def test_does_not_enqueue_unsupported_events(
+        self, is_enabled, handle_github_webhook, *_
+    ):
+        queue = InMemoryWorkQueue()
+        with patch.object(handler.work_queue, "singleton", return_value=queue):
+            response = handler.handler(_event("fork", {}), {})
+
+        self.assertEqual(response["statusCode"], "501")
+        self.assertEqual(len(queue), 0)
+
+    @patch.object(handler.work_queue, "is_enabled", return_value=False)
+    def test_records_outcome_of_processed_delivery(
+        self, is_enabled, handle_github_webhook, claim_delivery, record_outcome
+    ):
+        handle_github_webhook.return_value = HttpResponse("200")
+
+        handler.handler(_event("pull_request", self.PAYLOAD, "delivery-2"), {})
+
+        claim_delivery.assert_called_once_with("delivery-2")
+        record_outcome.assert_called_once()
+        self.assertEqual(record_outcome.call_args[0][:2], ("delivery-2", "200"))
+
+    @patch.object(handler.dead_letters, "record_dead_letter")
+    @patch.object(handler.work_queue, "is_enabled", return_value=False)
+    def test_records_failure_when_processing_raises(
+        self,
+        is_enabled,
+        record_dead_letter,
+        handle_github_webhook,
+        claim_delivery,
+        record_outcome,
+    ):
+        handle_github_webhook.side_effect = Exception("boom")
+
+        response = handler.handler(_event("pull_request", self.PAYLOAD), {})
+
+        self.assertEqual(response["statusCode"], "500")
+        self.assertEqual(record_outcome.call_args[0][:2], ("delivery-1", "500"))
+        delivery, stage, error = record_dead_letter.call_args[0]
+        self.assertEqual(
+            (delivery.delivery_id, stage, error), ("delivery-1", "handler", "boom")
+        )
+
+    @patch.object(handler.dead_letters, "record_dead_letter")
+    @patch.object(handler.work_queue, "is_enabled", return_value=False)
+    def test_defers_shed_deliveries_without_a_dead_letter(
+        self,
+        is_enabled,
+        record_dead_letter,
+        handle_github_webhook,
+        claim_delivery,
+        record_outcome,
+    ):
+        handle_github_webhook.side_effect = handler.backpressure.DeferredError("shed")
+
+        response = handler.handler(_event("pull_request", self.PAYLOAD), {})
+
+        self.assertEqual(response["statusCode"], "503")
+        # A 5xx outcome leaves the delivery claimable again
+        self.assertEqual(record_outcome.call_args[0][:2], ("delivery-1", "503"))
+        record_dead_letter.assert_not_called()
+
+    @patch.object(handler.work_queue, "is_enabled", return_value=False)
+    def test_skips_duplicate_delivery(
+        self, is_enabled, handle_github_webhook, claim_delivery, record_outcome
+    ):
+        claim_delivery.return_value = False
+
+        response = handler.handler(_event("pull_request", self.PAYLOAD), {})
+
+        self.assertEqual(response["statusCode"], "200")
+        handle_github_webhook.assert_not_called()
+        record_outcome.assert_not_called()
+
+    @patch.object(handler.work_queue, "is_enabled", return_value=True)
+    def test_drops_irrelevant_events_before_claiming_or_enqueueing(
+        self, is_enabled, handle_github_webhook, claim_delivery, record_outcome
+    ):
+        queue = InMemoryWorkQueue()
+        payload = {"action": "locked", "pull_request": {"node_id": "pr-node-id"}}
+        with patch.object(handler.work_queue, "singleton", return_value=queue):
+            response = handler.handler(_event("pull_request", payload), {})
+
+        self.assertEqual(response["statusCode"], "200")
+        claim_delivery.assert_not_called()
+        self.assertEqual(len(queue), 0)
+
+    @patch.object(handler.github_webhook.repositories, "is_mapped", return_value=False)
+    @patch.object(handler.work_queue, "is_enabled", return_value=True)
+    def test_drops_events_for_unmapped_repositories_before_claiming_or_enqueueing(
+        self, is_enabled, is_mapped, handle_github_webhook, claim_delivery, *_
+    ):
+        queue = InMemoryWorkQueue()
+        payload = {**self.PAYLOAD, "repository": {"node_id": "unmapped-repo"}}
+        with patch.object(handler.work_queue, "singleton", return_value=queue):
+            response = handler.handler(_event("pull_request", payload), {})
+
+        self.assertEqual(response["statusCode"], "200")
+        is_mapped.assert_called_once_with("unmapped-repo")
+        claim_delivery.assert_not_called()
+        self.assertEqual(len(queue), 0)
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
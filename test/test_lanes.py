@@ -0,0 +1,64 @@
+from unittest.mock import patch
+
+from test.impl.base_test_case_class import BaseClass
+from src import lanes
+from src.github.webhook import Lane
+
+
+class TestTokenBucket(BaseClass):
+    @patch("src.lanes.time.time")
+    def test_refills_at_rate(self, time):
+        time.return_value = 100.0
+        bucket = lanes.TokenBucket(rate_per_second=2)
+
+        self.assertTrue(bucket.try_acquire())
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+
+        time.return_value = 100.5
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+
+
+class TestLaneBudget(BaseClass):
+    def test_admits_everything_without_a_rate_budget(self):
+        budget = lanes.LaneBudget(Lane.HIGH, max_concurrency=1)
+
+        self.assertTrue(all(budget.admit() for _ in range(100)))
+
+    @patch("src.lanes.time.time", return_value=100.0)
+    def test_deferrable_lane_is_not_admitted_over_budget(self, time):
+        budget = lanes.LaneBudget(
+            Lane.LOW, max_concurrency=1, rate_per_second=1, can_defer=True
+        )
+
+        self.assertTrue(budget.admit())
+        self.assertFalse(budget.admit())
+
+    @patch("src.lanes.time.sleep")
+    @patch("src.lanes.time.time")
+    def test_other_lanes_wait_for_their_rate_budget(self, time, sleep):
+        time.return_value = 100.0
+        sleep.side_effect = lambda seconds: setattr(
+            time, "return_value", time.return_value + seconds
+        )
+        budget = lanes.LaneBudget(Lane.NORMAL, max_concurrency=1, rate_per_second=1)
+
+        self.assertTrue(budget.admit())
+        self.assertTrue(budget.admit())
+        sleep.assert_called_once_with(1.0)
+
+    @patch("src.lanes.metrics.gauge")
+    def test_reports_queue_depth(self, gauge):
+        budget = lanes.LaneBudget(Lane.LOW, max_concurrency=1)
+
+        budget.queued(3)
+        budget.queued(-1)
+
+        gauge.assert_called_with("LaneQueueDepth", 2, dimensions={"lane": "low"})
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
@@ -0,0 +1,59 @@
+import tempfile
+import threading
+from datetime import timedelta
+from unittest.mock import patch
+
+from test.impl.base_test_case_class import BaseClass
+from src import local_lock
+from src.local_lock import LockTimeoutError
+
+
+class TestLocalLock(BaseClass):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = patch.object(local_lock, "LOCAL_LOCK_DIR", directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_different_names_do_not_conflict(self):
+        with local_lock.local_lock("pull_request_1"):
+            with local_lock.local_lock(
+                "pull_request_2", retry_timeout=timedelta(seconds=0)
+            ):
+                pass
+
+    def test_lock_is_released_after_an_exception(self):
+        with self.assertRaises(ValueError):
+            with local_lock.local_lock("pull_request_id"):
+                raise ValueError("oops")
+
+        with local_lock.local_lock("pull_request_id", retry_timeout=timedelta(0)):
+            pass
+
+    def test_blocks_other_threads_until_released(self):
+        errors = []
+
+        def try_lock():
+            try:
+                with local_lock.local_lock(
+                    "pull_request_id", retry_timeout=timedelta(milliseconds=10)
+                ):
+                    pass
+            except LockTimeoutError as error:
+                errors.append(error)
+
+        with local_lock.local_lock("pull_request_id"):
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+        self.assertEqual(len(errors), 1)
+
+        try_lock()
+        self.assertEqual(len(errors), 1)
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
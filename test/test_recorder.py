@@ -0,0 +1,52 @@
+import json
+import os
+import tempfile
+
+from test.impl.base_test_case_class import BaseClass
+import src.recorder as recorder
+
+
+class TestRecorder(BaseClass):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "recording.jsonl.gz")
+
+    def test_appends_deliveries_and_reads_them_back_in_order(self):
+        recorder.record("a", "pull_request", '{"action": "opened"}', 1.0, self.path)
+        recorder.record("b", "issue_comment", '{"action": "created"}', 2.0, self.path)
+
+        self.assertEqual(
+            list(recorder.read_recording(self.path)),
+            [
+                {
+                    "delivery_id": "a",
+                    "event_type": "pull_request",
+                    "received_at": 1.0,
+                    "payload": {"action": "opened"},
+                },
+                {
+                    "delivery_id": "b",
+                    "event_type": "issue_comment",
+                    "received_at": 2.0,
+                    "payload": {"action": "created"},
+                },
+            ],
+        )
+
+    def test_does_nothing_without_a_path(self):
+        recorder.record("a", "pull_request", "not even json", 1.0, None)
+
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_never_raises(self):
+        recorder.record(
+            "a", "pull_request", json.dumps({}), 1.0, os.path.join(self.path, "nope")
+        )
+        recorder.record("b", "pull_request", "not even json", 1.0, self.path)
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
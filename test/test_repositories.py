@@ -0,0 +1,45 @@
+from unittest.mock import patch
+
+from test.impl.mock_dynamodb_test_case import MockDynamoDbTestCase
+import src.dynamodb.client as dynamodb_client
+import src.repositories as repositories
+
+
+class TestRepositories(MockDynamoDbTestCase):
+    def setUp(self):
+        repositories._mapped_repositories.clear()
+
+    def test_repository_with_a_project_is_mapped(self):
+        dynamodb_client.insert_github_node_to_asana_id_mapping("mapped", "project-1")
+
+        self.assertTrue(repositories.is_mapped("mapped"))
+
+    def test_repository_without_a_project_is_not_mapped(self):
+        self.assertFalse(repositories.is_mapped("unmapped"))
+
+    def test_caches_lookups_until_the_next_refresh(self):
+        with patch.object(
+            repositories.dynamodb_client,
+            "get_asana_id_from_github_node_id",
+            return_value=None,
+        ) as get_asana_id:
+            self.assertFalse(repositories.is_mapped("cached"))
+            self.assertFalse(repositories.is_mapped("cached"))
+
+        get_asana_id.assert_called_once_with("cached")
+
+    def test_repository_is_assumed_mapped_when_dynamodb_is_unavailable(self):
+        with patch.object(
+            repositories.dynamodb_client,
+            "get_asana_id_from_github_node_id",
+            side_effect=Exception("unavailable"),
+        ):
+            self.assertTrue(repositories.is_mapped("unknown"))
+        # the failure isn't cached
+        self.assertFalse(repositories.is_mapped("unknown"))
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
@@ -0,0 +1,44 @@
+from unittest.mock import patch
+
+from test.impl.builders import builder
+from test.impl.mock_dynamodb_test_case import MockDynamoDbTestCase
+import src.review_ids as review_ids
+
+
+class TestReviewIds(MockDynamoDbTestCase):
+    def setUp(self):
+        review_ids._node_ids.clear()
+
+    def test_looks_up_recorded_reviews_by_database_id(self):
+        review = builder.review().database_id(1234).build()
+        review_ids.record(review)
+        # as if another instance had recorded it
+        review_ids._node_ids.clear()
+
+        self.assertEqual(review_ids.node_id(1234), review.id())
+        self.assertEqual(review_ids.node_id("1234"), review.id())
+
+    def test_unknown_reviews_are_not_found(self):
+        self.assertIsNone(review_ids.node_id(5678))
+
+    def test_reviews_without_a_database_id_are_not_recorded(self):
+        with patch.object(
+            review_ids.dynamodb_client, "put_review_node_id"
+        ) as put_review_node_id:
+            review_ids.record(builder.review().build())
+
+        put_review_node_id.assert_not_called()
+
+    def test_lookups_fall_back_when_dynamodb_is_unavailable(self):
+        with patch.object(
+            review_ids.dynamodb_client,
+            "get_review_node_id",
+            side_effect=Exception("unavailable"),
+        ):
+            self.assertIsNone(review_ids.node_id(1234))
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
@@ -0,0 +1,218 @@
+import hashlib
+import hmac
+import io
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from unittest.mock import patch
+from wsgiref.util import setup_testing_defaults
+
+from test.impl.base_test_case_class import BaseClass
+from src import server
+from src.work_queue.client import WebhookDelivery
+
+SECRET = "top-secret"
+
+
+class TestKeyedWorkerPool(BaseClass):
+    def test_runs_jobs_with_the_same_key_in_order_and_others_concurrently(self):
+        pool = server.KeyedWorkerPool(ThreadPoolExecutor(max_workers=2))
+        release_first = threading.Event()
+        other_key_ran = threading.Event()
+        ran = []
+
+        def job(name):
+            if name == "a1":
+                # Only finishes once a job with another key got to run
+                other_key_ran.wait(5)
+                release_first.wait(5)
+            if name == "b1":
+                other_key_ran.set()
+            ran.append(name)
+
+        for key, name in (("a", "a1"), ("a", "a2"), ("b", "b1")):
+            pool.submit(key, job, (name,), lambda future: None)
+        self.assertTrue(other_key_ran.wait(5))
+        release_first.set()
+
+        self.assertTrue(pool.drain(timeout=5))
+        self.assertEqual(pool.pending(), 0)
+        self.assertLess(ran.index("a1"), ran.index("a2"))
+        self.assertLess(ran.index("b1"), ran.index("a1"))
+
+    def test_rejects_jobs_once_draining(self):
+        pool = server.KeyedWorkerPool(ThreadPoolExecutor(max_workers=1))
+        self.assertTrue(pool.drain(timeout=1))
+
+        with self.assertRaises(server.PoolClosedError):
+            pool.submit("a", print, (), lambda future: None)
+
+    def test_calls_callback_with_the_jobs_future(self):
+        pool = server.KeyedWorkerPool(ThreadPoolExecutor(max_workers=1))
+        results = []
+
+        pool.submit("a", lambda: "200", (), lambda f: results.append(f.result()))
+        pool.submit("a", lambda: 1 / 0, (), lambda f: results.append(f.exception()))
+        pool.drain(timeout=5)
+
+        self.assertEqual(results[0], "200")
+        self.assertIsInstance(results[1], ZeroDivisionError)
+
+
+def _environ(method: str, path: str, body: str = "", headers: dict = None) -> dict:
+    environ: dict = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": io.BytesIO(body.encode("utf-8")),
+    }
+    for name, value in (headers or {}).items():
+        environ["HTTP_" + name.upper().replace("-", "_")] = value
+    setup_testing_defaults(environ)
+    return environ
+
+
+def _call(app, environ):
+    statuses = []
+    body = b"".join(app(environ, lambda status, headers: statuses.append(status)))
+    return statuses[0], body.decode("utf-8")
+
+
+@patch.object(server.delivery_dedup, "record_delivery_outcome")
+@patch.object(server.handler.delivery_dedup, "claim_delivery", return_value=True)
+@patch.object(server.handler, "GITHUB_HMAC_SECRET", SECRET)
+class TestApplication(BaseClass):
+    def setUp(self):
+        self.app = server.Application(
+            server.KeyedWorkerPool(ThreadPoolExecutor(max_workers=1))
+        )
+
+    def test_health(self, *_):
+        status, body = _call(self.app, _environ("GET", "/health"))
+        self.assertEqual(status, "200 OK")
+        self.assertEqual(json.loads(body)["status"], "ok")
+
+        self.app.draining = True
+        status, _ = _call(self.app, _environ("GET", "/health"))
+        self.assertEqual(status, "503 Service Unavailable")
+
+    @patch.object(server.github_webhook, "handle_github_webhook")
+    def test_keeps_answering_while_draining(self, handle_github_webhook, *_):
+        release = threading.Event()
+        self.app.pool.submit("a", release.wait, (5,), lambda future: None)
+        stopped = threading.Event()
+        self.app.draining = True
+        drain = threading.Thread(
+            target=server.drain_and_stop, args=(self.app, stopped.set, 5)
+        )
+        drain.start()
+
+        status, body = _call(self.app, _environ("GET", "/health"))
+        self.assertEqual(status, "503 Service Unavailable")
+        self.assertEqual(json.loads(body), {"status": "draining", "pending": 1})
+        status, _ = _call(self.app, _environ("POST", "/", "{}"))
+        self.assertEqual(status, "503 Service Unavailable")
+        self.assertFalse(stopped.is_set())
+
+        release.set()
+        drain.join(timeout=5)
+        self.assertTrue(stopped.is_set())
+        handle_github_webhook.assert_not_called()
+
+    @patch.object(server.github_webhook, "handle_github_webhook")
+    def test_processes_verified_deliveries_in_the_pool(
+        self, handle_github_webhook, claim_delivery, record_delivery_outcome
+    ):
+        handle_github_webhook.return_value = server.HttpResponse("200")
+        payload = {"action": "edited", "pull_request": {"node_id": "pr-node-id"}}
+        body = json.dumps(payload)
+        signature = hmac.new(
+            bytes(SECRET, "utf-8"), msg=bytes(body, "utf-8"), digestmod=hashlib.sha1
+        ).hexdigest()
+        headers = {
+            "X-GitHub-Event": "pull_request",
+            "X-Hub-Signature": "sha1=" + signature,
+            "X-GitHub-Delivery": "delivery-1",
+        }
+
+        status, _ = _call(self.app, _environ("POST", "/", body, headers))
+        self.assertTrue(self.app.pool.drain(timeout=5))
+
+        self.assertEqual(status, "200 OK")
+        handle_github_webhook.assert_called_once_with("pull_request", payload)
+        self.assertEqual(
+            record_delivery_outcome.call_args[0][:2], ("delivery-1", "200")
+        )
+
+    @patch.object(server.github_webhook, "handle_github_webhook")
+    def test_rejects_invalid_signatures(self, handle_github_webhook, *_):
+        headers = {"X-GitHub-Event": "pull_request", "X-Hub-Signature": "sha1=nope"}
+
+        status, _ = _call(self.app, _environ("POST", "/", "{}", headers))
+
+        self.assertEqual(status, "501 Not Implemented")
+        self.assertEqual(self.app.pool.pending(), 0)
+        handle_github_webhook.assert_not_called()
+
+
+def _future(result=None, exception=None) -> Future:
+    future: Future = Future()
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+    return future
+
+
+@patch.object(server.dead_letters, "record_dead_letter")
+@patch.object(server.delivery_dedup, "record_delivery_outcome")
+class TestDeliveryProcessed(BaseClass):
+    DELIVERY = WebhookDelivery("delivery-1", "pull_request", "{}", "pr-node-id")
+
+    def test_dead_letters_deliveries_that_raise(
+        self, record_delivery_outcome, record_dead_letter
+    ):
+        server._delivery_processed(self.DELIVERY, _future(exception=Exception("boom")))
+
+        self.assertEqual(
+            record_delivery_outcome.call_args[0][:2], ("delivery-1", "500")
+        )
+        record_dead_letter.assert_called_once_with(self.DELIVERY, "server", "boom")
+
+    def test_dead_letters_deliveries_that_respond_with_server_errors(
+        self, record_delivery_outcome, record_dead_letter
+    ):
+        server._delivery_processed(self.DELIVERY, _future(result="502"))
+
+        self.assertEqual(
+            record_delivery_outcome.call_args[0][:2], ("delivery-1", "502")
+        )
+        record_dead_letter.assert_called_once_with(
+            self.DELIVERY, "server", "The handler responded 502"
+        )
+
+    def test_does_not_dead_letter_processed_deliveries(
+        self, record_delivery_outcome, record_dead_letter
+    ):
+        server._delivery_processed(self.DELIVERY, _future(result="200"))
+
+        record_dead_letter.assert_not_called()
+
+    def test_defers_shed_deliveries_without_a_dead_letter(
+        self, record_delivery_outcome, record_dead_letter
+    ):
+        error = server.backpressure.DeferredError("shed")
+
+        server._delivery_processed(self.DELIVERY, _future(exception=error))
+
+        # A 5xx outcome leaves the delivery claimable again
+        self.assertEqual(
+            record_delivery_outcome.call_args[0][:2], ("delivery-1", "503")
+        )
+        record_dead_letter.assert_not_called()
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
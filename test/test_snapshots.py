@@ -0,0 +1,83 @@
+import json
+import time
+import zlib
+from unittest.mock import patch
+
+from test.impl.mock_dynamodb_test_case import MockDynamoDbTestCase
+import src.snapshots as snapshots
+
+RAW = {"id": "pr", "title": "A pull request", "comments": {"nodes": []}}
+
+
+class TestSnapshots(MockDynamoDbTestCase):
+    def setUp(self):
+        snapshots._snapshots.clear()
+
+    def test_keeps_snapshots_in_process(self):
+        snapshots.put("pr", "v1", RAW)
+
+        self.assertEqual(snapshots.get("pr"), ("v1", RAW))
+        self.assertIsNone(snapshots.get("other-pr"))
+
+    @patch.object(snapshots, "PULL_REQUEST_SNAPSHOTS_SHARED", True)
+    def test_shares_compressed_snapshots_between_instances(self):
+        snapshots.put("shared-pr", "v1", RAW)
+        # as if another instance looked it up
+        snapshots._snapshots.clear()
+
+        self.assertEqual(snapshots.get("shared-pr"), ("v1", RAW))
+
+    def test_invalidates_snapshots(self):
+        snapshots.put("edited-pr", "v1", RAW)
+
+        snapshots.invalidate("edited-pr")
+
+        self.assertIsNone(snapshots.get("edited-pr"))
+
+    @patch.object(snapshots, "PULL_REQUEST_SNAPSHOTS_SHARED", True)
+    def test_invalidations_reach_other_instances(self):
+        snapshots.put("edited-shared-pr", "v1", RAW)
+        # as if another instance invalidated it
+        snapshots.dynamodb_client.delete_pull_request_snapshot("edited-shared-pr")
+
+        self.assertIsNone(snapshots.get("edited-shared-pr"))
+
+    @patch.object(snapshots, "PULL_REQUEST_SNAPSHOTS_SHARED", True)
+    def test_uses_later_shared_snapshots_over_local_ones(self):
+        later = dict(RAW, title="A renamed pull request")
+        snapshots.put("replaced-pr", "v1", RAW)
+        # as if another instance shared v2
+        snapshots.dynamodb_client.put_pull_request_snapshot(
+            "replaced-pr",
+            "v2",
+            zlib.compress(json.dumps(later).encode("utf-8")),
+            int(time.time() + 60),
+        )
+
+        self.assertEqual(snapshots.get("replaced-pr"), ("v2", later))
+
+    @patch.object(snapshots, "PULL_REQUEST_SNAPSHOTS_SHARED", True)
+    def test_uses_local_snapshots_when_dynamodb_is_unavailable(self):
+        snapshots.put("local-pr", "v1", RAW)
+
+        with patch.object(
+            snapshots.dynamodb_client,
+            "get_pull_request_snapshot_version",
+            side_effect=Exception("unavailable"),
+        ):
+            self.assertEqual(snapshots.get("local-pr"), ("v1", RAW))
+
+    @patch.object(snapshots, "PULL_REQUEST_SNAPSHOTS_SHARED", True)
+    def test_misses_when_dynamodb_is_unavailable(self):
+        with patch.object(
+            snapshots.dynamodb_client,
+            "get_pull_request_snapshot",
+            side_effect=Exception("unavailable"),
+        ):
+            self.assertIsNone(snapshots.get("unavailable-pr"))
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from test.impl.mock_dynamodb_test_case import MockDynamoDbTestCase
+import src.sync_versions as sync_versions
+
+OLDER = datetime(2020, 1, 1, tzinfo=timezone.utc)
+NEWER = datetime(2020, 1, 2, tzinfo=timezone.utc)
+
+
+class TestSyncVersions(MockDynamoDbTestCase):
+    def setUp(self):
+        sync_versions._synced_versions.clear()
+
+    def _record(self, node_id: str, updated_at: datetime, raw: dict):
+        sync_versions.record_synced(
+            node_id, sync_versions.snapshot_version(updated_at, raw)
+        )
+        # as if another instance had synced it
+        sync_versions._synced_versions.clear()
+
+    def _is_stale(self, node_id: str, updated_at: datetime, raw: dict) -> bool:
+        return sync_versions.is_stale(
+            node_id, sync_versions.snapshot_version(updated_at, raw), "pull_request"
+        )
+
+    def test_never_synced_is_not_stale(self):
+        self.assertFalse(self._is_stale("never-synced", NEWER, {"title": "a"}))
+
+    def test_older_snapshot_is_stale(self):
+        self._record("older", NEWER, {"title": "new"})
+
+        self.assertTrue(self._is_stale("older", OLDER, {"title": "old"}))
+
+    def test_same_snapshot_is_stale(self):
+        self._record("same", NEWER, {"title": "a", "body": "b"})
+
+        self.assertTrue(self._is_stale("same", NEWER, {"body": "b", "title": "a"}))
+
+    def test_changed_snapshot_with_the_same_updated_at_is_not_stale(self):
+        # e.g. a new commit status doesn't change the pull request's updatedAt
+        self._record("changed", NEWER, {"status": "PENDING"})
+
+        self.assertFalse(self._is_stale("changed", NEWER, {"status": "SUCCESS"}))
+
+    def test_newer_snapshot_is_not_stale(self):
+        self._record("newer", OLDER, {"title": "old"})
+
+        self.assertFalse(self._is_stale("newer", NEWER, {"title": "new"}))
+
+    def test_snapshot_without_updated_at_is_never_stale(self):
+        sync_versions.record_synced("unversioned", None)
+
+        self.assertIsNone(sync_versions.snapshot_version(None, {}))
+        self.assertFalse(sync_versions.is_stale("unversioned", None, "comment"))
+
+    def test_syncs_anyway_when_dynamodb_is_unavailable(self):
+        with patch.object(
+            sync_versions.dynamodb_client,
+            "get_sync_version",
+            side_effect=Exception("unavailable"),
+        ):
+            self.assertFalse(self._is_stale("unavailable", NEWER, {}))
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
@@ -1,6 +1,8 @@
 import unittest
 
-from src.utils import memoize, parse_date_string
+from unittest.mock import patch
+
+from src.utils import LruCache, memoize, parse_date_string
 
 
 class TestParseDateString(unittest.TestCase):
@@ -38,6 +40,29 @@ class TestMemoize(unittest.TestCase):
         )
 
 
+class TestLruCache(unittest.TestCase):
+    def test_evicts_least_recently_used_entry(self):
+        cache = LruCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_entries_expire_after_ttl(self):
+        cache = LruCache(max_size=2, ttl_seconds=10)
+        with patch("src.utils.time.time", return_value=100):
+            cache.set("a", 1)
+        with patch("src.utils.time.time", return_value=105):
+            self.assertEqual(cache.get("a"), 1)
+        with patch("src.utils.time.time", return_value=111):
+            self.assertEqual(cache.get("a", "expired"), "expired")
+
+
 if __name__ == "__main__":
     from unittest import main as run_tests
 
@@ -0,0 +1,437 @@
+import threading
+import time
+from typing import Optional
+from unittest.mock import patch
+
+from test.impl.base_test_case_class import BaseClass
+from src import worker
+from src.github.webhook import Lane
+from src.lanes import LaneBudget
+from src.http import HttpResponse
+from src.work_queue.client import InMemoryWorkQueue, WebhookDelivery
+
+
+def _delivery(
+    delivery_id: str,
+    ordering_key: str,
+    received_at: float,
+    event_type: str = "pull_request",
+    action: Optional[str] = None,
+):
+    body = f'"id": "{delivery_id}"'
+    if action is not None:
+        body += f', "action": "{action}"'
+    return WebhookDelivery(
+        delivery_id, event_type, f"{{{body}}}", ordering_key, received_at=received_at,
+    )
+
+
+@patch.object(worker.github_webhook, "handle_github_webhook")
+class TestProcessDeliveries(BaseClass):
+    def setUp(self):
+        patcher = patch.object(worker.delivery_dedup, "record_delivery_outcome")
+        self.record_delivery_outcome = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(worker.dead_letters, "record_dead_letter")
+        self.record_dead_letter = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_processes_deliveries_for_the_same_key_in_received_order(self, handle):
+        processed = []
+        lock = threading.Lock()
+
+        def record(event_type, payload):
+            with lock:
+                processed.append(payload["id"])
+            return HttpResponse("200")
+
+        handle.side_effect = record
+        deliveries = [
+            _delivery("b", "pr-1", received_at=2),
+            _delivery("a", "pr-1", received_at=1),
+            _delivery("c", "pr-2", received_at=3),
+        ]
+
+        results = worker.process_deliveries(
+            deliveries, max_concurrency=2, window_seconds=0
+        )
+
+        self.assertEqual([r.delivery.delivery_id for r in results], ["a", "b", "c"])
+        self.assertTrue(all(r.succeeded() for r in results))
+        self.assertLess(processed.index("a"), processed.index("b"))
+        self.assertEqual(len(processed), 3)
+
+    def test_failed_delivery_blocks_later_deliveries_with_the_same_key(self, handle):
+        handle.side_effect = [Exception("boom"), HttpResponse("200")]
+        deliveries = [
+            _delivery("a", "pr-1", received_at=1),
+            _delivery("b", "pr-1", received_at=2),
+            _delivery("c", "pr-2", received_at=3),
+        ]
+
+        results = worker.process_deliveries(
+            deliveries, max_concurrency=1, window_seconds=0
+        )
+
+        self.assertEqual(
+            [(r.delivery.delivery_id, r.succeeded()) for r in results],
+            [("a", False), ("b", False), ("c", True)],
+        )
+        self.assertEqual(handle.call_count, 2)
+        # "b" was never attempted, so its delivery stays claimable as-is
+        self.assertEqual(
+            sorted(call[0][:2] for call in self.record_delivery_outcome.call_args_list),
+            [("a", "500"), ("c", "200")],
+        )
+        self.record_dead_letter.assert_called_once()
+        self.assertEqual(self.record_dead_letter.call_args[0][1:], ("worker", "boom"))
+
+    def test_records_the_status_code_and_fails_on_server_errors(self, handle):
+        handle.side_effect = [HttpResponse("400"), HttpResponse("500")]
+        deliveries = [
+            _delivery("a", "pr-1", received_at=1),
+            _delivery("b", "pr-2", received_at=2),
+        ]
+
+        results = worker.process_deliveries(
+            deliveries, max_concurrency=1, window_seconds=0
+        )
+
+        self.assertEqual(
+            [(r.delivery.delivery_id, r.succeeded()) for r in results],
+            [("a", True), ("b", False)],
+        )
+        self.assertEqual(
+            sorted(call[0][:2] for call in self.record_delivery_outcome.call_args_list),
+            [("a", "400"), ("b", "500")],
+        )
+        self.record_dead_letter.assert_called_once()
+
+    def test_gives_up_on_deliveries_after_max_receives(self, handle):
+        handle.side_effect = Exception("boom")
+        delivery = _delivery("a", "pr-1", received_at=1)
+        delivery.receive_count = worker.WORKER_MAX_RECEIVES
+
+        self.record_dead_letter.return_value = False
+        (result,) = worker.process_deliveries([delivery], window_seconds=0)
+        # Kept on the queue while its dead letter can't be written
+        self.assertFalse(result.succeeded())
+
+        self.record_dead_letter.return_value = True
+        (result,) = worker.process_deliveries([delivery], window_seconds=0)
+        self.assertTrue(result.succeeded())
+
+    def test_drain_gives_up_on_deliveries_that_keep_failing(self, handle):
+        handle.side_effect = Exception("boom")
+        self.record_dead_letter.return_value = True
+        queue = InMemoryWorkQueue()
+        queue.enqueue(_delivery("a", "pr-1", received_at=1))
+
+        for _ in range(worker.WORKER_MAX_RECEIVES):
+            worker.drain(queue, max_concurrency=1, window_seconds=0)
+
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(handle.call_count, worker.WORKER_MAX_RECEIVES)
+
+    def test_drain_acks_successes_and_releases_failures(self, handle):
+        handle.side_effect = [HttpResponse("200"), Exception("boom")]
+        queue = InMemoryWorkQueue()
+        queue.enqueue(_delivery("a", "pr-1", received_at=1))
+        queue.enqueue(_delivery("b", "pr-2", received_at=2))
+
+        processed = worker.drain(queue, max_concurrency=1, window_seconds=0)
+
+        # "b" failed and was released; it succeeds on the next drain
+        handle.side_effect = None
+        handle.return_value = HttpResponse("200")
+        processed += worker.drain(queue, max_concurrency=1, window_seconds=0)
+        self.assertEqual(processed, 2)
+        self.assertEqual(len(queue), 0)
+
+    def test_lambda_handler_reports_failed_messages(self, handle):
+        def fail_for_b(event_type, payload):
+            if payload["id"] == "b":
+                raise Exception("boom")
+            return HttpResponse("200")
+
+        handle.side_effect = fail_for_b
+        event = {
+            "Records": [
+                {
+                    "messageId": "message-1",
+                    "receiptHandle": "receipt-1",
+                    "body": _delivery("a", "pr-1", received_at=1).to_json(),
+                },
+                {
+                    "messageId": "message-2",
+                    "receiptHandle": "receipt-2",
+                    "body": _delivery("b", "pr-2", received_at=2).to_json(),
+                },
+            ]
+        }
+
+        response = worker.handler(event, {})
+
+        self.assertEqual(
+            response, {"batchItemFailures": [{"itemIdentifier": "message-2"}]}
+        )
+
+
+@patch.object(worker.github_webhook, "handle_github_webhook")
+class TestPriorityLanes(BaseClass):
+    def setUp(self):
+        patcher = patch.object(worker.delivery_dedup, "record_delivery_outcome")
+        self.record_delivery_outcome = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(worker.dead_letters, "record_dead_letter")
+        self.record_dead_letter = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_starts_higher_lanes_first(self, handle):
+        processed = []
+
+        def record(event_type, payload):
+            processed.append(payload["id"])
+            return HttpResponse("200")
+
+        handle.side_effect = record
+        deliveries = [
+            _delivery("a", "pr-1", 1, "issue_comment", action="edited"),
+            _delivery("b", "pr-2", 2, "issue_comment", action="created"),
+            _delivery("c", "pr-3", 3, "pull_request", action="closed"),
+        ]
+
+        worker.process_deliveries(deliveries, max_concurrency=1, window_seconds=0)
+
+        self.assertEqual(processed, ["c", "b", "a"])
+
+    def test_group_takes_the_lane_of_its_most_urgent_delivery(self, handle):
+        group = [
+            _delivery("a", "pr-1", 1, "issue_comment", action="edited"),
+            _delivery("b", "pr-1", 2, "pull_request_review", action="submitted"),
+        ]
+
+        self.assertEqual(worker._group_lane(group), Lane.HIGH)
+
+    def test_defers_low_lane_deliveries_over_budget(self, handle):
+        handle.return_value = HttpResponse("200")
+        budget = LaneBudget(Lane.LOW, 1, rate_per_second=0.001, can_defer=True)
+        now = time.time()
+        deliveries = [
+            _delivery("a", "pr-1", now, "issue_comment", action="deleted"),
+            _delivery("b", "pr-1", now + 1, "issue_comment", action="edited"),
+        ]
+
+        with patch.object(worker.lanes, "budget", return_value=budget):
+            results = worker.process_deliveries(deliveries, window_seconds=0)
+
+        self.assertEqual(
+            [(r.delivery.delivery_id, r.succeeded()) for r in results],
+            [("a", True), ("b", False)],
+        )
+        self.assertEqual(handle.call_count, 1)
+        # "b" was deferred rather than attempted, so it has no outcome
+        self.assertEqual(self.record_delivery_outcome.call_count, 1)
+
+    def test_defers_deliveries_shed_while_throttled(self, handle):
+        handle.side_effect = [
+            worker.backpressure.DeferredError("Deferred while asana is throttling"),
+            HttpResponse("200"),
+        ]
+        deliveries = [
+            _delivery("a", "pr-1", 1, "issue_comment", action="created"),
+            _delivery("b", "pr-1", 2, "issue_comment", action="created"),
+        ]
+
+        results = worker.process_deliveries(deliveries, window_seconds=0)
+
+        self.assertFalse(any(r.succeeded() for r in results))
+        self.assertEqual(handle.call_count, 1)
+        # Deferred deliveries are retried by the queue, not dead-lettered
+        self.record_delivery_outcome.assert_not_called()
+        self.record_dead_letter.assert_not_called()
+
+    def test_drops_low_lane_deliveries_over_budget_for_too_long(self, handle):
+        handle.return_value = HttpResponse("200")
+        budget = LaneBudget(Lane.LOW, 1, rate_per_second=0.001, can_defer=True)
+        deliveries = [
+            _delivery("a", "pr-1", 1, "issue_comment", action="edited"),
+            _delivery("b", "pr-2", 2, "issue_comment", action="edited"),
+        ]
+
+        with patch.object(worker.lanes, "budget", return_value=budget):
+            results = worker.process_deliveries(deliveries, window_seconds=0)
+
+        self.assertTrue(all(r.succeeded() for r in results))
+        self.assertEqual(handle.call_count, 1)
+
+    def test_drops_low_lane_deliveries_over_budget_on_their_last_receive(self, handle):
+        handle.return_value = HttpResponse("200")
+        budget = LaneBudget(Lane.LOW, 1, rate_per_second=0.001, can_defer=True)
+        now = time.time()
+        deliveries = [
+            _delivery("a", "pr-1", now, "issue_comment", action="edited"),
+            _delivery("b", "pr-2", now + 1, "issue_comment", action="edited"),
+        ]
+        deliveries[1].receive_count = worker.WORK_QUEUE_MAX_RECEIVES
+
+        with patch.object(worker.lanes, "budget", return_value=budget):
+            results = worker.process_deliveries(
+                deliveries, max_concurrency=1, window_seconds=0
+            )
+
+        self.assertTrue(all(r.succeeded() for r in results))
+        self.assertEqual(handle.call_count, 1)
+
+    def test_fails_shed_deliveries_on_their_last_receive(self, handle):
+        handle.side_effect = worker.backpressure.DeferredError("Deferred")
+        self.record_dead_letter.return_value = True
+        delivery = _delivery("a", "pr-1", 1, "issue_comment", action="created")
+        delivery.receive_count = worker.WORK_QUEUE_MAX_RECEIVES
+
+        (result,) = worker.process_deliveries([delivery], window_seconds=0)
+
+        # Acknowledged, to be replayed from its dead letter
+        self.assertTrue(result.succeeded())
+        self.assertFalse(result.deferred)
+        self.record_dead_letter.assert_called_once_with(delivery, "worker", "Deferred")
+
+    @patch.object(worker.work_queue, "singleton")
+    def test_lambda_handler_defers_deferred_messages(self, singleton, handle):
+        handle.side_effect = worker.backpressure.DeferredError("Deferred")
+        body = _delivery("a", "pr-1", 1, "issue_comment", action="created").to_json()
+        event = {
+            "Records": [
+                {"messageId": "message-1", "receiptHandle": "receipt-1", "body": body}
+            ]
+        }
+
+        response = worker.handler(event, {})
+
+        self.assertEqual(
+            response, {"batchItemFailures": [{"itemIdentifier": "message-1"}]}
+        )
+        ((delivery, delay_seconds), _) = singleton.return_value.defer.call_args
+        self.assertEqual(delivery.receipt, "receipt-1")
+        self.assertEqual(delay_seconds, worker.WORKER_DEFER_SECONDS)
+
+    def test_drain_defers_deliveries_and_later_ones_with_their_key(self, handle):
+        handle.side_effect = [
+            worker.backpressure.DeferredError("Deferred"),
+            HttpResponse("200"),
+        ]
+        queue = InMemoryWorkQueue()
+        queue.enqueue(_delivery("a", "pr-1", 1, "issue_comment", action="created"))
+        queue.enqueue(_delivery("b", "pr-2", 2, "issue_comment", action="created"))
+        queue.enqueue(_delivery("c", "pr-1", 3, "issue_comment", action="created"))
+
+        processed = worker.drain(queue, batch_size=1, window_seconds=0)
+
+        self.assertEqual(processed, 1)
+        self.assertEqual(handle.call_count, 2)
+        # "a" and "c" are invisible until the deferral is over
+        self.assertEqual(len(queue), 2)
+        self.assertEqual(queue.receive(), [])
+
+
+@patch.object(worker.github_webhook, "handle_coalesced_github_webhooks")
+@patch.object(worker.github_webhook, "handle_github_webhook")
+class TestCoalescing(BaseClass):
+    def setUp(self):
+        patcher = patch.object(worker.delivery_dedup, "record_delivery_outcome")
+        self.record_delivery_outcome = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(worker.dead_letters, "record_dead_letter")
+        self.record_dead_letter = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_coalesces_events_for_the_same_key_within_the_window(
+        self, handle, handle_coalesced
+    ):
+        handle.return_value = HttpResponse("200")
+        handle_coalesced.return_value = HttpResponse("200")
+        deliveries = [
+            _delivery("a", "pr-1", received_at=10),
+            _delivery("b", "pr-1", received_at=11, event_type="issue_comment"),
+            _delivery("c", "pr-1", received_at=12, event_type="pull_request_review"),
+            # outside of the window that started with "a"
+            _delivery("d", "pr-1", received_at=20),
+        ]
+
+        results = worker.process_deliveries(deliveries, window_seconds=5)
+
+        self.assertTrue(all(r.succeeded() for r in results))
+        handle_coalesced.assert_called_once_with(
+            [
+                ("pull_request", {"id": "a"}),
+                ("issue_comment", {"id": "b"}),
+                ("pull_request_review", {"id": "c"}),
+            ]
+        )
+        handle.assert_called_once_with("pull_request", {"id": "d"})
+
+    @patch.object(worker.github_webhook, "prefetch_pull_requests")
+    def test_prefetches_the_jobs_of_the_batch_together(
+        self, prefetch_pull_requests, handle, handle_coalesced
+    ):
+        handle.return_value = HttpResponse("200")
+        handle_coalesced.return_value = HttpResponse("200")
+        deliveries = [
+            _delivery("a", "pr-1", received_at=10),
+            _delivery("b", "pr-2", received_at=10),
+            _delivery("c", "pr-1", received_at=11, event_type="issue_comment"),
+        ]
+
+        worker.process_deliveries(deliveries, window_seconds=5)
+
+        (jobs,), _ = prefetch_pull_requests.call_args
+        self.assertCountEqual(
+            jobs,
+            [
+                [("pull_request", {"id": "a"}), ("issue_comment", {"id": "c"})],
+                [("pull_request", {"id": "b"})],
+            ],
+        )
+
+    def test_does_not_coalesce_across_keys(self, handle, handle_coalesced):
+        handle.return_value = HttpResponse("200")
+        deliveries = [
+            _delivery("a", "pr-1", received_at=10),
+            _delivery("b", "pr-2", received_at=10),
+        ]
+
+        worker.process_deliveries(deliveries, window_seconds=5)
+
+        handle_coalesced.assert_not_called()
+        self.assertEqual(handle.call_count, 2)
+
+    def test_does_not_coalesce_uncoalescable_events(self, handle, handle_coalesced):
+        handle.return_value = HttpResponse("200")
+        deliveries = [
+            _delivery("a", "sha", received_at=10, event_type="check_run"),
+            _delivery("b", "sha", received_at=11, event_type="check_run"),
+        ]
+
+        worker.process_deliveries(deliveries, window_seconds=5)
+
+        handle_coalesced.assert_not_called()
+        self.assertEqual(handle.call_count, 2)
+
+    def test_failed_coalesced_job_fails_all_of_its_deliveries(
+        self, handle, handle_coalesced
+    ):
+        handle_coalesced.side_effect = Exception("boom")
+        deliveries = [
+            _delivery("a", "pr-1", received_at=10),
+            _delivery("b", "pr-1", received_at=11),
+        ]
+
+        results = worker.process_deliveries(deliveries, window_seconds=5)
+
+        self.assertFalse(any(r.succeeded() for r in results))
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()
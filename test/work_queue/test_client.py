@@ -0,0 +1,125 @@
+import os
+import tempfile
+import time
+
+from test.impl.base_test_case_class import BaseClass
+from src.work_queue.client import (
+    InMemoryWorkQueue,
+    SqliteWorkQueue,
+    WebhookDelivery,
+)
+
+
+def _delivery(delivery_id: str, ordering_key: str = "pr-1") -> WebhookDelivery:
+    return WebhookDelivery(
+        delivery_id, "pull_request", '{"action": "edited"}', ordering_key
+    )
+
+
+class WorkQueueContract(object):
+    """Tests that every work queue backend must pass"""
+
+    def create_queue(self):
+        raise NotImplementedError()
+
+    def test_receive_returns_deliveries_in_order(self):
+        queue = self.create_queue()
+        for delivery_id in ("1", "2", "3"):
+            queue.enqueue(_delivery(delivery_id))
+
+        received = queue.receive(max_items=2)
+
+        self.assertEqual([d.delivery_id for d in received], ["1", "2"])
+        self.assertEqual(received[0].payload(), {"action": "edited"})
+
+    def test_received_deliveries_are_not_received_again(self):
+        queue = self.create_queue()
+        queue.enqueue(_delivery("1"))
+
+        first = queue.receive()
+        second = queue.receive()
+
+        self.assertEqual(len(first), 1)
+        self.assertEqual(second, [])
+
+    def test_acked_deliveries_are_removed(self):
+        queue = self.create_queue()
+        queue.enqueue(_delivery("1"))
+
+        (delivery,) = queue.receive()
+        queue.ack(delivery)
+
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(queue.receive(), [])
+
+    def test_released_deliveries_are_received_again(self):
+        queue = self.create_queue()
+        queue.enqueue(_delivery("1"))
+
+        (delivery,) = queue.receive()
+        queue.release(delivery)
+
+        self.assertEqual([d.delivery_id for d in queue.receive()], ["1"])
+
+    def test_counts_the_receives_of_each_delivery(self):
+        queue = self.create_queue()
+        queue.enqueue(_delivery("1"))
+
+        for expected in (1, 2):
+            (delivery,) = queue.receive()
+            self.assertEqual(delivery.receive_count, expected)
+            queue.release(delivery)
+
+    def test_deferred_deliveries_are_received_again_after_the_delay(self):
+        queue = self.create_queue()
+        queue.enqueue(_delivery("1"))
+
+        (delivery,) = queue.receive()
+        queue.defer(delivery, 0.2)
+
+        self.assertEqual(queue.receive(), [])
+        time.sleep(0.3)
+        (delivery,) = queue.receive()
+        self.assertEqual(delivery.delivery_id, "1")
+        self.assertEqual(delivery.receive_count, 2)
+
+
+class TestInMemoryWorkQueue(WorkQueueContract, BaseClass):
+    def create_queue(self):
+        return InMemoryWorkQueue()
+
+
+class TestSqliteWorkQueue(WorkQueueContract, BaseClass):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_queue(self, visibility_timeout: float = 300):
+        return SqliteWorkQueue(
+            os.path.join(self.directory.name, "queue.sqlite3"),
+            visibility_timeout=visibility_timeout,
+        )
+
+    def test_unacknowledged_deliveries_become_visible_after_timeout(self):
+        queue = self.create_queue(visibility_timeout=0)
+        queue.enqueue(_delivery("1"))
+
+        queue.receive()
+
+        self.assertEqual([d.delivery_id for d in queue.receive()], ["1"])
+
+    def test_deliveries_survive_reopening_the_queue(self):
+        self.create_queue().enqueue(_delivery("1", ordering_key="pr-2"))
+
+        (delivery,) = self.create_queue().receive()
+
+        self.assertEqual(delivery.delivery_id, "1")
+        self.assertEqual(delivery.ordering_key, "pr-2")
+
+
+if __name__ == "__main__":
+    from unittest import main as run_tests
+
+    run_tests()